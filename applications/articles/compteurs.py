@@ -0,0 +1,144 @@
+"""
+Compteurs de vues des articles et des publications, tamponnés dans le cache.
+
+Un UPDATE par consultation sur la ligne d'un article populaire fait attendre
+les lectures suivantes sur son verrou (période d'admission). Chaque vue est
+donc ajoutée à un compteur du cache partagé (cache.incr, atomique sur Redis
+et Memcached) ; manage.py vider_compteurs_vues, à planifier toutes les
+minutes, reporte ces compteurs en base par lots, une requête UPDATE par lot.
+nombre_vues en base retarde ainsi d'au plus une période sur les vues réelles.
+
+Le report ne lit que les objets vus depuis le précédent : la première vue
+d'un objet (compteur qui passe à 1) l'inscrit au journal du modèle, une
+suite de clés numérotées par cache.incr — le cache n'a pas d'ensemble
+atomique commun à tous les backends.
+
+Un même visiteur (session, à défaut adresse et navigateur) qui revient sur
+un article n'est compté qu'une fois pendant VUES_DEDUP_DUREE secondes
+(30 minutes par défaut) : une clé de cache par visiteur et par article, qui
+doit donc expirer vite (robots sans session).
+
+Avec un cache propre à chaque processus (LocMemCache, le défaut en
+développement), la commande ne verrait pas les compteurs des processus web :
+chaque vue est alors écrite directement en base. VUES_TAMPON force l'un ou
+l'autre mode.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, Value, When
+
+from utilitaires.cache import cache_partage
+
+DEDUP_DUREE = 30 * 60
+
+
+def tampon_actif():
+    tampon = getattr(settings, "VUES_TAMPON", None)
+    if tampon is None:
+        return cache_partage()
+    return tampon
+
+
+def cle_compteur(modele, pk):
+    return f"vues:{modele._meta.label_lower}:{pk}"
+
+
+def _cle_journal(modele, suffixe):
+    return f"vues:journal:{modele._meta.label_lower}:{suffixe}"
+
+
+def _incr(cle):
+    try:
+        return cache.incr(cle)
+    except ValueError:
+        # Clé absente : add() la crée une seule fois, même entre processus
+        if cache.add(cle, 1, None):
+            return 1
+        return cache.incr(cle)
+
+
+def _inscrire(modele, pk):
+    """Ajoute `pk` au journal des objets à reporter"""
+    cache.set(_cle_journal(modele, _incr(_cle_journal(modele, "dernier"))), pk, None)
+
+
+def identifiant_visiteur(request):
+    """Clé de session, ou empreinte de l'adresse et du navigateur sans session"""
+    if request.session.session_key:
+        return request.session.session_key
+    empreinte = f"{request.META.get('REMOTE_ADDR', '')}|{request.META.get('HTTP_USER_AGENT', '')}"
+    return hashlib.sha1(empreinte.encode()).hexdigest()
+
+
+def compter_vue(objet, visiteur=None):
+    """
+    Ajoute une vue à `objet` (Article ou Publication), sauf si `visiteur` l'a
+    déjà vu récemment. Retourne True si la vue est comptée.
+    """
+    modele = type(objet)
+    if visiteur is not None:
+        deja_vu = f"vues:vu:{modele._meta.label_lower}:{objet.pk}:{visiteur}"
+        if not cache.add(deja_vu, 1, getattr(settings, "VUES_DEDUP_DUREE", DEDUP_DUREE)):
+            return False
+
+    if not tampon_actif():
+        modele.objects.filter(pk=objet.pk).update(nombre_vues=F("nombre_vues") + 1)
+        return True
+
+    if _incr(cle_compteur(modele, objet.pk)) == 1:
+        _inscrire(modele, objet.pk)
+    return True
+
+
+def vider_compteurs(modele, taille_lot=500):
+    """
+    Reporte en base les vues en attente dans le cache pour les objets de
+    `modele` inscrits au journal : par lot de `taille_lot` entrées, deux
+    lectures groupées du cache et un UPDATE. Les vues arrivées pendant le
+    report restent en attente (decr) et l'objet est réinscrit.
+    Retourne (objets mis à jour, vues reportées).
+    """
+    dernier = cache.get(_cle_journal(modele, "dernier"), 0)
+    lu = cache.get(_cle_journal(modele, "lu"), 0)
+    # Entrée numérotée mais pas encore écrite (vue en cours) : relue au
+    # prochain report, puis ignorée si elle manque toujours
+    attendue = cache.get(_cle_journal(modele, "attendue"))
+    jusqu_a = dernier
+
+    objets = vues = 0
+    for debut in range(lu + 1, dernier + 1, taille_lot):
+        numeros = range(debut, min(debut + taille_lot, dernier + 1))
+        entrees = cache.get_many([_cle_journal(modele, n) for n in numeros])
+        manquant = next((n for n in numeros if _cle_journal(modele, n) not in entrees), None)
+        if manquant is not None and manquant != attendue and jusqu_a == dernier:
+            jusqu_a = manquant - 1
+            cache.set(_cle_journal(modele, "attendue"), manquant, None)
+
+        pks = set(entrees.values())
+        cles = {cle_compteur(modele, pk): pk for pk in pks}
+        en_attente = {
+            cles[cle]: int(valeur) for cle, valeur in cache.get_many(list(cles)).items() if valeur
+        }
+        if en_attente:
+            modele.objects.filter(pk__in=list(en_attente)).update(
+                nombre_vues=F("nombre_vues") + Case(
+                    *(When(pk=pk, then=Value(n)) for pk, n in en_attente.items()),
+                    default=Value(0),
+                )
+            )
+            for pk, n in en_attente.items():
+                try:
+                    restantes = cache.decr(cle_compteur(modele, pk), n)
+                except ValueError:
+                    continue   # clé évincée entre-temps : ces vues sont déjà en base
+                if restantes > 0:
+                    _inscrire(modele, pk)
+            objets += len(en_attente)
+            vues += sum(en_attente.values())
+
+    cache.delete_many([_cle_journal(modele, n) for n in range(lu + 1, jusqu_a + 1)])
+    cache.set(_cle_journal(modele, "lu"), jusqu_a, None)
+    return objets, vues
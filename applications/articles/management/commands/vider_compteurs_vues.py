@@ -0,0 +1,40 @@
+"""
+Commande de report en base des vues d'articles et de publications
+accumulées dans le cache (voir applications/articles/compteurs.py).
+
+À planifier toutes les minutes (cron) quand le cache est partagé (Redis,
+Memcached) ; sans effet avec un cache local, les vues étant alors écrites
+directement.
+
+Usage :
+    python manage.py vider_compteurs_vues
+    python manage.py vider_compteurs_vues --taille-lot 1000
+"""
+
+from django.core.management.base import BaseCommand
+
+from applications.articles.compteurs import tampon_actif, vider_compteurs
+from applications.articles.models import Article, Publication
+
+
+class Command(BaseCommand):
+    help = "Reporte en base les vues d'articles et de publications en attente dans le cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--taille-lot", type=int, default=500,
+            help="Objets lus dans le cache et mis à jour par requête (défaut : 500)",
+        )
+
+    def handle(self, *args, **options):
+        if not tampon_actif():
+            self.stdout.write(self.style.WARNING(
+                "Cache local : les vues sont écrites directement en base, rien à reporter."
+            ))
+            return
+
+        for modele in (Article, Publication):
+            objets, vues = vider_compteurs(modele, options["taille_lot"])
+            self.stdout.write(self.style.SUCCESS(
+                f"{modele._meta.verbose_name_plural} : {vues} vue(s) reportée(s) sur {objets} objet(s)."
+            ))
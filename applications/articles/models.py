@@ -11,6 +11,8 @@ from django.utils import timezone
 
 from configuration import settings
 
+from .compteurs import compter_vue
+
 
 def generate_unique_slug(instance, model, slug_field="slug"):
     """
@@ -31,6 +33,18 @@ def generate_unique_slug(instance, model, slug_field="slug"):
     return unique_slug
 
 
+def _proteger_nombre_vues(instance, kwargs):
+    """
+    nombre_vues n'est écrit que par des UPDATE ... F() (vider_compteurs_vues) :
+    une instance chargée avant un report ne doit pas l'écraser.
+    """
+    if not instance._state.adding and kwargs.get("update_fields") is None:
+        kwargs["update_fields"] = [
+            f.attname for f in instance._meta.concrete_fields
+            if not f.primary_key and f.attname != "nombre_vues"
+        ]
+
+
 class Categorie(models.Model):
     nom = models.CharField(max_length=100, unique=True, verbose_name="Nom")
     slug = models.SlugField(max_length=120, unique=True, blank=True)
@@ -156,13 +170,15 @@ class Article(models.Model):
         if not self.extrait and self.contenu:
             clean = re.sub(r"<[^>]+>", "", self.contenu)
             self.extrait = clean[:300] + "..." if len(clean) > 300 else clean
+        _proteger_nombre_vues(self, kwargs)
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse("articles:detail", kwargs={"slug": self.slug})
 
-    def incrementer_vues(self):
-        Article.objects.filter(pk=self.pk).update(nombre_vues=F("nombre_vues") + 1)
+    def incrementer_vues(self, visiteur=None):
+        """Compte une vue, en différé (voir compteurs.py) ; True si comptée"""
+        return compter_vue(self, visiteur)
 
     @property
     def nombre_commentaires(self):
@@ -361,12 +377,12 @@ class Publication(models.Model):
                 slug = f"{base}-{n}"
                 n += 1
             self.slug = slug
+        _proteger_nombre_vues(self, kwargs)
         super().save(*args, **kwargs)
 
-    def incrementer_vues(self):
-        Publication.objects.filter(pk=self.pk).update(
-            nombre_vues=models.F("nombre_vues") + 1
-        )
+    def incrementer_vues(self, visiteur=None):
+        """Compte une vue, en différé (voir compteurs.py) ; True si comptée"""
+        return compter_vue(self, visiteur)
 
 
 class MetriqueRecherche(models.Model):
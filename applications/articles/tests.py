@@ -0,0 +1,96 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from applications.comptes.models import Utilisateur
+from .compteurs import _cle_journal, compter_vue, vider_compteurs
+from .models import Article, Publication
+
+
+@override_settings(VUES_TAMPON=True)
+class CompteursVuesTest(TestCase):
+    """Tests des compteurs de vues tamponnés dans le cache"""
+
+    def setUp(self):
+        cache.clear()
+        auteur = Utilisateur.objects.create_user(
+            email="redaction@example.com", password="motdepasse123",
+            first_name="Ré", last_name="Daction", role="ADMIN", doit_changer_mot_de_passe=False,
+        )
+        self.article = Article.objects.create(
+            titre="Rentrée 2026", contenu="<p>Bienvenue</p>", statut="publie", auteur=auteur,
+        )
+        self.publication = Publication.objects.create(
+            titre="Migrations haïtiennes", resume="…", annee_publication=2025,
+        )
+
+    def _vues(self, objet):
+        return type(objet).objects.values_list("nombre_vues", flat=True).get(pk=objet.pk)
+
+    def test_vues_reportees_par_lots(self):
+        for visiteur in ("a", "b", "c"):
+            self.assertTrue(self.article.incrementer_vues(visiteur))
+        self.publication.incrementer_vues()
+        self.assertEqual(self._vues(self.article), 0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(vider_compteurs(Article), (1, 3))
+        self.assertEqual(self._vues(self.article), 3)
+        # Reportées une seule fois, sans parcourir les objets non vus
+        with self.assertNumQueries(0):
+            self.assertEqual(vider_compteurs(Article), (0, 0))
+
+        self.article.incrementer_vues("d")
+        vider_compteurs(Article)
+        self.assertEqual(self._vues(self.article), 4)
+
+    def test_un_visiteur_compte_une_fois(self):
+        self.assertTrue(compter_vue(self.article, "a"))
+        self.assertFalse(compter_vue(self.article, "a"))
+        self.assertTrue(compter_vue(self.publication, "a"))
+        vider_compteurs(Article)
+        self.assertEqual(self._vues(self.article), 1)
+
+    def test_instance_perimee_n_ecrase_pas(self):
+        perime = Article.objects.get(pk=self.article.pk)
+        self.article.incrementer_vues("a")
+        vider_compteurs(Article)
+        perime.titre = "Rentrée universitaire 2026"
+        perime.save()
+        self.assertEqual(self._vues(self.article), 1)
+
+    def test_vue_detail(self):
+        url = reverse("articles:detail", kwargs={"slug": self.article.slug})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.get(url)
+
+        sortie = StringIO()
+        call_command("vider_compteurs_vues", stdout=sortie)
+        self.assertIn("1 vue(s) reportée(s) sur 1 objet(s)", sortie.getvalue())
+        self.assertEqual(self._vues(self.article), 1)
+
+    def test_entree_du_journal_en_cours_d_ecriture(self):
+        # Un processus a numéroté une entrée sans l'avoir encore écrite
+        cache.set(_cle_journal(Article, "dernier"), 1, None)
+        self.article.incrementer_vues("a")
+        self.assertEqual(vider_compteurs(Article), (1, 1))
+        cache.set(_cle_journal(Article, 1), self.article.pk, None)   # écrite ensuite
+        self.article.incrementer_vues("b")
+        self.assertEqual(vider_compteurs(Article), (1, 1))
+        self.assertEqual(self._vues(self.article), 2)
+
+        # Jamais écrite : ignorée au report suivant
+        cache.incr(_cle_journal(Article, "dernier"))
+        self.article.incrementer_vues("c")
+        vider_compteurs(Article)
+        vider_compteurs(Article)
+        self.assertEqual(cache.get(_cle_journal(Article, "lu")), cache.get(_cle_journal(Article, "dernier")))
+        self.assertEqual(self._vues(self.article), 3)
+
+    @override_settings(VUES_TAMPON=False)
+    def test_ecriture_directe_sans_cache_partage(self):
+        self.article.incrementer_vues("a")
+        self.assertEqual(self._vues(self.article), 1)
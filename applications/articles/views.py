@@ -14,6 +14,7 @@ from django.urls import reverse_lazy
 from django.core.cache import cache
 from django.db.models import Q
 from django.core.exceptions import PermissionDenied
+from .compteurs import identifiant_visiteur
 from .models import Annonce, Article, Categorie, Evenement, Tag
 from .forms import FormulaireArticle, FormulaireCategorieAdmin, FormulaireAnnonce, FormulaireEvenement
 # ── Mixins de permission ──────────────────────────────────────────────────────
@@ -136,7 +137,8 @@ class VueDetailArticle(DetailView):
         obj = super().get_object(queryset)
 
         if obj.statut == "publie":
-            obj.incrementer_vues()
+            # Une fois par visiteur, reportée en base par vider_compteurs_vues
+            obj.incrementer_vues(identifiant_visiteur(self.request))
             return obj
 
         # Brouillon / révision → staff ou auteur uniquement
@@ -8,4 +8,5 @@ class ComptesConfig(AppConfig):
 
     def ready(self):
         import applications.comptes.signals  # ✅ important !
+        import applications.comptes.checks  # noqa: F401
 
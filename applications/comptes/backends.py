@@ -1,11 +1,106 @@
-import re
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+
+from .models import classer_identifiant
 
 UserModel = get_user_model()
 
 
+# ── Limitation des tentatives échouées ──────────────────────────────
+# Compteurs en cache sur une fenêtre fixe, par identifiant et par adresse IP.
+# Au-delà de la limite, chaque nouvel échec impose un délai croissant
+# (CONNEXION_DELAI_BASE secondes, doublé à chaque échec, plafonné à
+# CONNEXION_DELAI_MAX) plutôt qu'un verrou pour toute la fenêtre : quelqu'un
+# qui essaie le mot de passe d'un autre ne peut bloquer son compte que
+# quelques minutes après chaque essai. Pendant le délai, la tentative est
+# refusée sans toucher à la table des utilisateurs, mais après le même
+# hachage qu'une vraie vérification : la durée de la réponse ne révèle pas
+# quels identifiants sont bloqués.
+#
+# Derrière un proxy inverse, REMOTE_ADDR est celle du proxy : l'adresse du
+# client est lue dans CONNEXION_ENTETE_IP (X-Forwarded-For), à condition que
+# la requête vienne d'un proxy de CONNEXION_PROXYS_DE_CONFIANCE.
+
+def _cle_cache(prefixe, valeur):
+    empreinte = hashlib.sha256(valeur.encode('utf-8')).hexdigest()
+    return f'connexion:{prefixe}:{empreinte}'
+
+
+def adresse_client(request):
+    """
+    Adresse IP du client : la plus à droite des adresses de l'en-tête
+    CONNEXION_ENTETE_IP qui n'est pas un proxy de confiance, si la requête
+    vient d'un proxy de confiance ; sinon REMOTE_ADDR.
+    """
+    if request is None:
+        return None
+    adresse = request.META.get('REMOTE_ADDR')
+    proxys = set(getattr(settings, 'CONNEXION_PROXYS_DE_CONFIANCE', ()))
+    if adresse not in proxys:
+        return adresse
+    entete = request.META.get(getattr(settings, 'CONNEXION_ENTETE_IP', 'HTTP_X_FORWARDED_FOR'), '')
+    # Chaque proxy ajoute à droite l'adresse qui l'a contacté : seules les
+    # adresses ajoutées par nos proxys sont fiables
+    for precedente in reversed([a.strip() for a in entete.split(',') if a.strip()]):
+        adresse = precedente
+        if adresse not in proxys:
+            break
+    return adresse
+
+
+def _compteurs(identifiant, request):
+    """Retourne [(clé de cache, limite)] applicables à cette tentative."""
+    compteurs = [(
+        _cle_cache('identifiant', identifiant),
+        getattr(settings, 'CONNEXION_ECHECS_MAX_IDENTIFIANT', 5),
+    )]
+    ip = adresse_client(request)
+    if ip:
+        compteurs.append((
+            _cle_cache('ip', ip),
+            getattr(settings, 'CONNEXION_ECHECS_MAX_IP', 50),
+        ))
+    return compteurs
+
+
+def _cle_delai(cle):
+    return f'{cle}:delai'
+
+
+def connexion_bloquee(identifiant, request=None):
+    """Vrai si un délai imposé après trop d'échecs court encore."""
+    cles = [_cle_delai(cle) for cle, _ in _compteurs(identifiant, request)]
+    return bool(cache.get_many(cles))
+
+
+def enregistrer_echec(identifiant, request=None):
+    duree = getattr(settings, 'CONNEXION_FENETRE_ECHECS', 15 * 60)
+    base = getattr(settings, 'CONNEXION_DELAI_BASE', 2)
+    plafond = getattr(settings, 'CONNEXION_DELAI_MAX', 5 * 60)
+    for cle, limite in _compteurs(identifiant, request):
+        # add() ne crée la clé (et sa durée de vie) qu'au premier échec
+        cache.add(cle, 0, duree)
+        try:
+            echecs = cache.incr(cle)
+        except ValueError:
+            # Clé expirée entre add() et incr()
+            cache.set(cle, 1, duree)
+            echecs = 1
+        if echecs >= limite:
+            delai = min(plafond, base * 2 ** min(echecs - limite, 32))
+            cache.set(_cle_delai(cle), 1, delai)
+
+
+def reinitialiser_echecs(identifiant):
+    cle = _cle_cache('identifiant', identifiant)
+    cache.delete_many([cle, _cle_delai(cle)])
+
+
 class AuthentificationUniverselle(ModelBackend):
     """
     Authentification via email, numéro de téléphone ou numéro étudiant (CIN).
@@ -15,43 +110,42 @@ class AuthentificationUniverselle(ModelBackend):
         509 (avec ou sans '+').
       - Matricule étudiant (CIN / NINU) : exactement 10 chiffres.
       - Email : contient '@'.
+
+    L'identifiant est normalisé puis recherché sur la colonne indexée
+    correspondante de Utilisateur (email_normalise, telephone_normalise ou
+    matricule_normalise) : une seule requête, sans jointure.
     """
 
     def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
         if not username or not password:
             return None
 
-        identifiant = username.strip()
-        normalise = re.sub(r'[\s\-]', '', identifiant)
-
-        # ── Email ───────────────────────────────────────────────────
-        if '@' in identifiant:
-            lookup = Q(email__iexact=identifiant)
-
-        # ── Téléphone (8 chiffres locaux, ou 11 avec indicatif 509) ──
-        elif re.fullmatch(r'\+?509\d{8}', normalise) or re.fullmatch(r'\d{8}', normalise):
-            if not normalise.startswith('+'):
-                if normalise.startswith('509') and len(normalise) == 11:
-                    normalise = f'+{normalise}'
-                elif len(normalise) == 8:
-                    normalise = f'+509{normalise}'
-            lookup = Q(numero_telephone=normalise)
+        champ, valeur = classer_identifiant(username)
+        if not valeur:
+            return None
 
-        # ── Numéro étudiant / CIN (10 chiffres, ou tout autre format) ─
-        else:
-            lookup = Q(profil_etudiant__numero_etudiant__iexact=identifiant)
+        cle = f'{champ}:{valeur}'
+        if connexion_bloquee(cle, request):
+            # Même coût qu'un vrai contrôle : ne révèle pas le blocage
+            make_password(password)
+            return None
 
-        utilisateur = UserModel.objects.filter(lookup).select_related(
-            'profil_etudiant'
-        ).first()
+        utilisateur = UserModel.objects.filter(**{champ: valeur}).first()
 
-        if utilisateur and utilisateur.check_password(password) and self.user_can_authenticate(utilisateur):
+        if utilisateur is None:
+            # Même coût qu'un vrai contrôle : ne révèle pas l'existence du compte
+            UserModel().set_password(password)
+        elif utilisateur.check_password(password) and self.user_can_authenticate(utilisateur):
+            reinitialiser_echecs(cle)
             return utilisateur
 
+        enregistrer_echec(cle, request)
         return None
 
     def get_user(self, user_id):
         try:
             return UserModel.objects.get(pk=user_id)
         except UserModel.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
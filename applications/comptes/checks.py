@@ -0,0 +1,31 @@
+"""
+Vérifications système (manage.py check) propres aux comptes.
+"""
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from utilitaires.cache import cache_partage
+
+MOTEUR_SESSIONS = "applications.comptes.sessions"
+
+
+@register(Tags.caches, Tags.security)
+def verifier_cache_sessions(app_configs, **kwargs):
+    """
+    Le moteur de sessions à écriture réduite sert les sessions depuis le
+    cache : avec un cache propre à chaque processus, une session supprimée
+    (déconnexion) dans un processus reste valide dans les autres.
+    """
+    if settings.SESSION_ENGINE != MOTEUR_SESSIONS or cache_partage(settings.SESSION_CACHE_ALIAS):
+        return []
+    return [
+        Warning(
+            "SESSION_ENGINE utilise le cache, mais le cache des sessions est propre à chaque processus.",
+            hint=(
+                "Configurer un cache partagé (CACHE_BACKEND / CACHE_LOCATION : Redis, Memcached) "
+                "ou SESSION_ENGINE = 'django.contrib.sessions.backends.db'."
+            ),
+            id="comptes.W001",
+        )
+    ]
@@ -0,0 +1,114 @@
+"""
+Banc d'essai des écritures de sessions.
+
+Rejoue le même trafic (utilisateurs connectés, une page vue toutes les
+--intervalle secondes simulées) à travers SessionMiddleware avec le moteur
+de sessions en base de Django puis avec applications.comptes.sessions, et
+compte les écritures sur django_session. Tout est annulé en fin de commande.
+
+Usage :
+    python manage.py bench_sessions
+    python manage.py bench_sessions --utilisateurs 50 --requetes 100 --intervalle 30
+"""
+
+import time
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+MOTEURS = [
+    ("Base de données (Django)", "django.contrib.sessions.backends.db"),
+    ("Écriture réduite",         "applications.comptes.sessions"),
+]
+
+
+class _AnnulerBanc(Exception):
+    """Exception interne : annule la transaction du banc d'essai."""
+    pass
+
+
+def _vue(request):
+    # Comme AuthenticationMiddleware : chaque page lit l'utilisateur en session
+    request.session.get("_auth_user_id")
+    return HttpResponse()
+
+
+class Command(BaseCommand):
+    help = "Compare les écritures django_session du moteur par défaut et du moteur à écriture réduite."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--utilisateurs", type=int, default=20, help="Sessions simulées (défaut : 20)")
+        parser.add_argument("--requetes", type=int, default=100, help="Pages vues par session (défaut : 100)")
+        parser.add_argument(
+            "--intervalle", type=int, default=30,
+            help="Secondes simulées entre deux pages vues (défaut : 30)",
+        )
+
+    def handle(self, *args, **options):
+        resultats = []
+        for libelle, moteur in MOTEURS:
+            try:
+                with transaction.atomic():
+                    resultats.append((libelle, *self._mesurer(moteur, options)))
+                    raise _AnnulerBanc()
+            except _AnnulerBanc:
+                pass
+
+        total = options["utilisateurs"] * options["requetes"]
+        self.stdout.write(f"\n{total} pages vues, une toutes les {options['intervalle']} s par session\n")
+        for libelle, ecritures, duree in resultats:
+            self.stdout.write(
+                f"  {libelle:<26} {ecritures:>7} écriture(s)   {duree:6.2f} s"
+            )
+
+        reference, reduit = resultats[0][1], resultats[1][1]
+        if reference:
+            self.stdout.write(self.style.SUCCESS(
+                f"\nÉcritures évitées : {100 * (reference - reduit) / reference:.1f} %"
+            ))
+
+    def _mesurer(self, moteur, options):
+        store = import_module(moteur).SessionStore
+        usine = RequestFactory()
+        depart = timezone.now()
+        horloge = [depart]
+
+        with override_settings(SESSION_ENGINE=moteur), \
+                mock.patch("django.utils.timezone.now", lambda: horloge[0]):
+            middleware = SessionMiddleware(_vue)
+
+            cles = []
+            for i in range(options["utilisateurs"]):
+                session = store()
+                session["_auth_user_id"] = str(i)
+                session.create()
+                cles.append(session.session_key)
+
+            debut = time.perf_counter()
+            with CaptureQueriesContext(connection) as requetes:
+                for n in range(options["requetes"]):
+                    horloge[0] = depart + timedelta(seconds=n * options["intervalle"])
+                    for cle in cles:
+                        requete = usine.get("/")
+                        requete.COOKIES[settings.SESSION_COOKIE_NAME] = cle
+                        middleware(requete)
+            duree = time.perf_counter() - debut
+
+            # Ne pas laisser d'entrées de cache pour des sessions annulées
+            for cle in cles:
+                store(cle).delete()
+
+        ecritures = sum(
+            1 for q in requetes.captured_queries
+            if "django_session" in q["sql"] and q["sql"].lstrip().upper().startswith(("UPDATE", "INSERT"))
+        )
+        return ecritures, duree
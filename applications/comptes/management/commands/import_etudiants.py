@@ -14,30 +14,57 @@ Emplacement attendu :
 Le script est idempotent : un étudiant déjà importé (retrouvé par
 `numero_etudiant`) est mis à jour, pas dupliqué.
 
+Le fichier est lu en flux et enregistré par lots (--taille-lot) : les
+emails existants sont chargés une fois en mémoire, les matricules sont
+recherchés une fois par lot, les mots de passe sont hachés en parallèle
+(--processus) et les lignes sont écrites par bulk_create / bulk_update. Le
+débit (lignes/s) et la durée de chaque étape sont affichés à la fin. En
+--dry-run, les mots de passe ne sont pas hachés.
+
 Usage :
     python manage.py import_etudiants donnees/etudiants.csv
     python manage.py import_etudiants etudiants.csv --dry-run
     python manage.py import_etudiants etudiants.csv --mot-de-passe-defaut motdepasse123
+    python manage.py import_etudiants etudiants.csv --processus 8 --taille-lot 1000 --rapport erreurs.csv
 """
 
-import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
 
-from django.contrib.auth import get_user_model
-from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
-from django.db.models.signals import post_save
+from django.contrib.auth.hashers import make_password
 from django.utils import timezone
 
-from applications.comptes.models import Utilisateur, Etudiant
+from applications.comptes.models import (
+    Utilisateur, Etudiant, normaliser_email, normaliser_matricule,
+)
 from applications.departements.models import Departement
+from utilitaires.importation import Colonne, CommandeImport, ErreurLigne, completer_pks
+
+
+# ── Hachage parallèle ─────────────────────────────────────────────────────────
+# Fonctions de module : elles sont exécutées dans les processus du pool.
+
+def _initialiser_processus():
+    import django
+    django.setup()
+
+
+def _hacher(mot_de_passe):
+    return make_password(mot_de_passe)
+
+
+def _email(valeur):
+    if "@" not in valeur:
+        raise ValueError(valeur)
+    return valeur
 
 
-class _StopDryRun(Exception):
-    """Exception interne : annule la transaction en mode --dry-run."""
-    pass
+def _genre(valeur):
+    # Valeur par défaut silencieuse
+    return valeur.upper() if valeur.upper() in ("M", "F") else "M"
 
 
-class Command(BaseCommand):
+class Command(CommandeImport):
     help = "Importe les étudiants depuis un fichier CSV."
 
     # Colonne CSV "departement" → code du modèle Departement
@@ -63,7 +90,20 @@ class Command(BaseCommand):
         "Niveau III":   "NIVEAU3",
     }
 
-    def add_arguments(self, parser):
+    COLONNES = {
+        "numero_etudiant": Colonne(obligatoire=True),
+        "email":           Colonne(obligatoire=True, convertir=_email),
+        "departement":     Colonne(choix=DEPARTEMENT_MAP, libelle="département"),
+        "niveau":          Colonne(choix=NIVEAU_MAP),
+        "last_name":       Colonne(),
+        "first_name":      Colonne(),
+        "password":        Colonne(),
+        "genre":           Colonne(defaut="M", convertir=_genre),
+    }
+
+    RESUME = "{creees} étudiant(s) créé(s), {mises_a_jour} mis à jour, {ignorees} ignoré(s)"
+
+    def ajouter_arguments(self, parser):
         parser.add_argument(
             "csv_path",
             type=str,
@@ -75,240 +115,155 @@ class Command(BaseCommand):
             help="Mot de passe utilisé si la colonne 'password' est vide.",
         )
         parser.add_argument(
-            "--dry-run",
-            action="store_true",
-            help="Simule l'import sans rien enregistrer en base.",
+            "--processus",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processus de hachage des mots de passe (défaut : nb de CPU).",
         )
 
-    def handle(self, *args, **options):
-        csv_path = options["csv_path"]
-        dry_run  = options["dry_run"]
+    # ── Index en mémoire ─────────────────────────────────────────────────────
 
-        try:
-            open(csv_path, newline="", encoding="utf-8").close()
-        except FileNotFoundError:
-            raise CommandError(f"Fichier introuvable : {csv_path}")
+    def preparer(self, options):
+        self._departements = {d.code: d for d in Departement.objects.all()}
+        self._manquants = set()
+        self._emails = set(Utilisateur.objects.values_list("email", flat=True))
+        self._pool = None
 
-        self._cache_departements = {}
-        self._stats = {
-            "crees":      0,
-            "mis_a_jour": 0,
-            "ignores":    0,
-        }
+    def liberer(self):
+        if getattr(self, "_pool", None) is not None:
+            self._pool.shutdown()
 
-        try:
-            with transaction.atomic():
-                # ── Désactivation du signal post_save pendant l'import ──────
-                # Le signal creer_ou_mettre_a_jour_profil tente un get_or_create
-                # sur Etudiant à chaque save() de l'Utilisateur, ce qui entre en
-                # conflit avec notre gestion manuelle du profil et déclenche une
-                # ValidationError (date_inscription null, utilisateur déjà lié).
-                # On gère le profil Etudiant nous-mêmes : le signal est inutile ici.
-                from applications.comptes.signals import creer_ou_mettre_a_jour_profil
-                post_save.disconnect(creer_ou_mettre_a_jour_profil, sender=get_user_model())
-
-                try:
-                    self._importer(csv_path, options)
-                finally:
-                    # Reconnexion du signal dans tous les cas (succès ou exception)
-                    post_save.connect(creer_ou_mettre_a_jour_profil, sender=get_user_model())
-
-                self._afficher_resume(dry_run)
-
-                if dry_run:
-                    raise _StopDryRun()
-
-        except _StopDryRun:
-            self.stdout.write(self.style.WARNING(
-                "\n[DRY-RUN] Aucune donnée enregistrée. "
-                "Relancez sans --dry-run pour appliquer."
-            ))
+    # ── Validation d'une ligne ───────────────────────────────────────────────
+
+    def valider(self, valeurs, source, options):
+        code_dep = valeurs["departement"]
+        valeurs["departement"] = self._departements.get(code_dep)
+        if valeurs["departement"] is None:
+            if code_dep not in self._manquants:
+                self._manquants.add(code_dep)
+                self.stdout.write(self.style.WARNING(
+                    f"Département « {code_dep} » introuvable (as-tu lancé import_departements ?)."
+                ))
+            raise ErreurLigne(f"département « {code_dep} » introuvable")
+        valeurs["password"] = valeurs["password"] or options["mot_de_passe_defaut"]
+        return valeurs
+
+    # ── Enregistrement d'un lot ──────────────────────────────────────────────
+
+    def ecrire_lot(self, lot, source, options):
+        existants = {
+            numero: valeurs
+            for numero, *valeurs in Etudiant.objects.filter(
+                numero_etudiant__in=[valeurs["numero_etudiant"] for valeurs in lot]
+            ).values_list(
+                "numero_etudiant", "pk", "departement_id", "niveau", "utilisateur_id",
+                "utilisateur__last_name", "utilisateur__first_name", "utilisateur__genre",
+            )
+        }
 
-    # ── Import principal ─────────────────────────────────────────────────────
-
-    def _importer(self, csv_path, options):
-        mdp_defaut = options["mot_de_passe_defaut"]
-
-        with open(csv_path, newline="", encoding="utf-8") as fichier:
-            lecteur = csv.DictReader(fichier)
-
-            for num_ligne, ligne in enumerate(lecteur, start=2):
-
-                # ── Lecture des colonnes ──────────────────────────────────
-                last_name       = (ligne.get("last_name")       or "").strip()
-                first_name      = (ligne.get("first_name")      or "").strip()
-                email           = (ligne.get("email")           or "").strip()
-                password        = (ligne.get("password")        or mdp_defaut).strip() or mdp_defaut
-                genre           = (ligne.get("genre")           or "M").strip().upper()
-                numero_etudiant = (ligne.get("numero_etudiant") or "").strip()
-                nom_departement = (ligne.get("departement")     or "").strip()
-                nom_niveau      = (ligne.get("niveau")          or "").strip()
-
-                # ── Validations minimales ─────────────────────────────────
-                if not numero_etudiant:
-                    self.stdout.write(self.style.WARNING(
-                        f"Ligne {num_ligne} : numero_etudiant manquant, ignorée."
-                    ))
-                    self._stats["ignores"] += 1
-                    continue
-
-                if not email:
-                    self.stdout.write(self.style.WARNING(
-                        f"Ligne {num_ligne} : email manquant pour {last_name} {first_name}, ignorée."
-                    ))
-                    self._stats["ignores"] += 1
-                    continue
-
-                # ── Département ───────────────────────────────────────────
-                code_dep = self.DEPARTEMENT_MAP.get(nom_departement)
-                if code_dep is None:
-                    self.stdout.write(self.style.WARNING(
-                        f"Ligne {num_ligne} : département inconnu "
-                        f"« {nom_departement} » — {numero_etudiant} ignoré."
-                    ))
-                    self._stats["ignores"] += 1
-                    continue
-
-                departement = self._obtenir_departement(code_dep, num_ligne)
-                if departement is None:
-                    self._stats["ignores"] += 1
-                    continue
-
-                # ── Niveau ────────────────────────────────────────────────
-                niveau = self.NIVEAU_MAP.get(nom_niveau)
-                if niveau is None:
-                    self.stdout.write(self.style.WARNING(
-                        f"Ligne {num_ligne} : niveau inconnu « {nom_niveau} » "
-                        f"— {numero_etudiant} ignoré."
-                    ))
-                    self._stats["ignores"] += 1
-                    continue
-
-                # ── Genre ─────────────────────────────────────────────────
-                if genre not in ("M", "F"):
-                    genre = "M"  # valeur par défaut silencieuse
-
-                # ── Création / mise à jour ────────────────────────────────
-                try:
-                    self._creer_ou_mettre_a_jour(
-                        num_ligne=num_ligne,
-                        last_name=last_name,
-                        first_name=first_name,
-                        email=email,
-                        password=password,
-                        genre=genre,
-                        numero_etudiant=numero_etudiant,
-                        departement=departement,
-                        niveau=niveau,
-                    )
-                except Exception as exc:
-                    self.stdout.write(self.style.ERROR(
-                        f"Ligne {num_ligne} : erreur inattendue pour "
-                        f"{numero_etudiant} — {exc}"
-                    ))
-                    self._stats["ignores"] += 1
-
-    # ── Création / mise à jour d'un étudiant ─────────────────────────────────
-
-    def _creer_ou_mettre_a_jour(self, num_ligne, last_name, first_name, email,
-                                  password, genre, numero_etudiant,
-                                  departement, niveau):
-        """
-        Crée ou met à jour le couple Utilisateur + Etudiant.
-        Recherche par `numero_etudiant` (idempotent).
-
-        Le signal post_save est déconnecté avant l'appel à cette méthode :
-        on gère le profil Etudiant manuellement via update_fields ciblés,
-        ce qui évite toute ValidationError liée à date_inscription.
-        """
-        # ── Vérification de l'email (unicité) ────────────────────────────
+        creations = {}       # numero_etudiant -> valeurs
+        mises_a_jour = {}    # numero_etudiant -> valeurs (la dernière ligne l'emporte)
+        for valeurs in lot:
+            numero = valeurs["numero_etudiant"]
+            if numero in creations:
+                # Même étudiant plus bas dans le lot : la seconde ligne met à jour la première
+                for champ in ("last_name", "first_name", "genre", "departement", "niveau"):
+                    creations[numero][champ] = valeurs[champ]
+            elif numero in existants:
+                mises_a_jour[numero] = valeurs
+            else:
+                valeurs["email"] = self._email_disponible(valeurs["email"])
+                creations[numero] = valeurs
+
+        with self.chronometrer("hachage"):
+            if options["dry_run"]:
+                empreintes = [make_password(None)] * len(creations)
+            else:
+                empreintes = self._hacher_mots_de_passe(
+                    [valeurs["password"] for valeurs in creations.values()], options["processus"],
+                )
+
+        self._ecrire_creations(list(creations.values()), empreintes, options["taille_lot"])
+        self._ecrire_mises_a_jour(mises_a_jour, existants, options["taille_lot"])
+        return len(creations), len(lot) - len(creations)
+
+    def _email_disponible(self, email):
+        """Email normalisé, suffixé s'il est déjà pris ; réservé dans self._emails"""
+        email = Utilisateur.objects.normalize_email(email)
         email_final = email
-        if (Utilisateur.objects.filter(email=email_final)
-                               .exclude(profil_etudiant__numero_etudiant=numero_etudiant)
-                               .exists()):
+        if email_final in self._emails:
             base, domaine = email.rsplit("@", 1)
             suffixe = 2
-            while Utilisateur.objects.filter(email=email_final).exists():
+            while email_final in self._emails:
                 email_final = f"{base}{suffixe}@{domaine}"
                 suffixe += 1
             self.stdout.write(self.style.WARNING(
                 f"  Email « {email} » déjà utilisé — remplacé par « {email_final} »."
             ))
-
-        # ── Étudiant déjà présent ? ───────────────────────────────────────
-        try:
-            etudiant = Etudiant.objects.select_related("utilisateur").get(
-                numero_etudiant=numero_etudiant
-            )
-            utilisateur = etudiant.utilisateur
-
-            # Mise à jour des champs Utilisateur
-            # (le signal est déconnecté : pas de déclenchement de get_or_create)
-            utilisateur.last_name  = last_name
-            utilisateur.first_name = first_name
-            utilisateur.genre      = genre
-            utilisateur.save(update_fields=["last_name", "first_name", "genre"])
-
-            # Mise à jour des champs Etudiant — on bypasse full_clean() via
-            # QuerySet.update() pour éviter la revalidation de date_inscription
-            # (déjà correctement définie en base lors de la création initiale).
-            Etudiant.objects.filter(pk=etudiant.pk).update(
-                departement=departement,
-                niveau=niveau,
-            )
-
-            self._stats["mis_a_jour"] += 1
-
-        except Etudiant.DoesNotExist:
-            # ── Création de l'Utilisateur ─────────────────────────────────
-            utilisateur = Utilisateur.objects.create_user(
-                email=email_final,
-                password=password,
-                first_name=first_name,
-                last_name=last_name,
-                genre=genre,
+        self._emails.add(email_final)
+        return email_final
+
+    def _hacher_mots_de_passe(self, mots_de_passe, processus):
+        # PBKDF2 est volontairement coûteux : c'est l'étape dominante de l'import
+        if processus <= 1 or len(mots_de_passe) < 2 * processus:
+            return [make_password(m) for m in mots_de_passe]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=processus, initializer=_initialiser_processus)
+        return list(self._pool.map(
+            _hacher, mots_de_passe,
+            chunksize=max(1, len(mots_de_passe) // (processus * 4)),
+        ))
+
+    def _ecrire_creations(self, creations, empreintes, taille_lot):
+        # bulk_create n'appelle ni save() ni les signaux (pas de profil créé
+        # automatiquement) : les clés de connexion normalisées
+        # (Utilisateur.save, Etudiant.save) sont renseignées ici
+        utilisateurs = [
+            Utilisateur(
+                email=valeurs["email"],
+                password=empreinte,
+                first_name=valeurs["first_name"],
+                last_name=valeurs["last_name"],
+                genre=valeurs["genre"],
                 role="ETUDIANT",
                 doit_changer_mot_de_passe=True,
+                email_normalise=normaliser_email(valeurs["email"]),
+                matricule_normalise=normaliser_matricule(valeurs["numero_etudiant"]),
             )
+            for valeurs, empreinte in zip(creations, empreintes)
+        ]
+        Utilisateur.objects.bulk_create(utilisateurs, batch_size=taille_lot)
+        completer_pks(Utilisateur, utilisateurs, "email")
+
+        aujourd_hui = timezone.now().date()
+        Etudiant.objects.bulk_create(
+            [
+                Etudiant(
+                    utilisateur=utilisateur,
+                    numero_etudiant=valeurs["numero_etudiant"],
+                    departement=valeurs["departement"],
+                    niveau=valeurs["niveau"],
+                    date_inscription=aujourd_hui,
+                )
+                for valeurs, utilisateur in zip(creations, utilisateurs)
+            ],
+            batch_size=taille_lot,
+        )
 
-            # ── Création du profil Etudiant ───────────────────────────────
-            # On contourne Etudiant.save() → full_clean() en utilisant
-            # directement le manager pour éviter toute contrainte de validation
-            # non pertinente à l'import (le signal est déjà déconnecté).
-            Etudiant.objects.create(
-                utilisateur=utilisateur,
-                numero_etudiant=numero_etudiant,
-                departement=departement,
-                niveau=niveau,
-                date_inscription=timezone.now().date(),
-            )
-
-            self._stats["crees"] += 1
-
-    # ── Cache département ─────────────────────────────────────────────────────
-
-    def _obtenir_departement(self, code, num_ligne):
-        if code not in self._cache_departements:
-            try:
-                self._cache_departements[code] = Departement.objects.get(code=code)
-            except Departement.DoesNotExist:
-                self._cache_departements[code] = None
-                self.stdout.write(self.style.WARNING(
-                    f"Ligne {num_ligne} : département « {code} » introuvable "
-                    f"(as-tu lancé import_departements ?)."
+    def _ecrire_mises_a_jour(self, mises_a_jour, existants, taille_lot):
+        """N'écrit que les lignes réellement modifiées"""
+        utilisateurs, etudiants = [], []
+        for numero, valeurs in mises_a_jour.items():
+            pk, departement_id, niveau, utilisateur_id, last_name, first_name, genre = existants[numero]
+            if (last_name, first_name, genre) != (valeurs["last_name"], valeurs["first_name"], valeurs["genre"]):
+                utilisateurs.append(Utilisateur(
+                    pk=utilisateur_id,
+                    last_name=valeurs["last_name"],
+                    first_name=valeurs["first_name"],
+                    genre=valeurs["genre"],
                 ))
-        return self._cache_departements[code]
-
-    # ── Résumé final ──────────────────────────────────────────────────────────
-
-    def _afficher_resume(self, dry_run):
-        s      = self._stats
-        prefixe = "[DRY-RUN] " if dry_run else ""
-        total  = s["crees"] + s["mis_a_jour"] + s["ignores"]
+            if (departement_id, niveau) != (valeurs["departement"].pk, valeurs["niveau"]):
+                etudiants.append(Etudiant(pk=pk, departement=valeurs["departement"], niveau=valeurs["niveau"]))
 
-        self.stdout.write(self.style.SUCCESS(
-            f"\n{prefixe}Terminé. {total} ligne(s) lues — "
-            f"{s['crees']} étudiant(s) créé(s), "
-            f"{s['mis_a_jour']} mis à jour, "
-            f"{s['ignores']} ignoré(s)."
-        ))
\ No newline at end of file
+        Utilisateur.objects.bulk_update(utilisateurs, ["last_name", "first_name", "genre"], batch_size=taille_lot)
+        Etudiant.objects.bulk_update(etudiants, ["departement", "niveau"], batch_size=taille_lot)
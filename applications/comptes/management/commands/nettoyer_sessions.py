@@ -0,0 +1,42 @@
+"""
+Commande de purge des sessions expirées.
+
+Contrairement à `clearsessions`, la suppression se fait par petits lots
+pour ne pas verrouiller longtemps la table django_session pendant les
+périodes chargées (semaine d'inscription). Les entrées du cache expirent
+d'elles-mêmes.
+
+Usage :
+    python manage.py nettoyer_sessions
+    python manage.py nettoyer_sessions --taille-lot 5000
+"""
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Supprime les sessions expirées de la base, par lots."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--taille-lot", type=int, default=1000,
+            help="Nombre de sessions supprimées par requête (défaut : 1000)",
+        )
+
+    def handle(self, *args, **options):
+        taille_lot = options["taille_lot"]
+        maintenant = timezone.now()
+        total = 0
+
+        while True:
+            cles = list(
+                Session.objects.filter(expire_date__lt=maintenant)
+                .values_list("session_key", flat=True)[:taille_lot]
+            )
+            if not cles:
+                break
+            total += Session.objects.filter(session_key__in=cles).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"{total} session(s) expirée(s) supprimée(s)."))
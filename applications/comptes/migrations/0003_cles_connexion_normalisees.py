@@ -0,0 +1,66 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:15
+
+from django.db import migrations, models
+
+
+# Copie des fonctions de applications/comptes/models.py au moment de la
+# migration : elle doit produire les mêmes clés même si le modèle évolue.
+
+def normaliser_email(valeur):
+    return (valeur or '').strip().lower() or None
+
+
+def normaliser_telephone(valeur):
+    compact = ''.join(c for c in (valeur or '') if c not in ' -.()')
+    chiffres = compact[1:] if compact.startswith('+') else compact
+    if not chiffres.isdigit():
+        return None
+    if len(chiffres) == 8:
+        return f'+509{chiffres}'
+    return f'+{chiffres}'
+
+
+def normaliser_matricule(valeur):
+    return (valeur or '').strip().upper() or None
+
+
+def remplir_cles_connexion(apps, schema_editor):
+    Utilisateur = apps.get_model('comptes', 'Utilisateur')
+    utilisateurs = []
+    for u in Utilisateur.objects.select_related('profil_etudiant').iterator():
+        u.email_normalise = normaliser_email(u.email)
+        u.telephone_normalise = normaliser_telephone(u.numero_telephone)
+        etudiant = getattr(u, 'profil_etudiant', None)
+        u.matricule_normalise = normaliser_matricule(etudiant.numero_etudiant) if etudiant else None
+        utilisateurs.append(u)
+    Utilisateur.objects.bulk_update(
+        utilisateurs,
+        ['email_normalise', 'telephone_normalise', 'matricule_normalise'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='utilisateur',
+            name='email_normalise',
+            field=models.CharField(db_index=True, editable=False, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='utilisateur',
+            name='matricule_normalise',
+            field=models.CharField(db_index=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='utilisateur',
+            name='telephone_normalise',
+            field=models.CharField(db_index=True, editable=False, max_length=17, null=True),
+        ),
+        migrations.RunPython(remplir_cles_connexion, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,50 @@ from django.db import models
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
 
+# ── Clés de connexion normalisées ─────────────────────────────────
+
+def normaliser_email(valeur):
+    return (valeur or '').strip().lower() or None
+
+
+def normaliser_telephone(valeur):
+    """
+    Forme canonique d'un numéro : '+509XXXXXXXX' pour un numéro haïtien
+    (8 chiffres locaux ou 11 avec l'indicatif), '+<chiffres>' sinon.
+    """
+    compact = ''.join(c for c in (valeur or '') if c not in ' -.()')
+    chiffres = compact[1:] if compact.startswith('+') else compact
+    if not chiffres.isdigit():
+        return None
+    if len(chiffres) == 8:
+        return f'+509{chiffres}'
+    return f'+{chiffres}'
+
+
+def normaliser_matricule(valeur):
+    return (valeur or '').strip().upper() or None
+
+
+def classer_identifiant(identifiant):
+    """
+    Détermine le champ de connexion visé par un identifiant saisi.
+
+    Retourne (nom_du_champ_normalisé, valeur) :
+      - Email : contient '@'.
+      - Téléphone haïtien : 8 chiffres locaux, ou 11 chiffres avec l'indicatif 509.
+      - Sinon : matricule étudiant (CIN / NINU ou tout autre format).
+    """
+    identifiant = identifiant.strip()
+    if '@' in identifiant:
+        return 'email_normalise', normaliser_email(identifiant)
+
+    telephone = normaliser_telephone(identifiant)
+    if telephone and len(telephone) == 12 and telephone.startswith('+509'):
+        return 'telephone_normalise', telephone
+
+    return 'matricule_normalise', normaliser_matricule(identifiant)
+
+
 class GestionnaireUtilisateur(BaseUserManager):
     """Manager personnalisé pour le modèle Utilisateur"""
 
@@ -91,6 +135,13 @@ class Utilisateur(AbstractUser):
         'Doit changer le mot de passe', default=True
     )
 
+    # Clés de connexion normalisées, maintenues à l'enregistrement
+    # (voir AuthentificationUniverselle) : une seule recherche indexée,
+    # sans jointure ni comparaison insensible à la casse.
+    email_normalise = models.CharField(max_length=254, null=True, editable=False, db_index=True)
+    telephone_normalise = models.CharField(max_length=17, null=True, editable=False, db_index=True)
+    matricule_normalise = models.CharField(max_length=20, null=True, editable=False, db_index=True)
+
     cree_le = models.DateTimeField('Date de création', auto_now_add=True)
     modifie_le = models.DateTimeField('Date de modification', auto_now=True)
 
@@ -107,6 +158,21 @@ class Utilisateur(AbstractUser):
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_role_display()})"
 
+    def save(self, *args, **kwargs):
+        self.email_normalise = normaliser_email(self.email)
+        self.telephone_normalise = normaliser_telephone(self.numero_telephone)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'email' in update_fields:
+                update_fields.add('email_normalise')
+            if 'numero_telephone' in update_fields:
+                update_fields.add('telephone_normalise')
+            kwargs['update_fields'] = update_fields
+
+        super().save(*args, **kwargs)
+
     def est_professeur(self):
         return self.role == 'PROFESSEUR'
 
@@ -173,6 +239,12 @@ class Etudiant(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
+
+        # Le matricule sert d'identifiant de connexion : copie sur l'utilisateur
+        matricule = normaliser_matricule(self.numero_etudiant)
+        if self.utilisateur.matricule_normalise != matricule:
+            Utilisateur.objects.filter(pk=self.utilisateur_id).update(matricule_normalise=matricule)
+            self.utilisateur.matricule_normalise = matricule
         
         
 class Professeur(models.Model):
@@ -0,0 +1,107 @@
+"""
+Moteur de sessions à écriture réduite.
+
+Avec SESSION_SAVE_EVERY_REQUEST = True, le moteur par défaut réécrit la
+ligne django_session à chaque page vue, uniquement pour repousser son
+expiration. Ce moteur sert les sessions depuis le cache et n'écrit en base
+que lorsque :
+  - les données de la session ont changé (y compris une modification en
+    place non signalée par session.modified),
+  - ou l'expiration enregistrée en base a pris plus de
+    SESSION_SEUIL_PROLONGATION secondes de retard sur l'expiration glissante.
+
+Le cookie continue de glisser à chaque requête ; côté serveur, une session
+inactive peut donc expirer au plus SESSION_SEUIL_PROLONGATION secondes avant
+l'échéance du cookie.
+
+Le cache doit être partagé entre les processus (Redis, Memcached) :
+voir CACHE_BACKEND / CACHE_LOCATION dans les réglages. Sinon une session
+supprimée (déconnexion) dans un processus reste valide dans les autres :
+configuration/settings.py ne l'active qu'avec un cache partagé, et la
+vérification comptes.W001 (manage.py check) signale le cas contraire.
+
+Réglage :
+    SESSION_ENGINE = "applications.comptes.sessions"
+"""
+
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.utils import timezone
+
+KEY_PREFIX = "applications.comptes.sessions"
+
+
+class SessionStore(CachedDBStore):
+    """
+    Session en cache (données + échéance en base), écrite en base à la demande.
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # Échéance actuellement enregistrée dans django_session (None = inconnue)
+        self._expire_en_base = None
+        # Empreinte des données telles qu'enregistrées
+        self._empreinte = None
+
+    @property
+    def seuil_prolongation(self):
+        return getattr(settings, "SESSION_SEUIL_PROLONGATION", 10 * 60)
+
+    def load(self):
+        try:
+            entree = self._cache.get(self.cache_key)
+        except Exception:
+            # Clé de cache invalide (memcache) : on repart de la base
+            entree = None
+
+        if entree is not None:
+            self._expire_en_base = entree["expire_le"]
+            self._empreinte = self._calculer_empreinte(entree["donnees"])
+            return entree["donnees"]
+
+        s = self._get_session_from_db()
+        if not s:
+            return {}
+
+        donnees = self.decode(s.session_data)
+        self._expire_en_base = s.expire_date
+        self._empreinte = self._calculer_empreinte(donnees)
+        self._mettre_en_cache(donnees)
+        return donnees
+
+    def _calculer_empreinte(self, donnees):
+        return hashlib.sha1(self.serializer().dumps(donnees)).hexdigest()
+
+    def _mettre_en_cache(self, donnees):
+        restant = (self._expire_en_base - timezone.now()).total_seconds()
+        if restant > 0:
+            self._cache.set(
+                self.cache_key,
+                {"donnees": donnees, "expire_le": self._expire_en_base},
+                int(restant),
+            )
+
+    def ecriture_necessaire(self):
+        """Vrai si la session doit être écrite en base à cet enregistrement."""
+        if self.modified or self._expire_en_base is None:
+            return True
+        if self._calculer_empreinte(self._session) != self._empreinte:
+            return True
+        echeance_voulue = timezone.now() + timedelta(seconds=self.get_expiry_age())
+        retard = (echeance_voulue - self._expire_en_base).total_seconds()
+        return retard > self.seuil_prolongation
+
+    def save(self, must_create=False):
+        if not must_create and self.session_key is not None and not self.ecriture_necessaire():
+            return
+
+        # Écriture en base (DBStore), sans l'écriture en cache de CachedDBStore
+        super(CachedDBStore, self).save(must_create)
+        self._expire_en_base = self.get_expiry_date()
+        self._empreinte = self._calculer_empreinte(self._session)
+        self._mettre_en_cache(self._session)
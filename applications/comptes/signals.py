@@ -1,4 +1,4 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -50,4 +50,9 @@ def creer_ou_mettre_a_jour_profil(sender, instance, created, **kwargs):
         if hasattr(instance, 'profil_etudiant'):
             instance.profil_etudiant.delete()
         if hasattr(instance, 'profil_professeur'):
-            instance.profil_professeur.delete()
\ No newline at end of file
+            instance.profil_professeur.delete()
+
+@receiver(post_delete, sender=Etudiant)
+def effacer_matricule_connexion(sender, instance, **kwargs):
+    """Le matricule d'un profil supprimé ne permet plus de se connecter."""
+    get_user_model().objects.filter(pk=instance.utilisateur_id).update(matricule_normalise=None)
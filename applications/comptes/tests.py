@@ -1,180 +1,391 @@
-from django.test import TestCase, Client
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.conf import settings
-from .models import User, Student, Professor
+from django.utils import timezone
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.core.management import call_command
+from .backends import adresse_client
+from .checks import verifier_cache_sessions
+from .models import Utilisateur, Etudiant
+from .sessions import SessionStore
 from applications.departements.models import Departement
-from datetime import date
 
 
-class UserModelTest(TestCase):
-    """Tests pour le modèle User"""
+class UtilisateurModelTest(TestCase):
+    """Tests pour le modèle Utilisateur"""
 
     def setUp(self):
-        self.user = User.objects.create_user(
+        self.utilisateur = Utilisateur.objects.create_user(
             email="test@example.com",
             password="motdepasse123",
             first_name="Test",
             last_name="User",
-            role="STUDENT",
+            role="ETUDIANT",
         )
 
-    def test_user_creation(self):
+    def test_creation_utilisateur(self):
         """Test de création d'utilisateur"""
-        self.assertEqual(self.user.email, "test@example.com")
-        self.assertEqual(self.user.get_full_name(), "Test User")
-        self.assertTrue(self.user.is_student())
-        self.assertFalse(self.user.is_professor())
+        self.assertEqual(self.utilisateur.email, "test@example.com")
+        self.assertEqual(self.utilisateur.get_full_name(), "Test User")
+        self.assertTrue(self.utilisateur.est_etudiant())
+        self.assertFalse(self.utilisateur.est_professeur())
 
-    def test_user_string_representation(self):
+    def test_representation_texte(self):
         """Test de la représentation string"""
-        expected = f"Test User (Étudiant)"
-        self.assertEqual(str(self.user), expected)
+        self.assertEqual(str(self.utilisateur), "Test User (Étudiant)")
 
 
-class StudentModelTest(TestCase):
-    """Tests pour le modèle Student"""
+class EtudiantModelTest(TestCase):
+    """Tests pour le profil Etudiant créé par signal"""
 
     def setUp(self):
-        self.department = Departement.objects.create(code="PSY", name="Psychologie")
-
-        self.user = User.objects.create_user(
-            email="student@example.com",
+        self.departement = Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        self.utilisateur = Utilisateur.objects.create_user(
+            email="etudiant@example.com",
             password="motdepasse123",
             first_name="John",
             last_name="Doe",
-            role="STUDENT",
+            role="ETUDIANT",
         )
+        self.etudiant = self.utilisateur.profil_etudiant
 
-        self.student = Student.objects.create(
-            user=self.user,
-            student_number="STU001",
-            department=self.department,
-            current_year=1,
-            enrollment_date=date.today(),
-        )
+    def test_profil_cree_automatiquement(self):
+        self.assertEqual(self.etudiant.numero_etudiant, f"ETU{self.utilisateur.id:04d}")
+        self.assertEqual(self.etudiant.niveau, "PREPARATOIRE")
 
-    def test_student_creation(self):
-        """Test de création d'étudiant"""
-        self.assertEqual(self.student.student_number, "STU001")
-        self.assertEqual(self.student.department, self.department)
-        self.assertEqual(self.student.current_year, 1)
+    def test_representation_texte(self):
+        self.assertEqual(str(self.etudiant), f"{self.etudiant.numero_etudiant} - John Doe")
 
-    def test_student_string_representation(self):
-        """Test de la représentation string"""
-        expected = "STU001 - John Doe"
-        self.assertEqual(str(self.student), expected)
 
-
-class LoginViewTest(TestCase):
+class VueConnexionTest(TestCase):
     """Tests pour la vue de connexion"""
 
     def setUp(self):
+        cache.clear()
         self.client = Client()
-        self.login_url = reverse("comptes:connexion")
-        self.user = User.objects.create_user(
+        self.url_connexion = reverse("comptes:connexion")
+        self.utilisateur = Utilisateur.objects.create_user(
             email="test@example.com",
             password="motdepasse123",
             first_name="Test",
             last_name="User",
-            role="STUDENT",
+            role="ETUDIANT",
+            doit_changer_mot_de_passe=False,
+        )
+
+    def test_page_connexion(self):
+        reponse = self.client.get(self.url_connexion)
+        self.assertEqual(reponse.status_code, 200)
+
+    def test_connexion_identifiants_valides(self):
+        reponse = self.client.post(
+            self.url_connexion, {"identifiant": "test@example.com", "password": "motdepasse123"}
         )
-        self.user.must_change_password = False
-        self.user.save()
-
-    def test_login_page_status_code(self):
-        """Test du code de statut de la page de connexion"""
-        response = self.client.get(self.login_url)
-        self.assertEqual(response.status_code, 200)
-
-    def test_login_with_valid_credentials(self):
-        """Test de connexion avec des identifiants valides"""
-        response = self.client.post(
-            self.login_url, {"email": "test@example.com", "password": "motdepasse123"}
+        self.assertRedirects(reponse, reverse("comptes:tableau_bord"), fetch_redirect_response=False)
+
+    def test_connexion_identifiants_invalides(self):
+        reponse = self.client.post(
+            self.url_connexion, {"identifiant": "test@example.com", "password": "mauvais"}
         )
-        self.assertEqual(response.status_code, 302)  # Redirection
+        self.assertEqual(reponse.status_code, 200)
+        self.assertContains(reponse, "Identifiant ou mot de passe incorrect")
+
+
+class AuthentificationUniverselleTest(TestCase):
+    """Tests de la recherche par clés normalisées et de la limitation des échecs"""
 
-    def test_login_with_invalid_credentials(self):
-        """Test de connexion avec des identifiants invalides"""
-        response = self.client.post(
-            self.login_url, {"email": "test@example.com", "password": "wrongpassword"}
+    def setUp(self):
+        cache.clear()
+        self.utilisateur = Utilisateur.objects.create_user(
+            email="Jean.Pierre@Example.com",
+            password="motdepasse123",
+            first_name="Jean",
+            last_name="Pierre",
+            role="ETUDIANT",
+            numero_telephone="+50937001234",
         )
-        self.assertEqual(response.status_code, 200)
-        self.assertContains(response, "Email ou mot de passe incorrect")
+        etudiant = self.utilisateur.profil_etudiant
+        etudiant.numero_etudiant = "ab12345678"
+        etudiant.save()
+
+    def test_cles_normalisees_maintenues(self):
+        self.utilisateur.refresh_from_db()
+        self.assertEqual(self.utilisateur.email_normalise, "jean.pierre@example.com")
+        self.assertEqual(self.utilisateur.telephone_normalise, "+50937001234")
+        self.assertEqual(self.utilisateur.matricule_normalise, "AB12345678")
+
+    def test_connexion_par_email_sans_casse(self):
+        self.assertEqual(authenticate(username="JEAN.PIERRE@example.COM", password="motdepasse123"),
+                         self.utilisateur)
+
+    def test_connexion_par_telephone(self):
+        for saisie in ("37001234", "509 3700-1234", "+50937001234"):
+            with self.subTest(saisie=saisie):
+                self.assertEqual(authenticate(username=saisie, password="motdepasse123"),
+                                 self.utilisateur)
+
+    def test_connexion_par_matricule(self):
+        self.assertEqual(authenticate(username="AB12345678", password="motdepasse123"),
+                         self.utilisateur)
+
+    def test_une_seule_requete(self):
+        with self.assertNumQueries(1):
+            authenticate(username="ab12345678", password="motdepasse123")
+
+    @override_settings(CONNEXION_ECHECS_MAX_IDENTIFIANT=3)
+    def test_limitation_des_echecs(self):
+        for _ in range(3):
+            self.assertIsNone(authenticate(username="37001234", password="mauvais"))
+        # Limite atteinte : refus sans interroger la base, même avec le bon mot de passe
+        with self.assertNumQueries(0):
+            self.assertIsNone(authenticate(username="37001234", password="motdepasse123"))
+        # Les autres identifiants du compte ne sont pas concernés
+        self.assertEqual(authenticate(username="ab12345678", password="motdepasse123"),
+                         self.utilisateur)
+
+    @override_settings(CONNEXION_ECHECS_MAX_IDENTIFIANT=3, CONNEXION_DELAI_BASE=2)
+    def test_delai_croissant_plutot_que_verrou(self):
+        debut = time.time()
+        for _ in range(3):
+            authenticate(username="37001234", password="mauvais")
+        # Bloqué : le mot de passe est tout de même haché (durée identique)
+        with mock.patch("applications.comptes.backends.make_password") as hachage:
+            self.assertIsNone(authenticate(username="37001234", password="motdepasse123"))
+        hachage.assert_called_once()
+
+        with mock.patch("time.time", return_value=debut + 3):
+            # Délai de 2 s écoulé : le titulaire du compte peut se connecter
+            self.assertEqual(authenticate(username="37001234", password="motdepasse123"),
+                             self.utilisateur)
+
+    @override_settings(CONNEXION_PROXYS_DE_CONFIANCE=["10.0.0.1"])
+    def test_adresse_client_derriere_proxy(self):
+        fabrique = RequestFactory()
+        directe = fabrique.get("/", REMOTE_ADDR="203.0.113.9", HTTP_X_FORWARDED_FOR="1.2.3.4")
+        self.assertEqual(adresse_client(directe), "203.0.113.9")   # en-tête non fiable
+        relayee = fabrique.get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="1.2.3.4, 198.51.100.7")
+        self.assertEqual(adresse_client(relayee), "198.51.100.7")
+
+        # Deux étudiants derrière le proxy n'ont pas le même compteur
+        with override_settings(CONNEXION_ECHECS_MAX_IP=2):
+            for _ in range(2):
+                authenticate(relayee, username="inconnu@example.com", password="x")
+            autre = fabrique.get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="198.51.100.8")
+            self.assertEqual(authenticate(autre, username="37001234", password="motdepasse123"),
+                             self.utilisateur)
+
+    def test_suppression_profil_efface_matricule(self):
+        self.utilisateur.profil_etudiant.delete()
+        self.assertIsNone(authenticate(username="AB12345678", password="motdepasse123"))
+
+
+@override_settings(SESSION_SEUIL_PROLONGATION=600, SESSION_COOKIE_AGE=7200)
+class SessionEcritureReduiteTest(TestCase):
+    """Tests du moteur de sessions à écriture réduite"""
+
+    def setUp(self):
+        cache.clear()
+        session = SessionStore()
+        session["_auth_user_id"] = "1"
+        session.create()
+        self.cle = session.session_key
 
+    def _compter_ecritures(self, session):
+        with CaptureQueriesContext(connection) as requetes:
+            session.save()
+        return sum(1 for q in requetes if q["sql"].startswith(("UPDATE", "INSERT")))
 
-class PasswordChangeTest(TestCase):
+    def test_page_vue_sans_ecriture(self):
+        session = SessionStore(self.cle)
+        with self.assertNumQueries(0):
+            session.get("_auth_user_id")
+            session.save()
+
+    def test_donnees_modifiees_ecrites(self):
+        session = SessionStore(self.cle)
+        session["panier"] = [1]
+        self.assertEqual(self._compter_ecritures(session), 1)
+        self.assertEqual(SessionStore(self.cle).load()["panier"], [1])
+
+    def test_modification_en_place_ecrite(self):
+        session = SessionStore(self.cle)
+        session["liste"] = []
+        session.save()
+        session = SessionStore(self.cle)
+        session["liste"].append(1)
+        self.assertFalse(session.modified)
+        self.assertEqual(self._compter_ecritures(session), 1)
+
+    def test_prolongation_au_dela_du_seuil(self):
+        plus_tard = timezone.now() + timedelta(seconds=601)
+        with mock.patch("django.utils.timezone.now", return_value=plus_tard):
+            session = SessionStore(self.cle)
+            session.get("_auth_user_id")
+            self.assertEqual(self._compter_ecritures(session), 1)
+
+    def test_lecture_en_base_si_cache_vide(self):
+        cache.clear()
+        session = SessionStore(self.cle)
+        with self.assertNumQueries(1):
+            self.assertEqual(session.get("_auth_user_id"), "1")
+
+
+    @override_settings(SESSION_ENGINE="applications.comptes.sessions")
+    def test_verification_cache_partage(self):
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([e.id for e in verifier_cache_sessions(None)], ["comptes.W001"])
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(verifier_cache_sessions(None), [])
+        with override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db", CACHES=locmem):
+            self.assertEqual(verifier_cache_sessions(None), [])
+
+
+class ChangementMotDePasseTest(TestCase):
     """Tests pour le changement de mot de passe"""
 
     def setUp(self):
         self.client = Client()
-        self.user = User.objects.create_user(
+        self.utilisateur = Utilisateur.objects.create_user(
             email="test@example.com",
-            password="oldpass123",
+            password="ancienmdp123",
             first_name="Test",
             last_name="User",
-            role="STUDENT",
+            role="ETUDIANT",
         )
-        self.user.must_change_password = True
-        self.user.save()
-        self.client.login(email="test@example.com", password="oldpass123")
-
-    def test_password_change_required(self):
-        """Test que le changement de mot de passe est requis"""
-        response = self.client.get(reverse("dashboard"))
-        self.assertRedirects(response, reverse("comptes:changer_mot_de_passe"))
-
-    def test_password_change_success(self):
-        """Test du changement de mot de passe réussi"""
-        response = self.client.post(
+        self.client.force_login(self.utilisateur)
+
+    def test_changement_requis(self):
+        reponse = self.client.get(reverse("comptes:tableau_bord"))
+        self.assertRedirects(reponse, reverse("comptes:changer_mot_de_passe"),
+                             fetch_redirect_response=False)
+
+    def test_changement_reussi(self):
+        self.client.post(
             reverse("comptes:changer_mot_de_passe"),
             {
-                "old_password": "oldpass123",
-                "new_password1": "newpass123!",
-                "new_password2": "newpass123!",
+                "old_password": "ancienmdp123",
+                "new_password1": "Nouveau-mdp-2026!",
+                "new_password2": "Nouveau-mdp-2026!",
             },
         )
-
-        # Recharger l'utilisateur
-        self.user.refresh_from_db()
-        self.assertFalse(self.user.must_change_password)
+        self.utilisateur.refresh_from_db()
+        self.assertFalse(self.utilisateur.doit_changer_mot_de_passe)
 
 
-class UserPermissionsTest(TestCase):
+class PermissionsUtilisateurTest(TestCase):
     """Tests pour les permissions utilisateur"""
 
     def setUp(self):
         self.client = Client()
+        self.etudiant = Utilisateur.objects.create_user(
+            email="etudiant@example.com", password="motdepasse123",
+            first_name="Etu", last_name="Test", role="ETUDIANT",
+            doit_changer_mot_de_passe=False,
+        )
+        self.admin = Utilisateur.objects.create_user(
+            email="admin@example.com", password="motdepasse123",
+            first_name="Admin", last_name="Test", role="ADMIN",
+            doit_changer_mot_de_passe=False,
+        )
 
-        # Créer un étudiant
-        self.student_user = User.objects.create_user(
-            email="student@example.com",
-            password="motdepasse123",
-            first_name="Student",
-            last_name="Test",
-            role="STUDENT",
+    def test_etudiant_sans_acces_admin(self):
+        self.client.force_login(self.etudiant)
+        reponse = self.client.get(reverse("comptes:liste_utilisateurs"))
+        self.assertEqual(reponse.status_code, 302)
+
+    def test_admin_acces_admin(self):
+        self.client.force_login(self.admin)
+        reponse = self.client.get(reverse("comptes:liste_utilisateurs"))
+        self.assertEqual(reponse.status_code, 200)
+
+
+class ImportEtudiantsTest(TestCase):
+    """Tests de import_etudiants (lots, hachage parallèle, rapport d'erreurs)"""
+
+    ENTETE = "last_name,first_name,email,password,role,genre,numero_etudiant,departement,niveau\n"
+
+    def setUp(self):
+        self.psy = Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        Departement.objects.create(code="SOCIO", slug="sociologie", nom="Sociologie")
+        Utilisateur.objects.create_user(
+            email="pris@example.com", password="x", first_name="Déjà", last_name="Là", role="ADMIN",
         )
-        self.student_user.must_change_password = False
-        self.student_user.save()
 
-        # Créer un admin
-        self.admin_user = User.objects.create_user(
-            email="admin@example.com",
-            password="motdepasse123",
-            first_name="Admin",
-            last_name="Test",
-            role="ADMIN",
+    def _importer(self, lignes, *options):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as fichier:
+            fichier.write(self.ENTETE + "".join(lignes))
+        self.addCleanup(os.remove, fichier.name)
+        sortie = StringIO()
+        call_command("import_etudiants", fichier.name, "--processus", "1",
+                     *options, stdout=sortie)
+        return sortie.getvalue()
+
+    def test_creation_et_cles_normalisees(self):
+        sortie = self._importer([
+            "Pierre,Jean,Jean.Pierre@Example.com,secret1,ETUDIANT,M,ab001,Psychologie,Niveau I\n",
+            "Joseph,Marie,pris@example.com,,ETUDIANT,F,ab002,Sociologie,NIVEAU2\n",
+            "Sans,Niveau,x@example.com,,ETUDIANT,F,ab003,Sociologie,Niveau IX\n",
+        ])
+        self.assertIn("2 étudiant(s) créé(s)", sortie)
+        self.assertIn("1 ignoré(s)", sortie)
+        self.assertIn("lignes/s", sortie)
+
+        jean = Etudiant.objects.select_related("utilisateur").get(numero_etudiant="ab001")
+        self.assertEqual((jean.departement, jean.niveau), (self.psy, "NIVEAU1"))
+        self.assertEqual(jean.utilisateur.email_normalise, "jean.pierre@example.com")
+        self.assertTrue(jean.utilisateur.doit_changer_mot_de_passe)
+        self.assertEqual(authenticate(username="AB001", password="secret1"), jean.utilisateur)
+        # Email déjà pris : suffixé, mot de passe par défaut
+        marie = Utilisateur.objects.get(profil_etudiant__numero_etudiant="ab002")
+        self.assertEqual(marie.email, "pris2@example.com")
+        self.assertTrue(marie.check_password("motdepasse123"))
+
+    def test_reimport_idempotent(self):
+        ligne = "Pierre,Jean,jean@example.com,,ETUDIANT,M,ab001,Psychologie,NIVEAU1\n"
+        self._importer([ligne])
+        sortie = self._importer([ligne.replace("NIVEAU1", "NIVEAU2").replace("Jean,", "Jean-Marc,")])
+        self.assertIn("0 étudiant(s) créé(s), 1 mis à jour", sortie)
+        etudiant = Etudiant.objects.select_related("utilisateur").get(numero_etudiant="ab001")
+        self.assertEqual((etudiant.niveau, etudiant.utilisateur.first_name), ("NIVEAU2", "Jean-Marc"))
+        self.assertEqual(Utilisateur.objects.filter(role="ETUDIANT").count(), 1)
+
+    def test_dry_run(self):
+        sortie = self._importer(
+            ["Pierre,Jean,jean@example.com,,ETUDIANT,M,ab001,Psychologie,NIVEAU1\n"], "--dry-run",
         )
-        self.admin_user.must_change_password = False
-        self.admin_user.save()
-
-    def test_student_cannot_access_admin_pages(self):
-        """Test qu'un étudiant ne peut pas accéder aux pages admin"""
-        self.client.login(email="student@example.com", password="motdepasse123")
-        response = self.client.get(reverse("comptes:liste_utilisateurs"))
-        self.assertEqual(response.status_code, 302)  # Redirection
-
-    def test_admin_can_access_admin_pages(self):
-        """Test qu'un admin peut accéder aux pages admin"""
-        self.client.login(email="admin@example.com", password="motdepasse123")
-        response = self.client.get(reverse("comptes:liste_utilisateurs"))
-        self.assertEqual(response.status_code, 200)
+        self.assertIn("[DRY-RUN]", sortie)
+        self.assertFalse(Etudiant.objects.exists())
+
+    def test_lots_et_rapport_json(self):
+        rapport = os.path.join(tempfile.mkdtemp(), "erreurs.json")
+        self.addCleanup(os.remove, rapport)
+        sortie = self._importer([
+            "A,Un,un@example.com,,ETUDIANT,M,ab001,Psychologie,NIVEAU1\n",
+            "B,Deux,deux@example.com,,ETUDIANT,M,ab002,Psychologie,NIVEAU1\n",
+            "C,Trois,sans-arobase,,ETUDIANT,M,ab003,Psychologie,NIVEAU1\n",
+            # Même matricule qu'une ligne d'un lot précédent : mise à jour
+            "A,Un-bis,autre@example.com,,ETUDIANT,M,ab001,Sociologie,NIVEAU1\n",
+        ], "--taille-lot", "2", "--rapport", rapport)
+        self.assertIn("2 étudiant(s) créé(s), 1 mis à jour, 1 ignoré(s)", sortie)
+        self.assertNotIn("sans-arobase", sortie)
+        etudiant = Etudiant.objects.select_related("utilisateur", "departement").get(numero_etudiant="ab001")
+        self.assertEqual((etudiant.utilisateur.first_name, etudiant.departement.code), ("Un-bis", "SOCIO"))
+
+        with open(rapport, encoding="utf-8") as fichier:
+            rejets = json.load(fichier)
+        self.assertEqual(len(rejets), 1)
+        self.assertEqual(rejets[0]["ligne"], 4)
+        self.assertEqual(rejets[0]["message"], "email invalide « sans-arobase »")
+        self.assertEqual(rejets[0]["donnees"]["numero_etudiant"], "ab003")
@@ -85,11 +85,7 @@ def tableau_bord(request):
     elif utilisateur.est_professeur():
         professeur = utilisateur.profil_professeur
 
-        sections = professeur.sections_cours.select_related("cours").annotate(
-            nombre_inscrits=Count(
-                "inscriptions", filter=Q(inscriptions__statut__in=Inscription.STATUTS_ACTIFS)
-            )
-        )[:5]
+        sections = professeur.sections_cours.select_related("cours")[:5]
 
         total_sections = professeur.sections_cours.count()
         total_etudiants_inscrits = Inscription.objects.filter(
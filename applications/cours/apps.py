@@ -5,3 +5,6 @@ class CoursConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'applications.cours'
     verbose_name = "Gestion des Cours"
+
+    def ready(self):
+        import applications.cours.signals  # noqa: F401
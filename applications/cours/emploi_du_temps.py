@@ -0,0 +1,242 @@
+"""
+Emploi du temps hebdomadaire d'un étudiant ou d'un professeur.
+
+Étudiant : sections de ses inscriptions en cours (statut INSCRIT).
+Professeur : ses sections ouvertes ou qui comptent encore des inscrits.
+Dans les deux cas, seulement celles de la période en cours (periodes.py).
+S'y ajoutent les examens de ces sections. Dans le flux, chaque cours se
+répète chaque semaine du premier au dernier jour du semestre.
+
+Les données sont calculées une fois puis gardées en cache par utilisateur,
+avec leur empreinte (ETag) et le flux iCalendar déjà rédigé : un client de
+calendrier qui interroge le flux toutes les quelques minutes reçoit un 304
+sans aucune requête SQL. Le cache est invalidé par les signaux de
+cours/signals.py — pour l'étudiant concerné à chaque inscription, pour tout
+le monde (génération incrémentée) quand une section ou un examen change —
+et expire au plus tard après EMPLOI_DU_TEMPS_CACHE_DUREE secondes
+(écritures en bloc, QuerySet.update).
+
+Le flux est servi sur une URL à jeton signé (django.core.signing) : stable
+tant que SECRET_KEY ne change pas, il ne révèle que l'emploi du temps.
+"""
+
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+
+from applications.comptes.models import Utilisateur
+from applications.portail.models import Examen
+
+from .models import SectionCours
+from .periodes import bornes_periode, periode_courante
+
+SEL_JETON = "cours.emploi_du_temps"
+CLE_GENERATION = "emploi_du_temps:generation"
+
+JOURS_ICAL = {"LUNDI": "MO", "MARDI": "TU", "MERCREDI": "WE", "JEUDI": "TH", "VENDREDI": "FR", "SAMEDI": "SA"}
+JOURS = list(JOURS_ICAL)
+
+
+# ── Jeton du flux ────────────────────────────────────────────────────────
+
+def jeton_calendrier(utilisateur):
+    return signing.Signer(salt=SEL_JETON).sign(str(utilisateur.pk))
+
+
+def utilisateur_du_jeton(jeton):
+    """pk de l'utilisateur, ou None si le jeton est invalide"""
+    try:
+        return int(signing.Signer(salt=SEL_JETON).unsign(jeton))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+# ── Cache ────────────────────────────────────────────────────────────────
+
+def _generation():
+    return cache.get_or_set(CLE_GENERATION, 1, None)
+
+
+def _cle(id_utilisateur, generation):
+    # La période fait partie de la clé : un changement de semestre recalcule
+    annee, semestre = periode_courante()
+    return f"emploi_du_temps:{generation}:{annee}-{semestre}:{id_utilisateur}"
+
+
+def invalider_emploi_du_temps(id_utilisateur=None):
+    """Oublie l'emploi du temps d'un utilisateur, ou de tous (None)"""
+    if id_utilisateur is not None:
+        cache.delete(_cle(id_utilisateur, _generation()))
+        return
+    _generation()
+    try:
+        cache.incr(CLE_GENERATION)
+    except ValueError:
+        # Clé évincée entre-temps : toute nouvelle valeur invalide l'ancienne
+        cache.set(CLE_GENERATION, int(datetime.datetime.now().timestamp()), None)
+
+
+def obtenir_emploi_du_temps(id_utilisateur):
+    """
+    {etag, sections: [...], examens: [...], ics} de l'utilisateur, depuis le
+    cache si possible. None si le compte n'existe pas ou est désactivé.
+    """
+    cle = _cle(id_utilisateur, _generation())
+    donnees = cache.get(cle)
+    if donnees is None:
+        utilisateur = Utilisateur.objects.filter(pk=id_utilisateur, is_active=True).first()
+        if utilisateur is None:
+            return None
+        donnees = calculer_emploi_du_temps(utilisateur)
+        cache.set(cle, donnees, getattr(settings, "EMPLOI_DU_TEMPS_CACHE_DUREE", 15 * 60))
+    return donnees
+
+
+# ── Calcul ───────────────────────────────────────────────────────────────
+
+def _sections(utilisateur, annee, semestre):
+    sections = SectionCours.objects.none()
+    if utilisateur.est_etudiant():
+        sections = SectionCours.objects.filter(
+            inscriptions__etudiant__utilisateur=utilisateur, inscriptions__statut="INSCRIT",
+        )
+    elif utilisateur.est_professeur():
+        sections = SectionCours.objects.filter(
+            Q(est_ouverte=True) | Q(inscriptions__statut="INSCRIT"),
+            professeur__utilisateur=utilisateur,
+        ).distinct()
+    return sections.filter(annee=annee, semestre=semestre).select_related("cours", "professeur__utilisateur")
+
+
+def calculer_emploi_du_temps(utilisateur):
+    annee, semestre = periode_courante()
+    debut, fin = bornes_periode(annee, semestre)
+    sections = sorted(
+        _sections(utilisateur, annee, semestre),
+        key=lambda s: (JOURS.index(s.jour_semaine), s.heure_debut, s.cours.code),
+    )
+    examens = (
+        Examen.objects
+        .filter(section_cours__in=[s.id for s in sections])
+        .select_related("section_cours__cours")
+        .order_by("date", "heure")
+    )
+    donnees = {
+        "sections": [
+            {
+                "id": s.id,
+                "code": s.cours.code,
+                "nom": s.cours.nom,
+                "numero": s.numero_section,
+                "jour": s.jour_semaine,
+                "jour_affiche": s.get_jour_semaine_display(),
+                "debut": s.heure_debut.strftime("%H:%M"),
+                "fin": s.heure_fin.strftime("%H:%M"),
+                "salle": s.salle,
+                "professeur": s.professeur.utilisateur.get_full_name() if s.professeur else "",
+                # Occurrences : chaque semaine du semestre
+                "premier_jour": _premier_jour(debut, s.jour_semaine).isoformat(),
+                "dernier_jour": fin.isoformat(),
+            }
+            for s in sections
+        ],
+        "examens": [
+            {
+                "id": e.id,
+                "code": e.section_cours.cours.code,
+                "nom": e.section_cours.cours.nom,
+                "type": e.get_type_examen_display(),
+                "date": e.date.isoformat(),
+                "date_affichee": e.date.strftime("%d/%m/%Y"),
+                "heure": e.heure.strftime("%H:%M") if e.heure else "",
+                "duree": e.duree_minutes,
+                "salle": e.salle,
+            }
+            for e in examens
+        ],
+    }
+    empreinte = hashlib.sha1(json.dumps(donnees, sort_keys=True).encode()).hexdigest()
+    donnees["etag"] = f'"{empreinte}"'
+    donnees["ics"] = rediger_ics(donnees)
+    return donnees
+
+
+def _premier_jour(depuis, jour):
+    return depuis + datetime.timedelta(days=(JOURS.index(jour) - depuis.weekday()) % 7)
+
+
+# ── iCalendar (RFC 5545) ─────────────────────────────────────────────────
+# Heures « flottantes » (sans fuseau) : affichées telles quelles, à l'heure
+# locale de l'établissement.
+
+def _echapper(texte):
+    return (
+        texte.replace("\\", "\\\\").replace(";", "\\;")
+        .replace(",", "\\,").replace("\n", "\\n")
+    )
+
+
+def _plier(ligne):
+    """Coupe les lignes de plus de 75 octets (continuation : espace initial)"""
+    morceaux, courant, taille = [], "", 0
+    for caractere in ligne:
+        octets = len(caractere.encode("utf-8"))
+        if taille + octets > 75:
+            morceaux.append(courant)
+            courant, taille = " ", 1
+        courant += caractere
+        taille += octets
+    morceaux.append(courant)
+    return "\r\n".join(morceaux)
+
+
+def _horodatage(date, heure):
+    return f"{date.replace('-', '')}T{heure.replace(':', '')}00"
+
+
+def rediger_ics(donnees):
+    maintenant = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    lignes = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//gestionEtudiants//Emploi du temps//FR",
+        "CALSCALE:GREGORIAN",
+        "X-WR-CALNAME:Emploi du temps",
+    ]
+    for s in donnees["sections"]:
+        description = f"Section {s['numero']}" + (f" — {s['professeur']}" if s["professeur"] else "")
+        lignes += [
+            "BEGIN:VEVENT",
+            f"UID:section-{s['id']}@gestion-etudiants",
+            f"DTSTAMP:{maintenant}",
+            f"DTSTART:{_horodatage(s['premier_jour'], s['debut'])}",
+            f"DTEND:{_horodatage(s['premier_jour'], s['fin'])}",
+            f"RRULE:FREQ=WEEKLY;BYDAY={JOURS_ICAL[s['jour']]};"
+            f"UNTIL={_horodatage(s['dernier_jour'], '23:59')}",
+            f"SUMMARY:{_echapper(s['code'] + ' — ' + s['nom'])}",
+            f"DESCRIPTION:{_echapper(description)}",
+        ]
+        if s["salle"]:
+            lignes.append(f"LOCATION:{_echapper(s['salle'])}")
+        lignes.append("END:VEVENT")
+    for e in donnees["examens"]:
+        lignes += [
+            "BEGIN:VEVENT",
+            f"UID:examen-{e['id']}@gestion-etudiants",
+            f"DTSTAMP:{maintenant}",
+        ]
+        if e["heure"]:
+            lignes += [f"DTSTART:{_horodatage(e['date'], e['heure'])}", f"DURATION:PT{e['duree']}M"]
+        else:
+            lignes.append(f"DTSTART;VALUE=DATE:{e['date'].replace('-', '')}")
+        lignes.append(f"SUMMARY:{_echapper(e['type'] + ' — ' + e['code'])}")
+        if e["salle"]:
+            lignes.append(f"LOCATION:{_echapper(e['salle'])}")
+        lignes.append("END:VEVENT")
+    lignes.append("END:VCALENDAR")
+    return "\r\n".join(_plier(ligne) for ligne in lignes) + "\r\n"
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Cours, SectionCours, Prerequis
+from .planning import conflits_section, verifier_formulaire
 
 
 class FormulaireCours(forms.ModelForm):
@@ -65,6 +66,12 @@ class FormulaireSection(forms.ModelForm):
             "est_ouverte": forms.CheckboxInput(attrs={"class": "form-check-input"}),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        # Salle et professeur ne doivent pas être déjà pris sur ce créneau
+        verifier_formulaire(self, conflits_section)
+        return cleaned_data
+
 
 class FormulairePrerequis(forms.ModelForm):
     """Ajout d'un prérequis à un cours"""
@@ -13,19 +13,26 @@ lignes "Préparatoire" qui n'ont volontairement aucun département
 (departement = None), le préparatoire étant un niveau transversal
 et non un département académique.
 
+Un cours déjà importé (retrouvé par son `code`) est mis à jour.
+
 Usage :
     python manage.py import_cours /chemin/vers/cursus.csv
+    python manage.py import_cours cursus.csv --dry-run --rapport erreurs.json
 """
 
-import csv
-
-from django.core.management.base import BaseCommand, CommandError
-
 from applications.departements.models import Departement
 from applications.cours.models import Cours
+from utilitaires.importation import Colonne, CommandeImport, upsert
 
 
-class Command(BaseCommand):
+def _credits(valeur):
+    try:
+        return int(valeur)
+    except ValueError:
+        return 0
+
+
+class Command(CommandeImport):
     help = "Importe les cours depuis un fichier CSV (departement,niveau,code,cours,credits,optionnel)."
 
     # Nom du département (colonne CSV) -> code du modèle Departement
@@ -46,109 +53,50 @@ class Command(BaseCommand):
         "Niveau III": "NIVEAU3",
     }
 
-    def add_arguments(self, parser):
+    COLONNES = {
+        "code":        Colonne(obligatoire=True),
+        "departement": Colonne(choix=DEPARTEMENT_MAP, libelle="département"),
+        "niveau":      Colonne(choix=NIVEAU_MAP),
+        "nom":         Colonne(source="cours"),
+        "credits":     Colonne(defaut=0, convertir=_credits),
+        "optionnel":   Colonne(convertir=lambda valeur: valeur.lower() == "oui", defaut=False),
+    }
+
+    RESUME = "{creees} cours créé(s), {mises_a_jour} mis à jour, {ignorees} ignoré(s)"
+
+    def ajouter_arguments(self, parser):
         parser.add_argument(
             "csv_path", type=str, help="Chemin vers le fichier cursus.csv"
         )
 
-    def handle(self, *args, **options):
-        csv_path = options["csv_path"]
-
-        try:
-            fichier = open(csv_path, newline="", encoding="utf-8")
-        except FileNotFoundError:
-            raise CommandError(f"Fichier introuvable : {csv_path}")
-
-        # Cache pour éviter une requête DB par ligne
-        cache_departements = {}
-
-        crees = 0
-        maj = 0
-        ignores = 0
-
-        with fichier:
-            lecteur = csv.DictReader(fichier)
-            for num_ligne, ligne in enumerate(lecteur, start=2):
-                nom_departement = (ligne.get("departement") or "").strip()
-                nom_niveau = (ligne.get("niveau") or "").strip()
-                code = (ligne.get("code") or "").strip()
-                nom_cours = (ligne.get("cours") or "").strip()
-                credits_str = (ligne.get("credits") or "").strip()
-                optionnel = (ligne.get("optionnel") or "").strip().lower() == "oui"
-
-                if not code:
-                    self.stdout.write(
-                        self.style.WARNING(f"Ligne {num_ligne} : code manquant, ignorée.")
-                    )
-                    ignores += 1
-                    continue
-
-                if nom_departement not in self.DEPARTEMENT_MAP:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f"Ligne {num_ligne} : département inconnu « {nom_departement} », "
-                            f"cours {code} ignoré."
-                        )
-                    )
-                    ignores += 1
-                    continue
-
-                code_departement = self.DEPARTEMENT_MAP[nom_departement]
-                departement = None
-
-                if code_departement is not None:
-                    if code_departement not in cache_departements:
-                        try:
-                            cache_departements[code_departement] = Departement.objects.get(
-                                code=code_departement
-                            )
-                        except Departement.DoesNotExist:
-                            cache_departements[code_departement] = None
-                            self.stdout.write(
-                                self.style.WARNING(
-                                    f"Département « {code_departement} » introuvable en base "
-                                    f"(as-tu lancé import_departements ?)."
-                                )
-                            )
-                    departement = cache_departements[code_departement]
-                # Sinon (Préparatoire) : departement reste None, comme demandé.
-
-                niveau = self.NIVEAU_MAP.get(nom_niveau)
-                if niveau is None:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f"Ligne {num_ligne} : niveau inconnu « {nom_niveau} », "
-                            f"cours {code} ignoré."
-                        )
-                    )
-                    ignores += 1
-                    continue
-
-                try:
-                    credits = int(credits_str) if credits_str else 0
-                except ValueError:
-                    credits = 0
-
-                description = "Cours optionnel." if optionnel else ""
-
-                cours_obj, created = Cours.objects.update_or_create(
-                    code=code,
-                    defaults={
-                        "nom": nom_cours,
-                        "credits": credits,
-                        "departement": departement,
-                        "niveau": niveau,
-                        "description": description,
-                    },
-                )
-
-                if created:
-                    crees += 1
-                else:
-                    maj += 1
-
-        self.stdout.write(
-            self.style.SUCCESS(
-                f"\nTerminé. {crees} cours créé(s), {maj} mis à jour, {ignores} ignoré(s)."
-            )
-        )
\ No newline at end of file
+    def preparer(self, options):
+        self._departements = {d.code: d for d in Departement.objects.all()}
+        self._manquants = set()
+
+    def valider(self, valeurs, source, options):
+        code_departement = valeurs["departement"]
+        departement = None
+        if code_departement is not None:
+            departement = self._departements.get(code_departement)
+            if departement is None and code_departement not in self._manquants:
+                self._manquants.add(code_departement)
+                self.stdout.write(self.style.WARNING(
+                    f"Département « {code_departement} » introuvable en base "
+                    f"(as-tu lancé import_departements ?)."
+                ))
+        # Sinon (Préparatoire) : departement reste None, comme demandé.
+
+        return Cours(
+            code=valeurs["code"],
+            nom=valeurs["nom"],
+            credits=valeurs["credits"],
+            departement=departement,
+            niveau=valeurs["niveau"],
+            description="Cours optionnel." if valeurs["optionnel"] else "",
+        )
+
+    def ecrire_lot(self, lot, source, options):
+        return upsert(
+            Cours, lot, "code",
+            ["nom", "credits", "departement", "niveau", "description"], options["taille_lot"],
+        )
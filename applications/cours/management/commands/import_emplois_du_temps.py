@@ -38,34 +38,77 @@ Hypothèses prises par défaut (à ajuster si besoin) :
     - --annee et --semestre ne sont pas dans le CSV : ils sont passés en
       argument car ils dépendent de la période académique en cours.
 
+Déroulement (moteur commun utilitaires/importation.py, durée de chaque
+étape affichée à la fin) :
+    - préchargement : départements, cours, professeurs, emails, identifiants
+                      et sections existantes de la période sont chargés une
+                      fois en mémoire ;
+    - lecture       : les fichiers sont lus en flux, à l'avance et en
+                      parallèle avec --fils ;
+    - validation    : chaque ligne est comparée à ces index, sans requête ;
+    - écriture      : par lot (--taille-lot), professeurs et sections sont
+                      créés et mis à jour par bulk_create / bulk_update.
+
+Après l'import, les horaires de la période sont vérifiés (voir
+cours/planning.py) : si une section importée met un professeur ou une salle
+sur deux créneaux à la fois, tout l'import est annulé, sauf avec
+--autoriser-conflits (les conflits sont alors seulement signalés).
+
 Usage :
     python manage.py import_emplois_du_temps emploi_du_temps_communication_niveau1.csv --annee 2026 --semestre AUTOMNE
     python manage.py import_emplois_du_temps . --annee 2026 --semestre AUTOMNE --dry-run
     python manage.py import_emplois_du_temps . --annee 2026 --semestre AUTOMNE
         (traite tous les emploi_du_temps_*.csv du dossier courant)
+    python manage.py import_emplois_du_temps donnees/ --annee 2026 --semestre AUTOMNE --fils 4 --rapport erreurs.csv
 """
 
-import csv
 import datetime
 import glob
 import os
 import re
 
-from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.utils import timezone
 from django.utils.text import slugify
 
 from applications.departements.models import Departement
+from applications.cours.emploi_du_temps import invalider_emploi_du_temps
 from applications.cours.models import Cours, SectionCours
-from applications.comptes.models import Utilisateur, Professeur
+from applications.cours.planning import decrire_conflit, verifier_horaires
+from applications.comptes.models import Utilisateur, Professeur, normaliser_email
+from utilitaires.importation import Colonne, CommandeImport, ErreurLigne, Source, completer_pks
+
+
+JOURS = {
+    "LUNDI": "LUN", "MARDI": "MAR", "MERCREDI": "MER",
+    "JEUDI": "JEU", "VENDREDI": "VEN", "SAMEDI": "SAM",
+}
+
+SESSION_REGEX = re.compile(r'^session(\d+)$')
 
 
-class _StopDryRun(Exception):
-    """Exception interne utilisée uniquement pour annuler la transaction en --dry-run."""
-    pass
+def _jour(valeur):
+    if valeur.upper() not in JOURS:
+        raise ValueError(valeur)
+    return valeur.upper()
 
 
-class Command(BaseCommand):
+def _heure(valeur):
+    return datetime.datetime.strptime(valeur, "%H:%M").time()
+
+
+def _session(valeur):
+    m = SESSION_REGEX.match(valeur.lower())
+    if not m:
+        raise ValueError(valeur)
+    session = f"SESSION_{m.group(1)}"
+    if session not in dict(SectionCours.CHOIX_SESSION):
+        raise ValueError(valeur)
+    return session
+
+
+class Command(CommandeImport):
     help = "Importe les sections de cours (emplois du temps) depuis un ou plusieurs fichiers CSV."
 
     # Nom du fichier -> déduction département + niveau
@@ -82,16 +125,30 @@ class Command(BaseCommand):
 
     NIVEAU_DIGIT_MAP = {"1": "NIVEAU1", "2": "NIVEAU2", "3": "NIVEAU3"}
 
-    JOUR_ABBREV = {
-        "LUNDI": "LUN", "MARDI": "MAR", "MERCREDI": "MER",
-        "JEUDI": "JEU", "VENDREDI": "VEN", "SAMEDI": "SAM",
+    JOUR_ABBREV = JOURS
+
+    COLONNES = {
+        "jour":        Colonne(obligatoire=True, convertir=_jour),
+        "heure_debut": Colonne(obligatoire=True, convertir=_heure, libelle="heure de début"),
+        "heure_fin":   Colonne(obligatoire=True, convertir=_heure, libelle="heure de fin"),
+        "session":     Colonne(obligatoire=True, convertir=_session),
+        "code_cours":  Colonne(),
+        "prenom_prof": Colonne(),
+        "nom_prof":    Colonne(),
     }
 
-    SESSION_REGEX = re.compile(r'^session(\d+)$')
+    FILS = 4
+
+    RESUME = "{creees} section(s) créée(s), {mises_a_jour} mise(s) à jour, {ignorees} ignorée(s)"
+    CATEGORIES = {
+        "cours_introuvable": "cours introuvable",
+        "incoherence":       "incohérence département/niveau",
+        "format":            "format invalide",
+    }
 
     # ── Arguments ────────────────────────────────────────────────────────────
 
-    def add_arguments(self, parser):
+    def ajouter_arguments(self, parser):
         parser.add_argument(
             "chemins", nargs="+",
             help="Fichier(s) CSV emploi_du_temps_*.csv, ou dossier(s) les contenant.",
@@ -109,48 +166,26 @@ class Command(BaseCommand):
             help="Mot de passe initial des nouveaux comptes professeur.",
         )
         parser.add_argument(
-            "--dry-run", action="store_true",
-            help="Simule l'import (affiche le résumé) sans rien enregistrer en base.",
+            "--autoriser-conflits", action="store_true",
+            help="Enregistre l'import même si des sections importées sont en double réservation.",
         )
 
-    # ── Point d'entrée ───────────────────────────────────────────────────────
+    # ── Résolution des fichiers à traiter ───────────────────────────────────
 
-    def handle(self, *args, **options):
-        fichiers = self._resoudre_fichiers(options["chemins"])
-        if not fichiers:
+    def sources(self, options):
+        sources = []
+        for chemin in self._resoudre_fichiers(options["chemins"]):
+            nom_fichier = os.path.basename(chemin)
+            try:
+                code_departement, niveau = self._deduire_departement_niveau(nom_fichier)
+            except ValueError as exc:
+                sources.append(Source(nom_fichier, chemin, erreur=str(exc)))
+                continue
+            contexte = {"code_departement": code_departement, "niveau": niveau}
+            sources.append(Source(nom_fichier, chemin, contexte=contexte))
+        if not sources:
             raise CommandError("Aucun fichier emploi_du_temps_*.csv trouvé.")
-
-        self._cache_departements = {}
-        self._cache_professeurs = {}
-        self._cache_cours = {}
-        self._numeros_utilises = {}
-        self._profs_crees = []
-        self._stats = {
-            "lignes_traitees": 0,
-            "sections_creees": 0,
-            "sections_maj": 0,
-            "ignorees_cours_introuvable": 0,
-            "ignorees_incoherence": 0,
-            "ignorees_format": 0,
-            "erreurs_inattendues": 0,
-        }
-
-        try:
-            with transaction.atomic():
-                for chemin in fichiers:
-                    self._traiter_fichier(chemin, options)
-
-                self._afficher_resume(options)
-
-                if options["dry_run"]:
-                    raise _StopDryRun()
-        except _StopDryRun:
-            self.stdout.write(self.style.WARNING(
-                "\n[DRY-RUN] Aucune donnée n'a été enregistrée en base. "
-                "Relance sans --dry-run pour appliquer ces changements."
-            ))
-
-    # ── Résolution des fichiers à traiter ───────────────────────────────────
+        return sources
 
     def _resoudre_fichiers(self, chemins):
         resultats = []
@@ -198,28 +233,49 @@ class Command(BaseCommand):
 
         return code_departement, niveau
 
-    # ── Caches / lookups ─────────────────────────────────────────────────────
+    # ── Index en mémoire ─────────────────────────────────────────────────────
+
+    def preparer(self, options):
+        self._numeros_utilises = {}
+        self._profs_crees = []
+        self._sections_importees = set()
+        self._mot_de_passe_hache = None
+        self._conflits = []
+
+        self._departements = {d.code: d for d in Departement.objects.all()}
+        self._departements_manquants = set()
+        self._cours = {c.code: c for c in Cours.objects.select_related("departement")}
+
+        # (prénom, nom) sans casse -> Professeur, ou Utilisateur encore sans profil
+        self._professeurs = {}
+        utilisateurs = (
+            Utilisateur.objects.filter(role="PROFESSEUR")
+            .select_related("profil_professeur").order_by("pk")
+        )
+        for utilisateur in utilisateurs:
+            cle = (utilisateur.first_name.strip().casefold(), utilisateur.last_name.strip().casefold())
+            profil = getattr(utilisateur, "profil_professeur", None)
+            self._professeurs.setdefault(cle, profil or utilisateur)
+
+        self._emails = {email.casefold() for email in Utilisateur.objects.values_list("email", flat=True)}
+        self._identifiants = set(Professeur.objects.values_list("identifiant_professeur", flat=True))
+        self._prochain_identifiant = len(self._identifiants) + 1
+
+        # Même clé que l'ancien update_or_create : (cours, jour, heure de début)
+        self._sections = {}
+        for section in SectionCours.objects.filter(annee=options["annee"], semestre=options["semestre"]):
+            self._sections.setdefault((section.cours_id, section.jour_semaine, section.heure_debut), section)
 
     def _obtenir_departement(self, code):
         if code is None:
             return None
-        if code not in self._cache_departements:
-            try:
-                self._cache_departements[code] = Departement.objects.get(code=code)
-            except Departement.DoesNotExist:
-                self._cache_departements[code] = None
-                self.stdout.write(self.style.WARNING(
-                    f"Département « {code} » introuvable en base (as-tu lancé import_departements ?)."
-                ))
-        return self._cache_departements[code]
-
-    def _obtenir_cours(self, code):
-        if code not in self._cache_cours:
-            try:
-                self._cache_cours[code] = Cours.objects.select_related("departement").get(code=code)
-            except Cours.DoesNotExist:
-                self._cache_cours[code] = None
-        return self._cache_cours[code]
+        departement = self._departements.get(code)
+        if departement is None and code not in self._departements_manquants:
+            self._departements_manquants.add(code)
+            self.stdout.write(self.style.WARNING(
+                f"Département « {code} » introuvable en base (as-tu lancé import_departements ?)."
+            ))
+        return departement
 
     # ── Création / récupération des professeurs ─────────────────────────────
 
@@ -227,65 +283,62 @@ class Command(BaseCommand):
         base = f"{slugify(prenom)}.{slugify(nom)}"
         email = f"{base}@{domaine}"
         compteur = 2
-        while Utilisateur.objects.filter(email=email).exists():
+        while email.casefold() in self._emails:
             email = f"{base}{compteur}@{domaine}"
             compteur += 1
+        self._emails.add(email.casefold())
         return email
 
     def _generer_identifiant_professeur(self):
-        compteur = Professeur.objects.count() + 1
         while True:
-            identifiant = f"PROF{compteur:05d}"
-            if not Professeur.objects.filter(identifiant_professeur=identifiant).exists():
+            identifiant = f"PROF{self._prochain_identifiant:05d}"
+            self._prochain_identifiant += 1
+            if identifiant not in self._identifiants:
+                self._identifiants.add(identifiant)
                 return identifiant
-            compteur += 1
-
-    def _obtenir_ou_creer_professeur(self, prenom, nom, departement, options):
-        cle = (prenom.strip().casefold(), nom.strip().casefold())
-        if cle in self._cache_professeurs:
-            return self._cache_professeurs[cle]
-
-        prenom = prenom.strip()
-        nom = nom.strip()
-
-        # 1. On retrouve d'abord un compte utilisateur existant.
-        utilisateur = Utilisateur.objects.filter(
-            first_name__iexact=prenom,
-            last_name__iexact=nom,
-            role="PROFESSEUR",
-        ).first()
 
-        # 2. Si aucun utilisateur n'existe, on le crée.
+    def _obtenir_ou_creer_professeur(self, prenom, nom, departement, options, lot):
+        """
+        Professeur existant, ou nouveau (pas encore en base) ajouté au `lot`.
+        Un même prénom+nom n'est créé qu'une seule fois.
+        """
+        cle = (prenom.casefold(), nom.casefold())
+        connu = self._professeurs.get(cle)
+
+        if isinstance(connu, Professeur):
+            # Profil existant : on renseigne au moins le département s'il manque
+            if departement is not None and connu.departement_id is None:
+                connu.departement = departement
+                if connu.pk is not None:
+                    lot["professeurs_maj"].append(connu)
+            return connu
+
+        # Compte existant sans profil, ou nouveau compte
+        utilisateur = connu
         if utilisateur is None:
+            if self._mot_de_passe_hache is None:
+                self._mot_de_passe_hache = make_password(options["mot_de_passe_defaut"])
             email = self._generer_email(prenom, nom, options["email_domaine"])
-            utilisateur = Utilisateur.objects.create_user(
+            utilisateur = Utilisateur(
                 email=email,
-                password=options["mot_de_passe_defaut"],
+                password=self._mot_de_passe_hache,
                 first_name=prenom,
                 last_name=nom,
                 role="PROFESSEUR",
+                doit_changer_mot_de_passe=True,
+                email_normalise=normaliser_email(email),
             )
+            lot["utilisateurs"].append(utilisateur)
 
-        # 3. On récupère le profil Professeur lié à cet utilisateur,
-        #    ou on le crée s'il manque.
-        professeur, created = Professeur.objects.get_or_create(
+        professeur = Professeur(
             utilisateur=utilisateur,
-            defaults={
-                "identifiant_professeur": self._generer_identifiant_professeur(),
-                "departement": departement,
-                "date_embauche": datetime.date.today(),
-            },
+            identifiant_professeur=self._generer_identifiant_professeur(),
+            departement=departement,
+            date_embauche=datetime.date.today(),
         )
-
-        # Si le profil existait déjà, on s'assure au moins que le département
-        # soit renseigné quand il était vide.
-        if not created and departement is not None and professeur.departement_id is None:
-            professeur.departement = departement
-            professeur.save(update_fields=["departement"])
-
-        self._cache_professeurs[cle] = professeur
-        if created:
-            self._profs_crees.append((professeur.identifiant_professeur, prenom, nom, utilisateur.email))
+        lot["professeurs"].append(professeur)
+        self._professeurs[cle] = professeur
+        self._profs_crees.append((professeur.identifiant_professeur, prenom, nom, utilisateur.email))
         return professeur
 
     # ── Génération du numero_section (absent du CSV) ────────────────────────
@@ -301,155 +354,158 @@ class Command(BaseCommand):
         utilises.add(numero)
         return numero
 
-    # ── Traitement d'un fichier ──────────────────────────────────────────────
-
-    def _traiter_fichier(self, chemin, options):
-        nom_fichier = os.path.basename(chemin)
-        self.stdout.write(f"\n→ {nom_fichier}")
-
-        try:
-            code_departement, niveau_attendu = self._deduire_departement_niveau(nom_fichier)
-        except ValueError as exc:
-            self.stdout.write(self.style.ERROR(f"  Fichier ignoré : {exc}"))
-            return
-
-        departement_attendu = self._obtenir_departement(code_departement)
-
-        try:
-            fichier = open(chemin, newline="", encoding="utf-8")
-        except FileNotFoundError:
-            raise CommandError(f"Fichier introuvable : {chemin}")
-
-        with fichier:
-            lecteur = csv.DictReader(fichier)
-            for num_ligne, ligne in enumerate(lecteur, start=2):
-                self._stats["lignes_traitees"] += 1
-                self._traiter_ligne(
-                    ligne, num_ligne, nom_fichier,
-                    departement_attendu, niveau_attendu, options,
-                )
-
-    # ── Traitement d'une ligne ───────────────────────────────────────────────
-
-    def _traiter_ligne(self, ligne, num_ligne, nom_fichier, departement_attendu, niveau_attendu, options):
-        prefixe = f"  Ligne {num_ligne}"
+    # ── Validation d'une ligne ───────────────────────────────────────────────
 
-        jour = (ligne.get("jour") or "").strip().upper()
-        code_cours = (ligne.get("code_cours") or "").strip()
-        prenom_prof = (ligne.get("prenom_prof") or "").strip()
-        nom_prof = (ligne.get("nom_prof") or "").strip()
-        session_brute = (ligne.get("session") or "").strip().lower()
+    def debut_source(self, source, options):
+        self.stdout.write(f"\n→ {source.nom}")
+        if source.contexte is not None:
+            source.contexte["departement"] = self._obtenir_departement(source.contexte["code_departement"])
 
-        if jour not in self.JOUR_ABBREV:
-            self.stdout.write(self.style.WARNING(f"{prefixe} : jour invalide « {jour} », ignorée."))
-            self._stats["ignorees_format"] += 1
-            return
+    def valider(self, valeurs, source, options):
+        code_cours = valeurs["code_cours"]
+        departement_attendu = source.contexte["departement"]
+        niveau_attendu = source.contexte["niveau"]
 
-        try:
-            heure_debut = datetime.datetime.strptime((ligne.get("heure_debut") or "").strip(), "%H:%M").time()
-            heure_fin = datetime.datetime.strptime((ligne.get("heure_fin") or "").strip(), "%H:%M").time()
-        except ValueError:
-            self.stdout.write(self.style.WARNING(f"{prefixe} : heure invalide, ignorée."))
-            self._stats["ignorees_format"] += 1
-            return
-
-        m = self.SESSION_REGEX.match(session_brute)
-        if not m:
-            self.stdout.write(self.style.WARNING(f"{prefixe} : session invalide « {session_brute} », ignorée."))
-            self._stats["ignorees_format"] += 1
-            return
-        session = f"SESSION_{m.group(1)}"
-        if session not in dict(SectionCours.CHOIX_SESSION):
-            self.stdout.write(self.style.WARNING(
-                f"{prefixe} : session « {session} » non gérée par le modèle, ignorée."
-            ))
-            self._stats["ignorees_format"] += 1
-            return
-
-        cours = self._obtenir_cours(code_cours)
+        cours = self._cours.get(code_cours)
         if cours is None:
-            self.stdout.write(self.style.WARNING(
-                f"{prefixe} : cours « {code_cours} » introuvable (as-tu lancé import_cours ?), ignorée."
-            ))
-            self._stats["ignorees_cours_introuvable"] += 1
-            return
+            raise ErreurLigne(
+                f"cours « {code_cours} » introuvable (as-tu lancé import_cours ?)", "cours_introuvable",
+            )
 
         # Vérification de cohérence : ce que dit le nom du fichier doit
         # correspondre à ce qui est réellement enregistré pour ce cours.
         departement_cours_code = cours.departement.code if cours.departement else None
         departement_attendu_code = departement_attendu.code if departement_attendu else None
         if cours.niveau != niveau_attendu or departement_cours_code != departement_attendu_code:
-            self.stdout.write(self.style.ERROR(
-                f"{prefixe} : incohérence — {code_cours} est enregistré comme "
+            raise ErreurLigne(
+                f"incohérence — {code_cours} est enregistré comme "
                 f"{cours.get_niveau_display()} / {departement_cours_code or 'aucun département'} "
-                f"(cursus.csv), mais apparaît dans « {nom_fichier} » "
-                f"({niveau_attendu} / {departement_attendu_code or 'aucun département'}). Ignorée."
-            ))
-            self._stats["ignorees_incoherence"] += 1
-            return
-
-        if not prenom_prof or not nom_prof:
-            self.stdout.write(self.style.WARNING(f"{prefixe} : professeur manquant pour {code_cours}, ignorée."))
-            self._stats["ignorees_format"] += 1
-            return
-
-        try:
-            professeur = self._obtenir_ou_creer_professeur(prenom_prof, nom_prof, departement_attendu, options)
-        except Exception as exc:
-            self.stdout.write(self.style.ERROR(
-                f"{prefixe} : échec récupération/création professeur {prenom_prof} {nom_prof} : {exc}"
-            ))
-            self._stats["erreurs_inattendues"] += 1
-            return
+                f"(cursus.csv), mais apparaît dans « {source.nom} » "
+                f"({niveau_attendu} / {departement_attendu_code or 'aucun département'})",
+                "incoherence",
+            )
+
+        if not valeurs["prenom_prof"] or not valeurs["nom_prof"]:
+            raise ErreurLigne(f"professeur manquant pour {code_cours}")
+
+        valeurs["cours"] = cours
+        return valeurs
+
+    # ── Enregistrement d'un lot ──────────────────────────────────────────────
 
-        numero_section = self._generer_numero_section(code_cours, jour, heure_debut)
+    def ecrire_lot(self, lignes, source, options):
+        lot = {
+            "utilisateurs": [], "professeurs": [], "professeurs_maj": [],
+            "sections": [], "sections_maj": {},
+        }
+        mises_a_jour = 0
+        for valeurs in lignes:
+            mises_a_jour += not self._rapprocher_section(valeurs, source, options, lot)
+        self._ecrire(lot, options)
+        return len(lot["sections"]), mises_a_jour
+
+    def _rapprocher_section(self, valeurs, source, options, lot):
+        """Prépare la création ou la mise à jour de la section ; True si elle est nouvelle"""
+        cours = valeurs["cours"]
+        professeur = self._obtenir_ou_creer_professeur(
+            valeurs["prenom_prof"], valeurs["nom_prof"], source.contexte["departement"], options, lot,
+        )
+        champs = {
+            "numero_section": self._generer_numero_section(cours.code, valeurs["jour"], valeurs["heure_debut"]),
+            "professeur": professeur,
+            "heure_fin": valeurs["heure_fin"],
+            "session": valeurs["session"],
+        }
 
-        try:
-            section, created = SectionCours.objects.update_or_create(
+        cle = (cours.id, valeurs["jour"], valeurs["heure_debut"])
+        section = self._sections.get(cle)
+        if section is None:
+            section = SectionCours(
                 cours=cours,
-                jour_semaine=jour,
-                heure_debut=heure_debut,
+                jour_semaine=valeurs["jour"],
+                heure_debut=valeurs["heure_debut"],
                 semestre=options["semestre"],
                 annee=options["annee"],
-                defaults={
-                    "numero_section": numero_section,
-                    "professeur": professeur,
-                    "heure_fin": heure_fin,
-                    "session": session,
-                },
+                **champs,
             )
-        except Exception as exc:
-            self.stdout.write(self.style.ERROR(f"{prefixe} : échec enregistrement section {code_cours} : {exc}"))
-            self._stats["erreurs_inattendues"] += 1
-            return
+            self._sections[cle] = section
+            lot["sections"].append(section)
+            return True
+
+        avant = (section.numero_section, section.professeur_id, section.heure_fin, section.session)
+        apres = (champs["numero_section"], professeur.pk, champs["heure_fin"], champs["session"])
+        for champ, valeur in champs.items():
+            setattr(section, champ, valeur)
+        # Section créée plus haut dans ce lot : elle sera insérée telle quelle
+        if section.pk is not None and (professeur.pk is None or avant != apres):
+            lot["sections_maj"][section.pk] = section
+        return False
+
+    def _ecrire(self, lot, options):
+        # bulk_create n'appelle ni save() ni les signaux : pas de profil créé
+        # automatiquement, email_normalise renseigné à la construction
+        Utilisateur.objects.bulk_create(lot["utilisateurs"])
+        completer_pks(Utilisateur, lot["utilisateurs"], "email")
+        Professeur.objects.bulk_create(lot["professeurs"])
+        completer_pks(Professeur, lot["professeurs"], "identifiant_professeur")
+        Professeur.objects.bulk_update(lot["professeurs_maj"], ["departement"])
+
+        SectionCours.objects.bulk_create(lot["sections"])
+        if lot["sections"] and lot["sections"][0].pk is None:
+            # MySQL : les clés primaires ne sont pas renvoyées par l'INSERT groupé
+            ids = {
+                (cours_id, jour, heure): pk
+                for cours_id, jour, heure, pk in SectionCours.objects.filter(
+                    annee=options["annee"], semestre=options["semestre"],
+                    cours_id__in={s.cours_id for s in lot["sections"]},
+                ).values_list("cours_id", "jour_semaine", "heure_debut", "pk")
+            }
+            for section in lot["sections"]:
+                section.pk = ids[(section.cours_id, section.jour_semaine, section.heure_debut)]
+
+        sections_maj = list(lot["sections_maj"].values())
+        maintenant = timezone.now()
+        for section in sections_maj:
+            section.modifie_le = maintenant
+        SectionCours.objects.bulk_update(
+            sections_maj, ["numero_section", "professeur", "heure_fin", "session", "modifie_le"],
+        )
 
-        if created:
-            self._stats["sections_creees"] += 1
-        else:
-            self._stats["sections_maj"] += 1
+        self._sections_importees.update(s.pk for s in lot["sections"])
+        self._sections_importees.update(lot["sections_maj"])
+
+    # ── Vérification des doubles réservations ──────────────────────────────
+
+    def terminer(self, options):
+        """Conflits de la période qui impliquent au moins une section importée"""
+        with self.chronometrer("vérification"):
+            self._conflits = [
+                conflit for conflit in verifier_horaires(options["annee"], options["semestre"])
+                if any(
+                    isinstance(objet, SectionCours) and objet.id in self._sections_importees
+                    for objet in (conflit.premier, conflit.second)
+                )
+            ]
+        if self._conflits:
+            self.stdout.write(self.style.ERROR(f"\n{len(self._conflits)} double(s) réservation(s) :"))
+            for conflit in self._conflits:
+                self.stdout.write(self.style.ERROR(f"  {decrire_conflit(conflit)}"))
+
+    def confirmer(self, options):
+        if self._conflits and not options["autoriser_conflits"]:
+            raise CommandError(
+                f"{len(self._conflits)} double(s) réservation(s) : import annulé. "
+                "Corrige les fichiers, ou relance avec --autoriser-conflits."
+            )
+
+    def apres_enregistrement(self, options):
+        # Écritures en bloc : les signaux post_save ne sont pas émis
+        invalider_emploi_du_temps()
 
     # ── Résumé final ─────────────────────────────────────────────────────────
 
-    def _afficher_resume(self, options):
-        s = self._stats
-        prefixe = "[DRY-RUN] " if options["dry_run"] else ""
-        self.stdout.write(self.style.SUCCESS(
-            f"\n{prefixe}Terminé. {s['lignes_traitees']} ligne(s) lues — "
-            f"{s['sections_creees']} section(s) créée(s), {s['sections_maj']} mise(s) à jour."
-        ))
-
-        total_ignorees = (
-            s["ignorees_cours_introuvable"] + s["ignorees_incoherence"]
-            + s["ignorees_format"] + s["erreurs_inattendues"]
-        )
-        if total_ignorees:
-            self.stdout.write(self.style.WARNING(
-                f"{total_ignorees} ligne(s) ignorée(s) : "
-                f"{s['ignorees_cours_introuvable']} cours introuvable, "
-                f"{s['ignorees_incoherence']} incohérence département/niveau, "
-                f"{s['ignorees_format']} format invalide, "
-                f"{s['erreurs_inattendues']} erreur inattendue."
-            ))
+    def afficher_resume(self, options):
+        super().afficher_resume(options)
 
         if self._profs_crees:
             self.stdout.write(self.style.SUCCESS(f"\n{len(self._profs_crees)} professeur(s) créé(s) :"))
@@ -458,4 +514,4 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING(
                 "Mot de passe initial identique pour tous (voir --mot-de-passe-defaut) ; "
                 "doit_changer_mot_de_passe=True force un changement à la 1ère connexion."
-            ))
\ No newline at end of file
+            ))
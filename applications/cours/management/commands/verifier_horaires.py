@@ -0,0 +1,40 @@
+"""
+Commande de contrôle des doubles réservations (salles et professeurs).
+
+Parcourt toutes les sections et tous les examens (éventuellement d'une seule
+période) et signale chaque salle ou professeur occupé par deux créneaux qui
+se chevauchent. Règles de comparaison : voir cours/planning.py.
+
+Le code de sortie est non nul s'il reste des conflits (utilisable en cron).
+
+Usage :
+    python manage.py verifier_horaires
+    python manage.py verifier_horaires --annee 2026 --semestre AUTOMNE
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.cours.planning import decrire_conflit, verifier_horaires
+
+
+class Command(BaseCommand):
+    help = "Signale les salles et professeurs réservés deux fois sur le même créneau."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--annee", type=int, help="Année académique, ex: 2026")
+        parser.add_argument("--semestre", choices=["AUTOMNE", "PRINTEMPS", "ETE"])
+
+    def handle(self, *args, **options):
+        conflits = verifier_horaires(options["annee"], options["semestre"])
+        if not conflits:
+            self.stdout.write(self.style.SUCCESS("Aucune double réservation."))
+            return
+
+        for nature, titre in (("salle", "Salles"), ("professeur", "Professeurs")):
+            lignes = sorted(decrire_conflit(c) for c in conflits if c.nature == nature)
+            if lignes:
+                self.stdout.write(f"\n{titre} ({len(lignes)}) :")
+                for ligne in lignes:
+                    self.stdout.write(self.style.ERROR(f"  {ligne}"))
+
+        raise CommandError(f"{len(conflits)} double(s) réservation(s).")
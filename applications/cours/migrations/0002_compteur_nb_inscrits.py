@@ -0,0 +1,37 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remplir_nb_inscrits(apps, schema_editor):
+    SectionCours = apps.get_model('cours', 'SectionCours')
+    Inscription = apps.get_model('inscriptions', 'Inscription')
+    actives = (
+        Inscription.objects.filter(
+            section_cours=OuterRef('pk'), statut__in=['INSCRIT', 'COMPLETE', 'ECHOUE']
+        )
+        .order_by()
+        .values('section_cours')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    SectionCours.objects.update(nb_inscrits=Coalesce(Subquery(actives), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cours', '0001_initial'),
+        ('inscriptions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sectioncours',
+            name='nb_inscrits',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Nombre d'inscrits"),
+        ),
+        migrations.RunPython(remplir_nb_inscrits, migrations.RunPython.noop),
+    ]
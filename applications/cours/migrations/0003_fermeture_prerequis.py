@@ -0,0 +1,94 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:33
+
+from django.core.exceptions import ValidationError
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Copie de calculer_fermeture (applications/cours/models.py) au moment de la
+# migration : elle ne doit pas dépendre du code courant de l'application.
+
+def calculer_fermeture(aretes):
+    successeurs = {}
+    for cours, prerequis in aretes:
+        successeurs.setdefault(cours, []).append(prerequis)
+
+    BLANC, GRIS, NOIR = 0, 1, 2
+    couleur = {}
+    for depart in successeurs:
+        if couleur.get(depart, BLANC) != BLANC:
+            continue
+        pile = [(depart, iter(successeurs.get(depart, ())))]
+        chemin = [depart]
+        couleur[depart] = GRIS
+        while pile:
+            noeud, suivants = pile[-1]
+            for suivant in suivants:
+                etat = couleur.get(suivant, BLANC)
+                if etat == GRIS:
+                    cycle = chemin[chemin.index(suivant):] + [suivant]
+                    raise ValidationError(
+                        "Cycle de prérequis détecté.", code="cycle", params={"cycle": cycle}
+                    )
+                if etat == BLANC:
+                    couleur[suivant] = GRIS
+                    pile.append((suivant, iter(successeurs.get(suivant, ()))))
+                    chemin.append(suivant)
+                    break
+            else:
+                couleur[noeud] = NOIR
+                pile.pop()
+                chemin.pop()
+
+    fermeture = {}
+    for cours in successeurs:
+        vus = {cours}
+        niveau, distance = successeurs[cours], 1
+        while niveau:
+            suivant = []
+            for prerequis in niveau:
+                if prerequis in vus:
+                    continue
+                vus.add(prerequis)
+                fermeture[(cours, prerequis)] = distance
+                suivant.extend(successeurs.get(prerequis, ()))
+            niveau, distance = suivant, distance + 1
+    return fermeture
+
+
+def remplir_fermeture(apps, schema_editor):
+    Prerequis = apps.get_model('cours', 'Prerequis')
+    FermeturePrerequis = apps.get_model('cours', 'FermeturePrerequis')
+    fermeture = calculer_fermeture(Prerequis.objects.values_list('cours_id', 'cours_prerequis_id'))
+    FermeturePrerequis.objects.bulk_create(
+        [
+            FermeturePrerequis(cours_id=cours, prerequis_id=prerequis, distance=distance)
+            for (cours, prerequis), distance in fermeture.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cours', '0002_compteur_nb_inscrits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FermeturePrerequis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.PositiveSmallIntegerField(default=1, verbose_name='Distance')),
+                ('cours', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tous_prerequis', to='cours.cours', verbose_name='Cours')),
+                ('prerequis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cours.cours', verbose_name='Prérequis (direct ou indirect)')),
+            ],
+            options={
+                'verbose_name': 'Prérequis (fermeture)',
+                'verbose_name_plural': 'Prérequis (fermeture)',
+                'unique_together': {('cours', 'prerequis')},
+            },
+        ),
+        migrations.RunPython(remplir_fermeture, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 
 
@@ -101,6 +101,10 @@ class SectionCours(models.Model):
     capacite_max = models.IntegerField("Nombre maximum d'étudiants", default=30)
     est_ouverte  = models.BooleanField('Ouvert aux inscriptions',     default=True)
 
+    # Inscriptions actives (Inscription.STATUTS_ACTIFS), tenu à jour par
+    # applications/inscriptions/signals.py — manage.py recalculer_inscrits
+    nb_inscrits = models.PositiveIntegerField("Nombre d'inscrits", default=0, editable=False)
+
     cree_le    = models.DateTimeField('Date de création',     auto_now_add=True)
     modifie_le = models.DateTimeField('Date de modification', auto_now=True)
 
@@ -124,18 +128,30 @@ class SectionCours(models.Model):
             if self.heure_debut >= self.heure_fin:
                 raise ValidationError("L'heure de début doit être avant l'heure de fin.")
 
+    def save(self, *args, **kwargs):
+        # nb_inscrits n'est écrit que par des UPDATE ... F() : une instance
+        # chargée avant une inscription ne doit pas l'écraser.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.attname for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname != 'nb_inscrits'
+            ]
+        super().save(*args, **kwargs)
+
     # ── Méthodes métier ──────────────────────────────────────────────────────
     # Note : `inscriptions` est le related_name défini dans le modèle Inscription
     # (app inscriptions) — il ne peut pas être renommé ici.
 
     def nombre_inscrits(self):
         """Retourne le nombre d'étudiants actuellement inscrits (statuts actifs)"""
-        from applications.inscriptions.models import Inscription
-        return self.inscriptions.filter(statut__in=Inscription.STATUTS_ACTIFS).count()
+        return self.nb_inscrits
+
+    def places_disponibles(self):
+        return max(self.capacite_max - self.nb_inscrits, 0)
 
     def est_pleine(self):
         """Vérifie si la section a atteint sa capacité maximale"""
-        return self.nombre_inscrits() >= self.capacite_max
+        return self.nb_inscrits >= self.capacite_max
 
     def inscription_possible(self):
         """Vérifie si un étudiant peut encore s'inscrire"""
@@ -173,6 +189,133 @@ class Prerequis(models.Model):
         return f"{self.cours.code} nécessite {self.cours_prerequis.code}"
 
     def clean(self):
-        """Empêche un cours d'être son propre prérequis"""
-        if self.cours == self.cours_prerequis:
-            raise ValidationError("Un cours ne peut pas être son propre prérequis.")
\ No newline at end of file
+        """Empêche un cours d'être son propre prérequis, directement ou non"""
+        if self.cours_id is None or self.cours_prerequis_id is None:
+            return
+        if self.cours_id == self.cours_prerequis_id:
+            raise ValidationError("Un cours ne peut pas être son propre prérequis.")
+        # cours_prerequis exige déjà (même indirectement) cours : cycle
+        if FermeturePrerequis.objects.filter(
+            cours_id=self.cours_prerequis_id, prerequis_id=self.cours_id
+        ).exists():
+            raise ValidationError(
+                f"{self.cours_prerequis.code} exige déjà {self.cours.code} : "
+                f"ce prérequis créerait un cycle."
+            )
+
+    def save(self, *args, **kwargs):
+        # La fermeture est recalculée par signal : un cycle annule l'enregistrement
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+def calculer_fermeture(aretes):
+    """
+    Fermeture transitive du graphe des prérequis.
+
+    `aretes` : couples (id cours, id prérequis direct).
+    Retourne {(id cours, id prérequis): distance}, la distance étant le plus
+    petit nombre d'arêtes (1 = prérequis direct). Lève ValidationError si le
+    graphe contient un cycle.
+    """
+    successeurs = {}
+    for cours, prerequis in aretes:
+        successeurs.setdefault(cours, []).append(prerequis)
+
+    # Détection de cycle : parcours en profondeur itératif à trois couleurs
+    BLANC, GRIS, NOIR = 0, 1, 2
+    couleur = {}
+    for depart in successeurs:
+        if couleur.get(depart, BLANC) != BLANC:
+            continue
+        pile = [(depart, iter(successeurs.get(depart, ())))]
+        chemin = [depart]
+        couleur[depart] = GRIS
+        while pile:
+            noeud, suivants = pile[-1]
+            for suivant in suivants:
+                etat = couleur.get(suivant, BLANC)
+                if etat == GRIS:
+                    cycle = chemin[chemin.index(suivant):] + [suivant]
+                    raise ValidationError(
+                        "Cycle de prérequis détecté.", code="cycle", params={"cycle": cycle}
+                    )
+                if etat == BLANC:
+                    couleur[suivant] = GRIS
+                    pile.append((suivant, iter(successeurs.get(suivant, ()))))
+                    chemin.append(suivant)
+                    break
+            else:
+                couleur[noeud] = NOIR
+                pile.pop()
+                chemin.pop()
+
+    # Parcours en largeur depuis chaque cours : plus courte distance
+    fermeture = {}
+    for cours in successeurs:
+        vus = {cours}
+        niveau, distance = successeurs[cours], 1
+        while niveau:
+            suivant = []
+            for prerequis in niveau:
+                if prerequis in vus:
+                    continue
+                vus.add(prerequis)
+                fermeture[(cours, prerequis)] = distance
+                suivant.extend(successeurs.get(prerequis, ()))
+            niveau, distance = suivant, distance + 1
+    return fermeture
+
+
+class FermeturePrerequis(models.Model):
+    """
+    Tous les prérequis d'un cours, directs et indirects (fermeture transitive
+    de Prerequis). Reconstruite à chaque modification de Prerequis (voir
+    applications/cours/signals.py) : la vérification à l'inscription se fait
+    en une requête, sans parcourir le graphe.
+    """
+
+    cours = models.ForeignKey(
+        Cours,
+        on_delete=models.CASCADE,
+        related_name='tous_prerequis',
+        verbose_name='Cours',
+    )
+    prerequis = models.ForeignKey(
+        Cours,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Prérequis (direct ou indirect)',
+    )
+    distance = models.PositiveSmallIntegerField('Distance', default=1)
+
+    class Meta:
+        verbose_name        = 'Prérequis (fermeture)'
+        verbose_name_plural = 'Prérequis (fermeture)'
+        unique_together     = ['cours', 'prerequis']
+
+    def __str__(self):
+        return f"{self.cours_id} → {self.prerequis_id} ({self.distance})"
+
+    @classmethod
+    def reconstruire(cls):
+        """Recalcule toute la table depuis Prerequis (lève ValidationError si cycle)"""
+        aretes = Prerequis.objects.values_list('cours_id', 'cours_prerequis_id')
+        try:
+            fermeture = calculer_fermeture(aretes)
+        except ValidationError as e:
+            codes = dict(Cours.objects.filter(pk__in=e.params['cycle']).values_list('pk', 'code'))
+            raise ValidationError(
+                "Cycle de prérequis : " + " → ".join(codes[i] for i in e.params['cycle']),
+                code='cycle',
+            )
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [
+                    cls(cours_id=cours, prerequis_id=prerequis, distance=distance)
+                    for (cours, prerequis), distance in fermeture.items()
+                ],
+                batch_size=1000,
+            )
+        return len(fermeture)
\ No newline at end of file
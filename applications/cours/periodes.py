@@ -0,0 +1,53 @@
+"""
+Période (année, semestre) en cours et ses dates.
+
+Les sections ne portent que leur année et leur semestre : les dates d'un
+semestre viennent de SEMESTRES_DATES, {semestre: ((mois, jour) de début,
+(mois, jour) de fin)} dans l'année de la section. Par défaut les semestres
+se suivent sans trou : printemps de janvier à mai, été de juin à août,
+automne de septembre à décembre.
+
+PERIODE_COURANTE = (annee, semestre) fixe la période en cours (rentrée
+décalée, tests) ; sinon c'est celle qui contient la date du jour.
+"""
+
+import datetime
+
+from django.conf import settings
+
+SEMESTRES_DATES = {
+    "PRINTEMPS": ((1, 1), (5, 31)),
+    "ETE":       ((6, 1), (8, 31)),
+    "AUTOMNE":   ((9, 1), (12, 31)),
+}
+
+
+def _semestres_dates():
+    return getattr(settings, "SEMESTRES_DATES", SEMESTRES_DATES)
+
+
+def bornes_periode(annee, semestre):
+    """(premier jour, dernier jour) du semestre"""
+    (mois_debut, jour_debut), (mois_fin, jour_fin) = _semestres_dates()[semestre]
+    return datetime.date(annee, mois_debut, jour_debut), datetime.date(annee, mois_fin, jour_fin)
+
+
+def periode_courante(aujourd_hui=None):
+    """
+    (annee, semestre) en cours. Entre deux semestres (si SEMESTRES_DATES
+    laisse des trous), le prochain à commencer.
+    """
+    periode = getattr(settings, "PERIODE_COURANTE", None)
+    if periode:
+        return tuple(periode)
+    aujourd_hui = aujourd_hui or datetime.date.today()
+    a_venir = []
+    for annee in (aujourd_hui.year, aujourd_hui.year + 1):
+        for semestre in _semestres_dates():
+            debut, fin = bornes_periode(annee, semestre)
+            if debut <= aujourd_hui <= fin:
+                return annee, semestre
+            if debut > aujourd_hui:
+                a_venir.append((debut, annee, semestre))
+    _, annee, semestre = min(a_venir)
+    return annee, semestre
@@ -0,0 +1,237 @@
+"""
+Doubles réservations des salles et des professeurs.
+
+Une section occupe chaque semaine [heure_debut, heure_fin[ de son jour, pour
+sa période (année, semestre, session) ; un examen occupe
+[heure, heure + duree_minutes[ à sa date. Une ressource — salle ou
+professeur — est doublement réservée quand deux créneaux qui l'utilisent se
+chevauchent :
+  - deux sections de la même période, le même jour ;
+  - un examen et une section de la période de l'examen, le jour de la
+    semaine de sa date ;
+  - deux examens à la même date.
+Les salles sont comparées sans casse ni espaces superflus ; les examens sans
+heure et les créneaux sans salle (pour les salles) sont ignorés. Le
+professeur d'un examen est celui de sa section, et un examen peut se tenir
+pendant le cours de sa propre section.
+
+Les créneaux sont répartis par (ressource, jour), triés par début puis
+balayés une fois : O(n log n + k) pour k conflits, au lieu de comparer
+toutes les paires.
+"""
+
+import heapq
+from collections import defaultdict, namedtuple
+from copy import copy
+
+from django.forms.models import construct_instance
+
+from applications.portail.models import Examen
+
+from .models import SectionCours
+
+JOURS = [code for code, _ in SectionCours.CHOIX_JOUR]   # lundi = 0 … samedi = 5
+
+Creneau = namedtuple("Creneau", "objet debut fin")
+Conflit = namedtuple("Conflit", "nature premier second")
+
+
+def normaliser_salle(salle):
+    return " ".join((salle or "").split()).casefold()
+
+
+def _minutes(heure):
+    return heure.hour * 60 + heure.minute
+
+
+def _jour_examen(examen):
+    jour = examen.date.weekday()
+    return JOURS[jour] if jour < len(JOURS) else None
+
+
+def _periode(section):
+    return (section.annee, section.semestre, section.session)
+
+
+def _creneau(objet):
+    if isinstance(objet, Examen):
+        debut = _minutes(objet.heure)
+        return Creneau(objet, debut, debut + objet.duree_minutes)
+    return Creneau(objet, _minutes(objet.heure_debut), _minutes(objet.heure_fin))
+
+
+def _ressources(objet, section):
+    salle = normaliser_salle(objet.salle)
+    if salle:
+        yield "salle", salle
+    if section.professeur_id:
+        yield "professeur", section.professeur_id
+
+
+def _groupes(sections, examens):
+    """{(portée, jour, nature, ressource): [Creneau]}"""
+    groupes = defaultdict(list)
+    for section in sections:
+        creneau = _creneau(section)
+        jour = ("semaine", _periode(section) + (section.jour_semaine,))
+        for ressource in _ressources(section, section):
+            groupes[jour + ressource].append(creneau)
+    for examen in examens:
+        if examen.heure is None:
+            continue
+        creneau = _creneau(examen)
+        section = examen.section_cours
+        jours = [("date", examen.date)]
+        jour_semaine = _jour_examen(examen)
+        if jour_semaine is not None:
+            jours.append(("semaine", _periode(section) + (jour_semaine,)))
+        for jour in jours:
+            for ressource in _ressources(examen, section):
+                groupes[jour + ressource].append(creneau)
+    return groupes
+
+
+def _balayer(creneaux):
+    """Paires de créneaux qui se chevauchent, par balayage des débuts"""
+    creneaux.sort(key=lambda c: (c.debut, c.fin))
+    actifs = []  # tas (fin, rang, créneau) des créneaux encore ouverts
+    for rang, creneau in enumerate(creneaux):
+        while actifs and actifs[0][0] <= creneau.debut:
+            heapq.heappop(actifs)
+        for _, _, ouvert in actifs:
+            yield ouvert, creneau
+        heapq.heappush(actifs, (creneau.fin, rang, creneau))
+
+
+def _compatibles(a, b):
+    """Paires d'un groupe hebdomadaire qui ne constituent pas un conflit"""
+    examens = [objet for objet in (a, b) if isinstance(objet, Examen)]
+    if len(examens) == 2:
+        # Deux examens du même jour de la semaine : déjà comparés par date
+        return True
+    # Examen passé pendant le cours de sa propre section
+    return len(examens) == 1 and examens[0].section_cours_id == (b if examens[0] is a else a).id
+
+
+def detecter_doubles_reservations(sections=(), examens=()):
+    """
+    Retourne la liste des Conflit(nature, premier, second) — nature « salle »
+    ou « professeur », premier/second étant des SectionCours ou des Examen.
+    """
+    conflits = []
+    for (portee, _, nature, _), creneaux in _groupes(sections, examens).items():
+        for premier, second in _balayer(creneaux):
+            if portee == "semaine" and _compatibles(premier.objet, second.objet):
+                continue
+            conflits.append(Conflit(nature, premier.objet, second.objet))
+    return conflits
+
+
+# ── Chargement depuis la base ────────────────────────────────────────────
+
+def _sections():
+    return SectionCours.objects.select_related("cours", "professeur__utilisateur")
+
+
+def _examens():
+    return (
+        Examen.objects
+        .filter(heure__isnull=False)
+        .select_related("section_cours__cours", "section_cours__professeur__utilisateur")
+    )
+
+
+def verifier_horaires(annee=None, semestre=None):
+    """Doubles réservations de toutes les sections et examens d'une période (2 requêtes)"""
+    sections, examens = _sections(), _examens()
+    if annee is not None:
+        sections = sections.filter(annee=annee)
+        examens = examens.filter(section_cours__annee=annee)
+    if semestre:
+        sections = sections.filter(semestre=semestre)
+        examens = examens.filter(section_cours__semestre=semestre)
+    return detecter_doubles_reservations(sections, examens)
+
+
+def _conflits_de(objet, sections, examens):
+    return [
+        conflit for conflit in detecter_doubles_reservations(sections, examens)
+        if objet is conflit.premier or objet is conflit.second
+    ]
+
+
+def conflits_section(section):
+    """
+    Doubles réservations qu'entraînerait `section` (enregistrée ou non),
+    face aux sections et examens déjà en base pour son jour et sa période.
+    """
+    if not all((section.jour_semaine, section.heure_debut, section.heure_fin,
+                section.annee, section.semestre, section.session)):
+        return []
+    if section.heure_debut >= section.heure_fin:
+        return []
+    periode = {"annee": section.annee, "semestre": section.semestre, "session": section.session}
+    autres = _sections().filter(jour_semaine=section.jour_semaine, **periode).exclude(pk=section.pk)
+    # __week_day : 1 = dimanche, 2 = lundi, …
+    examens = _examens().filter(
+        date__week_day=JOURS.index(section.jour_semaine) + 2,
+        **{f"section_cours__{champ}": valeur for champ, valeur in periode.items()},
+    )
+    return _conflits_de(section, [section, *autres], examens)
+
+
+def conflits_examen(examen):
+    """
+    Doubles réservations qu'entraînerait `examen` (enregistré ou non) : autres
+    examens à sa date, sections de sa période le même jour de la semaine.
+    """
+    if examen.heure is None or examen.date is None or examen.section_cours_id is None:
+        return []
+    section = examen.section_cours
+    jour = _jour_examen(examen)
+    sections = []
+    if jour is not None:
+        sections = _sections().filter(
+            jour_semaine=jour, annee=section.annee, semestre=section.semestre, session=section.session,
+        )
+    autres = _examens().filter(date=examen.date).exclude(pk=examen.pk)
+    return _conflits_de(examen, sections, [examen, *autres])
+
+
+def verifier_formulaire(formulaire, conflits):
+    """
+    Ajoute aux erreurs du ModelForm `formulaire` les doubles réservations
+    (`conflits_section` ou `conflits_examen`) qu'entraînerait l'objet saisi.
+    Le contrôle porte sur une copie : formulaire.instance reste intacte
+    jusqu'à _post_clean.
+    """
+    candidat = construct_instance(formulaire, copy(formulaire.instance))
+    for conflit in conflits(candidat):
+        formulaire.add_error(None, decrire_conflit(conflit))
+
+
+# ── Affichage ────────────────────────────────────────────────────────────
+
+def decrire_creneau(objet):
+    """« PSY101-01 (Lundi 09:00-11:00) » ou « Examen final PSY101-01 le 12/01/2026 09:00-11:00 »"""
+    if isinstance(objet, Examen):
+        section = objet.section_cours
+        debut, fin = _creneau(objet)[1:]
+        return (
+            f"{objet.get_type_examen_display()} {section.cours.code}-{section.numero_section} "
+            f"le {objet.date:%d/%m/%Y} {debut // 60:02d}:{debut % 60:02d}-{fin // 60:02d}:{fin % 60:02d}"
+        )
+    return (
+        f"{objet.cours.code}-{objet.numero_section} "
+        f"({objet.get_jour_semaine_display()} {objet.heure_debut:%H:%M}-{objet.heure_fin:%H:%M})"
+    )
+
+
+def decrire_conflit(conflit):
+    premier = conflit.premier
+    if conflit.nature == "salle":
+        ressource = f"Salle {premier.salle.strip()}"
+    else:
+        section = premier.section_cours if isinstance(premier, Examen) else premier
+        ressource = f"Professeur {section.professeur}"
+    return f"{ressource} : {decrire_creneau(premier)} et {decrire_creneau(conflit.second)} se chevauchent."
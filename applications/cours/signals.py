@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from applications.inscriptions.models import Inscription
+from applications.portail.models import Examen
+
+from .emploi_du_temps import invalider_emploi_du_temps
+from .models import FermeturePrerequis, Prerequis, SectionCours
+
+
+@receiver(post_save, sender=Prerequis)
+@receiver(post_delete, sender=Prerequis)
+def reconstruire_fermeture_prerequis(sender, instance, **kwargs):
+    """
+    Le graphe des prérequis est petit et rarement modifié : la fermeture est
+    recalculée entièrement. Un cycle lève ValidationError, ce qui annule
+    l'enregistrement si celui-ci a lieu dans une transaction (admin, vues).
+    """
+    FermeturePrerequis.reconstruire()
+
+
+# ── Emplois du temps en cache (voir emploi_du_temps.py) ─────────────────
+
+@receiver(post_save, sender=SectionCours)
+@receiver(post_delete, sender=SectionCours)
+@receiver(post_save, sender=Examen)
+@receiver(post_delete, sender=Examen)
+def invalider_emplois_du_temps(sender, instance, **kwargs):
+    invalider_emploi_du_temps()
+
+
+@receiver(post_save, sender=Inscription)
+@receiver(post_delete, sender=Inscription)
+def invalider_emploi_du_temps_etudiant(sender, instance, **kwargs):
+    # Sans requête supplémentaire : l'étudiant est presque toujours déjà chargé
+    if Inscription.etudiant.is_cached(instance):
+        invalider_emploi_du_temps(instance.etudiant.utilisateur_id)
+    else:
+        invalider_emploi_du_temps()
@@ -1,3 +1,450 @@
-from django.test import TestCase
+import csv
+import os
+import random
+import shutil
+import tempfile
+from datetime import date, time
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from applications.comptes.models import Professeur, Utilisateur
+from applications.departements.models import Departement
+from applications.inscriptions.models import Inscription
+from applications.portail.forms import ExamenForm
+from applications.portail.models import Examen
+from utilitaires.importation import CommandeImport
+from .emploi_du_temps import jeton_calendrier
+from .forms import FormulaireSection
+from .models import Cours, FermeturePrerequis, Prerequis, SectionCours, calculer_fermeture
+from .periodes import periode_courante
+from .planning import conflits_examen, detecter_doubles_reservations, verifier_horaires
+
+
+class FermeturePrerequisTest(TestCase):
+    """Tests de la fermeture transitive des prérequis"""
+
+    def setUp(self):
+        departement = Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        self.a, self.b, self.c, self.d = (
+            Cours.objects.create(code=code, nom=code, credits=3, departement=departement, niveau="NIVEAU1")
+            for code in ("PSY100", "PSY200", "PSY300", "PSY400")
+        )
+
+    def fermeture(self):
+        return set(FermeturePrerequis.objects.values_list("cours__code", "prerequis__code", "distance"))
+
+    def test_prerequis_indirects(self):
+        Prerequis.objects.create(cours=self.b, cours_prerequis=self.a)
+        Prerequis.objects.create(cours=self.c, cours_prerequis=self.b)
+        Prerequis.objects.create(cours=self.d, cours_prerequis=self.c)
+        Prerequis.objects.create(cours=self.d, cours_prerequis=self.a)
+
+        self.assertEqual(self.fermeture(), {
+            ("PSY200", "PSY100", 1),
+            ("PSY300", "PSY200", 1), ("PSY300", "PSY100", 2),
+            ("PSY400", "PSY300", 1), ("PSY400", "PSY200", 2), ("PSY400", "PSY100", 1),
+        })
+
+    def test_suppression_recalcule(self):
+        lien = Prerequis.objects.create(cours=self.b, cours_prerequis=self.a)
+        Prerequis.objects.create(cours=self.c, cours_prerequis=self.b)
+        lien.delete()
+        self.assertEqual(self.fermeture(), {("PSY300", "PSY200", 1)})
+
+    def test_cycle_refuse_par_clean(self):
+        Prerequis.objects.create(cours=self.b, cours_prerequis=self.a)
+        Prerequis.objects.create(cours=self.c, cours_prerequis=self.b)
+        with self.assertRaises(ValidationError):
+            Prerequis(cours=self.a, cours_prerequis=self.c).full_clean()
+
+    def test_cycle_annule_l_enregistrement(self):
+        Prerequis.objects.create(cours=self.b, cours_prerequis=self.a)
+        with self.assertRaisesMessage(ValidationError, "Cycle de prérequis"):
+            Prerequis.objects.create(cours=self.a, cours_prerequis=self.b)
+        self.assertEqual(Prerequis.objects.count(), 1)
+        self.assertEqual(self.fermeture(), {("PSY200", "PSY100", 1)})
+
+    def test_calcul_sur_graphe_en_losange(self):
+        # 4 → 2 → 1 et 4 → 3 → 1 : 1 n'apparaît qu'une fois, à distance 2
+        self.assertEqual(
+            calculer_fermeture([(4, 2), (4, 3), (2, 1), (3, 1)]),
+            {(4, 2): 1, (4, 3): 1, (4, 1): 2, (2, 1): 1, (3, 1): 1},
+        )
+
+
+class DoublesReservationsTest(TestCase):
+    """Tests du détecteur de doubles réservations (salles, professeurs)"""
+
+    def setUp(self):
+        self.departement = Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        self.prof_a, self.prof_b = (
+            Utilisateur.objects.create_user(
+                email=f"{nom}@example.com", password="motdepasse123",
+                first_name=nom, last_name="Prof", role="PROFESSEUR",
+            ).profil_professeur
+            for nom in ("alice", "bruno")
+        )
+        self.numero = 0
+
+    def creer_section(self, code, debut, fin, professeur=None, salle="", jour="LUNDI", enregistrer=True):
+        self.numero += 1
+        cours, _ = Cours.objects.get_or_create(
+            code=code, defaults={"nom": code, "credits": 3, "departement": self.departement, "niveau": "NIVEAU1"},
+        )
+        section = SectionCours(
+            cours=cours, numero_section=f"{self.numero:02d}", professeur=professeur,
+            jour_semaine=jour, heure_debut=time(debut), heure_fin=time(fin), salle=salle,
+            session="SESSION_1", semestre="AUTOMNE", annee=2026,
+        )
+        if enregistrer:
+            section.save()
+        return section
+
+    def test_salle_et_professeur(self):
+        a = self.creer_section("PSY101", 8, 10, self.prof_a, salle="A-101")
+        b = self.creer_section("PSY102", 9, 11, self.prof_b, salle=" a-101 ")
+        c = self.creer_section("PSY103", 10, 12, self.prof_a, salle="B-2")
+        self.creer_section("PSY104", 9, 11, self.prof_a, jour="MARDI")
+
+        conflits = verifier_horaires(2026, "AUTOMNE")
+        self.assertEqual(
+            {(c.nature, c.premier.id, c.second.id) for c in conflits},
+            {("salle", a.id, b.id)},  # a et c se touchent sans se chevaucher
+        )
+        c.heure_debut = time(9, 30)
+        c.save()
+        self.assertEqual(
+            {(c.nature, c.premier.id, c.second.id) for c in verifier_horaires()},
+            {("salle", a.id, b.id), ("professeur", a.id, c.id)},
+        )
+
+    def test_balayage_equivalent_aux_paires(self):
+        aleatoire = random.Random(38)
+        sections = []
+        for i in range(60):
+            debut = aleatoire.randrange(7, 18)
+            section = self.creer_section(
+                "PSY101", debut, debut + aleatoire.randrange(1, 4),
+                professeur=aleatoire.choice([self.prof_a, self.prof_b, None]),
+                salle=aleatoire.choice(["A", "B", "C", ""]),
+                jour=aleatoire.choice(["LUNDI", "MARDI"]), enregistrer=False,
+            )
+            section.id = i
+            sections.append(section)
+
+        attendu = set()
+        for i, x in enumerate(sections):
+            for y in sections[i + 1:]:
+                if not x.conflit_horaire(y.jour_semaine, y.heure_debut, y.heure_fin):
+                    continue
+                if x.salle and x.salle == y.salle:
+                    attendu.add(("salle", frozenset((x.id, y.id))))
+                if x.professeur and x.professeur == y.professeur:
+                    attendu.add(("professeur", frozenset((x.id, y.id))))
+
+        self.assertEqual(
+            {(c.nature, frozenset((c.premier.id, c.second.id))) for c in detecter_doubles_reservations(sections)},
+            attendu,
+        )
+
+    def test_examens(self):
+        section = self.creer_section("PSY101", 8, 10, self.prof_a, salle="A-101")
+        autre = self.creer_section("PSY102", 14, 16, self.prof_b)
+        lundi = date(2026, 10, 19)
+        # Occupe la salle A-101 un lundi pendant le cours de PSY101
+        examen = Examen.objects.create(section_cours=autre, date=lundi, heure=time(9), salle="A-101")
+        # Pendant le cours de sa propre section : autorisé
+        Examen.objects.create(section_cours=autre, date=date(2026, 10, 26), heure=time(14), salle="C")
+        # Professeur de PSY101 retenu par l'examen de PSY101 un autre lundi… pendant PSY103
+        self.creer_section("PSY103", 15, 17, self.prof_a)
+        Examen.objects.create(section_cours=section, date=date(2026, 11, 2), heure=time(15))
+
+        conflits = verifier_horaires(2026)
+        self.assertEqual(
+            {(c.nature, type(c.premier).__name__, type(c.second).__name__) for c in conflits},
+            {("salle", "SectionCours", "Examen"), ("professeur", "SectionCours", "Examen")},
+        )
+
+        candidat = Examen(section_cours=autre, date=lundi, heure=time(10), duree_minutes=60, salle="Z")
+        self.assertEqual([(c.nature, c.premier) for c in conflits_examen(candidat)], [("professeur", examen)])
+        candidat.heure = time(11)
+        self.assertEqual(conflits_examen(candidat), [])
+
+    def test_formulaires(self):
+        self.creer_section("PSY101", 8, 10, self.prof_a, salle="A-101")
+        donnees = {
+            "cours": Cours.objects.get(code="PSY101").id, "numero_section": "99",
+            "professeur": self.prof_b.id, "jour_semaine": "LUNDI",
+            "heure_debut": "09:00", "heure_fin": "11:00", "salle": "A-101",
+            "session": "SESSION_1", "semestre": "AUTOMNE", "annee": 2026,
+            "capacite_max": 30, "est_ouverte": True,
+        }
+        formulaire = FormulaireSection(donnees)
+        self.assertFalse(formulaire.is_valid())
+        self.assertIn("Salle A-101", formulaire.non_field_errors()[0])
+        self.assertTrue(FormulaireSection(dict(donnees, salle="B-2")).is_valid())
+
+        autre = self.creer_section("PSY102", 14, 16, self.prof_b)
+        formulaire = ExamenForm({
+            "section_cours": autre.id, "type_examen": "final", "date": "2026-10-19",
+            "heure": "09:30", "salle": "B-2", "duree_minutes": 60,
+        })
+        self.assertTrue(formulaire.is_valid(), formulaire.errors)
+        formulaire = ExamenForm({
+            "section_cours": autre.id, "type_examen": "final", "date": "2026-10-19",
+            "heure": "09:30", "salle": "a-101", "duree_minutes": 60,
+        })
+        self.assertFalse(formulaire.is_valid())
+
+    def test_import_annule_en_cas_de_conflit(self):
+        self.creer_section("PSY102", 8, 10, self.prof_a)
+        Cours.objects.create(code="PSY110", nom="PSY110", credits=3, departement=self.departement, niveau="NIVEAU1")
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, "emploi_du_temps_psychologie_niveau1.csv")
+            with open(chemin, "w", encoding="utf-8") as fichier:
+                fichier.write(
+                    "jour,heure_debut,heure_fin,code_cours,cours,prenom_prof,nom_prof,departement,niveau,session\n"
+                    "LUNDI,09:00,11:00,PSY110,X,alice,Prof,PSY,1,session1\n"
+                )
+            arguments = [chemin, "--annee", "2026", "--semestre", "AUTOMNE"]
+            with self.assertRaisesMessage(CommandError, "1 double(s) réservation(s)"):
+                call_command("import_emplois_du_temps", *arguments, stdout=StringIO())
+            self.assertFalse(SectionCours.objects.filter(cours__code="PSY110").exists())
+
+            call_command("import_emplois_du_temps", *arguments, "--autoriser-conflits", stdout=StringIO())
+            self.assertTrue(SectionCours.objects.filter(cours__code="PSY110").exists())
+        with self.assertRaises(CommandError):
+            call_command("verifier_horaires", stdout=StringIO())
+
+
+class ImportEmploisDuTempsTest(TestCase):
+    """Tests de import_emplois_du_temps (index en mémoire, écritures groupées)"""
+
+    ENTETE = "jour,heure_debut,heure_fin,code_cours,cours,prenom_prof,nom_prof,departement,niveau,session\n"
+
+    def setUp(self):
+        departement = Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        for numero in range(1, 10):
+            Cours.objects.create(
+                code=f"PSY10{numero}", nom="X", credits=3, departement=departement, niveau="NIVEAU1",
+            )
+        Utilisateur.objects.create_user(
+            email="alice.prof@ueh.edu.ht", password="x", first_name="Alice", last_name="Autre", role="ADMIN",
+        )
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier)
+
+    def ecrire(self, nom, lignes):
+        with open(os.path.join(self.dossier, nom), "w", encoding="utf-8") as fichier:
+            fichier.write(self.ENTETE + "".join(lignes))
+
+    def importer(self, *options):
+        sortie = StringIO()
+        call_command(
+            "import_emplois_du_temps", self.dossier, "--annee", "2026", "--semestre", "AUTOMNE",
+            *options, stdout=sortie,
+        )
+        return sortie.getvalue()
+
+    def lignes(self, nombre, heure_fin="10:00"):
+        return [
+            f"{jour},08:00,{heure_fin},PSY10{numero},X,Alice,Prof,PSY,1,session1\n"
+            for numero, jour in zip(range(1, nombre + 1), ["LUNDI", "MARDI", "MERCREDI"] * 3)
+        ]
+
+    def test_import_puis_mise_a_jour(self):
+        self.ecrire("emploi_du_temps_psychologie_niveau1.csv", self.lignes(3) + [
+            "DIMANCHE,08:00,10:00,PSY101,X,Alice,Prof,PSY,1,session1\n",
+            "MARDI,08:00,10:00,INCONNU,X,Alice,Prof,PSY,1,session1\n",
+        ])
+        self.ecrire("emploi_du_temps_nimporte_quoi.csv", [])
+        sortie = self.importer()
+        self.assertIn("3 section(s) créée(s)", sortie)
+        self.assertIn("1 cours introuvable", sortie)
+        self.assertIn("lignes/s", sortie)
+
+        professeur = Professeur.objects.get(utilisateur__last_name="Prof")
+        self.assertEqual(professeur.utilisateur.email, "alice.prof2@ueh.edu.ht")
+        self.assertEqual(professeur.utilisateur.email_normalise, "alice.prof2@ueh.edu.ht")
+        self.assertEqual(professeur.departement.code, "PSY")
+        self.assertTrue(professeur.utilisateur.check_password("motdepasse123"))
+        self.assertEqual(
+            set(SectionCours.objects.values_list("numero_section", "professeur", "session")),
+            {("LUN0800", professeur.id, "SESSION_1"), ("MAR0800", professeur.id, "SESSION_1"),
+             ("MER0800", professeur.id, "SESSION_1")},
+        )
+
+        self.ecrire("emploi_du_temps_psychologie_niveau1.csv", self.lignes(3, heure_fin="11:00"))
+        sortie = self.importer()
+        self.assertIn("0 section(s) créée(s), 3 mise(s) à jour", sortie)
+        self.assertEqual(SectionCours.objects.filter(heure_fin=time(11)).count(), 3)
+        self.assertEqual(Professeur.objects.count(), 1)
+
+    def test_requetes_independantes_du_nombre_de_lignes(self):
+        requetes = []
+        for nombre in (2, 9):
+            self.ecrire("emploi_du_temps_psychologie_niveau1.csv", self.lignes(nombre))
+            with CaptureQueriesContext(connection) as contexte:
+                self.importer("--dry-run")
+            requetes.append(len(contexte))
+        self.assertEqual(requetes[0], requetes[1])
+        self.assertFalse(SectionCours.objects.exists())
+
+    def test_plusieurs_fichiers_en_parallele(self):
+        Cours.objects.create(
+            code="PSY201", nom="X", credits=3, departement=Departement.objects.get(code="PSY"), niveau="NIVEAU2",
+        )
+        self.ecrire("emploi_du_temps_psychologie_niveau1.csv", self.lignes(9))
+        self.ecrire("emploi_du_temps_psychologie_niveau2.csv", [
+            "JEUDI,08:00,10:00,PSY201,X,alice,PROF,PSY,2,session1\n",
+            "JEUDI,10:00,12:00,PSY101,X,Alice,Prof,PSY,2,session1\n",
+        ])
+        sortie = self.importer("--fils", "2", "--taille-lot", "2", "--autoriser-conflits")
+        self.assertLess(sortie.index("niveau1.csv"), sortie.index("niveau2.csv"))
+        self.assertIn("10 section(s) créée(s), 0 mise(s) à jour, 1 ignorée(s)", sortie)
+        self.assertIn("1 incohérence département/niveau", sortie)
+        self.assertEqual(Professeur.objects.count(), 1)
+
+
+class ImportCoursTest(TestCase):
+    """Tests de import_cours et du rapport CSV des lignes rejetées"""
+
+    def test_import_et_rapport_csv(self):
+        Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        Cours.objects.create(code="PSY101", nom="Ancien nom", credits=2, niveau="NIVEAU1")
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, "cursus.csv")
+            rapport = os.path.join(dossier, "erreurs.csv")
+            with open(chemin, "w", encoding="utf-8") as fichier:
+                fichier.write(
+                    "departement,niveau,code,cours,credits,optionnel\n"
+                    "Psychologie,Niveau I,PSY101,Introduction,3,non\n"
+                    "Psychologie,Niveau I,PSY102,Méthodes,x,oui\n"
+                    "Préparatoire,Préparatoire,PREP01,Français,2,non\n"
+                    "Géographie,Niveau I,GEO101,Cartes,3,non\n"
+                )
+            sortie = StringIO()
+            call_command("import_cours", chemin, "--rapport", rapport, stdout=sortie)
+            with open(rapport, encoding="utf-8") as fichier:
+                rejets = list(csv.DictReader(fichier))
+
+        self.assertIn("2 cours créé(s), 1 mis à jour, 1 ignoré(s)", sortie.getvalue())
+        self.assertEqual(
+            [(r["ligne"], r["message"]) for r in rejets], [("5", "département inconnu « Géographie »")],
+        )
+        psy101 = Cours.objects.get(code="PSY101")
+        self.assertEqual((psy101.nom, psy101.credits, psy101.departement.code), ("Introduction", 3, "PSY"))
+        psy102 = Cours.objects.get(code="PSY102")
+        self.assertEqual((psy102.credits, psy102.description), (0, "Cours optionnel."))
+        self.assertIsNone(Cours.objects.get(code="PREP01").departement)
+
+    def test_commande_sans_ecrire_lot_refusee(self):
+        with self.assertRaisesMessage(TypeError, "Incomplete doit définir ecrire_lot()"):
+            class Incomplete(CommandeImport):
+                pass
+
+
+@override_settings(PERIODE_COURANTE=(2026, "AUTOMNE"))
+class EmploiDuTempsTest(TestCase):
+    """Tests de l'emploi du temps (HTML et flux iCalendar)"""
+
+    def setUp(self):
+        cache.clear()
+        departement = Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        self.professeur = Utilisateur.objects.create_user(
+            email="prof@example.com", password="motdepasse123", first_name="Paul",
+            last_name="Prof", role="PROFESSEUR", doit_changer_mot_de_passe=False,
+        )
+        self.etudiant = Utilisateur.objects.create_user(
+            email="etu@example.com", password="motdepasse123", first_name="Emma",
+            last_name="Etu", role="ETUDIANT", doit_changer_mot_de_passe=False,
+        )
+        cours = Cours.objects.create(
+            code="PSY101", nom="Introduction, bases; méthodes", credits=3,
+            departement=departement, niveau="NIVEAU1",
+        )
+        self.section = SectionCours.objects.create(
+            cours=cours, numero_section="01", professeur=self.professeur.profil_professeur,
+            jour_semaine="MARDI", heure_debut=time(9), heure_fin=time(11), salle="A-101",
+            session="SESSION_1", semestre="AUTOMNE", annee=2026,
+        )
+        Inscription.objects.create(etudiant=self.etudiant.profil_etudiant, section_cours=self.section)
+        self.url_ics = reverse("cours:emploi_du_temps_ics", args=[jeton_calendrier(self.etudiant)])
+
+    def test_page_html(self):
+        for utilisateur in (self.etudiant, self.professeur):
+            with self.subTest(role=utilisateur.role):
+                self.client.force_login(utilisateur)
+                reponse = self.client.get(reverse("cours:emploi_du_temps"))
+                self.assertContains(reponse, "PSY101")
+                self.assertContains(reponse, "09:00 - 11:00")
+                self.assertContains(reponse, "webcal://")
+
+    def test_flux_ics(self):
+        reponse = Client().get(self.url_ics)
+        self.assertEqual(reponse["Content-Type"], "text/calendar; charset=utf-8")
+        contenu = reponse.content.decode()
+        # Chaque mardi du semestre d'automne, du 1er septembre au 31 décembre
+        self.assertIn("DTSTART:20260901T090000\r\n", contenu)
+        self.assertIn("RRULE:FREQ=WEEKLY;BYDAY=TU;UNTIL=20261231T235900\r\n", contenu)
+        self.assertIn("SUMMARY:PSY101 — Introduction\\, bases\\; méthodes\r\n", contenu)
+        self.assertIn("LOCATION:A-101", contenu)
+        self.assertTrue(all(len(ligne.encode()) <= 75 for ligne in contenu.split("\r\n")))
+
+    def test_304_sans_requete(self):
+        etag = Client().get(self.url_ics)["ETag"]
+        with self.assertNumQueries(0):
+            reponse = Client().get(self.url_ics, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reponse.status_code, 304)
+
+        # Un nouvel examen invalide le cache : nouvelle empreinte
+        Examen.objects.create(section_cours=self.section, date=date(2026, 12, 8), heure=time(8))
+        reponse = Client().get(self.url_ics, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse["ETag"], etag)
+        self.assertIn("DURATION:PT120M", reponse.content.decode())
+
+    def test_abandon_retire_le_cours(self):
+        Client().get(self.url_ics)
+        inscription = Inscription.objects.select_related("etudiant").get()
+        inscription.statut = "ABANDONNE"
+        inscription.save()
+        self.assertNotIn("PSY101", Client().get(self.url_ics).content.decode())
+
+    def test_jeton_invalide(self):
+        self.assertEqual(Client().get(self.url_ics.replace(".ics", "x.ics")).status_code, 404)
+
+    def test_periodes_passees_exclues(self):
+        ancienne = SectionCours.objects.create(
+            cours=Cours.objects.create(
+                code="PSY100", nom="Ancien cours", credits=3,
+                departement=self.section.cours.departement, niveau="NIVEAU1",
+            ),
+            numero_section="01", professeur=self.professeur.profil_professeur,
+            jour_semaine="JEUDI", heure_debut=time(9), heure_fin=time(11),
+            session="SESSION_1", semestre="PRINTEMPS", annee=2026,
+        )
+        # Inscription jamais notée d'un semestre terminé
+        Inscription.objects.create(etudiant=self.etudiant.profil_etudiant, section_cours=ancienne)
+        self.assertNotIn("PSY100", Client().get(self.url_ics).content.decode())
+
+        self.client.force_login(self.professeur)
+        reponse = self.client.get(reverse("cours:emploi_du_temps"))
+        self.assertContains(reponse, "PSY101")
+        self.assertNotContains(reponse, "PSY100")
+
+    @override_settings(PERIODE_COURANTE=None)
+    def test_periode_courante(self):
+        self.assertEqual(periode_courante(date(2026, 10, 19)), (2026, "AUTOMNE"))
+        self.assertEqual(periode_courante(date(2027, 1, 1)), (2027, "PRINTEMPS"))
+        with override_settings(SEMESTRES_DATES={"AUTOMNE": ((9, 1), (12, 20)), "PRINTEMPS": ((1, 15), (5, 31))}):
+            # Entre deux semestres : le prochain
+            self.assertEqual(periode_courante(date(2026, 12, 28)), (2027, "PRINTEMPS"))
+            self.assertEqual(periode_courante(date(2026, 7, 1)), (2026, "AUTOMNE"))
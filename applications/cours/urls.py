@@ -22,4 +22,8 @@ urlpatterns = [
     path('<int:section_id>/export-csv/',    views.vue_export_section_csv,  name='export_section_csv'),
     # ── Mes cours ────────────────────────────────────────────────────────────
     path('mes-cours/', views.mes_cours, name='mes_cours'),
+
+    # ── Emploi du temps ──────────────────────────────────────────────────────
+    path('emploi-du-temps/',                views.emploi_du_temps,     name='emploi_du_temps'),
+    path('emploi-du-temps/<str:jeton>.ics', views.emploi_du_temps_ics, name='emploi_du_temps_ics'),
 ]
\ No newline at end of file
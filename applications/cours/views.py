@@ -1,12 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db.models import Q
 from django.conf import settings
 
 from applications.inscriptions.models import Inscription
 
+from .emploi_du_temps import JOURS, jeton_calendrier, obtenir_emploi_du_temps, utilisateur_du_jeton
 from .models import Cours, SectionCours
 from .forms import FormulaireCours, FormulaireSection
 from applications.comptes.views import est_administrateur
@@ -60,12 +65,6 @@ def detail_cours(request, id_cours):
     sections = (
         cours.sections
         .select_related("professeur__utilisateur")
-        .annotate(
-            nb_inscrits=Count(
-                "inscriptions",
-                filter=Q(inscriptions__statut__in=["INSCRIT", "COMPLETE", "ECHOUE"])
-            )
-        )
         .order_by("numero_section")
     )
 
@@ -143,11 +142,6 @@ def liste_sections(request):
     """Affiche la liste paginée des sections avec filtres"""
     sections = SectionCours.objects.select_related(
         "cours", "professeur__utilisateur"
-    ).annotate(
-        nb_inscrits=Count(
-            "inscriptions",
-            filter=Q(inscriptions__statut__in=Inscription.STATUTS_ACTIFS)  # ✅ INSCRIT + COMPLETE
-        )
     )
 
     session = request.GET.get("session")
@@ -195,11 +189,11 @@ def detail_section(request, id_section):
     inscriptions = section.inscriptions.filter(
     statut__in=Inscription.STATUTS_ACTIFS
 )
-    nb_inscrits = inscriptions.count()
+    nb_inscrits = section.nb_inscrits
     capacite_max = getattr(section, "capacite_max", 0) or 0
     taux_remplissage = int((nb_inscrits / capacite_max) * 100) if capacite_max else 0
-    places_disponibles = max(capacite_max - nb_inscrits, 0)
-    est_pleine = capacite_max > 0 and nb_inscrits >= capacite_max
+    places_disponibles = section.places_disponibles()
+    est_pleine = capacite_max > 0 and section.est_pleine()
 
     peut_voir_inscrits = request.user.est_administrateur() or (
         request.user.est_professeur()
@@ -353,12 +347,6 @@ def mes_cours(request):
     sections = (
         professeur.sections_cours
         .select_related("cours")
-        .annotate(
-            nb_inscrits=Count(
-                "inscriptions",
-                filter=Q(inscriptions__statut__in=["INSCRIT", "COMPLETE", "EN_COURS"])
-            )
-        )
         .order_by("-annee", "cours__code")
     )
 
@@ -367,4 +355,57 @@ def mes_cours(request):
         "est_professeur": True,
         "nombre_cours": sections.count(),
     }
-    return render(request, "cours/mes_cours.html", contexte)
\ No newline at end of file
+    return render(request, "cours/mes_cours.html", contexte)
+
+# ===========================================================================
+# EMPLOI DU TEMPS
+# ===========================================================================
+
+
+@login_required
+def emploi_du_temps(request):
+    """Emploi du temps hebdomadaire et examens (étudiant ou professeur)"""
+    if not (request.user.est_etudiant() or request.user.est_professeur()):
+        messages.warning(
+            request,
+            "L'emploi du temps n'est disponible que pour les étudiants et les professeurs.",
+        )
+        return redirect("accueil")
+
+    donnees = obtenir_emploi_du_temps(request.user.pk)
+    jours = [
+        (jour, libelle, [s for s in donnees["sections"] if s["jour"] == jour])
+        for jour, libelle in SectionCours.CHOIX_JOUR
+        if jour in JOURS
+    ]
+    lien_ics = request.build_absolute_uri(
+        reverse("cours:emploi_du_temps_ics", args=[jeton_calendrier(request.user)])
+    )
+
+    contexte = {
+        "jours": [j for j in jours if j[2]],
+        "examens": donnees["examens"],
+        "lien_ics": lien_ics,
+        "lien_webcal": "webcal://" + lien_ics.split("://", 1)[1],
+    }
+    return render(request, "cours/emploi_du_temps.html", contexte)
+
+
+@require_safe
+def emploi_du_temps_ics(request, jeton):
+    """
+    Flux iCalendar de l'emploi du temps, sans connexion (URL à jeton).
+    Répond 304 sans requête SQL tant que l'emploi du temps n'a pas changé.
+    """
+    id_utilisateur = utilisateur_du_jeton(jeton)
+    donnees = obtenir_emploi_du_temps(id_utilisateur) if id_utilisateur else None
+    if donnees is None:
+        raise Http404("Calendrier introuvable")
+
+    reponse = get_conditional_response(request, etag=donnees["etag"])
+    if reponse is None:
+        reponse = HttpResponse(donnees["ics"], content_type="text/calendar; charset=utf-8")
+        reponse["Content-Disposition"] = 'inline; filename="emploi_du_temps.ics"'
+    reponse["ETag"] = donnees["etag"]
+    patch_cache_control(reponse, private=True, no_cache=True)
+    return reponse
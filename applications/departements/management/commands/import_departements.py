@@ -4,18 +4,34 @@ Commande d'import des départements de base.
 Emplacement attendu : departements/management/commands/import_departements.py
 (adapter l'app si la tienne porte un autre nom).
 
+Sans fichier, ce sont les quatre départements de base ci-dessous. Un CSV
+aux mêmes colonnes peut être fourni à la place :
+    code,slug,nom,couleur,emoji,slogan,ordre
+
 Usage :
     python manage.py import_departements
+    python manage.py import_departements departements.csv --rapport erreurs.csv
 """
 
-from django.core.management.base import BaseCommand
-
 from applications.departements.models import Departement
+from utilitaires.importation import Colonne, CommandeImport, Source, upsert
 
 
-class Command(BaseCommand):
+class Command(CommandeImport):
     help = "Crée ou met à jour les départements de base (PSY, COMM, SOCIO, TS)."
 
+    COLONNES = {
+        "code":    Colonne(obligatoire=True),
+        "slug":    Colonne(obligatoire=True),
+        "nom":     Colonne(obligatoire=True),
+        "couleur": Colonne(defaut="primary"),
+        "emoji":   Colonne(),
+        "slogan":  Colonne(),
+        "ordre":   Colonne(defaut=0, convertir=int),
+    }
+
+    RESUME = "{creees} département(s) créé(s), {mises_a_jour} mis à jour, {ignorees} ignoré(s)"
+
     # Ces valeurs sont des valeurs par défaut raisonnables.
     # Tu pourras toujours les ajuster ensuite via l'admin Django
     # (description, image_hero_url, conditions_admission, etc.)
@@ -58,31 +74,22 @@ class Command(BaseCommand):
         },
     ]
 
-    def handle(self, *args, **options):
-        crees = 0
-        maj = 0
+    def ajouter_arguments(self, parser):
+        parser.add_argument(
+            "csv_path", nargs="?",
+            help="Fichier CSV des départements (défaut : les départements de base).",
+        )
+
+    def sources(self, options):
+        if options["csv_path"] is None:
+            return [Source("départements de base", lignes=self.DEPARTEMENTS)]
+        return super().sources(options)
 
-        for data in self.DEPARTEMENTS:
-            departement, created = Departement.objects.update_or_create(
-                code=data["code"],
-                defaults={
-                    "slug": data["slug"],
-                    "nom": data["nom"],
-                    "couleur": data["couleur"],
-                    "emoji": data["emoji"],
-                    "slogan": data["slogan"],
-                    "ordre": data["ordre"],
-                },
-            )
-            if created:
-                crees += 1
-                self.stdout.write(self.style.SUCCESS(f"Créé : {departement}"))
-            else:
-                maj += 1
-                self.stdout.write(f"Mis à jour : {departement}")
+    def valider(self, valeurs, source, options):
+        return Departement(**valeurs)
 
-        self.stdout.write(
-            self.style.SUCCESS(
-                f"\nTerminé. {crees} département(s) créé(s), {maj} mis à jour."
-            )
-        )
\ No newline at end of file
+    def ecrire_lot(self, lot, source, options):
+        return upsert(
+            Departement, lot, "code",
+            ["slug", "nom", "couleur", "emoji", "slogan", "ordre"], options["taille_lot"],
+        )
@@ -1,3 +1,21 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Departement
+
+
+class ImportDepartementsTest(TestCase):
+    """Tests de import_departements"""
+
+    def test_departements_de_base_idempotent(self):
+        sortie = StringIO()
+        call_command("import_departements", stdout=sortie)
+        self.assertIn("4 département(s) créé(s)", sortie.getvalue())
+
+        Departement.objects.filter(code="PSY").update(nom="Psycho")
+        sortie = StringIO()
+        call_command("import_departements", stdout=sortie)
+        self.assertIn("0 département(s) créé(s), 4 mis à jour", sortie.getvalue())
+        self.assertEqual(Departement.objects.get(code="PSY").nom, "Psychologie")
@@ -1,6 +1,10 @@
+from collections import Counter
+
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
-from .models import Inscription, HistoriqueInscription
+from .models import DemandeAttente, Inscription, HistoriqueInscription
+from .services import abandonner, ajuster_nb_inscrits, quitter_liste_attente
 
 
 @admin.register(Inscription)
@@ -67,17 +71,27 @@ class InscriptionAdmin(admin.ModelAdmin):
     actions_rapides.short_description = 'Actions'
 
     def marquer_complete(self, request, queryset):
-        nb = queryset.update(statut='COMPLETE')
+        # update() ne déclenche pas les signaux : les inscriptions qui
+        # redeviennent actives sont ajoutées au compteur de leur section
+        with transaction.atomic():
+            reactivees = Counter(
+                queryset.exclude(statut__in=Inscription.STATUTS_ACTIFS)
+                .values_list('section_cours_id', flat=True)
+            )
+            nb = queryset.update(statut='COMPLETE')
+            for id_section, ecart in reactivees.items():
+                ajuster_nb_inscrits(id_section, ecart)
         self.message_user(request, f'{nb} inscription(s) marquée(s) comme complétée(s).')
     marquer_complete.short_description = "✓ Marquer comme complété"
 
     def marquer_abandonne(self, request, queryset):
-        from django.utils import timezone
-        for inscription in queryset:
-            inscription.statut      = 'ABANDONNE'
-            inscription.date_abandon = timezone.now()
-            inscription.save()
-        self.message_user(request, f'{queryset.count()} inscription(s) abandonnée(s).')
+        # Chaque place libérée est attribuée à la liste d'attente de la section
+        nb = 0
+        for inscription in queryset.exclude(statut='ABANDONNE'):
+            abandonner(inscription, modifie_par=request.user,
+                       raison=f'Abandon depuis l\'administration ({request.user.get_full_name()})')
+            nb += 1
+        self.message_user(request, f'{nb} inscription(s) abandonnée(s).')
     marquer_abandonne.short_description = "✗ Marquer comme abandonné"
 
 
@@ -94,4 +108,25 @@ class HistoriqueInscriptionAdmin(admin.ModelAdmin):
         return False
 
     def has_change_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(DemandeAttente)
+class DemandeAttenteAdmin(admin.ModelAdmin):
+    list_display  = ['section_cours', 'position', 'etudiant', 'date_demande']
+    list_filter   = ['section_cours__semestre', 'section_cours__annee']
+    search_fields = ['etudiant__numero_etudiant', 'section_cours__cours__code']
+    raw_id_fields = ['etudiant', 'section_cours']
+    ordering      = ['section_cours', 'position']
+    # Positions tenues par services.mettre_en_attente / retirer_de_la_liste
+    readonly_fields = ['position', 'date_demande']
+
+    def has_add_permission(self, request):
+        return False
+
+    def delete_model(self, request, obj):
+        quitter_liste_attente(obj)
+
+    def delete_queryset(self, request, queryset):
+        for demande in queryset:
+            quitter_liste_attente(demande)
@@ -5,3 +5,6 @@ class InscriptionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'applications.inscriptions'
     verbose_name = "Gestion des Inscriptions"
+
+    def ready(self):
+        import applications.inscriptions.signals  # noqa: F401
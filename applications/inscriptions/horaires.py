@@ -0,0 +1,102 @@
+"""
+Horaires hebdomadaires vus comme des intervalles.
+
+Une section occupe l'intervalle [heure_debut, heure_fin[ d'un jour, pour une
+période (année, semestre, session). Deux sections sont en conflit si elles
+partagent période et jour et que leurs intervalles se chevauchent — même
+règle que SectionCours.conflit_horaire.
+"""
+
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+
+def cle_periode(section):
+    return (section.annee, section.semestre, section.session)
+
+
+def cle_jour(section):
+    return cle_periode(section) + (section.jour_semaine,)
+
+
+class GrilleHoraire:
+    """
+    Emploi du temps d'un étudiant : pour chaque (période, jour), les sections
+    triées par heure de début, et pour chaque rang la section qui finit le
+    plus tard parmi celles commencées jusque-là. Un conflit se teste en
+    O(log n) : parmi les sections commencées avant la candidate, il suffit
+    de regarder celle qui finit le plus tard ; parmi les autres, la première.
+
+    Les sections d'une grille peuvent se chevaucher entre elles (inscriptions
+    antérieures à la vérification, inscriptions forcées par l'administration).
+    """
+
+    def __init__(self, sections=()):
+        self._debuts = defaultdict(list)
+        self._sections = defaultdict(list)
+        self._plus_tardives = defaultdict(list)
+        self._nb_par_periode = Counter()
+        for section in sections:
+            self.ajouter(section)
+
+    def conflit(self, section):
+        """Retourne une section de la grille qui chevauche `section`, ou None"""
+        cle = cle_jour(section)
+        debuts = self._debuts.get(cle)
+        if not debuts:
+            return None
+        occupees = self._sections[cle]
+        i = bisect_right(debuts, section.heure_debut)
+        # Sections commencées avant (ou en même temps) : la plus tardive finit-elle après ?
+        if i > 0 and self._plus_tardives[cle][i - 1].heure_fin > section.heure_debut:
+            return self._plus_tardives[cle][i - 1]
+        # Première section commencée après : commence-t-elle avant la fin ?
+        if i < len(debuts) and debuts[i] < section.heure_fin:
+            return occupees[i]
+        return None
+
+    def ajouter(self, section):
+        cle = cle_jour(section)
+        i = bisect_right(self._debuts[cle], section.heure_debut)
+        self._debuts[cle].insert(i, section.heure_debut)
+        self._sections[cle].insert(i, section)
+        # Maximum préfixe des heures de fin, recalculé à partir du rang inséré
+        plus_tardives = self._plus_tardives[cle]
+        plus_tardives.insert(i, section)
+        for j in range(i, len(plus_tardives)):
+            courante = self._sections[cle][j]
+            if j > 0 and plus_tardives[j - 1].heure_fin >= courante.heure_fin:
+                plus_tardives[j] = plus_tardives[j - 1]
+            else:
+                plus_tardives[j] = courante
+        self._nb_par_periode[cle_periode(section)] += 1
+
+    def nombre_cours(self, section):
+        """Nombre de sections de la grille sur la période de `section`"""
+        return self._nb_par_periode[cle_periode(section)]
+
+
+def detecter_conflits(occupees, candidates):
+    """
+    Retourne {id de section candidate: section occupée en conflit} pour les
+    candidates qui chevauchent l'horaire `occupees`.
+
+    La grille est construite une fois (O(n log n)), puis chaque candidate est
+    testée en O(log n) : O((n + m) log n) au lieu de comparer chaque paire.
+    """
+    grille = GrilleHoraire(occupees)
+    conflits = {}
+    for candidate in candidates:
+        occupee = grille.conflit(candidate)
+        if occupee is not None:
+            conflits[candidate.id] = occupee
+    return conflits
+
+
+def decrire(section):
+    """« PSY101-01 (Lundi 09:00-11:00) »"""
+    return (
+        f"{section.cours.code}-{section.numero_section} "
+        f"({section.get_jour_semaine_display()} "
+        f"{section.heure_debut:%H:%M}-{section.heure_fin:%H:%M})"
+    )
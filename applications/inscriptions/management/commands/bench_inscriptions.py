@@ -0,0 +1,270 @@
+"""
+Banc d'essai de la période d'inscription.
+
+Crée une cohorte fictive (étudiants, cours, sections de capacité limitée)
+dans la base configurée, puis lance --etudiants inscriptions simultanées
+à travers le client de test Django (vue_inscrire, middlewares compris),
+réparties sur --concurrence fils d'exécution. Chaque étudiant demande une
+section tirée au hasard : les places sont volontairement moins nombreuses
+que les demandes.
+
+Rapport : débit, latences (p50 / p90 / p99 / max), requêtes SQL par
+inscription, issues (inscrit, refusé, erreur) et dépassements de capacité
+ou compteurs nb_inscrits faux constatés en fin de course. Les données
+créées sont supprimées à la fin (sauf --conserver).
+
+À lancer sur une base locale (MySQL/PostgreSQL) : SQLite sérialise les
+écritures et rapporte des erreurs « database is locked » sous concurrence.
+
+Usage :
+    python manage.py bench_inscriptions
+    python manage.py bench_inscriptions --etudiants 500 --concurrence 32 --sections 10 --capacite 30
+    python manage.py bench_inscriptions --json > resultats.json
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time as heure
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from applications.comptes.models import Utilisateur
+from applications.cours.models import Cours, SectionCours
+from applications.departements.models import Departement
+from applications.inscriptions.models import Inscription
+
+PREFIXE = "bench-inscriptions"
+
+
+def _centile(valeurs_triees, p):
+    if not valeurs_triees:
+        return 0.0
+    rang = min(len(valeurs_triees) - 1, int(round(p / 100 * (len(valeurs_triees) - 1))))
+    return valeurs_triees[rang]
+
+
+class Command(BaseCommand):
+    help = "Mesure la tenue en charge de vue_inscrire sous inscriptions simultanées."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--etudiants", type=int, default=200, help="Étudiants simulés (défaut : 200)")
+        parser.add_argument("--concurrence", type=int, default=16, help="Requêtes simultanées (défaut : 16)")
+        parser.add_argument("--sections", type=int, default=5, help="Sections proposées (défaut : 5)")
+        parser.add_argument("--capacite", type=int, default=30, help="Capacité de chaque section (défaut : 30)")
+        parser.add_argument("--graine", type=int, default=2026, help="Graine du tirage des sections")
+        parser.add_argument(
+            "--departement", default="PSY",
+            help="Code du département utilisé pour la cohorte (défaut : PSY)",
+        )
+        parser.add_argument("--conserver", action="store_true", help="Ne pas supprimer les données créées")
+        parser.add_argument("--json", action="store_true", help="Affiche les résultats en JSON")
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Autorise l'exécution avec DEBUG = False (base de production ?)",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["force"]:
+            raise CommandError(
+                "DEBUG est désactivé : ce banc écrit dans la base configurée. "
+                "Utilisez une base locale ou ajoutez --force."
+            )
+        if Utilisateur.objects.filter(email__startswith=f"{PREFIXE}-").exists():
+            raise CommandError(
+                f"Des données « {PREFIXE} » existent déjà (exécution précédente avec --conserver ?)."
+            )
+
+        # Tout ou rien : une cohorte à moitié créée ne serait jamais nettoyée
+        try:
+            with transaction.atomic():
+                donnees = self._creer_cohorte(options)
+        except IntegrityError as erreur:
+            raise CommandError(f"Création de la cohorte impossible : {erreur}") from erreur
+        try:
+            # Les erreurs 500 sont comptées dans le rapport, pas journalisées une à une
+            journal = logging.getLogger("django.request")
+            niveau = journal.level
+            journal.setLevel(logging.CRITICAL)
+            try:
+                with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                    mesures, duree = self._lancer(donnees, options)
+            finally:
+                journal.setLevel(niveau)
+            resultats = self._resultats(donnees, mesures, duree, options)
+        finally:
+            if not options["conserver"]:
+                self._nettoyer(donnees)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultats, indent=2))
+        else:
+            self._afficher(resultats)
+
+    # ── Préparation ─────────────────────────────────────────────────────────
+
+    def _creer_cohorte(self, options):
+        departement, dept_cree = Departement.objects.get_or_create(
+            code=options["departement"],
+            defaults={"slug": f"{PREFIXE}-{options['departement'].lower()}", "nom": "Banc d'essai"},
+        )
+        professeur = Utilisateur.objects.create_user(
+            email=f"{PREFIXE}-prof@example.invalid", password=None,
+            first_name="Banc", last_name="Professeur", role="PROFESSEUR",
+        ).profil_professeur
+
+        sections = []
+        for i in range(options["sections"]):
+            cours = Cours.objects.create(
+                code=f"BENCH{i:03d}", nom=f"Cours du banc {i}", credits=3,
+                departement=departement, niveau="NIVEAU1",
+            )
+            sections.append(SectionCours.objects.create(
+                cours=cours, numero_section="01", professeur=professeur,
+                jour_semaine="LUNDI", heure_debut=heure(8 + i % 10, 0), heure_fin=heure(9 + i % 10, 0),
+                session="SESSION_1", semestre="AUTOMNE", annee=2099,
+                capacite_max=options["capacite"],
+            ))
+
+        clients = []
+        for i in range(options["etudiants"]):
+            utilisateur = Utilisateur.objects.create_user(
+                email=f"{PREFIXE}-{i:05d}@example.invalid", password=None,
+                first_name="Banc", last_name=f"Étudiant {i}", role="ETUDIANT",
+                doit_changer_mot_de_passe=False,
+            )
+            etudiant = utilisateur.profil_etudiant
+            etudiant.departement = departement
+            etudiant.niveau = "NIVEAU1"
+            etudiant.save()
+            client = Client(raise_request_exception=False)
+            client.force_login(utilisateur)
+            clients.append(client)
+
+        return {
+            "departement": departement if dept_cree else None,
+            "professeur": professeur.utilisateur,
+            "sections": sections,
+            "clients": clients,
+        }
+
+    def _nettoyer(self, donnees):
+        for client in donnees["clients"]:
+            client.logout()
+        Utilisateur.objects.filter(email__startswith=f"{PREFIXE}-").delete()
+        Cours.objects.filter(pk__in=[s.cours_id for s in donnees["sections"]]).delete()
+        if donnees["departement"] is not None:
+            donnees["departement"].delete()
+
+    # ── Course ──────────────────────────────────────────────────────────────
+
+    def _lancer(self, donnees, options):
+        alea = random.Random(options["graine"])
+        demandes = [
+            (client, alea.choice(donnees["sections"]).id) for client in donnees["clients"]
+        ]
+        # Première vague : autant de demandes que de fils, lâchées ensemble
+        premiere_vague = min(options["concurrence"], len(demandes))
+        depart = threading.Barrier(premiere_vague or 1)
+
+        def inscrire(rang_et_demande):
+            rang, (client, id_section) = rang_et_demande
+            try:
+                if rang < premiere_vague:
+                    depart.wait()
+                url = reverse("inscriptions:inscrire", kwargs={"id_section": id_section})
+                with CaptureQueriesContext(connection) as requetes:
+                    debut = time.perf_counter()
+                    reponse = client.get(url)
+                    latence = time.perf_counter() - debut
+                if reponse.status_code != 302:
+                    issue = "erreur"
+                elif reponse.url == reverse("inscriptions:mes_inscriptions"):
+                    issue = "inscrit"
+                else:
+                    issue = "refuse"
+                return issue, latence, len(requetes.captured_queries)
+            finally:
+                connection.close()
+
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrence"]) as pool:
+            mesures = list(pool.map(inscrire, enumerate(demandes)))
+        return mesures, time.perf_counter() - debut
+
+    # ── Rapport ─────────────────────────────────────────────────────────────
+
+    def _resultats(self, donnees, mesures, duree, options):
+        latences = sorted(m[1] * 1000 for m in mesures)
+        # Requêtes SQL hors erreurs (la page 500 fausserait la comparaison)
+        nb_requetes = [m[2] for m in mesures if m[0] != "erreur"]
+        issues = {issue: sum(1 for m in mesures if m[0] == issue) for issue in ("inscrit", "refuse", "erreur")}
+
+        sections = SectionCours.objects.filter(
+            pk__in=[s.id for s in donnees["sections"]]
+        ).annotate(
+            reel=Count("inscriptions", filter=Q(inscriptions__statut__in=Inscription.STATUTS_ACTIFS))
+        )
+        depassements = sections.filter(reel__gt=F("capacite_max")).count()
+        compteurs_faux = sections.exclude(nb_inscrits=F("reel")).count()
+        places = options["sections"] * options["capacite"]
+
+        return {
+            "etudiants": options["etudiants"],
+            "concurrence": options["concurrence"],
+            "places": places,
+            "moteur": connection.vendor,
+            "duree_s": round(duree, 3),
+            "debit_req_s": round(len(mesures) / duree, 1) if duree else 0,
+            "latence_ms": {
+                "p50": round(_centile(latences, 50), 1),
+                "p90": round(_centile(latences, 90), 1),
+                "p99": round(_centile(latences, 99), 1),
+                "max": round(latences[-1], 1) if latences else 0,
+            },
+            "requetes_sql": {
+                "moyenne": round(sum(nb_requetes) / len(nb_requetes), 1) if nb_requetes else 0,
+                "max": max(nb_requetes, default=0),
+            },
+            "issues": issues,
+            "inscrits_attendus": min(places, len(mesures)),
+            "depassements_capacite": depassements,
+            "compteurs_faux": compteurs_faux,
+        }
+
+    def _afficher(self, r):
+        self.stdout.write(
+            f"\n{r['etudiants']} inscriptions, {r['concurrence']} simultanées, "
+            f"{r['places']} places ({r['moteur']})\n"
+        )
+        self.stdout.write(f"  Durée            {r['duree_s']:.2f} s")
+        self.stdout.write(f"  Débit            {r['debit_req_s']} requêtes/s")
+        lat = r["latence_ms"]
+        self.stdout.write(
+            f"  Latence (ms)     p50 {lat['p50']}   p90 {lat['p90']}   p99 {lat['p99']}   max {lat['max']}"
+        )
+        sql = r["requetes_sql"]
+        self.stdout.write(
+            f"  Requêtes SQL     {sql['moyenne']} en moyenne, {sql['max']} au plus (hors erreurs)"
+        )
+        iss = r["issues"]
+        self.stdout.write(
+            f"  Issues           {iss['inscrit']} inscrit(s), {iss['refuse']} refus, {iss['erreur']} erreur(s)"
+        )
+
+        if r["depassements_capacite"] or r["compteurs_faux"]:
+            self.stdout.write(self.style.ERROR(
+                f"\n{r['depassements_capacite']} section(s) en surréservation, "
+                f"{r['compteurs_faux']} compteur(s) nb_inscrits faux."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("\nAucune surréservation, compteurs exacts."))
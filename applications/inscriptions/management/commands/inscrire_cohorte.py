@@ -0,0 +1,88 @@
+"""
+Commande d'inscription d'une cohorte (département + niveau) à son cursus.
+
+Chaque étudiant actif de la cohorte est inscrit à une section de chaque
+cours du niveau ouvert pour la période. Capacité, maximum de cours par
+session et conflits d'horaire sont vérifiés en mémoire ; les inscriptions
+sont créées par lots. Les cours qui n'ont pas pu être attribués sont listés
+dans le rapport final.
+
+Usage :
+    python manage.py inscrire_cohorte --departement PSY --niveau NIVEAU1 --annee 2026 --semestre AUTOMNE
+    python manage.py inscrire_cohorte --departement PSY --niveau NIVEAU1 --annee 2026 --semestre AUTOMNE --dry-run
+"""
+
+import time
+from itertools import groupby
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.comptes.models import Etudiant
+from applications.cours.models import SectionCours
+from applications.departements.models import Departement
+from applications.inscriptions.services import inscrire_cohorte
+
+
+class Command(BaseCommand):
+    help = "Inscrit toute une cohorte (département + niveau) aux sections de son cursus."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--departement", required=True, help="Code du département (ex. PSY)")
+        parser.add_argument(
+            "--niveau", required=True,
+            choices=[code for code, _ in Etudiant.CHOIX_ANNEE],
+            help="Niveau de la cohorte (NIVEAU1, NIVEAU2, …)",
+        )
+        parser.add_argument("--annee", type=int, required=True, help="Année académique (ex. 2026)")
+        parser.add_argument(
+            "--semestre", required=True,
+            choices=[code for code, _ in SectionCours.CHOIX_SEMESTRE],
+            help="Semestre (AUTOMNE, PRINTEMPS, ETE)",
+        )
+        parser.add_argument(
+            "--taille-lot", type=int, default=500,
+            help="Nombre de lignes insérées par requête (défaut : 500)",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Calcule et affiche le rapport sans rien enregistrer",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            departement = Departement.objects.get(code=options["departement"])
+        except Departement.DoesNotExist:
+            raise CommandError(f"Département introuvable : {options['departement']}")
+
+        dry_run = options["dry_run"]
+        debut = time.monotonic()
+        rapport = inscrire_cohorte(
+            departement, options["niveau"], options["annee"], options["semestre"],
+            appliquer=not dry_run, taille_lot=options["taille_lot"],
+        )
+        duree = time.monotonic() - debut
+
+        self.stdout.write(
+            f"Cohorte {departement.code} {options['niveau']} : {rapport['etudiants']} étudiant(s), "
+            f"{rapport['sections']} section(s) ouverte(s) en {options['semestre']} {options['annee']}."
+        )
+
+        if rapport["refus"]:
+            self.stdout.write(self.style.WARNING(f"\n{len(rapport['refus'])} cours non attribué(s) :"))
+            for etudiant, refus in groupby(rapport["refus"], key=lambda r: r[0]):
+                self.stdout.write(f"  {etudiant.numero_etudiant} — {etudiant.utilisateur.get_full_name()}")
+                for _, cours, motif in refus:
+                    self.stdout.write(f"      {cours.code} : {motif}")
+            self.stdout.write("")
+
+        if rapport["deja_inscrits"]:
+            self.stdout.write(f"{rapport['deja_inscrits']} inscription(s) déjà existante(s), ignorée(s).")
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(
+                f"Dry-run : {rapport['creees']} inscription(s) auraient été créées ({duree:.2f} s)."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"{rapport['creees']} inscription(s) créée(s) en {duree:.2f} s."
+            ))
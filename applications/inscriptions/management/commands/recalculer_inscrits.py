@@ -0,0 +1,42 @@
+"""
+Commande de rapprochement du compteur SectionCours.nb_inscrits.
+
+Le compteur est tenu à jour par les signaux de l'app inscriptions ; les
+écritures faites hors de l'ORM (SQL direct, QuerySet.update sur le statut)
+peuvent le décaler. Cette commande recalcule les sections en écart à partir
+des inscriptions actives.
+
+Usage :
+    python manage.py recalculer_inscrits
+    python manage.py recalculer_inscrits --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from applications.inscriptions.services import recalculer_nb_inscrits
+
+
+class Command(BaseCommand):
+    help = "Recalcule le nombre d'inscrits des sections dont le compteur est en écart."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Affiche les écarts sans corriger les compteurs",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        ecarts = recalculer_nb_inscrits(appliquer=not dry_run)
+
+        for id_section, compteur, reel in ecarts:
+            self.stdout.write(f"  Section {id_section} : compteur {compteur}, réel {reel}")
+
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS("Tous les compteurs sont à jour."))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(
+                f"{len(ecarts)} section(s) en écart (dry-run : aucune correction)."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(ecarts)} section(s) corrigée(s)."))
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptes', '0003_cles_connexion_normalisees'),
+        ('cours', '0002_compteur_nb_inscrits'),
+        ('inscriptions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandeAttente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(verbose_name='Position')),
+                ('date_demande', models.DateTimeField(auto_now_add=True, verbose_name='Date de la demande')),
+                ('etudiant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demandes_attente', to='comptes.etudiant', verbose_name='Étudiant')),
+                ('section_cours', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='liste_attente', to='cours.sectioncours', verbose_name='Section de cours')),
+            ],
+            options={
+                'verbose_name': "Demande en liste d'attente",
+                'verbose_name_plural': "Listes d'attente",
+                'ordering': ['section_cours', 'position'],
+                'indexes': [models.Index(fields=['section_cours', 'position'], name='attente_section_position')],
+                'unique_together': {('etudiant', 'section_cours')},
+            },
+        ),
+    ]
@@ -1,6 +1,5 @@
 from django.db import models
 from django.core.exceptions import ValidationError
-from django.conf import settings
 
 
 class Inscription(models.Model):
@@ -51,60 +50,36 @@ class Inscription(models.Model):
             f"{self.section_cours.numero_section}"
         )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Mémorise section et statut chargés (maintien de SectionCours.nb_inscrits)"""
+        instance = super().from_db(db, field_names, values)
+        instance.memoriser_etat()
+        return instance
+
+    def memoriser_etat(self):
+        differes = self.get_deferred_fields()
+        self._etat_charge = (
+            None if 'section_cours_id' in differes else self.section_cours_id,
+            None if 'statut' in differes else self.statut,
+        )
+
     def clean(self):
-        """Validation des inscriptions"""
-        if not self.pk:  # Nouvelle inscription seulement
-            max_cours = getattr(settings, 'MAX_COURS_PAR_SESSION', 7)
-
-            # Vérifier le nombre maximum de cours par session
-            nb_inscriptions_session = Inscription.objects.filter(
-                etudiant=self.etudiant,
-                section_cours__session=self.section_cours.session,
-                section_cours__semestre=self.section_cours.semestre,
-                section_cours__annee=self.section_cours.annee,
-                statut='INSCRIT'
-            ).count()
-
-            if nb_inscriptions_session >= max_cours:
-                raise ValidationError(
-                    f"L'étudiant a déjà atteint le maximum de "
-                    f"{max_cours} cours pour cette session."
-                )
-
-            # Vérifier si la section est ouverte et pas pleine
-            if not self.section_cours.inscription_possible():
-                raise ValidationError(
-                    "Cette section n'est pas disponible pour inscription."
-                )
-
-            # Vérifier les conflits d'horaire
-            inscriptions_meme_jour = Inscription.objects.filter(
-                etudiant=self.etudiant,
-                section_cours__session=self.section_cours.session,
-                section_cours__semestre=self.section_cours.semestre,
-                section_cours__annee=self.section_cours.annee,
-                section_cours__jour_semaine=self.section_cours.jour_semaine,
-                statut='INSCRIT'
-            )
-
-            for inscription in inscriptions_meme_jour:
-                section = inscription.section_cours
-                if section.conflit_horaire(
-                    self.section_cours.jour_semaine,
-                    self.section_cours.heure_debut,
-                    self.section_cours.heure_fin
-                ):
-                    raise ValidationError(
-                        f"Conflit d'horaire avec le cours "
-                        f"{section.cours.code}-{section.numero_section}."
-                    )
+        """Validation des inscriptions (voir services.verifier_admission)"""
+        if not self.pk:
+            from .services import verifier_admission
+            # L'instance de section peut être ancienne : compteur relu en base
+            self.section_cours.refresh_from_db(fields=['nb_inscrits'])
+            verifier_admission(self.etudiant, self.section_cours)
 
     # def save(self, *args, **kwargs):
     #     self.full_clean()
     #     super().save(*args, **kwargs)
         
     def save(self, *args, **kwargs):
-        if not self.pk:  # full_clean uniquement à la création
+        # full_clean uniquement à la création, sauf si services.admettre
+        # vient de tout vérifier sous verrou
+        if not self.pk and not getattr(self, '_admission_verifiee', False):
             self.full_clean()
         super().save(*args, **kwargs)
 
@@ -141,4 +116,46 @@ class HistoriqueInscription(models.Model):
         return (
             f"{self.inscription.etudiant.numero_etudiant} - "
             f"{self.statut_precedent} → {self.nouveau_statut}"
-        )
\ No newline at end of file
+        )
+
+class DemandeAttente(models.Model):
+    """
+    Place dans la liste d'attente d'une section complète.
+
+    `position` est tenue dense (1, 2, 3…) : la lecture du rang d'un étudiant
+    est une simple lecture de ligne. Chaque sortie de la liste décale les
+    suivants d'un seul UPDATE (voir services.retirer_de_la_liste).
+    """
+
+    etudiant = models.ForeignKey(
+        'comptes.Etudiant',
+        on_delete=models.CASCADE,
+        related_name='demandes_attente',
+        verbose_name='Étudiant'
+    )
+
+    section_cours = models.ForeignKey(
+        'cours.SectionCours',
+        on_delete=models.CASCADE,
+        related_name='liste_attente',
+        verbose_name='Section de cours'
+    )
+
+    position     = models.PositiveIntegerField('Position')
+    date_demande = models.DateTimeField('Date de la demande', auto_now_add=True)
+
+    class Meta:
+        verbose_name        = "Demande en liste d'attente"
+        verbose_name_plural = "Listes d'attente"
+        ordering            = ['section_cours', 'position']
+        unique_together     = ['etudiant', 'section_cours']
+        indexes = [
+            models.Index(fields=['section_cours', 'position'], name='attente_section_position'),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.etudiant.numero_etudiant} - "
+            f"{self.section_cours.cours.code}-{self.section_cours.numero_section} "
+            f"(#{self.position})"
+        )
@@ -0,0 +1,542 @@
+"""
+Admission aux sections de cours.
+
+Toutes les conditions d'inscription (cours déjà suivi, maximum de cours par
+session, section ouverte, capacité, prérequis, conflits d'horaire) sont vérifiées ici,
+en un nombre fixe de requêtes. `admettre` fait ces vérifications dans une
+transaction qui verrouille la ligne SectionCours (et l'étudiant) : deux
+inscriptions simultanées à la même section sont sérialisées et la capacité
+ne peut plus être dépassée.
+
+Utilisé par vue_inscrire, vue_reprendre, vue_creer_inscription et
+Inscription.clean.
+
+Liste d'attente : quand une place se libère (abandon, suppression), le
+premier étudiant en attente est inscrit dans la même transaction et notifié.
+"""
+
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils import timezone
+
+from applications.comptes.models import Etudiant
+from applications.cours.emploi_du_temps import invalider_emploi_du_temps
+from applications.cours.models import FermeturePrerequis, SectionCours
+from applications.notes.models import Note
+from applications.notifications.models import Notification
+from .horaires import GrilleHoraire, decrire
+from .models import DemandeAttente, Inscription, HistoriqueInscription
+
+
+def prerequis_manquants(etudiant, ids_cours):
+    """
+    Retourne {id cours: [codes des prérequis non validés]} pour les cours de
+    `ids_cours` dont l'étudiant n'a pas validé tous les prérequis, directs
+    ou indirects. Une seule requête (FermeturePrerequis + sous-requête).
+
+    Un cours est validé par une inscription COMPLETE dont la note, si elle
+    existe, atteint le seuil de réussite.
+    """
+    valides = (
+        Inscription.objects.filter(etudiant=etudiant, statut="COMPLETE")
+        .exclude(note__note_finale__lt=Note.SEUIL_REUSSITE)
+        .values("section_cours__cours_id")
+    )
+    manquants = defaultdict(list)
+    for id_cours, code in (
+        FermeturePrerequis.objects.filter(cours_id__in=ids_cours)
+        .exclude(prerequis_id__in=Subquery(valides))
+        .order_by("distance", "prerequis__code")
+        .values_list("cours_id", "prerequis__code")
+    ):
+        manquants[id_cours].append(code)
+    return dict(manquants)
+
+
+def verifier_admission(etudiant, section, exclure=None, ignorer_capacite=False):
+    """
+    Lève ValidationError (avec un `code`) si l'étudiant ne peut pas être
+    inscrit à la section. Deux requêtes, quel que soit le nombre de cours
+    (inscriptions en cours, prérequis manquants ; la capacité est lue sur le
+    compteur SectionCours.nb_inscrits).
+
+    `exclure` : inscription existante à ignorer (reprise d'un abandon).
+    `ignorer_capacite` : pour la liste d'attente, seule la capacité est
+    acceptée comme motif de refus.
+    """
+    if not section.est_ouverte:
+        raise ValidationError(
+            f"La section {section.numero_section} de {section.cours.code} est fermée.",
+            code="fermee",
+        )
+
+    if (not ignorer_capacite and section.capacite_max
+            and section.nb_inscrits >= section.capacite_max):
+        raise ValidationError(
+            f"La section {section.numero_section} de {section.cours.code} est complète.",
+            code="complete",
+        )
+
+    # Inscriptions en cours de l'étudiant : même cours, ou même période
+    en_cours = Inscription.objects.filter(
+        Q(section_cours__cours_id=section.cours_id)
+        | Q(
+            section_cours__session=section.session,
+            section_cours__semestre=section.semestre,
+            section_cours__annee=section.annee,
+        ),
+        etudiant=etudiant,
+        statut="INSCRIT",
+    ).select_related("section_cours__cours").order_by()
+    if exclure is not None and exclure.pk:
+        en_cours = en_cours.exclude(pk=exclure.pk)
+    en_cours = list(en_cours)
+
+    if any(i.section_cours.cours_id == section.cours_id for i in en_cours):
+        raise ValidationError(
+            f"Déjà inscrit au cours {section.cours.code}.",
+            code="deja_inscrit",
+        )
+
+    meme_periode = [
+        i.section_cours for i in en_cours
+        if (i.section_cours.session, i.section_cours.semestre, i.section_cours.annee)
+        == (section.session, section.semestre, section.annee)
+    ]
+
+    max_cours = getattr(settings, "MAX_COURS_PAR_SESSION", 7)
+    if len(meme_periode) >= max_cours:
+        raise ValidationError(
+            f"Maximum de {max_cours} cours atteint pour cette session "
+            f"(actuellement inscrit à {len(meme_periode)} cours).",
+            code="maximum_cours",
+        )
+
+    manquants = prerequis_manquants(etudiant, [section.cours_id]).get(section.cours_id)
+    if manquants:
+        raise ValidationError(
+            f"Prérequis non validé(s) pour {section.cours.code} : {', '.join(manquants)}.",
+            code="prerequis",
+        )
+
+    existante = GrilleHoraire(meme_periode).conflit(section)
+    if existante is not None:
+        raise ValidationError(
+            f"Conflit d'horaire avec le cours {decrire(existante)}.",
+            code="conflit_horaire",
+        )
+
+
+def ajuster_nb_inscrits(id_section, ecart):
+    """Ajoute `ecart` (positif ou négatif) au compteur d'inscrits de la section"""
+    if ecart:
+        SectionCours.objects.filter(pk=id_section).update(nb_inscrits=F("nb_inscrits") + ecart)
+
+
+def nb_inscrits_reel():
+    """Expression : nombre d'inscriptions actives de la section (sous-requête)"""
+    actives = (
+        Inscription.objects.filter(
+            section_cours=OuterRef("pk"), statut__in=Inscription.STATUTS_ACTIFS
+        )
+        .order_by()
+        .values("section_cours")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(actives), 0)
+
+
+def recalculer_nb_inscrits(appliquer=True):
+    """
+    Compare SectionCours.nb_inscrits aux inscriptions réelles et corrige les
+    écarts (une requête de contrôle, un UPDATE). Retourne la liste des
+    sections en écart : [(id, compteur, réel)].
+    """
+    ecarts = list(
+        SectionCours.objects.annotate(reel=nb_inscrits_reel())
+        .exclude(nb_inscrits=F("reel"))
+        .order_by("pk")
+        .values_list("pk", "nb_inscrits", "reel")
+    )
+    if appliquer and ecarts:
+        # Recalcul dans l'UPDATE lui-même : pas de fenêtre entre lecture et écriture
+        SectionCours.objects.filter(pk__in=[e[0] for e in ecarts]).update(
+            nb_inscrits=nb_inscrits_reel()
+        )
+    return ecarts
+
+
+def _verrouiller_section(id_section):
+    return (
+        SectionCours.objects.select_for_update(of=("self",))
+        .select_related("cours")
+        .get(pk=id_section)
+    )
+
+
+def _enregistrer_admission(etudiant, section, inscription, modifie_par, raison):
+    """Crée (ou réactive) l'inscription déjà vérifiée sous verrou"""
+    if inscription is None:
+        statut_precedent = ""
+        inscription = Inscription(etudiant=etudiant, section_cours=section)
+        # Vérifications déjà faites sous verrou : pas de full_clean() dans save()
+        inscription._admission_verifiee = True
+        try:
+            with transaction.atomic():
+                inscription.save()
+        except IntegrityError:
+            # Ancienne inscription (abandonnée) à cette même section
+            raise ValidationError(
+                "Une inscription à cette section existe déjà : utilisez la reprise.",
+                code="existe",
+            )
+    else:
+        statut_precedent = inscription.statut
+        inscription.statut = "INSCRIT"
+        inscription.date_abandon = None
+        inscription.save()
+
+    if raison is not None:
+        HistoriqueInscription.objects.create(
+            inscription=inscription,
+            statut_precedent=statut_precedent,
+            nouveau_statut="INSCRIT",
+            modifie_par=modifie_par,
+            raison=raison,
+        )
+    return inscription
+
+
+def admettre(etudiant, id_section, inscription=None, modifie_par=None, raison=None):
+    """
+    Inscrit l'étudiant à la section (ou reprend `inscription` abandonnée)
+    après vérification sous verrou. Lève ValidationError si refusé.
+
+    Si `raison` est fournie, une ligne HistoriqueInscription est ajoutée.
+    Retourne l'inscription.
+    """
+    with transaction.atomic():
+        # Verrou de l'étudiant : ses propres demandes simultanées
+        # (maximum de cours, conflits) sont elles aussi sérialisées.
+        list(
+            Etudiant.objects.select_for_update()
+            .filter(pk=etudiant.pk).order_by().values_list("pk", flat=True)
+        )
+        section = _verrouiller_section(id_section)
+        verifier_admission(etudiant, section, exclure=inscription)
+        return _enregistrer_admission(etudiant, section, inscription, modifie_par, raison)
+
+
+# ── Liste d'attente ─────────────────────────────────────────────────────────
+
+def mettre_en_attente(etudiant, id_section):
+    """
+    Ajoute l'étudiant en fin de liste d'attente d'une section complète.
+    Lève ValidationError si la section n'est pas complète ou si l'étudiant
+    ne pourrait pas y être inscrit de toute façon. Retourne la demande.
+    """
+    with transaction.atomic():
+        section = _verrouiller_section(id_section)
+        if not section.est_pleine():
+            raise ValidationError(
+                "Des places sont disponibles : inscrivez-vous directement.",
+                code="places_disponibles",
+            )
+        verifier_admission(etudiant, section, ignorer_capacite=True)
+
+        derniere = section.liste_attente.aggregate(m=Max("position"))["m"] or 0
+        try:
+            with transaction.atomic():
+                return DemandeAttente.objects.create(
+                    etudiant=etudiant, section_cours=section, position=derniere + 1
+                )
+        except IntegrityError:
+            raise ValidationError(
+                "Vous êtes déjà dans la liste d'attente de cette section.",
+                code="deja_en_attente",
+            )
+
+
+def retirer_de_la_liste(demande):
+    """Supprime la demande et fait avancer les suivants (deux requêtes)"""
+    demande.delete()
+    DemandeAttente.objects.filter(
+        section_cours_id=demande.section_cours_id, position__gt=demande.position
+    ).update(position=F("position") - 1)
+
+
+def quitter_liste_attente(demande):
+    with transaction.atomic():
+        _verrouiller_section(demande.section_cours_id)
+        # Position relue sous verrou : elle a pu avancer depuis le chargement
+        demande = DemandeAttente.objects.filter(pk=demande.pk).first()
+        if demande is not None:
+            retirer_de_la_liste(demande)
+
+
+def _notifier_promotion(inscription):
+    section = inscription.section_cours
+    Notification.objects.create(
+        utilisateur=inscription.etudiant.utilisateur,
+        type_notification="inscription_confirmee",
+        titre=f"Place obtenue en {section.cours.code}-{section.numero_section}",
+        message=(
+            f"Une place s'est libérée dans la section {section.numero_section} "
+            f"de {section.cours.code} : vous y êtes maintenant inscrit "
+            f"(depuis la liste d'attente)."
+        ),
+        lien=reverse("inscriptions:mes_inscriptions"),
+    )
+
+
+def promouvoir_liste_attente(id_section, modifie_par=None):
+    """
+    Inscrit, dans l'ordre d'arrivée, les étudiants en attente tant que la
+    section a des places. Une demande devenue impossible (conflit d'horaire,
+    cours déjà suivi ailleurs, maximum atteint) est retirée et l'on passe à la
+    suivante. Nombre de requêtes constant par place attribuée.
+
+    À appeler dans la transaction qui libère la place.
+    Retourne la liste des inscriptions créées ou reprises.
+    """
+    promues = []
+    with transaction.atomic():
+        section = _verrouiller_section(id_section)
+        places = section.places_disponibles()
+
+        while places > 0:
+            demande = (
+                section.liste_attente.select_related("etudiant__utilisateur")
+                .order_by("position").first()
+            )
+            if demande is None:
+                break
+            retirer_de_la_liste(demande)
+
+            etudiant = demande.etudiant
+            existante = Inscription.objects.filter(
+                etudiant=etudiant, section_cours=section
+            ).first()
+            if existante is not None and existante.statut != "ABANDONNE":
+                continue
+            try:
+                verifier_admission(etudiant, section, exclure=existante, ignorer_capacite=True)
+            except ValidationError:
+                continue
+
+            inscription = _enregistrer_admission(
+                etudiant, section, existante, modifie_par,
+                raison=f"Promu depuis la liste d'attente (position {demande.position})",
+            )
+            _notifier_promotion(inscription)
+            promues.append(inscription)
+            places -= 1
+
+    return promues
+
+
+def abandonner(inscription, modifie_par=None, raison="Abandonné par l'étudiant"):
+    """
+    Passe l'inscription en ABANDONNE et attribue la place libérée au premier
+    étudiant en attente, dans la même transaction. Retourne les promotions.
+    """
+    with transaction.atomic():
+        _verrouiller_section(inscription.section_cours_id)
+        HistoriqueInscription.objects.create(
+            inscription=inscription,
+            statut_precedent=inscription.statut,
+            nouveau_statut="ABANDONNE",
+            modifie_par=modifie_par,
+            raison=raison,
+        )
+        inscription.statut = "ABANDONNE"
+        inscription.date_abandon = timezone.now()
+        inscription.save()
+        return promouvoir_liste_attente(inscription.section_cours_id, modifie_par)
+
+
+def supprimer_inscription(inscription, modifie_par=None, raison=""):
+    """Supprime l'inscription puis promeut la liste d'attente (même transaction)"""
+    with transaction.atomic():
+        _verrouiller_section(inscription.section_cours_id)
+        HistoriqueInscription.objects.create(
+            inscription=inscription,
+            statut_precedent=inscription.statut,
+            nouveau_statut="SUPPRIME",
+            modifie_par=modifie_par,
+            raison=raison,
+        )
+        id_section = inscription.section_cours_id
+        inscription.delete()
+        return promouvoir_liste_attente(id_section, modifie_par)
+
+
+# ── Inscription d'une cohorte ───────────────────────────────────────────────
+
+def inscrire_cohorte(departement, niveau, annee, semestre, modifie_par=None,
+                     appliquer=True, taille_lot=500):
+    """
+    Inscrit tous les étudiants actifs d'un département et d'un niveau à une
+    section de chaque cours de leur cursus pour la période donnée.
+
+    Cohorte, sections et inscriptions existantes sont chargées une fois ;
+    capacité, maximum de cours et conflits d'horaire sont vérifiés en mémoire
+    (GrilleHoraire), prérequis contre la table FermeturePrerequis, puis
+    Inscription et HistoriqueInscription sont créées
+    par bulk_create. Les sections visées restent verrouillées pendant tout
+    le traitement : les inscriptions individuelles simultanées attendent.
+
+    Pour chaque cours, la première section (par numéro) qui a de la place et
+    n'entre pas en conflit avec l'horaire de l'étudiant est retenue.
+
+    Retourne un rapport : {"etudiants", "sections", "creees", "deja_inscrits",
+    "refus": [(etudiant, cours, motif)]}.
+    """
+    max_cours = getattr(settings, "MAX_COURS_PAR_SESSION", 7)
+
+    with transaction.atomic():
+        etudiants = list(
+            Etudiant.objects.filter(
+                departement=departement, niveau=niveau, utilisateur__is_active=True
+            ).select_related("utilisateur").order_by("numero_etudiant")
+        )
+        sections = list(
+            SectionCours.objects.select_for_update(of=("self",))
+            .filter(
+                cours__departement=departement, cours__niveau=niveau,
+                annee=annee, semestre=semestre, est_ouverte=True,
+            )
+            .select_related("cours")
+            .order_by("cours__code", "numero_section")
+        )
+        sections_par_cours = defaultdict(list)
+        for section in sections:
+            sections_par_cours[section.cours].append(section)
+        places = {s.id: s.capacite_max - s.nb_inscrits for s in sections}
+
+        # Prérequis (directs et indirects) des cours visés, et ceux que la
+        # cohorte a validés : deux requêtes pour toute la cohorte
+        prerequis = defaultdict(list)
+        for id_cours, id_prerequis, code in FermeturePrerequis.objects.filter(
+            cours__in=list(sections_par_cours)
+        ).order_by("distance", "prerequis__code").values_list("cours_id", "prerequis_id", "prerequis__code"):
+            prerequis[id_cours].append((id_prerequis, code))
+        valides = set(
+            Inscription.objects.filter(
+                etudiant__in=etudiants, statut="COMPLETE",
+                section_cours__cours_id__in={p for liste in prerequis.values() for p, _ in liste},
+            )
+            .exclude(note__note_finale__lt=Note.SEUIL_REUSSITE)
+            .values_list("etudiant_id", "section_cours__cours_id")
+        ) if prerequis else set()
+
+        # Inscriptions existantes de la cohorte : période visée (horaire),
+        # cours visés (déjà suivis), sections visées (contrainte d'unicité)
+        existantes = Inscription.objects.filter(
+            Q(section_cours__annee=annee, section_cours__semestre=semestre)
+            | Q(section_cours__cours__in=list(sections_par_cours)),
+            etudiant__in=etudiants,
+        ).select_related("section_cours").order_by()
+
+        grilles = defaultdict(GrilleHoraire)
+        cours_en_cours = set()
+        paires = set()
+        for inscription in existantes:
+            section = inscription.section_cours
+            paires.add((inscription.etudiant_id, section.id))
+            if inscription.statut != "INSCRIT":
+                continue
+            cours_en_cours.add((inscription.etudiant_id, section.cours_id))
+            if (section.annee, section.semestre) == (annee, semestre):
+                grilles[inscription.etudiant_id].ajouter(section)
+
+        nouvelles = []
+        refus = []
+        deja_inscrits = 0
+        for etudiant in etudiants:
+            grille = grilles[etudiant.id]
+            for cours, candidates in sections_par_cours.items():
+                if (etudiant.id, cours.id) in cours_en_cours:
+                    deja_inscrits += 1
+                    continue
+                manquants = [code for p, code in prerequis[cours.id] if (etudiant.id, p) not in valides]
+                if manquants:
+                    refus.append((etudiant, cours, f"prérequis non validé(s) : {', '.join(manquants)}"))
+                    continue
+                retenue, motif = None, None
+                for section in candidates:
+                    if (etudiant.id, section.id) in paires:
+                        motif = "ancienne inscription à cette section (utiliser la reprise)"
+                        continue
+                    if places[section.id] <= 0:
+                        motif = motif or f"section {section.numero_section} complète"
+                        continue
+                    if grille.nombre_cours(section) >= max_cours:
+                        motif = f"maximum de {max_cours} cours atteint"
+                        break
+                    occupee = grille.conflit(section)
+                    if occupee is not None:
+                        motif = f"conflit d'horaire avec {decrire(occupee)}"
+                        continue
+                    retenue = section
+                    break
+
+                if retenue is None:
+                    refus.append((etudiant, cours, motif or "aucune section ouverte"))
+                    continue
+                grille.ajouter(retenue)
+                places[retenue.id] -= 1
+                nouvelles.append(Inscription(etudiant=etudiant, section_cours=retenue))
+
+        if appliquer and nouvelles:
+            _enregistrer_cohorte(nouvelles, modifie_par, taille_lot)
+
+    return {
+        "etudiants": len(etudiants),
+        "sections": len(sections),
+        "creees": len(nouvelles),
+        "deja_inscrits": deja_inscrits,
+        "refus": refus,
+    }
+
+
+def _enregistrer_cohorte(nouvelles, modifie_par, taille_lot):
+    Inscription.objects.bulk_create(nouvelles, batch_size=taille_lot)
+
+    # bulk_create ne déclenche pas les signaux : compteurs mis à jour ici
+    for id_section, ecart in Counter(i.section_cours_id for i in nouvelles).items():
+        ajuster_nb_inscrits(id_section, ecart)
+
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # MySQL : les clés primaires ne sont pas renvoyées par l'INSERT groupé
+        ids = {
+            (id_etudiant, id_section): pk
+            for pk, id_etudiant, id_section in Inscription.objects.filter(
+                etudiant_id__in={i.etudiant_id for i in nouvelles},
+                section_cours_id__in={i.section_cours_id for i in nouvelles},
+            ).values_list("pk", "etudiant_id", "section_cours_id")
+        }
+        for inscription in nouvelles:
+            inscription.pk = ids[(inscription.etudiant_id, inscription.section_cours_id)]
+
+    HistoriqueInscription.objects.bulk_create(
+        [
+            HistoriqueInscription(
+                inscription=inscription,
+                statut_precedent="",
+                nouveau_statut="INSCRIT",
+                modifie_par=modifie_par,
+                raison="Inscription de la cohorte",
+            )
+            for inscription in nouvelles
+        ],
+        batch_size=taille_lot,
+    )
+    invalider_emploi_du_temps()
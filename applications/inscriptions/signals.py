@@ -0,0 +1,59 @@
+"""
+Maintien du compteur SectionCours.nb_inscrits.
+
+Chaque création, changement de statut (ou de section) et suppression
+d'inscription ajuste le compteur par une expression F() : l'UPDATE est
+atomique côté base et ne dépend pas d'une valeur lue auparavant.
+
+Les QuerySet.update(statut=...) ne passent pas par ces signaux : ils doivent
+appeler services.ajuster_nb_inscrits eux-mêmes (voir l'admin). En cas de
+doute : manage.py recalculer_inscrits.
+"""
+
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Inscription
+from .services import ajuster_nb_inscrits
+
+
+@receiver(pre_save, sender=Inscription)
+def charger_etat_precedent(sender, instance, **kwargs):
+    """Lit l'état en base seulement pour une instance construite à la main"""
+    if instance._state.adding:
+        return
+    etat = getattr(instance, '_etat_charge', (None, None))
+    if None not in etat:
+        return
+    ligne = (
+        Inscription.objects.filter(pk=instance.pk)
+        .values_list('section_cours_id', 'statut').first()
+    )
+    instance._etat_charge = ligne or (None, None)
+
+
+@receiver(post_save, sender=Inscription)
+def maj_nb_inscrits_enregistrement(sender, instance, created, **kwargs):
+    ancienne_section, ancien_statut = (
+        (None, None) if created else getattr(instance, '_etat_charge', (None, None))
+    )
+
+    ecarts = Counter()
+    if ancienne_section is not None and ancien_statut in Inscription.STATUTS_ACTIFS:
+        ecarts[ancienne_section] -= 1
+    if instance.statut in Inscription.STATUTS_ACTIFS:
+        ecarts[instance.section_cours_id] += 1
+    # Rien à écrire si l'inscription reste active dans la même section
+    for id_section, ecart in ecarts.items():
+        ajuster_nb_inscrits(id_section, ecart)
+
+    instance.memoriser_etat()
+
+
+@receiver(post_delete, sender=Inscription)
+def maj_nb_inscrits_suppression(sender, instance, **kwargs):
+    section, statut = getattr(instance, '_etat_charge', (None, None))
+    if (statut or instance.statut) in Inscription.STATUTS_ACTIFS:
+        ajuster_nb_inscrits(section or instance.section_cours_id, -1)
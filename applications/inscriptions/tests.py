@@ -1,285 +1,607 @@
-from django.test import TestCase
-from django.core.exceptions import ValidationError
-from django.conf import settings
-from datetime import date, time
-from applications.comptes.models import User, Student, Professor
-from applications.departements.models import Departement
-from applications.cours.models import Cours, CourseSection
-from applications.inscriptions.models import Enrollment
-
+import json
+import random
+import threading
+import unittest
+from datetime import time
 
-class EnrollmentModelTest(TestCase):
-    """Tests pour le modèle Enrollment"""
+from io import StringIO
 
-    def setUp(self):
-        # Créer un département
-        self.department = Department.objects.create(code="PSYCHO", name="Psychologie")
-
-        # Créer un étudiant
-        self.student_user = User.objects.create_user(
-            email="student@example.com",
-            password="testpass123",
-            first_name="Student",
-            last_name="Test",
-            role="STUDENT",
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.exceptions import ValidationError
+from django.db import connection, close_old_connections
+from django.urls import reverse
+from applications.comptes.models import Utilisateur
+from applications.departements.models import Departement
+from applications.cours.models import Cours, Prerequis, SectionCours
+from applications.inscriptions.models import DemandeAttente, HistoriqueInscription, Inscription
+from applications.inscriptions.horaires import detecter_conflits
+from applications.inscriptions.services import (
+    abandonner, admettre, mettre_en_attente, quitter_liste_attente, supprimer_inscription,
+)
+from applications.notes.models import Note
+from applications.notifications.models import Notification
+
+
+class DonneesInscriptionMixin:
+    """Département, professeur, cours PSY101 et sa section du lundi 9h-11h"""
+
+    def creer_etudiant(self, numero):
+        utilisateur = Utilisateur.objects.create_user(
+            email=f"etudiant{numero}@example.com",
+            password="motdepasse123",
+            first_name="Etu",
+            last_name=f"Diant{numero}",
+            role="ETUDIANT",
+            doit_changer_mot_de_passe=False,
+        )
+        etudiant = utilisateur.profil_etudiant
+        etudiant.departement = self.departement
+        etudiant.niveau = "NIVEAU1"
+        etudiant.save()
+        return etudiant
+
+    def creer_section(self, code, jour="LUNDI", debut=9, fin=11, **kwargs):
+        cours = Cours.objects.create(
+            code=code, nom=f"Cours {code}", credits=3,
+            departement=self.departement, niveau="NIVEAU1",
         )
-        self.student = Student.objects.create(
-            user=self.student_user,
-            student_number="STU001",
-            department=self.department,
-            current_year=1,
-            enrollment_date=date.today(),
+        return SectionCours.objects.create(
+            cours=cours,
+            numero_section="01",
+            professeur=self.professeur,
+            jour_semaine=jour,
+            heure_debut=time(debut, 0),
+            heure_fin=time(fin, 0),
+            session="SESSION_1",
+            semestre="AUTOMNE",
+            annee=2026,
+            **kwargs,
         )
 
-        # Créer un professeur
-        self.professor_user = User.objects.create_user(
+    def setUp(self):
+        self.departement = Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        utilisateur_prof = Utilisateur.objects.create_user(
             email="prof@example.com",
-            password="testpass123",
+            password="motdepasse123",
             first_name="Prof",
             last_name="Test",
-            role="PROFESSOR",
-        )
-        self.professor = Professor.objects.create(
-            user=self.professor_user,
-            professor_id="PROF001",
-            department=self.department,
-            hire_date=date.today(),
+            role="PROFESSEUR",
         )
+        self.professeur = utilisateur_prof.profil_professeur
+        self.etudiant = self.creer_etudiant(0)
+        self.section = self.creer_section("PSY101")
 
-        # Créer un cours
-        self.course = Course.objects.create(
-            code="PSY101",
-            name="Introduction à la Psychologie",
-            credits=3,
-            department=self.department,
-            year_level=1,
-        )
 
-        # Créer une section
-        self.section = CourseSection.objects.create(
-            course=self.course,
-            section_number="01",
-            professor=self.professor,
-            day_of_week="LUNDI",
-            start_time=time(9, 0),
-            end_time=time(11, 0),
-            session="SESSION_1",
-            semester="FALL",
-            year=2024,
-            max_students=30,
-        )
+class InscriptionModelTest(DonneesInscriptionMixin, TestCase):
+    """Tests pour le modèle Inscription"""
 
-    def test_enrollment_creation(self):
-        """Test de création d'inscription"""
-        enrollment = Enrollment.objects.create(
-            student=self.student, course_section=self.section
-        )
-        self.assertEqual(enrollment.status, "ENROLLED")
-        self.assertEqual(enrollment.student, self.student)
-        self.assertEqual(enrollment.course_section, self.section)
+    def test_creation_inscription(self):
+        inscription = Inscription.objects.create(etudiant=self.etudiant, section_cours=self.section)
+        self.assertEqual(inscription.statut, "INSCRIT")
 
-    def test_max_courses_per_session(self):
-        """Test de la limite de cours par session"""
-        # Créer 7 sections différentes
+    def test_maximum_cours_par_session(self):
         for i in range(7):
-            course = Course.objects.create(
-                code=f"PSY10{i+2}",
-                name=f"Course {i+2}",
-                credits=3,
-                department=self.department,
-                year_level=1,
-            )
-            section = CourseSection.objects.create(
-                course=course,
-                section_number="01",
-                professor=self.professor,
-                day_of_week="LUNDI",
-                start_time=time(9 + i, 0),
-                end_time=time(10 + i, 0),
-                session="SESSION_1",
-                semester="FALL",
-                year=2024,
-                max_students=30,
-            )
-            Enrollment.objects.create(student=self.student, course_section=section)
-
-        # Essayer de créer une 8ème inscription
-        course8 = Course.objects.create(
-            code="PSY109",
-            name="Course 8",
-            credits=3,
-            department=self.department,
-            year_level=1,
-        )
-        section8 = CourseSection.objects.create(
-            course=course8,
-            section_number="01",
-            professor=self.professor,
-            day_of_week="MARDI",
-            start_time=time(9, 0),
-            end_time=time(10, 0),
-            session="SESSION_1",
-            semester="FALL",
-            year=2024,
-            max_students=30,
-        )
+            section = self.creer_section(f"PSY2{i}", jour="MARDI", debut=7 + i, fin=8 + i)
+            Inscription.objects.create(etudiant=self.etudiant, section_cours=section)
 
-        enrollment = Enrollment(student=self.student, course_section=section8)
+        huitieme = self.creer_section("PSY300", jour="MERCREDI")
+        with self.assertRaises(ValidationError):
+            Inscription(etudiant=self.etudiant, section_cours=huitieme).save()
 
+    def test_conflit_horaire(self):
+        Inscription.objects.create(etudiant=self.etudiant, section_cours=self.section)
+        chevauchante = self.creer_section("PSY102", debut=10, fin=12)
         with self.assertRaises(ValidationError):
-            enrollment.save()
-
-    def test_schedule_conflict_detection(self):
-        """Test de détection des conflits d'horaire"""
-        # Créer une première inscription
-        Enrollment.objects.create(student=self.student, course_section=self.section)
-
-        # Créer une section qui chevauche
-        course2 = Course.objects.create(
-            code="PSY102",
-            name="Psychology 2",
-            credits=3,
-            department=self.department,
-            year_level=1,
-        )
-        section2 = CourseSection.objects.create(
-            course=course2,
-            section_number="01",
-            professor=self.professor,
-            day_of_week="LUNDI",
-            start_time=time(10, 0),  # Chevauche avec 9h-11h
-            end_time=time(12, 0),
-            session="SESSION_1",
-            semester="FALL",
-            year=2024,
-            max_students=30,
-        )
+            Inscription(etudiant=self.etudiant, section_cours=chevauchante).save()
 
-        enrollment2 = Enrollment(student=self.student, course_section=section2)
+    def test_section_pleine(self):
+        self.section.capacite_max = 2
+        self.section.save()
+        for i in (1, 2):
+            Inscription.objects.create(etudiant=self.creer_etudiant(i), section_cours=self.section)
+        with self.assertRaises(ValidationError):
+            Inscription(etudiant=self.etudiant, section_cours=self.section).save()
 
+    def test_double_inscription(self):
+        Inscription.objects.create(etudiant=self.etudiant, section_cours=self.section)
         with self.assertRaises(ValidationError):
-            enrollment2.save()
+            Inscription.objects.create(etudiant=self.etudiant, section_cours=self.section)
 
-    def test_section_full(self):
-        """Test qu'on ne peut pas s'inscrire à une section pleine"""
-        # Limiter à 2 étudiants
-        self.section.max_students = 2
-        self.section.save()
 
-        # Créer 2 autres étudiants et les inscrire
-        for i in range(2):
-            user = User.objects.create_user(
-                email=f"student{i}@example.com",
-                password="testpass123",
-                first_name=f"Student{i}",
-                last_name="Test",
-                role="STUDENT",
-            )
-            student = Student.objects.create(
-                user=user,
-                student_number=f"STU00{i+2}",
-                department=self.department,
-                current_year=1,
-                enrollment_date=date.today(),
-            )
-            Enrollment.objects.create(student=student, course_section=self.section)
+class AdmissionTest(DonneesInscriptionMixin, TestCase):
+    """Tests du service d'admission"""
 
-        # Essayer d'inscrire un 3ème étudiant
-        enrollment = Enrollment(student=self.student, course_section=self.section)
+    def test_nombre_de_requetes_fixe(self):
+        for i in range(5):
+            section = self.creer_section(f"PSY2{i}", jour="MARDI", debut=7 + i, fin=8 + i)
+            admettre(self.etudiant, section.id)
+        # Verrou étudiant, verrou section, inscriptions en cours, prérequis,
+        # insertion, compteur nb_inscrits — plus 4 instructions SAVEPOINT / RELEASE
+        autre = self.creer_section("PSY300", jour="JEUDI")
+        with self.assertNumQueries(10):
+            admettre(self.etudiant, autre.id)
 
-        with self.assertRaises(ValidationError):
-            enrollment.save()
+    def test_code_du_refus(self):
+        admettre(self.etudiant, self.section.id)
+        self.section.est_ouverte = False
+        self.section.save()
+        with self.assertRaises(ValidationError) as ctx:
+            admettre(self.creer_etudiant(1), self.section.id)
+        self.assertEqual(ctx.exception.code, "fermee")
+
+    def test_prerequis_indirects_exiges(self):
+        psy100 = self.creer_section("PSY100", jour="MARDI")
+        psy200 = self.creer_section("PSY200", jour="MERCREDI")
+        psy300 = self.creer_section("PSY300", jour="JEUDI")
+        Prerequis.objects.create(cours=psy200.cours, cours_prerequis=psy100.cours)
+        Prerequis.objects.create(cours=psy300.cours, cours_prerequis=psy200.cours)
+
+        with self.assertRaises(ValidationError) as ctx:
+            admettre(self.etudiant, psy300.id)
+        self.assertEqual(ctx.exception.code, "prerequis")
+        self.assertIn("PSY200, PSY100", ctx.exception.messages[0])
+
+        for section in (psy100, psy200):
+            inscription = admettre(self.etudiant, section.id)
+            Note.objects.create(inscription=inscription, examen_final=75)
+        admettre(self.etudiant, psy300.id)
+
+    def test_prerequis_echoue_non_valide(self):
+        psy100 = self.creer_section("PSY100", jour="MARDI")
+        psy200 = self.creer_section("PSY200", jour="MERCREDI")
+        Prerequis.objects.create(cours=psy200.cours, cours_prerequis=psy100.cours)
+
+        inscription = admettre(self.etudiant, psy100.id)
+        Note.objects.create(inscription=inscription, examen_final=40)  # sous le seuil
+        with self.assertRaises(ValidationError) as ctx:
+            admettre(self.etudiant, psy200.id)
+        self.assertEqual(ctx.exception.code, "prerequis")
+
+    def test_reprise_abandon(self):
+        inscription = admettre(self.etudiant, self.section.id)
+        inscription.statut = "ABANDONNE"
+        inscription.save()
+        admettre(self.etudiant, self.section.id, inscription=inscription,
+                 modifie_par=self.etudiant.utilisateur, raison="Reprise")
+        inscription.refresh_from_db()
+        self.assertEqual(inscription.statut, "INSCRIT")
+        self.assertEqual(inscription.historique.count(), 1)
+
+
+class CompteurInscritsTest(DonneesInscriptionMixin, TestCase):
+    """Tests du compteur SectionCours.nb_inscrits"""
+
+    def compteur(self):
+        self.section.refresh_from_db(fields=["nb_inscrits"])
+        return self.section.nb_inscrits
+
+    def test_creation_changement_statut_suppression(self):
+        inscription = admettre(self.etudiant, self.section.id)
+        self.assertEqual(self.compteur(), 1)
+
+        inscription.statut = "COMPLETE"
+        with self.assertNumQueries(1):
+            inscription.save()
+        self.assertEqual(self.compteur(), 1)
+
+        inscription.statut = "ABANDONNE"
+        inscription.save()
+        self.assertEqual(self.compteur(), 0)
+
+        admettre(self.etudiant, self.section.id, inscription=inscription)
+        self.assertEqual(self.compteur(), 1)
+
+        inscription.delete()
+        self.assertEqual(self.compteur(), 0)
+
+    def test_changement_de_section(self):
+        inscription = admettre(self.etudiant, self.section.id)
+        autre = self.creer_section("PSY102", jour="MARDI")
+        inscription = Inscription.objects.get(pk=inscription.pk)
+        inscription.section_cours = autre
+        inscription.save()
+        autre.refresh_from_db()
+        self.assertEqual((self.compteur(), autre.nb_inscrits), (0, 1))
+
+    def test_suppression_en_cascade(self):
+        admettre(self.etudiant, self.section.id)
+        admettre(self.creer_etudiant(1), self.section.id)
+        self.etudiant.utilisateur.delete()
+        self.assertEqual(self.compteur(), 1)
+
+    def test_capacite_lue_sur_le_compteur(self):
+        self.section.capacite_max = 1
+        self.section.save()
+        admettre(self.creer_etudiant(1), self.section.id)
+        self.assertTrue(SectionCours.objects.get(pk=self.section.pk).est_pleine())
+        with self.assertRaises(ValidationError) as ctx:
+            admettre(self.etudiant, self.section.id)
+        self.assertEqual(ctx.exception.code, "complete")
+
+    def test_instance_perimee_n_ecrase_pas_le_compteur(self):
+        self.section.capacite_max = 1
+        self.section.save()
+        perimee = SectionCours.objects.get(pk=self.section.pk)
+        admettre(self.creer_etudiant(1), self.section.id)
 
-    def test_duplicate_enrollment(self):
-        """Test qu'on ne peut pas s'inscrire deux fois au même cours"""
-        Enrollment.objects.create(student=self.student, course_section=self.section)
+        # Comme modifier_section / basculer_ouverture_section
+        perimee.est_ouverte = True
+        perimee.save()
+        self.assertEqual(self.compteur(), 1)
+        with self.assertRaises(ValidationError) as ctx:
+            admettre(self.etudiant, self.section.id)
+        self.assertEqual(ctx.exception.code, "complete")
 
-        # Essayer de créer une deuxième inscription
-        with self.assertRaises(Exception):  # Violation de contrainte unique
-            Enrollment.objects.create(student=self.student, course_section=self.section)
+    def test_commande_de_rapprochement(self):
+        admettre(self.etudiant, self.section.id)
+        SectionCours.objects.filter(pk=self.section.pk).update(nb_inscrits=7)
 
+        sortie = StringIO()
+        call_command("recalculer_inscrits", "--dry-run", stdout=sortie)
+        self.assertIn("compteur 7, réel 1", sortie.getvalue())
+        self.assertEqual(self.compteur(), 7)
 
-class EnrollmentViewTest(TestCase):
-    """Tests pour les vues d'inscription"""
+        call_command("recalculer_inscrits", stdout=StringIO())
+        self.assertEqual(self.compteur(), 1)
+
+
+class ListeAttenteTest(DonneesInscriptionMixin, TestCase):
+    """Tests de la liste d'attente et de la promotion automatique"""
 
     def setUp(self):
-        # Configuration similaire à EnrollmentModelTest
-        self.department = Department.objects.create(code="PSYCHO", name="Psychologie")
+        super().setUp()
+        self.section.capacite_max = 1
+        self.section.save()
+        self.inscription = admettre(self.etudiant, self.section.id)
+        self.premier = self.creer_etudiant(1)
+        self.second = self.creer_etudiant(2)
+
+    def positions(self):
+        return list(
+            self.section.liste_attente.order_by("position")
+            .values_list("etudiant_id", "position")
+        )
 
-        self.student_user = User.objects.create_user(
-            email="student@example.com",
-            password="testpass123",
-            first_name="Student",
-            last_name="Test",
-            role="STUDENT",
+    def test_attente_seulement_si_complete(self):
+        autre = self.creer_section("PSY102", jour="MARDI")
+        with self.assertRaises(ValidationError) as ctx:
+            mettre_en_attente(self.premier, autre.id)
+        self.assertEqual(ctx.exception.code, "places_disponibles")
+
+    def test_positions_fifo(self):
+        self.assertEqual(mettre_en_attente(self.premier, self.section.id).position, 1)
+        self.assertEqual(mettre_en_attente(self.second, self.section.id).position, 2)
+        with self.assertRaises(ValidationError) as ctx:
+            mettre_en_attente(self.premier, self.section.id)
+        self.assertEqual(ctx.exception.code, "deja_en_attente")
+
+    def test_abandon_promeut_le_premier(self):
+        mettre_en_attente(self.premier, self.section.id)
+        mettre_en_attente(self.second, self.section.id)
+
+        promues = abandonner(self.inscription, modifie_par=self.etudiant.utilisateur)
+
+        self.assertEqual([i.etudiant for i in promues], [self.premier])
+        self.assertTrue(
+            Inscription.objects.filter(
+                etudiant=self.premier, section_cours=self.section, statut="INSCRIT"
+            ).exists()
         )
-        self.student_user.must_change_password = False
-        self.student_user.save()
-
-        self.student = Student.objects.create(
-            user=self.student_user,
-            student_number="STU001",
-            department=self.department,
-            current_year=1,
-            enrollment_date=date.today(),
+        self.assertEqual(self.positions(), [(self.second.id, 1)])
+        self.section.refresh_from_db()
+        self.assertEqual(self.section.nb_inscrits, 1)
+        self.assertTrue(
+            Notification.objects.filter(
+                utilisateur=self.premier.utilisateur, type_notification="inscription_confirmee"
+            ).exists()
         )
 
-        professor_user = User.objects.create_user(
-            email="prof@example.com",
-            password="testpass123",
-            first_name="Prof",
-            last_name="Test",
-            role="PROFESSOR",
+    def test_demande_impossible_ignoree(self):
+        # Le premier s'est entre-temps inscrit à une section en conflit d'horaire
+        mettre_en_attente(self.premier, self.section.id)
+        mettre_en_attente(self.second, self.section.id)
+        admettre(self.premier, self.creer_section("PSY102", debut=10, fin=12).id)
+
+        promues = abandonner(self.inscription)
+
+        self.assertEqual([i.etudiant for i in promues], [self.second])
+        self.assertEqual(self.positions(), [])
+
+    def test_suppression_promeut(self):
+        mettre_en_attente(self.premier, self.section.id)
+        promues = supprimer_inscription(self.inscription)
+        self.assertEqual([i.etudiant for i in promues], [self.premier])
+
+    def test_quitter_fait_avancer_les_suivants(self):
+        demande = mettre_en_attente(self.premier, self.section.id)
+        mettre_en_attente(self.second, self.section.id)
+        quitter_liste_attente(demande)
+        self.assertEqual(self.positions(), [(self.second.id, 1)])
+
+    def test_vue_abandon_promeut(self):
+        mettre_en_attente(self.premier, self.section.id)
+        self.client.force_login(self.etudiant.utilisateur)
+        self.client.get(reverse("inscriptions:abandonner", kwargs={"id_inscription": self.inscription.id}))
+        self.assertFalse(DemandeAttente.objects.exists())
+        self.assertEqual(self.section.inscriptions.get(statut="INSCRIT").etudiant, self.premier)
+
+
+class AdministrationInscriptionsTest(DonneesInscriptionMixin, TestCase):
+    """Tests des suppressions depuis l'administration"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(Utilisateur.objects.create_superuser(
+            email="super@example.com", password="motdepasse123", first_name="Su", last_name="Per",
+        ))
+        self.inscription = admettre(self.etudiant, self.section.id)
+
+    def test_supprimer_historique(self):
+        historique = HistoriqueInscription.objects.create(
+            inscription=self.inscription, statut_precedent="INSCRIT", nouveau_statut="ABANDONNE",
+        )
+        url = reverse("admin:inscriptions_historiqueinscription_delete", args=[historique.id])
+        self.assertEqual(self.client.post(url, {"post": "yes"}).status_code, 302)
+        self.assertFalse(HistoriqueInscription.objects.filter(pk=historique.pk).exists())
+
+        autres = [
+            HistoriqueInscription.objects.create(
+                inscription=self.inscription, statut_precedent="INSCRIT", nouveau_statut=statut,
+            ).id
+            for statut in ("ABANDONNE", "COMPLETE")
+        ]
+        self.client.post(reverse("admin:inscriptions_historiqueinscription_changelist"), {
+            "action": "delete_selected", "_selected_action": autres, "post": "yes",
+        })
+        self.assertFalse(HistoriqueInscription.objects.exists())
+
+    def test_supprimer_demande_fait_avancer_la_liste(self):
+        SectionCours.objects.filter(pk=self.section.pk).update(capacite_max=1)
+        premiere = mettre_en_attente(self.creer_etudiant(1), self.section.id)
+        seconde = mettre_en_attente(self.creer_etudiant(2), self.section.id)
+
+        url = reverse("admin:inscriptions_demandeattente_delete", args=[premiere.id])
+        self.client.post(url, {"post": "yes"})
+
+        self.assertFalse(DemandeAttente.objects.filter(pk=premiere.pk).exists())
+        seconde.refresh_from_db()
+        self.assertEqual(seconde.position, 1)
+
+
+class InscriptionCohorteTest(DonneesInscriptionMixin, TestCase):
+    """Tests de la commande inscrire_cohorte"""
+
+    def setUp(self):
+        super().setUp()
+        self.section.capacite_max = 2
+        self.section.save()
+        # Deuxième section de PSY101, le mardi
+        self.section_02 = SectionCours.objects.create(
+            cours=self.section.cours, numero_section="02", professeur=self.professeur,
+            jour_semaine="MARDI", heure_debut=time(9, 0), heure_fin=time(11, 0),
+            session="SESSION_1", semestre="AUTOMNE", annee=2026, capacite_max=2,
         )
-        professor = Professor.objects.create(
-            user=professor_user,
-            professor_id="PROF001",
-            department=self.department,
-            hire_date=date.today(),
+        self.autres = [self.creer_etudiant(i) for i in range(1, 4)]
+
+    def inscrire(self, *options):
+        sortie = StringIO()
+        call_command(
+            "inscrire_cohorte", "--departement", "PSY", "--niveau", "NIVEAU1",
+            "--annee", "2026", "--semestre", "AUTOMNE", *options, stdout=sortie,
         )
+        return sortie.getvalue()
+
+    def test_repartition_selon_capacite(self):
+        self.creer_section("PSY102", jour="MERCREDI")
+        self.inscrire()
 
-        course = Course.objects.create(
-            code="PSY101",
-            name="Introduction à la Psychologie",
-            credits=3,
-            department=self.department,
-            year_level=1,
+        self.assertEqual(Inscription.objects.filter(section_cours__cours__code="PSY102").count(), 4)
+        self.assertEqual(
+            sorted(Inscription.objects.filter(section_cours__cours__code="PSY101")
+                   .values_list("section_cours__numero_section", flat=True)),
+            ["01", "01", "02", "02"],
         )
+        self.section.refresh_from_db()
+        self.assertEqual(self.section.nb_inscrits, 2)
+        self.assertEqual(HistoriqueInscription.objects.count(), 8)
+
+    def test_conflits_et_deja_inscrits_rapportes(self):
+        admettre(self.etudiant, self.section.id)
+        # Le lundi 10h-12h chevauche PSY101-01
+        self.creer_section("PSY102", debut=10, fin=12, capacite_max=10)
+
+        sortie = self.inscrire()
+
+        self.assertIn("1 inscription(s) déjà existante(s)", sortie)
+        self.assertIn(f"{self.etudiant.numero_etudiant}", sortie)
+        self.assertIn("PSY102 : conflit d'horaire avec PSY101-01", sortie)
+        # Celui placé en section 02 (mardi) obtient aussi PSY102
+        self.assertEqual(Inscription.objects.filter(section_cours__cours__code="PSY102").count(), 2)
+
+    def test_dry_run(self):
+        sortie = self.inscrire("--dry-run")
+        self.assertIn("4 inscription(s) auraient été créées", sortie)
+        self.assertFalse(Inscription.objects.exists())
+
+
+class DetectionConflitsTest(DonneesInscriptionMixin, TestCase):
+    """Tests de la détection de conflits par intervalles"""
+
+    def test_equivalent_a_la_comparaison_par_paires(self):
+        alea = random.Random(2026)
+
+        def section_au_hasard(i):
+            debut = alea.randrange(7, 18)
+            return SectionCours(
+                id=i, jour_semaine=alea.choice(["LUNDI", "MARDI"]),
+                heure_debut=time(debut, alea.choice([0, 30])),
+                heure_fin=time(debut + alea.randrange(1, 4), 0),
+                session="SESSION_1", semestre="AUTOMNE", annee=2026,
+            )
 
-        self.section = CourseSection.objects.create(
-            course=course,
-            section_number="01",
-            professor=professor,
-            day_of_week="LUNDI",
-            start_time=time(9, 0),
-            end_time=time(11, 0),
-            session="SESSION_1",
-            semester="FALL",
-            year=2024,
-            max_students=30,
+        # Horaire de l'étudiant : sections sans chevauchement entre elles
+        occupees = []
+        for i in range(40):
+            s = section_au_hasard(i)
+            if not any(o.conflit_horaire(s.jour_semaine, s.heure_debut, s.heure_fin) for o in occupees):
+                occupees.append(s)
+        candidates = [section_au_hasard(100 + i) for i in range(200)]
+
+        attendu = {
+            c.id for c in candidates
+            if any(o.conflit_horaire(c.jour_semaine, c.heure_debut, c.heure_fin) for o in occupees)
+        }
+        self.assertEqual(set(detecter_conflits(occupees, candidates)), attendu)
+
+        # Horaire qui se chevauche déjà (inscriptions forcées)
+        occupees = [section_au_hasard(200 + i) for i in range(40)]
+        attendu = {
+            c.id for c in candidates
+            if any(o.conflit_horaire(c.jour_semaine, c.heure_debut, c.heure_fin) for o in occupees)
+        }
+        self.assertEqual(set(detecter_conflits(occupees, candidates)), attendu)
+
+    def test_horaire_deja_en_conflit(self):
+        # Inscriptions antérieures qui se chevauchent : lundi 8h-12h et 9h-10h
+        longue = self.creer_section("PSY102", debut=8, fin=12)
+        courte = self.creer_section("PSY103", debut=9, fin=10)
+        candidate = self.creer_section("PSY104", debut=11, fin=12)
+        self.assertEqual(detecter_conflits([longue, courte], [candidate]), {candidate.id: longue})
+        self.assertEqual(detecter_conflits([courte, longue], [candidate]), {candidate.id: longue})
+
+        # Lignes antérieures à la vérification : insérées sans full_clean()
+        Inscription.objects.bulk_create([
+            Inscription(etudiant=self.etudiant, section_cours=longue),
+            Inscription(etudiant=self.etudiant, section_cours=courte),
+        ])
+        with self.assertRaises(ValidationError) as ctx:
+            admettre(self.etudiant, candidate.id)
+        self.assertEqual(ctx.exception.code, "conflit_horaire")
+
+    # Session servie depuis le cache : aucune requête de session comptée
+    @override_settings(SESSION_ENGINE="applications.comptes.sessions")
+    def test_sections_pour_etudiant_signale_les_conflits(self):
+        admin = Utilisateur.objects.create_user(
+            email="admin@example.com", password="motdepasse123", first_name="Ad",
+            last_name="Min", role="ADMIN", doit_changer_mot_de_passe=False,
         )
+        admettre(self.etudiant, self.section.id)
+        chevauchante = self.creer_section("PSY102", debut=10, fin=12)
+        libre = self.creer_section("PSY103", jour="MARDI")
+        Prerequis.objects.create(cours=libre.cours, cours_prerequis=chevauchante.cours)
+
+        self.client.force_login(admin)
+        with self.assertNumQueries(5):  # utilisateur, étudiant, inscriptions, sections, prérequis
+            donnees = self.client.get(
+                reverse("inscriptions:ajax_sections_etudiant", kwargs={"etudiant_id": self.etudiant.id})
+            ).json()
+
+        par_id = {s["id"]: s for c in donnees["cours"].values() for s in c["sections"]}
+        self.assertNotIn(self.section.id, par_id)
+        self.assertEqual(par_id[chevauchante.id]["conflit"], "PSY101-01 (Lundi 09:00-11:00)")
+        self.assertIsNone(par_id[libre.id]["conflit"])
+        self.assertEqual(par_id[libre.id]["prerequis_manquants"], ["PSY102"])
+        self.assertEqual(par_id[chevauchante.id]["prerequis_manquants"], [])
+
+
+class VuesInscriptionTest(DonneesInscriptionMixin, TestCase):
+    """Tests pour les vues d'inscription"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.etudiant.utilisateur)
+
+    def test_sections_disponibles(self):
+        reponse = self.client.get(reverse("inscriptions:sections_disponibles"))
+        self.assertEqual(reponse.status_code, 200)
 
-        self.client.login(email="student@example.com", password="testpass123")
+    def test_inscription_a_une_section(self):
+        reponse = self.client.get(reverse("inscriptions:inscrire", kwargs={"id_section": self.section.id}))
+        self.assertRedirects(reponse, reverse("inscriptions:mes_inscriptions"), fetch_redirect_response=False)
+        self.assertTrue(
+            Inscription.objects.filter(etudiant=self.etudiant, section_cours=self.section).exists()
+        )
 
-    def test_available_sections_view(self):
-        """Test de la vue des sections disponibles"""
-        from django.urls import reverse
+    def test_inscription_section_complete(self):
+        self.section.capacite_max = 0
+        self.section.est_ouverte = False
+        self.section.save()
+        reponse = self.client.get(reverse("inscriptions:inscrire", kwargs={"id_section": self.section.id}))
+        self.assertRedirects(reponse, reverse("inscriptions:sections_disponibles"),
+                             fetch_redirect_response=False)
+        self.assertFalse(Inscription.objects.exists())
 
-        response = self.client.get(reverse("enrollments:available_sections"))
-        self.assertEqual(response.status_code, 200)
 
-    def test_enroll_to_section(self):
-        """Test d'inscription à une section"""
-        from django.urls import reverse
+class BancInscriptionsTest(TransactionTestCase):
+    """Test de fumée de la commande bench_inscriptions"""
 
-        response = self.client.get(
-            reverse("enrollments:enroll", kwargs={"section_id": self.section.id})
+    def test_rapport_et_nettoyage(self):
+        sortie = StringIO()
+        call_command(
+            "bench_inscriptions", "--etudiants", "6", "--concurrence", "1",
+            "--sections", "2", "--capacite", "2", "--json", "--force", stdout=sortie,
         )
-        self.assertEqual(response.status_code, 302)  # Redirection
+        resultats = json.loads(sortie.getvalue())
+
+        self.assertEqual(sum(resultats["issues"].values()), 6)
+        self.assertEqual(resultats["issues"]["erreur"], 0)
+        self.assertLessEqual(resultats["issues"]["inscrit"], 4)
+        self.assertEqual(resultats["depassements_capacite"], 0)
+        self.assertEqual(resultats["compteurs_faux"], 0)
+        self.assertFalse(Utilisateur.objects.exists())
+        self.assertFalse(SectionCours.objects.exists())
+
+    def test_cohorte_annulee_si_creation_echoue(self):
+        departement = Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        Cours.objects.create(
+            code="BENCH001", nom="Existant", credits=3, departement=departement, niveau="NIVEAU1",
+        )
+        with self.assertRaises(CommandError):
+            call_command(
+                "bench_inscriptions", "--etudiants", "2", "--sections", "2", "--force",
+                stdout=StringIO(),
+            )
+        self.assertFalse(Utilisateur.objects.exists())
+        self.assertEqual(list(Cours.objects.values_list("code", flat=True)), ["BENCH001"])
 
-        # Vérifier que l'inscription a été créée
-        self.assertTrue(
-            Enrollment.objects.filter(
-                student=self.student, course_section=self.section
-            ).exists()
+
+@unittest.skipUnless(
+    connection.features.has_select_for_update,
+    "Le verrouillage de lignes (SELECT ... FOR UPDATE) n'est pas supporté par cette base.",
+)
+class AdmissionConcurrenteTest(DonneesInscriptionMixin, TransactionTestCase):
+    """Des inscriptions simultanées ne dépassent pas la capacité"""
+
+    NB_ETUDIANTS = 12
+    CAPACITE = 5
+
+    def test_capacite_respectee_sous_concurrence(self):
+        self.section.capacite_max = self.CAPACITE
+        self.section.save()
+        etudiants = [self.creer_etudiant(i) for i in range(1, self.NB_ETUDIANTS + 1)]
+
+        depart = threading.Barrier(self.NB_ETUDIANTS)
+        refus = []
+
+        def inscrire(etudiant):
+            try:
+                depart.wait()
+                admettre(etudiant, self.section.id)
+            except ValidationError as e:
+                refus.append(e.code)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        fils = [threading.Thread(target=inscrire, args=(e,)) for e in etudiants]
+        for f in fils:
+            f.start()
+        for f in fils:
+            f.join()
+
+        self.assertEqual(
+            Inscription.objects.filter(section_cours=self.section).count(), self.CAPACITE
         )
+        self.assertEqual(refus, ["complete"] * (self.NB_ETUDIANTS - self.CAPACITE))
@@ -10,6 +10,8 @@ urlpatterns = [
     path('inscrire/<int:id_section>/',            views.vue_inscrire,                name='inscrire'),
     path('abandonner/<int:id_inscription>/',      views.vue_abandonner,              name='abandonner'),
     path('reprendre/<int:id_inscription>/',       views.vue_reprendre,               name='reprendre'),
+    path('attente/rejoindre/<int:id_section>/',   views.vue_rejoindre_liste_attente, name='rejoindre_liste_attente'),
+    path('attente/quitter/<int:id_demande>/',     views.vue_quitter_liste_attente,   name='quitter_liste_attente'),
 
     # ===== Vues Admin =====
     path('liste/',                                views.vue_liste_inscriptions,      name='liste_inscriptions'),
@@ -6,9 +6,15 @@ from django.core.paginator import Paginator
 from django.conf import settings
 from django.utils import timezone
 from django.http import JsonResponse
+from django.db.models import OuterRef, Subquery
 from collections import defaultdict
 
-from .models import Inscription, HistoriqueInscription
+from .models import DemandeAttente, Inscription, HistoriqueInscription
+from .horaires import decrire, detecter_conflits
+from .services import (
+    abandonner, admettre, mettre_en_attente, prerequis_manquants, quitter_liste_attente,
+    supprimer_inscription,
+)
 from applications.cours.models import SectionCours
 from applications.comptes.models import Etudiant
 from applications.departements.models import Departement
@@ -41,6 +47,15 @@ def vue_sections_disponibles(request):
     )
     sections = sections.exclude(cours_id__in=ids_cours_inscrits)
 
+    # Rang de l'étudiant dans la liste d'attente de chaque section (ou None)
+    sections = sections.annotate(
+        position_attente=Subquery(
+            DemandeAttente.objects.filter(
+                section_cours=OuterRef("pk"), etudiant=etudiant
+            ).values("position")[:1]
+        )
+    )
+
     session  = request.GET.get("session")
     semestre = request.GET.get("semestre")
 
@@ -65,99 +80,31 @@ def vue_sections_disponibles(request):
 def vue_inscrire(request, id_section):
     """Inscrire l'étudiant connecté à une section"""
     etudiant = request.user.profil_etudiant
-    section = get_object_or_404(SectionCours, id=id_section)
-
-    # Déjà inscrit à ce cours (toutes sections confondues) ?
-    if Inscription.objects.filter(
-        etudiant=etudiant, section_cours__cours=section.cours, statut="INSCRIT"
-    ).exists():
-        messages.warning(
-            request, f"Vous êtes déjà inscrit au cours {section.cours.code}."
-        )
-        return redirect("inscriptions:mes_inscriptions")
-
-    # Limite de 8 cours par session
-    nb_session = Inscription.objects.filter(
-        etudiant=etudiant,
-        section_cours__session=section.session,
-        section_cours__semestre=section.semestre,
-        section_cours__annee=section.annee,
-        statut="INSCRIT",
-    ).count()
-
-    max_cours = getattr(settings, "MAX_COURS_PAR_SESSION", 7)
-    if nb_session >= max_cours:
-        messages.error(
-            request,
-            f"Vous avez atteint le maximum de {max_cours} cours pour cette session "
-            f"(actuellement inscrit à {nb_session} cours).",
-        )
-        return redirect("inscriptions:sections_disponibles")
+    section = get_object_or_404(SectionCours.objects.select_related("cours"), id=id_section)
 
-    # Section complète ou fermée ?
-    nb_inscrits = Inscription.objects.filter(
-        section_cours=section, statut="INSCRIT"
-    ).count()
-    if section.capacite_max and nb_inscrits >= section.capacite_max:
-        messages.error(
-            request,
-            f"La section {section.numero_section} de {section.cours.code} est complète.",
-        )
-        return redirect("inscriptions:sections_disponibles")
-
-    if not section.est_ouverte:
-        messages.error(
-            request,
-            f"La section {section.numero_section} de {section.cours.code} est fermée.",
-        )
-        return redirect("inscriptions:sections_disponibles")
-
-    # Conflits d'horaire
-    inscriptions_meme_jour = Inscription.objects.filter(
-        etudiant=etudiant,
-        section_cours__session=section.session,
-        section_cours__semestre=section.semestre,
-        section_cours__annee=section.annee,
-        section_cours__jour_semaine=section.jour_semaine,
-        statut="INSCRIT",
-    )
-    for insc in inscriptions_meme_jour:
-        sect_existante = insc.section_cours
-        if sect_existante.conflit_horaire(
-            section.jour_semaine, section.heure_debut, section.heure_fin
-        ):
-            messages.error(
+    # Toutes les vérifications (cours déjà suivi, maximum par session,
+    # capacité, ouverture, conflits) sont faites sous verrou par le service
+    try:
+        admettre(etudiant, section.id)
+    except ValidationError as e:
+        if e.code == "deja_inscrit":
+            messages.warning(request, f"Vous êtes déjà inscrit au cours {section.cours.code}.")
+            return redirect("inscriptions:mes_inscriptions")
+        if e.code == "complete":
+            messages.warning(
                 request,
-                f"Conflit d'horaire avec le cours {sect_existante.cours.code}-"
-                f"{sect_existante.numero_section} "
-                f"({sect_existante.get_jour_semaine_display()} "
-                f"{sect_existante.heure_debut.strftime('%H:%M')}-"
-                f"{sect_existante.heure_fin.strftime('%H:%M')}).",
+                f"La section {section.numero_section} de {section.cours.code} est complète : "
+                f"vous pouvez rejoindre sa liste d'attente.",
             )
             return redirect("inscriptions:sections_disponibles")
-
-    # Créer l'inscription
-    try:
-        nouvelle_inscription = Inscription(etudiant=etudiant, section_cours=section)
-        nouvelle_inscription.full_clean()
-        nouvelle_inscription.save()
-        messages.success(
-            request,
-            f"✓ Inscription réussie à {section.cours.code}-{section.numero_section}.",
-        )
-    except ValidationError as e:
-        if hasattr(e, "message_dict"):
-            for champ, erreurs in e.message_dict.items():
-                for erreur in erreurs:
-                    messages.error(request, f"{champ} : {erreur}")
-        else:
-            for msg in e.messages:
-                messages.error(request, msg)
-        return redirect("inscriptions:sections_disponibles")
-    except Exception as e:
-        messages.error(request, f"Erreur lors de l'inscription : {str(e)}")
+        for msg in e.messages:
+            messages.error(request, msg)
         return redirect("inscriptions:sections_disponibles")
 
+    messages.success(
+        request,
+        f"✓ Inscription réussie à {section.cours.code}-{section.numero_section}.",
+    )
     return redirect("inscriptions:mes_inscriptions")
 
 
@@ -173,19 +120,44 @@ def vue_abandonner(request, id_inscription):
         messages.warning(request, "Cette inscription ne peut pas être abandonnée.")
         return redirect("inscriptions:mes_inscriptions")
 
-    HistoriqueInscription.objects.create(
-        inscription=inscription,
-        statut_precedent=inscription.statut,
-        nouveau_statut="ABANDONNE",
-        modifie_par=request.user,
-        raison="Abandonné par l'étudiant",
+    # La place libérée revient au premier étudiant en attente (même transaction)
+    abandonner(inscription, modifie_par=request.user)
+
+    messages.success(request, "Inscription abandonnée avec succès.")
+    return redirect("inscriptions:mes_inscriptions")
+
+
+@login_required
+@user_passes_test(est_etudiant)
+def vue_rejoindre_liste_attente(request, id_section):
+    """Rejoindre la liste d'attente d'une section complète"""
+    section = get_object_or_404(SectionCours.objects.select_related("cours"), id=id_section)
+
+    try:
+        demande = mettre_en_attente(request.user.profil_etudiant, section.id)
+    except ValidationError as e:
+        for msg in e.messages:
+            messages.error(request, msg)
+        return redirect("inscriptions:sections_disponibles")
+
+    messages.success(
+        request,
+        f"Vous êtes en position {demande.position} dans la liste d'attente de "
+        f"{section.cours.code}-{section.numero_section}. Vous serez inscrit et "
+        f"notifié dès qu'une place se libère.",
     )
+    return redirect("inscriptions:mes_inscriptions")
 
-    inscription.statut = "ABANDONNE"
-    inscription.date_abandon = timezone.now()
-    inscription.save()
 
-    messages.success(request, "Inscription abandonnée avec succès.")
+@login_required
+@user_passes_test(est_etudiant)
+def vue_quitter_liste_attente(request, id_demande):
+    """Quitter une liste d'attente"""
+    demande = get_object_or_404(
+        DemandeAttente, id=id_demande, etudiant=request.user.profil_etudiant
+    )
+    quitter_liste_attente(demande)
+    messages.success(request, "Vous avez quitté la liste d'attente.")
     return redirect("inscriptions:mes_inscriptions")
 
 
@@ -203,47 +175,24 @@ def vue_reprendre(request, id_inscription):
 
     section = inscription.section_cours
 
-    # Section encore ouverte ?
-    if not section.est_ouverte:
-        messages.error(
-            request,
-            f"La section {section.numero_section} de {section.cours.code} est fermée — reprise impossible.",
-        )
-        return redirect("inscriptions:mes_inscriptions")
-
-    # Capacité encore disponible ?
-    nb_inscrits = Inscription.objects.filter(section_cours=section, statut="INSCRIT").count()
-    if section.capacite_max and nb_inscrits >= section.capacite_max:
-        messages.error(
-            request,
-            f"La section {section.numero_section} de {section.cours.code} est complète — reprise impossible.",
-        )
-        return redirect("inscriptions:mes_inscriptions")
-
-    # Déjà réinscrit à ce cours via une autre inscription active ?
-    if Inscription.objects.filter(
-        etudiant=request.user.profil_etudiant,
-        section_cours__cours=section.cours,
-        statut="INSCRIT",
-    ).exclude(pk=inscription.pk).exists():
-        messages.warning(
-            request,
-            f"Vous êtes déjà inscrit au cours {section.cours.code} via une autre section.",
+    try:
+        admettre(
+            request.user.profil_etudiant, section.id,
+            inscription=inscription,
+            modifie_par=request.user,
+            raison="Reprise par l'étudiant",
         )
+    except ValidationError as e:
+        if e.code == "deja_inscrit":
+            messages.warning(
+                request,
+                f"Vous êtes déjà inscrit au cours {section.cours.code} via une autre section.",
+            )
+        else:
+            for msg in e.messages:
+                messages.error(request, f"{msg} Reprise impossible.")
         return redirect("inscriptions:mes_inscriptions")
 
-    HistoriqueInscription.objects.create(
-        inscription=inscription,
-        statut_precedent=inscription.statut,
-        nouveau_statut="INSCRIT",
-        modifie_par=request.user,
-        raison="Reprise par l'étudiant",
-    )
-
-    inscription.statut = "INSCRIT"
-    inscription.date_abandon = None
-    inscription.save()
-
     messages.success(
         request,
         f"✓ Vous avez repris le cours {section.cours.code}-{section.numero_section}.",
@@ -313,8 +262,14 @@ def vue_mes_inscriptions(request):
         for p in periodes
     ]
 
+    # Listes d'attente : la position est stockée, aucun calcul de rang
+    demandes_attente = etudiant.demandes_attente.select_related(
+        "section_cours__cours"
+    ).order_by("date_demande")
+
     contexte = {
         "inscriptions":      inscriptions,
+        "demandes_attente":  demandes_attente,
         "statut_actuel":     statut,
         "choix_statut":      Inscription.CHOIX_STATUT,
         "total_inscrit":     total_inscrit,
@@ -434,116 +389,27 @@ def vue_creer_inscription(request):
         nb_creees  = 0
         nb_erreurs = 0
 
+        sections = SectionCours.objects.select_related("cours").in_bulk(
+            [i for i in ids_sections if i.isdigit()]
+        )
+
         for id_section in ids_sections:
-            try:
-                section = SectionCours.objects.get(id=id_section)
-
-                # Déjà inscrit à ce cours ?
-                if Inscription.objects.filter(
-                    etudiant=etudiant,
-                    section_cours__cours=section.cours,
-                    statut="INSCRIT",
-                ).exists():
-                    messages.warning(
-                        request,
-                        f"L'étudiant est déjà inscrit au cours {section.cours.code}.",
-                    )
-                    nb_erreurs += 1
-                    continue
-
-                # Maximum de cours par session
-                max_cours  = getattr(settings, "MAX_COURS_PAR_SESSION", 7)
-                nb_session = Inscription.objects.filter(
-                    etudiant=etudiant,
-                    section_cours__session=section.session,
-                    section_cours__semestre=section.semestre,
-                    section_cours__annee=section.annee,
-                    statut="INSCRIT",
-                ).count()
-
-                if nb_session >= max_cours:
-                    messages.error(
-                        request,
-                        f"Maximum de {max_cours} cours atteint pour cette session "
-                        f"— {section.cours.code} non inscrit.",
-                    )
-                    nb_erreurs += 1
-                    continue
-
-                # Capacité de la section
-                nb_inscrits = Inscription.objects.filter(
-                    section_cours=section,
-                    statut="INSCRIT",
-                ).count()
-
-                if section.capacite_max and nb_inscrits >= section.capacite_max:
-                    messages.error(
-                        request,
-                        f"La section {section.numero_section} de {section.cours.code} est complète.",
-                    )
-                    nb_erreurs += 1
-                    continue
-
-                # Conflits d'horaire
-                conflit = False
-                inscriptions_meme_jour = Inscription.objects.filter(
-                    etudiant=etudiant,
-                    section_cours__session=section.session,
-                    section_cours__semestre=section.semestre,
-                    section_cours__annee=section.annee,
-                    section_cours__jour_semaine=section.jour_semaine,
-                    statut="INSCRIT",
-                )
+            section = sections.get(int(id_section)) if id_section.isdigit() else None
+            if section is None:
+                messages.error(request, f"Section {id_section} introuvable.")
+                nb_erreurs += 1
+                continue
 
-                for insc in inscriptions_meme_jour:
-                    sect_existante = insc.section_cours
-                    if sect_existante.conflit_horaire(
-                        section.jour_semaine,
-                        section.heure_debut,
-                        section.heure_fin,
-                    ):
-                        messages.error(
-                            request,
-                            f"Conflit d'horaire : {section.cours.code} chevauche "
-                            f"{sect_existante.cours.code}-{sect_existante.numero_section}.",
-                        )
-                        conflit = True
-                        nb_erreurs += 1
-                        break
-
-                if conflit:
-                    continue
-
-                # Création
-                nouvelle_inscription = Inscription(etudiant=etudiant, section_cours=section)
-                nouvelle_inscription.full_clean()
-                nouvelle_inscription.save()
-
-                HistoriqueInscription.objects.create(
-                    inscription=nouvelle_inscription,
-                    statut_precedent="",
-                    nouveau_statut="INSCRIT",
+            try:
+                admettre(
+                    etudiant, section.id,
                     modifie_par=request.user,
                     raison=f"Inscription créée par {request.user.get_full_name()}",
                 )
                 nb_creees += 1
-
-            except SectionCours.DoesNotExist:
-                messages.error(request, f"Section {id_section} introuvable.")
-                nb_erreurs += 1
-
             except ValidationError as e:
-                if hasattr(e, "message_dict"):
-                    for champ, erreurs in e.message_dict.items():
-                        for erreur in erreurs:
-                            messages.error(request, f"{section.cours.code} — {champ} : {erreur}")
-                else:
-                    for msg in e.messages:
-                        messages.error(request, f"{section.cours.code} — {msg}")
-                nb_erreurs += 1
-
-            except Exception as e:
-                messages.error(request, f"Erreur ({section.cours.code}) : {str(e)}")
+                for msg in e.messages:
+                    messages.error(request, f"{section.cours.code} — {msg}")
                 nb_erreurs += 1
 
         if nb_creees > 0:
@@ -603,13 +469,16 @@ def sections_pour_etudiant(request, etudiant_id):
         .order_by("cours__code", "numero_section")
     )
 
-    # Exclure les cours où l'étudiant est déjà inscrit
-    deja_inscrits = Inscription.objects.filter(
-        etudiant=etudiant,
-        statut="INSCRIT",
-    ).values_list("section_cours_id", flat=True)
-
-    sections = sections.exclude(id__in=deja_inscrits)
+    # Sections actuelles de l'étudiant (une requête) : exclues de la liste
+    # et base de la détection des conflits d'horaire
+    actuelles = [
+        i.section_cours for i in Inscription.objects.filter(
+            etudiant=etudiant, statut="INSCRIT",
+        ).select_related("section_cours__cours").order_by()
+    ]
+    sections = list(sections.exclude(id__in=[a.id for a in actuelles]))
+    conflits = detecter_conflits(actuelles, sections)
+    manquants = prerequis_manquants(etudiant, {s.cours_id for s in sections})
 
     cours_data = {}
     for section in sections:
@@ -634,8 +503,11 @@ def sections_pour_etudiant(request, etudiant_id):
             "semestre_raw": section.semestre,
             "annee":        section.annee,
             "salle":        section.salle,
-            "nb_inscrits":  section.nombre_inscrits(),
+            "nb_inscrits":  section.nb_inscrits,
             "capacite_max": section.capacite_max,
+            "est_pleine":   section.est_pleine(),
+            "conflit":      decrire(conflits[section.id]) if section.id in conflits else None,
+            "prerequis_manquants": manquants.get(section.cours_id, []),
         })
 
     return JsonResponse({
@@ -750,18 +622,21 @@ def vue_supprimer_inscription(request, id_inscription):
         code_cours = inscription.section_cours.cours.code
         num_section = inscription.section_cours.numero_section
 
-        HistoriqueInscription.objects.create(
-            inscription=inscription,
-            statut_precedent=inscription.statut,
-            nouveau_statut="SUPPRIME",
+        promues = supprimer_inscription(
+            inscription,
             modifie_par=request.user,
             raison=f"Inscription supprimée par {request.user.get_full_name()}",
         )
-        inscription.delete()
         messages.success(
             request,
             f"Inscription supprimée : {nom_etudiant} - {code_cours}-{num_section}",
         )
+        for promue in promues:
+            messages.info(
+                request,
+                f"{promue.etudiant.utilisateur.get_full_name()} a été inscrit "
+                f"depuis la liste d'attente.",
+            )
         return redirect("inscriptions:liste_inscriptions")
 
     contexte = {"inscription": inscription}
@@ -1,7 +1,11 @@
+import io
+
 from django.contrib import admin
+from django.core.management import call_command
 from django.utils.html import format_html
 from django.db.models import Avg, Count
-from .models import Note, HistoriqueNote, Bulletin
+from .models import Note, HistoriqueNote, Bulletin, NoteDeclaree
+from .services import valider_notes_declarees, rejeter_notes_declarees
 
 @admin.register(Note)
 class AdminNote(admin.ModelAdmin):
@@ -149,7 +153,7 @@ class AdminBulletin(admin.ModelAdmin):
         }),
     )
 
-    actions = ['recalculer_gpa']
+    actions = ['recalculer_gpa', 'regenerer_periodes']
 
     # ------------------#
     # Colonnes personnalisées
@@ -295,7 +299,44 @@ class AdminBulletin(admin.ModelAdmin):
             nombre += 1
         self.message_user(request, f"{nombre} relevé(s) recalculé(s) avec succès.")
 
+    @admin.action(description='Régénérer tous les relevés des périodes sélectionnées')
+    def regenerer_periodes(self, request, queryset):
+        periodes = queryset.order_by().values_list('annee', 'semestre').distinct()
+        for annee, semestre in periodes:
+            sortie = io.StringIO()
+            call_command('generer_bulletins', annee=annee, semestre=semestre, stdout=sortie)
+            self.message_user(request, sortie.getvalue().strip())
+
     def save_model(self, request, obj, form, change):
         """Recalcule le GPA automatiquement à chaque sauvegarde admin"""
         obj.calculer_gpa()
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+@admin.register(NoteDeclaree)
+class AdminNoteDeclaree(admin.ModelAdmin):
+    list_display = ['inscription', 'note_declaree', 'statut', 'declare_le', 'valide_par']
+    list_filter = ['statut', 'inscription__section_cours__semestre', 'inscription__section_cours__annee']
+    search_fields = [
+        'inscription__etudiant__numero_etudiant',
+        'inscription__section_cours__cours__code',
+    ]
+    raw_id_fields = ['inscription', 'valide_par']
+    readonly_fields = ['declare_le', 'modifie_le']
+    ordering = ['-declare_le']
+    list_per_page = 50
+
+    actions = ['valider_selection', 'rejeter_selection']
+
+    # ------------------#
+    # Actions
+    # ------------------#
+
+    @admin.action(description='✅ Valider les notes déclarées sélectionnées')
+    def valider_selection(self, request, queryset):
+        validees = valider_notes_declarees(list(queryset.values_list('id', flat=True)), request.user)
+        self.message_user(request, f"{len(validees)} note(s) validée(s).")
+
+    @admin.action(description='❌ Rejeter les notes déclarées sélectionnées')
+    def rejeter_selection(self, request, queryset):
+        nombre = rejeter_notes_declarees(list(queryset.values_list('id', flat=True)), request.user)
+        self.message_user(request, f"{nombre} note(s) rejetée(s).")
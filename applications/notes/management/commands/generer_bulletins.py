@@ -0,0 +1,59 @@
+"""
+Commande de génération des bulletins d'une période.
+
+Les statistiques de tous les étudiants sont calculées par une requête
+groupée, puis les bulletins sont créés ou mis à jour par lots.
+
+Usage :
+    python manage.py generer_bulletins --annee 2026 --semestre AUTOMNE
+    python manage.py generer_bulletins --annee 2026 --semestre AUTOMNE --departement PSY
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.cours.models import SectionCours
+from applications.departements.models import Departement
+from applications.notes.services import generer_bulletins
+
+
+class Command(BaseCommand):
+    help = "Génère (ou régénère) les bulletins de tous les étudiants pour un semestre donné."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--annee", type=int, required=True, help="Année académique (ex. 2026)")
+        parser.add_argument(
+            "--semestre", required=True,
+            choices=[code for code, _ in SectionCours.CHOIX_SEMESTRE],
+            help="Semestre (AUTOMNE, PRINTEMPS, ETE)",
+        )
+        parser.add_argument(
+            "--departement", default=None,
+            help="Code du département (ex. PSY) ; par défaut tous les départements",
+        )
+        parser.add_argument(
+            "--taille-lot", type=int, default=500,
+            help="Nombre de bulletins écrits par requête (défaut : 500)",
+        )
+
+    def handle(self, *args, **options):
+        departement = None
+        if options["departement"]:
+            try:
+                departement = Departement.objects.get(code=options["departement"])
+            except Departement.DoesNotExist:
+                raise CommandError(f"Département introuvable : {options['departement']}")
+
+        debut = time.monotonic()
+        nombre = generer_bulletins(
+            options["annee"], options["semestre"],
+            departement=departement, taille_lot=options["taille_lot"],
+        )
+        duree = time.monotonic() - debut
+
+        perimetre = departement.code if departement else "tous départements"
+        self.stdout.write(self.style.SUCCESS(
+            f"{nombre} bulletin(s) générés pour {options['semestre']} {options['annee']} "
+            f"({perimetre}) en {duree:.2f} s."
+        ))
@@ -1,4 +1,7 @@
+from decimal import Decimal
+
 from django.db import models
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from applications.inscriptions.models import Inscription
 
@@ -76,6 +79,20 @@ class Note(models.Model):
     cree_le    = models.DateTimeField('Date de création',     auto_now_add=True)
     modifie_le = models.DateTimeField('Date de modification', auto_now=True)
     est_lu = models.BooleanField("Vue par l'étudiant", default=False)
+
+    # Champs dont les modifications sont suivies (notifications, historique)
+    COMPOSANTES = (
+        'examen_mi_parcours',
+        'examen_final',
+        'travaux',
+        'participation',
+        'projet',
+    )
+    CHAMPS_SUIVIS = COMPOSANTES + ('note_finale', 'mention')
+
+    # Note finale minimale pour obtenir les crédits du cours
+    SEUIL_REUSSITE = 60
+
     class Meta:
         verbose_name        = 'Note'
         verbose_name_plural = 'Notes'
@@ -88,6 +105,52 @@ class Note(models.Model):
             f"{self.note_finale or 'Non noté'}"
         )
 
+    # ── Suivi des modifications ──────────────────────────────────────────────
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Mémorise l'état chargé pour détecter les changements sans second SELECT"""
+        instance = super().from_db(db, field_names, values)
+        instance.memoriser_etat()
+        return instance
+
+    def memoriser_etat(self):
+        """Prend l'état courant des champs suivis comme nouvelle référence"""
+        differes = self.get_deferred_fields()
+        self._valeurs_chargees = {
+            champ: getattr(self, champ)
+            for champ in self.CHAMPS_SUIVIS
+            if champ not in differes
+        }
+
+    def _normaliser(self, champ, valeur):
+        # Les vues affectent des float : on les ramène au type du champ
+        # (Decimal) pour que 85.5 et Decimal('85.50') soient jugés égaux.
+        try:
+            return self._meta.get_field(champ).to_python(valeur)
+        except ValidationError:
+            return valeur
+
+    def champs_modifies(self, champs=None):
+        """
+        Retourne {champ: {'ancienne': ..., 'nouvelle': ...}} pour chaque champ
+        suivi dont la valeur diffère de l'état chargé depuis la base.
+        Une note jamais enregistrée est comparée à des valeurs vides.
+        """
+        chargees = getattr(self, '_valeurs_chargees', None)
+        if chargees is None:
+            chargees = dict.fromkeys(self.CHAMPS_SUIVIS)
+
+        changements = {}
+        for champ in champs or self.CHAMPS_SUIVIS:
+            if champ not in chargees:
+                continue
+            ancienne = chargees[champ]
+            nouvelle = getattr(self, champ)
+            if self._normaliser(champ, ancienne) != self._normaliser(champ, nouvelle):
+                changements[champ] = {'ancienne': ancienne, 'nouvelle': nouvelle}
+        return changements
+
 
     @property
     def classe_mention(self):
@@ -137,11 +200,14 @@ class Note(models.Model):
     def est_recu(self):
         if self.note_finale is None:
             return None
-        return float(self.note_finale) >= 60
+        return float(self.note_finale) >= self.SEUIL_REUSSITE
 
     def save(self, *args, **kwargs):
         self.calculer_note_finale()
         super().save(*args, **kwargs)
+        # Les receveurs post_save ont lu champs_modifies() : l'état
+        # enregistré devient la nouvelle référence.
+        self.memoriser_etat()
         if self.note_finale is not None and self.inscription.statut == 'INSCRIT':
             Inscription.objects.filter(pk=self.inscription.pk).update(statut='COMPLETE')
 
@@ -215,31 +281,45 @@ class Bulletin(models.Model):
     def __str__(self):
         return f"{self.etudiant.numero_etudiant} - {self.semestre} {self.annee}"
 
+    STATUTS_COMPTABILISES = ['INSCRIT', 'COMPLETE']
+
+    @staticmethod
+    def agreger_par_etudiant(inscriptions):
+        """
+        Agrège les notes d'un ensemble d'inscriptions en une requête groupée.
+
+        Retourne un queryset de dicts {etudiant_id, moyenne, cours_notes, cours_reussis}.
+        """
+        return (
+            inscriptions
+            .order_by()
+            .values('etudiant_id')
+            .annotate(
+                moyenne=models.Avg('note__note_finale'),
+                cours_notes=models.Count('note__note_finale'),
+                cours_reussis=models.Count(
+                    'note', filter=models.Q(note__note_finale__gte=Note.SEUIL_REUSSITE)
+                ),
+            )
+        )
+
+    def appliquer_statistiques(self, stats):
+        """Reporte sur le bulletin le résultat de agreger_par_etudiant()"""
+        self.credits_tentes  = stats['cours_notes'] if stats else 0
+        self.credits_obtenus = stats['cours_reussis'] if stats else 0
+        moyenne = stats['moyenne'] if stats else None
+        self.gpa = round(Decimal(moyenne), 2) if moyenne is not None else None
+
     def calculer_gpa(self):
         """Calcule la moyenne générale haïtienne sur 100 pour ce semestre"""
-        inscriptions = self.etudiant.inscriptions.filter(
+        inscriptions = Inscription.objects.filter(
+            etudiant_id=self.etudiant_id,
             section_cours__semestre=self.semestre,
             section_cours__annee=self.annee,
-            statut__in=['INSCRIT', 'COMPLETE']
+            statut__in=self.STATUTS_COMPTABILISES,
         )
-
-        total_notes = 0
-        total_cours = 0
-
-        for inscription in inscriptions:
-            try:
-                note = inscription.note
-                if note.note_finale is not None:
-                    total_notes += float(note.note_finale)
-                    total_cours += 1
-
-                    if note.est_recu():
-                        self.credits_obtenus += 1
-            except Note.DoesNotExist:
-                pass
-
-        self.credits_tentes = total_cours
-        self.gpa = round(total_notes / total_cours, 2) if total_cours > 0 else None
+        stats = next(iter(self.agreger_par_etudiant(inscriptions)), None)
+        self.appliquer_statistiques(stats)
         return self.gpa
     
     
@@ -0,0 +1,519 @@
+"""
+Traitements groupés sur les notes.
+
+Ces fonctions sont partagées par les vues, l'administration Django et les
+commandes de gestion : elles travaillent sur des lots et limitent le nombre
+de requêtes, indépendamment du nombre de lignes traitées.
+"""
+
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from applications.inscriptions.models import Inscription
+from applications.notifications.models import Notification
+from applications.notifications.utils import contenu_notification_note, envoyer_emails_notes
+from utilitaires.importation import completer_pks
+from utilitaires.tableur import ErreurTableur, ecrire_xlsx, est_xlsx, lire_xlsx
+from .models import Bulletin, HistoriqueNote, Note, NoteDeclaree
+
+
+# ===========================================================================
+# VALIDATION DES NOTES DÉCLARÉES
+# ===========================================================================
+
+
+def valider_notes_declarees(ids_declarations, utilisateur):
+    """
+    Valide en une transaction les déclarations EN_ATTENTE données.
+
+    - les Note manquantes sont créées par un seul bulk_create,
+    - les Note existantes reçoivent la note déclarée par un seul bulk_update,
+    - les statuts des déclarations passent à VALIDEE par un seul UPDATE.
+
+    Retourne la liste des déclarations validées.
+    """
+    with transaction.atomic():
+        declarations = list(
+            NoteDeclaree.objects.select_for_update()
+            .filter(id__in=ids_declarations, statut="EN_ATTENTE")
+            .select_related("inscription__etudiant", "inscription__section_cours__cours")
+        )
+        if not declarations:
+            return []
+
+        ids_inscriptions = [d.inscription_id for d in declarations]
+        notes_existantes = {
+            n.inscription_id: n
+            for n in Note.objects.filter(inscription_id__in=ids_inscriptions)
+        }
+
+        a_creer, a_modifier = [], []
+        for declaration in declarations:
+            valeur = declaration.note_declaree
+            mention = Note.obtenir_mention(float(valeur))
+            note = notes_existantes.get(declaration.inscription_id)
+            if note is None:
+                a_creer.append(Note(
+                    inscription_id=declaration.inscription_id,
+                    note_finale=valeur,
+                    mention=mention,
+                ))
+            else:
+                note.note_finale = valeur
+                note.mention = mention
+                note.modifie_le = timezone.now()
+                a_modifier.append(note)
+
+        # bulk_* ne passe pas par Note.save() : calculer_note_finale() ne
+        # vient pas écraser la note validée par une moyenne des composantes.
+        Note.objects.bulk_create(a_creer)
+        Note.objects.bulk_update(a_modifier, ["note_finale", "mention", "modifie_le"])
+
+        NoteDeclaree.objects.filter(id__in=[d.id for d in declarations]).update(
+            statut="VALIDEE",
+            valide_par=utilisateur,
+            modifie_le=timezone.now(),
+        )
+        Inscription.objects.filter(id__in=ids_inscriptions, statut="INSCRIT").update(
+            statut="COMPLETE"
+        )
+
+        Notification.objects.bulk_create([
+            Notification(
+                utilisateur_id=d.inscription.etudiant.utilisateur_id,
+                type_notification="note_publiee",
+                titre=f"Votre note en {d.inscription.section_cours.cours.nom} a été validée",
+                message=(
+                    f"La note déclarée de {d.note_declaree}/100 pour le cours "
+                    f"{d.inscription.section_cours.cours.code} a été validée."
+                ),
+                lien="/notes/",
+            )
+            for d in declarations
+        ])
+
+    for declaration in declarations:
+        declaration.statut = "VALIDEE"
+        declaration.valide_par = utilisateur
+    return declarations
+
+
+def rejeter_notes_declarees(ids_declarations, utilisateur, commentaire=""):
+    """Rejette les déclarations EN_ATTENTE données par un seul UPDATE. Retourne le nombre rejeté."""
+    return NoteDeclaree.objects.filter(
+        id__in=ids_declarations, statut="EN_ATTENTE"
+    ).update(
+        statut="REJETEE",
+        valide_par=utilisateur,
+        commentaire_admin=commentaire,
+        modifie_le=timezone.now(),
+    )
+
+
+# ===========================================================================
+# RAPPROCHEMENT AVEC LA FEUILLE DE NOTES DU PROFESSEUR
+# ===========================================================================
+
+COLONNES_MATRICULE = ("numero_etudiant", "matricule")
+COLONNES_NOTE      = ("note_finale", "note")
+
+
+class ErreurFeuilleNotes(ValueError):
+    """Feuille de notes illisible (colonnes manquantes, encodage…)"""
+
+
+def _decoder_csv(contenu):
+    """(texte, dialecte) d'un CSV en UTF-8, séparateur , ; ou tabulation"""
+    if isinstance(contenu, bytes):
+        try:
+            contenu = contenu.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise ErreurFeuilleNotes("Le fichier doit être encodé en UTF-8.")
+
+    echantillon = contenu[:2048]
+    try:
+        dialecte = csv.Sniffer().sniff(echantillon, delimiters=",;\t")
+    except csv.Error:
+        dialecte = csv.excel
+    return contenu, dialecte
+
+
+def lire_feuille_notes(fichier):
+    """
+    Lit une feuille de notes CSV (numero_etudiant/matricule, note/note_finale).
+
+    Retourne ({matricule: Decimal}, [messages d'erreur par ligne]).
+    """
+    contenu, dialecte = _decoder_csv(fichier.read())
+    lecteur = csv.DictReader(io.StringIO(contenu), dialect=dialecte)
+
+    entetes = {(e or "").strip().lower() for e in (lecteur.fieldnames or [])}
+    col_matricule = next((c for c in COLONNES_MATRICULE if c in entetes), None)
+    col_note      = next((c for c in COLONNES_NOTE if c in entetes), None)
+    if not col_matricule or not col_note:
+        raise ErreurFeuilleNotes(
+            "Colonnes attendues : numero_etudiant (ou matricule) et note (ou note_finale)."
+        )
+
+    notes, erreurs = {}, []
+    for num_ligne, ligne in enumerate(lecteur, start=2):
+        ligne = {(k or "").strip().lower(): (v or "").strip() for k, v in ligne.items()}
+        matricule = ligne.get(col_matricule, "")
+        try:
+            valeur = lire_composante(ligne.get(col_note, ""))
+        except ValueError as e:
+            erreurs.append(f"Ligne {num_ligne} : note {e}.")
+            continue
+        if not matricule or valeur is None:
+            continue
+        notes[matricule.upper()] = valeur
+    return notes, erreurs
+
+
+def rapprocher_notes_declarees(section, notes_feuille, utilisateur, appliquer=True):
+    """
+    Compare les déclarations EN_ATTENTE d'une section à la feuille du professeur.
+
+    - note identique            → validée,
+    - note différente           → rejetée, avec la note du professeur en commentaire,
+    - étudiant absent du fichier → laissée en attente.
+
+    Avec appliquer=False, seul le rapport est calculé.
+    """
+    declarations = (
+        NoteDeclaree.objects.filter(
+            inscription__section_cours=section, statut="EN_ATTENTE"
+        )
+        .select_related("inscription__etudiant__utilisateur")
+        .order_by("inscription__etudiant__numero_etudiant")
+    )
+
+    rapport = {"concordantes": [], "divergentes": [], "absentes": []}
+    for declaration in declarations:
+        matricule = declaration.inscription.etudiant.numero_etudiant.upper()
+        note_prof = notes_feuille.get(matricule)
+        ligne = {"declaration": declaration, "note_professeur": note_prof}
+        if note_prof is None:
+            rapport["absentes"].append(ligne)
+        elif note_prof == declaration.note_declaree.quantize(Decimal("0.01")):
+            rapport["concordantes"].append(ligne)
+        else:
+            rapport["divergentes"].append(ligne)
+
+    if appliquer:
+        with transaction.atomic():
+            valider_notes_declarees(
+                [l["declaration"].id for l in rapport["concordantes"]], utilisateur
+            )
+            # Un UPDATE par valeur distincte de la feuille (commentaire différent)
+            par_note = {}
+            for l in rapport["divergentes"]:
+                par_note.setdefault(l["note_professeur"], []).append(l["declaration"].id)
+            for note_prof, ids in par_note.items():
+                rejeter_notes_declarees(
+                    ids, utilisateur,
+                    commentaire=f"Ne correspond pas à la feuille du professeur ({note_prof}/100).",
+                )
+
+    return rapport
+
+
+# ===========================================================================
+# FEUILLE DE NOTES D'UNE SECTION (SAISIE HORS LIGNE)
+# ===========================================================================
+# Le professeur télécharge le modèle de sa section (CSV ou XLSX), le remplit
+# hors ligne puis le renvoie : le fichier entier est contrôlé, les écarts
+# avec les notes enregistrées sont présentés, puis appliqués en une
+# transaction. Une cellule vide laisse la composante inchangée.
+
+COLONNES_FEUILLE = ("inscription", "numero_etudiant", "nom") + Note.COMPOSANTES
+RAISON_IMPORT_FEUILLE = "Import de la feuille de notes"
+
+
+def _inscriptions_feuille(section):
+    return (
+        section.inscriptions
+        .filter(statut__in=Inscription.STATUTS_ACTIFS)
+        .select_related("etudiant__utilisateur", "note")
+        .order_by("etudiant__numero_etudiant")
+    )
+
+
+def _note_existante(inscription):
+    try:
+        return inscription.note
+    except Note.DoesNotExist:
+        return None
+
+
+def lignes_feuille_section(section):
+    """En-tête puis une ligne par inscription active, composantes actuelles pré-remplies"""
+    lignes = [list(COLONNES_FEUILLE)]
+    for inscription in _inscriptions_feuille(section):
+        note = _note_existante(inscription)
+        lignes.append([
+            inscription.id,
+            inscription.etudiant.numero_etudiant,
+            inscription.etudiant.utilisateur.get_full_name(),
+            *(getattr(note, c) if note else None for c in Note.COMPOSANTES),
+        ])
+    return lignes
+
+
+def exporter_feuille_csv(section):
+    tampon = io.StringIO()
+    tampon.write("\ufeff")  # BOM pour Excel
+    writer = csv.writer(tampon)
+    for ligne in lignes_feuille_section(section):
+        writer.writerow("" if v is None else v for v in ligne)
+    return tampon.getvalue()
+
+
+def exporter_feuille_xlsx(section):
+    titre = f"{section.cours.code} {section.numero_section}"
+    return ecrire_xlsx(lignes_feuille_section(section), titre=titre)
+
+
+def _lignes_fichier(fichier):
+    contenu = fichier.read()
+    if isinstance(contenu, bytes) and est_xlsx(contenu):
+        try:
+            return lire_xlsx(contenu)
+        except ErreurTableur as e:
+            raise ErreurFeuilleNotes(str(e))
+    contenu, dialecte = _decoder_csv(contenu)
+    return list(csv.reader(io.StringIO(contenu), dialect=dialecte))
+
+
+def lire_composante(brute):
+    """Decimal arrondi au centième, None si la cellule est vide ; ValueError si invalide"""
+    brute = brute.replace(",", ".")
+    if not brute:
+        return None
+    try:
+        valeur = Decimal(brute).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"invalide « {brute} »")
+    if not (valeur.is_finite() and 0 <= valeur <= 100):
+        raise ValueError(f"hors limites ({brute})")
+    return valeur
+
+
+def lire_feuille_section(fichier, section):
+    """
+    Lit une feuille de notes remplie (CSV ou XLSX, colonnes du modèle exporté)
+    et la compare aux notes enregistrées de la section.
+
+    Retourne (modifications, erreurs) : une modification par inscription dont
+    au moins une composante change — {inscription, note (ou None), valeurs:
+    {composante: (ancienne, nouvelle)}, note_finale: (ancienne, nouvelle)} —
+    et les messages d'erreur par ligne. Les lignes en erreur sont écartées
+    des modifications.
+    """
+    lignes = _lignes_fichier(fichier)
+    entetes = [(e or "").strip().lower() for e in (lignes[0] if lignes else [])]
+    if "inscription" not in entetes or not set(Note.COMPOSANTES) & set(entetes):
+        raise ErreurFeuilleNotes(
+            "Colonnes attendues : inscription et au moins une composante "
+            f"({', '.join(Note.COMPOSANTES)}). Partez du modèle téléchargé."
+        )
+    positions = {nom: i for i, nom in enumerate(entetes) if nom}
+
+    inscriptions = {i.id: i for i in _inscriptions_feuille(section)}
+    modifications, erreurs, vues = [], [], set()
+    for num_ligne, ligne in enumerate(lignes[1:], start=2):
+        cellules = {
+            nom: (ligne[i] or "").strip() if i < len(ligne) else ""
+            for nom, i in positions.items()
+        }
+        if not any(cellules.values()):
+            continue
+
+        brut = cellules["inscription"]
+        try:
+            inscription = inscriptions.get(int(Decimal(brut)))
+        except (InvalidOperation, ValueError):
+            inscription = None
+        if inscription is None:
+            erreurs.append(f"Ligne {num_ligne} : inscription « {brut} » inconnue dans cette section.")
+            continue
+        if inscription.id in vues:
+            erreurs.append(f"Ligne {num_ligne} : inscription {inscription.id} en double.")
+            continue
+        vues.add(inscription.id)
+
+        matricule = inscription.etudiant.numero_etudiant
+        if cellules.get("numero_etudiant") and cellules["numero_etudiant"].upper() != matricule.upper():
+            erreurs.append(
+                f"Ligne {num_ligne} : le matricule « {cellules['numero_etudiant']} » "
+                f"ne correspond pas à l'inscription {inscription.id} ({matricule})."
+            )
+            continue
+
+        note = _note_existante(inscription)
+        valeurs, valide = {}, True
+        for composante in Note.COMPOSANTES:
+            try:
+                valeur = lire_composante(cellules.get(composante, ""))
+            except ValueError as e:
+                erreurs.append(f"Ligne {num_ligne} : {composante} {e}.")
+                valide = False
+                continue
+            ancienne = getattr(note, composante) if note else None
+            if valeur is not None and valeur != ancienne:
+                valeurs[composante] = (ancienne, valeur)
+        if not valide or not valeurs:
+            continue
+
+        # Note finale obtenue, calculée sur une copie : la note chargée reste intacte
+        apercu = Note(**{c: getattr(note, c) if note else None for c in Note.COMPOSANTES})
+        for composante, (_, valeur) in valeurs.items():
+            setattr(apercu, composante, valeur)
+        modifications.append({
+            "inscription": inscription,
+            "note": note,
+            "valeurs": valeurs,
+            "note_finale": (note.note_finale if note else None, apercu.calculer_note_finale()),
+        })
+    return modifications, erreurs
+
+
+def appliquer_feuille_section(section, valeurs, note_par, raison=RAISON_IMPORT_FEUILLE):
+    """
+    Enregistre {id d'inscription: {composante: Decimal}} en une transaction :
+
+    - les Note existantes sont verrouillées puis modifiées par un seul bulk_update,
+    - les Note manquantes sont créées par un seul bulk_create,
+    - chaque composante modifiée donne un HistoriqueNote (un seul bulk_create),
+    - les inscriptions notées passent à COMPLETE et les étudiants sont
+      notifiés (Notification en bloc, puis email après la validation de la
+      transaction, comme pour une note saisie champ par champ).
+
+    Les écritures en bloc ne passent ni par Note.save() ni par les signaux :
+    la note finale est calculée ici. Les inscriptions qui ne sont plus
+    actives dans la section sont ignorées. Retourne les notes modifiées.
+    """
+    with transaction.atomic():
+        inscriptions = {
+            i.id: i
+            for i in Inscription.objects.filter(
+                section_cours=section, statut__in=Inscription.STATUTS_ACTIFS, id__in=list(valeurs),
+            ).select_related("etudiant__utilisateur", "section_cours__cours")
+        }
+        notes = {
+            n.inscription_id: n
+            for n in Note.objects.select_for_update().filter(inscription_id__in=list(inscriptions))
+        }
+
+        a_creer, a_modifier, modifiees = [], [], []
+        maintenant = timezone.now()
+        for id_inscription, composantes in valeurs.items():
+            inscription = inscriptions.get(id_inscription)
+            if inscription is None:
+                continue
+            note = notes.get(id_inscription)
+            nouvelle = note is None
+            if nouvelle:
+                note = Note(inscription=inscription)
+            else:
+                note.inscription = inscription
+            for composante, valeur in composantes.items():
+                setattr(note, composante, valeur)
+            note.calculer_note_finale()
+            changements = note.champs_modifies()
+            if not changements:
+                continue
+            note.note_par = note_par
+            note.modifie_le = maintenant
+            (a_creer if nouvelle else a_modifier).append(note)
+            modifiees.append((note, changements, nouvelle))
+
+        Note.objects.bulk_create(a_creer)
+        completer_pks(Note, a_creer, "inscription_id")
+        Note.objects.bulk_update(
+            a_modifier, [*Note.COMPOSANTES, "note_finale", "mention", "note_par", "modifie_le"],
+        )
+
+        HistoriqueNote.objects.bulk_create(
+            HistoriqueNote(
+                note=note,
+                composante=composante,
+                ancienne_valeur=changement["ancienne"],
+                nouvelle_valeur=changement["nouvelle"],
+                modifie_par=note_par,
+                raison=raison,
+            )
+            for note, changements, _ in modifiees
+            for composante, changement in changements.items()
+            if composante in Note.COMPOSANTES
+        )
+        Inscription.objects.filter(
+            id__in=[note.inscription_id for note, _, _ in modifiees if note.note_finale is not None],
+            statut="INSCRIT",
+        ).update(statut="COMPLETE")
+
+        notifications, emails = [], []
+        for note, changements, nouvelle in modifiees:
+            anciennes_valeurs = None if nouvelle else changements
+            type_notification, titre, message = contenu_notification_note(note, anciennes_valeurs)
+            emails.append((note, titre, anciennes_valeurs))
+            notifications.append(Notification(
+                utilisateur_id=note.inscription.etudiant.utilisateur_id,
+                type_notification=type_notification,
+                titre=titre,
+                message=message,
+                lien="/notes/",
+            ))
+        Notification.objects.bulk_create(notifications)
+        # Emails envoyés seulement si les notes sont bien enregistrées
+        transaction.on_commit(lambda: envoyer_emails_notes(emails))
+
+    for note, _, _ in modifiees:
+        note.memoriser_etat()
+    return [note for note, _, _ in modifiees]
+
+
+# ===========================================================================
+# GÉNÉRATION DES BULLETINS
+# ===========================================================================
+
+
+def generer_bulletins(annee, semestre, departement=None, taille_lot=500):
+    """
+    Calcule et enregistre les bulletins de tous les étudiants d'une période.
+
+    Une requête groupée fournit les statistiques de chaque étudiant, puis les
+    bulletins sont insérés ou mis à jour par lots (bulk_create avec
+    update_conflicts). Retourne le nombre de bulletins écrits.
+    """
+    inscriptions = Inscription.objects.filter(
+        section_cours__annee=annee,
+        section_cours__semestre=semestre,
+        statut__in=Bulletin.STATUTS_COMPTABILISES,
+    )
+    if departement is not None:
+        inscriptions = inscriptions.filter(etudiant__departement=departement)
+
+    bulletins = []
+    for stats in Bulletin.agreger_par_etudiant(inscriptions).iterator():
+        bulletin = Bulletin(etudiant_id=stats['etudiant_id'], semestre=semestre, annee=annee)
+        bulletin.appliquer_statistiques(stats)
+        bulletins.append(bulletin)
+
+    # MySQL ne supporte pas la cible ON CONFLICT : il s'appuie sur unique_together
+    cible = (
+        {'unique_fields': ['etudiant', 'semestre', 'annee']}
+        if connection.features.supports_update_conflicts_with_target else {}
+    )
+    Bulletin.objects.bulk_create(
+        bulletins,
+        batch_size=taille_lot,
+        update_conflicts=True,
+        update_fields=['gpa', 'credits_tentes', 'credits_obtenus', 'genere_le'],
+        **cible,
+    )
+    return len(bulletins)
@@ -1,3 +1,381 @@
+import io
+from datetime import time
+from decimal import Decimal
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from applications.comptes.models import Utilisateur
+from applications.cours.models import Cours, SectionCours
+from applications.inscriptions.models import Inscription
+from applications.notifications.models import Notification
+from utilitaires.tableur import ecrire_xlsx, lire_xlsx
+from .models import Bulletin, HistoriqueNote, Note, NoteDeclaree
+from .services import (
+    COLONNES_FEUILLE, RAISON_IMPORT_FEUILLE, lire_feuille_notes, lire_feuille_section,
+    rapprocher_notes_declarees, rejeter_notes_declarees, valider_notes_declarees,
+)
+
+
+class DonneesNotesMixin:
+    """Étudiant inscrit à une section, prêt à être noté"""
+
+    def setUp(self):
+        self.utilisateur = Utilisateur.objects.create_user(
+            email="etudiant@example.com",
+            password="motdepasse123",
+            first_name="Etu",
+            last_name="Diant",
+            role="ETUDIANT",
+        )
+        self.etudiant = self.utilisateur.profil_etudiant
+        self.cours = Cours.objects.create(
+            code="PSY101", nom="Introduction", credits=3, niveau="NIVEAU1",
+        )
+        self.section = SectionCours.objects.create(
+            cours=self.cours,
+            numero_section="01",
+            jour_semaine="LUNDI",
+            heure_debut=time(8, 0),
+            heure_fin=time(10, 0),
+            session="SESSION_1",
+            semestre="AUTOMNE",
+            annee=2026,
+        )
+        self.inscription = Inscription.objects.create(
+            etudiant=self.etudiant, section_cours=self.section,
+        )
+
+
+class SuiviModificationsNoteTest(DonneesNotesMixin, TestCase):
+    """Tests du suivi des champs modifiés sur Note"""
+
+    def test_note_chargee_sans_modification(self):
+        Note.objects.create(inscription=self.inscription, examen_final=80)
+        note = Note.objects.get(inscription=self.inscription)
+        note.examen_final = 80.0
+        self.assertEqual(note.champs_modifies(), {})
+
+    def test_champs_modifies_apres_chargement(self):
+        Note.objects.create(inscription=self.inscription, examen_final=80)
+        note = Note.objects.get(inscription=self.inscription)
+        note.examen_final = 85.5
+        changements = note.champs_modifies(Note.COMPOSANTES)
+        self.assertEqual(list(changements), ["examen_final"])
+        self.assertEqual(changements["examen_final"]["ancienne"], Decimal("80.00"))
+
+    def test_sauvegarde_sans_relecture(self):
+        Note.objects.create(inscription=self.inscription, examen_final=80)
+        note = Note.objects.select_related("inscription__etudiant__utilisateur",
+                                           "inscription__section_cours__cours").get()
+        note.examen_final = 90
+        # UPDATE de la note + INSERT de la notification, aucun SELECT de la note
+        with self.assertNumQueries(2):
+            note.save()
+
+    def test_notification_modification(self):
+        note = Note.objects.create(inscription=self.inscription, examen_final=80)
+        note = Note.objects.get(pk=note.pk)
+        note.examen_final = 50
+        note.save()
+        derniere = Notification.objects.filter(utilisateur=self.utilisateur).first()
+        self.assertEqual(derniere.type_notification, "note_modifiee")
+        self.assertIn("Examen final", derniere.message)
+        # L'état enregistré devient la nouvelle référence
+        self.assertEqual(note.champs_modifies(), {})
+
+    def test_instance_construite_avec_pk(self):
+        note = Note.objects.create(inscription=self.inscription, examen_final=80)
+        copie = Note(pk=note.pk, inscription=self.inscription, examen_final=70,
+                     cree_le=note.cree_le)
+        copie.save()
+        derniere = Notification.objects.filter(utilisateur=self.utilisateur).first()
+        self.assertEqual(derniere.type_notification, "note_modifiee")
+
+
+class ValidationGroupeeNotesDeclareesTest(DonneesNotesMixin, TestCase):
+    """Tests de la validation groupée et du rapprochement des notes déclarées"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = Utilisateur.objects.create_user(
+            email="admin@example.com", password="motdepasse123",
+            first_name="Ad", last_name="Min", role="ADMIN",
+            doit_changer_mot_de_passe=False,
+        )
+        self.declarations = [
+            NoteDeclaree.objects.create(inscription=self.inscription, note_declaree=Decimal("85"))
+        ]
+        for i in range(2):
+            utilisateur = Utilisateur.objects.create_user(
+                email=f"etudiant{i}@example.com", password="motdepasse123",
+                first_name="Etu", last_name=f"Diant{i}", role="ETUDIANT",
+            )
+            inscription = Inscription.objects.create(
+                etudiant=utilisateur.profil_etudiant, section_cours=self.section,
+            )
+            self.declarations.append(
+                NoteDeclaree.objects.create(inscription=inscription, note_declaree=Decimal("55"))
+            )
+        # Une des inscriptions a déjà une Note (sans note finale)
+        Note.objects.create(inscription=self.inscription)
+
+    def _ids(self):
+        return [d.id for d in self.declarations]
+
+    def test_validation_cree_et_met_a_jour_les_notes(self):
+        validees = valider_notes_declarees(self._ids(), self.admin)
+        self.assertEqual(len(validees), 3)
+        self.assertEqual(Note.objects.count(), 3)
+        note = Note.objects.get(inscription=self.inscription)
+        self.assertEqual(note.note_finale, Decimal("85.00"))
+        self.assertEqual(note.mention, "Très bien")
+        self.assertFalse(NoteDeclaree.objects.exclude(statut="VALIDEE").exists())
+        self.assertFalse(Inscription.objects.filter(statut="INSCRIT").exists())
+
+    def test_nombre_de_requetes_independant_du_lot(self):
+        with CaptureQueriesContext(connection) as une:
+            valider_notes_declarees(self._ids()[:1], self.admin)
+        NoteDeclaree.objects.update(statut="EN_ATTENTE")
+        with CaptureQueriesContext(connection) as lot:
+            valider_notes_declarees(self._ids()[1:], self.admin)
+        self.assertEqual(len(une), len(lot))
+
+    def test_declarations_deja_traitees_ignorees(self):
+        rejeter_notes_declarees(self._ids()[:1], self.admin, "Justificatif manquant")
+        validees = valider_notes_declarees(self._ids(), self.admin)
+        self.assertEqual(len(validees), 2)
+        rejetee = NoteDeclaree.objects.get(pk=self.declarations[0].pk)
+        self.assertEqual(rejetee.statut, "REJETEE")
+        self.assertEqual(rejetee.commentaire_admin, "Justificatif manquant")
+
+    def test_rapprochement_avec_feuille(self):
+        matricules = [d.inscription.etudiant.numero_etudiant for d in self.declarations]
+        fichier = io.BytesIO(
+            f"numero_etudiant;note\n{matricules[0]};85,00\n{matricules[1]};70\n".encode()
+        )
+        notes_feuille, erreurs = lire_feuille_notes(fichier)
+        self.assertEqual(erreurs, [])
+
+        rapport = rapprocher_notes_declarees(self.section, notes_feuille, self.admin)
+        self.assertEqual(len(rapport["concordantes"]), 1)
+        self.assertEqual(len(rapport["divergentes"]), 1)
+        self.assertEqual(len(rapport["absentes"]), 1)
+
+        statuts = dict(NoteDeclaree.objects.values_list("id", "statut"))
+        self.assertEqual(statuts[self.declarations[0].id], "VALIDEE")
+        self.assertEqual(statuts[self.declarations[1].id], "REJETEE")
+        self.assertEqual(statuts[self.declarations[2].id], "EN_ATTENTE")
+
+    def test_confirmation_falsifiee_refusee(self):
+        self.client.force_login(self.admin)
+        matricule = self.declarations[0].inscription.etudiant.numero_etudiant
+        url = reverse("notes:rapprocher_notes_declarees")
+        for valeurs in (["abc"], [""], ["NaN"], ["150"], ["85", "70"]):
+            with self.subTest(valeurs=valeurs):
+                reponse = self.client.post(url, {
+                    "section": self.section.id, "appliquer": "1",
+                    "matricules": [matricule], "valeurs": valeurs,
+                }, follow=True)
+                self.assertContains(reponse, "Notes de la feuille invalides")
+        self.assertFalse(NoteDeclaree.objects.exclude(statut="EN_ATTENTE").exists())
+
+        _, erreurs = lire_feuille_notes(io.BytesIO(f"numero_etudiant;note\n{matricule};NaN\n".encode()))
+        self.assertEqual(erreurs, ["Ligne 2 : note hors limites (NaN)."])
+
+    def test_vue_validation_selection(self):
+        self.client.force_login(self.admin)
+        reponse = self.client.post(
+            reverse("notes:valider_notes_declarees"),
+            {"action": "valider", "note_ids": self._ids()[1:]},
+        )
+        self.assertRedirects(reponse, reverse("notes:valider_notes_declarees"),
+                             fetch_redirect_response=False)
+        self.assertEqual(NoteDeclaree.objects.filter(statut="VALIDEE").count(), 2)
+
+
+class FeuilleNotesSectionTest(DonneesNotesMixin, TestCase):
+    """Tests de l'export et de l'import de la feuille de notes d'une section"""
+
+    def setUp(self):
+        super().setUp()
+        self.prof = Utilisateur.objects.create_user(
+            email="prof@example.com", password="motdepasse123",
+            first_name="Pro", last_name="Fesseur", role="PROFESSEUR",
+            doit_changer_mot_de_passe=False,
+        )
+        self.section.professeur = self.prof.profil_professeur
+        self.section.save()
+        autre = Utilisateur.objects.create_user(
+            email="etudiant2@example.com", password="motdepasse123",
+            first_name="Etu", last_name="Deux", role="ETUDIANT",
+        )
+        self.inscription2 = Inscription.objects.create(
+            etudiant=autre.profil_etudiant, section_cours=self.section,
+        )
+        self.note2 = Note.objects.create(inscription=self.inscription2, examen_final=70)
+        self.client.force_login(self.prof)
+
+    def _feuille(self, lignes):
+        return io.BytesIO(ecrire_xlsx([list(COLONNES_FEUILLE)] + lignes))
+
+    def test_export_xlsx_pre_rempli(self):
+        reponse = self.client.get(reverse("notes:exporter_feuille_notes", args=[self.section.id]))
+        lignes = lire_xlsx(reponse.content)
+        self.assertEqual(lignes[0], list(COLONNES_FEUILLE))
+        ligne = next(l for l in lignes[1:] if l[0] == str(self.inscription2.id))
+        self.assertEqual(ligne[COLONNES_FEUILLE.index("examen_final")], "70.00")
+
+    def test_export_csv(self):
+        reponse = self.client.get(
+            reverse("notes:exporter_feuille_notes", args=[self.section.id]), {"format": "csv"},
+        )
+        contenu = reponse.content.decode("utf-8-sig")
+        self.assertTrue(contenu.startswith(",".join(COLONNES_FEUILLE)))
+        self.assertIn(self.etudiant.numero_etudiant, contenu)
+
+    def test_lecture_signale_toutes_les_erreurs(self):
+        feuille = io.BytesIO(
+            (",".join(COLONNES_FEUILLE) + "\n"
+             f"{self.inscription.id},,,80,90,,,\n"
+             f"{self.inscription2.id},,,,120,,,\n"
+             "9999,,,50,,,,\n").encode()
+        )
+        modifications, erreurs = lire_feuille_section(feuille, self.section)
+        self.assertEqual(len(modifications), 1)
+        self.assertEqual(modifications[0]["valeurs"]["examen_final"], (None, Decimal("90.00")))
+        self.assertEqual(len(erreurs), 2)
+        self.assertIn("hors limites", erreurs[0])
+        self.assertIn("9999", erreurs[1])
+        self.assertFalse(Note.objects.filter(inscription=self.inscription).exists())
+
+    def test_apercu_puis_application(self):
+        url = reverse("notes:importer_feuille_notes", args=[self.section.id])
+        feuille = self._feuille([
+            [self.inscription.id, self.etudiant.numero_etudiant, "", 80, 90, 75, 100, 60],
+            [self.inscription2.id, "", "", None, 70, None, None, None],   # inchangée
+        ])
+        feuille.name = "notes.xlsx"
+        reponse = self.client.post(url, {"feuille": feuille})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(len(reponse.context["modifications"]), 1)
+        self.assertFalse(Note.objects.filter(inscription=self.inscription).exists())
+
+        jeton = reponse.context["jeton"]
+        mail.outbox = []
+        with self.captureOnCommitCallbacks(execute=True):
+            # Valeurs ajoutées au formulaire : ignorées, seul l'aperçu est appliqué
+            reponse = self.client.post(url, {
+                "appliquer": "1", "jeton": jeton,
+                "cles": [f"{self.inscription2.id}:examen_final"], "valeurs": ["5"],
+            })
+        self.assertRedirects(reponse, reverse("notes:saisie_notes_professeur", args=[self.section.id]),
+                             fetch_redirect_response=False)
+
+        note = Note.objects.get(inscription=self.inscription)
+        self.assertEqual(note.examen_final, Decimal("90.00"))
+        self.assertEqual(note.note_finale, Decimal("82.50"))
+        self.assertEqual(note.note_par, self.prof.profil_professeur)
+        historique = HistoriqueNote.objects.filter(note=note)
+        self.assertEqual(historique.count(), 5)
+        self.assertEqual(set(historique.values_list("raison", flat=True)), {RAISON_IMPORT_FEUILLE})
+        self.assertFalse(HistoriqueNote.objects.filter(note=self.note2).exists())
+        self.assertEqual(Inscription.objects.get(pk=self.inscription.pk).statut, "COMPLETE")
+        self.assertTrue(Notification.objects.filter(
+            utilisateur=self.utilisateur, type_notification="note_publiee",
+        ).exists())
+        # Même email que pour une note saisie champ par champ
+        self.assertEqual([m.to for m in mail.outbox], [[self.utilisateur.email]])
+        self.assertIn("Introduction", mail.outbox[0].subject)
+
+        # L'aperçu ne s'applique qu'une fois
+        self.client.post(url, {"appliquer": "1", "jeton": jeton})
+        self.assertEqual(HistoriqueNote.objects.filter(note=note).count(), 5)
+
+    def _apercu(self, lignes):
+        feuille = self._feuille(lignes)
+        feuille.name = "notes.xlsx"
+        return self.client.post(
+            reverse("notes:importer_feuille_notes", args=[self.section.id]), {"feuille": feuille},
+        )
+
+    def test_feuille_en_erreur_non_applicable(self):
+        url = reverse("notes:importer_feuille_notes", args=[self.section.id])
+        reponse = self._apercu([
+            [self.inscription.id, "", "", 80, 90, None, None, None],
+            [self.inscription2.id, "", "", None, 120, None, None, None],   # hors limites
+        ])
+        self.assertIsNone(reponse.context["jeton"])
+
+        # Confirmation forgée : refusée côté serveur
+        reponse = self.client.post(url, {
+            "appliquer": "1", "jeton": "x", "cles": [f"{self.inscription.id}:examen_final"], "valeurs": ["90"],
+        }, follow=True)
+        self.assertContains(reponse, "Aucun aperçu valide")
+        self.assertFalse(Note.objects.filter(inscription=self.inscription).exists())
+
+    def test_modification_note_existante(self):
+        url = reverse("notes:importer_feuille_notes", args=[self.section.id])
+        jeton = self._apercu([[self.inscription2.id, "", "", None, 55, None, None, None]]).context["jeton"]
+        reponse = self.client.post(url, {"appliquer": "1", "jeton": jeton})
+        self.assertEqual(reponse.status_code, 302)
+        self.note2.refresh_from_db()
+        self.assertEqual(self.note2.examen_final, Decimal("55.00"))
+        self.assertEqual(self.note2.note_finale, Decimal("55.00"))
+        entree = HistoriqueNote.objects.get(note=self.note2)
+        self.assertEqual((entree.ancienne_valeur, entree.nouvelle_valeur), (Decimal("70.00"), Decimal("55.00")))
+
+    def test_section_d_un_autre_professeur(self):
+        autre = Utilisateur.objects.create_user(
+            email="prof2@example.com", password="motdepasse123",
+            first_name="Autre", last_name="Prof", role="PROFESSEUR",
+            doit_changer_mot_de_passe=False,
+        )
+        self.client.force_login(autre)
+        reponse = self.client.get(reverse("notes:exporter_feuille_notes", args=[self.section.id]))
+        self.assertRedirects(reponse, reverse("notes:sections_professeur"), fetch_redirect_response=False)
+
+
+class GenerationBulletinsTest(DonneesNotesMixin, TestCase):
+    """Tests de la génération groupée des bulletins"""
+
+    def setUp(self):
+        super().setUp()
+        autre_cours = Cours.objects.create(code="PSY102", nom="Méthodes", credits=3, niveau="NIVEAU1")
+        autre_section = SectionCours.objects.create(
+            cours=autre_cours, numero_section="01", jour_semaine="MARDI",
+            heure_debut=time(8, 0), heure_fin=time(10, 0),
+            session="SESSION_1", semestre="AUTOMNE", annee=2026,
+        )
+        autre_inscription = Inscription.objects.create(
+            etudiant=self.etudiant, section_cours=autre_section,
+        )
+        Note.objects.create(inscription=self.inscription, examen_final=100, examen_mi_parcours=100,
+                            travaux=100, participation=100, projet=100)
+        Note.objects.create(inscription=autre_inscription, examen_final=40, examen_mi_parcours=40,
+                            travaux=40, participation=40, projet=40)
+
+    def test_generation_et_regeneration(self):
+        call_command("generer_bulletins", annee=2026, semestre="AUTOMNE", stdout=io.StringIO())
+        call_command("generer_bulletins", annee=2026, semestre="AUTOMNE", stdout=io.StringIO())
+
+        bulletin = Bulletin.objects.get(etudiant=self.etudiant)
+        self.assertEqual(bulletin.gpa, Decimal("70.00"))
+        self.assertEqual(bulletin.credits_tentes, 2)
+        # Pas d'accumulation d'une génération à l'autre
+        self.assertEqual(bulletin.credits_obtenus, 1)
+
+    def test_calculer_gpa_repetable(self):
+        bulletin = Bulletin(etudiant=self.etudiant, semestre="AUTOMNE", annee=2026)
+        bulletin.calculer_gpa()
+        bulletin.calculer_gpa()
+        self.assertEqual(bulletin.credits_obtenus, 1)
+        self.assertEqual(bulletin.gpa, Decimal("70.00"))
 
-# Create your tests here.
+    def test_periode_sans_inscription(self):
+        call_command("generer_bulletins", annee=2025, semestre="AUTOMNE", stdout=io.StringIO())
+        self.assertFalse(Bulletin.objects.exists())
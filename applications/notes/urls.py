@@ -8,6 +8,8 @@ urlpatterns = [
     path('sections/',                             views.vue_sections_professeur,    name='sections_professeur'),
     path('section/<int:id_section>/recap/',       views.vue_recap_notes,            name='recap_notes'),
     path('section/<int:id_section>/saisie/',      views.vue_saisie_notes,           name='saisie_notes_professeur'),
+    path('section/<int:id_section>/feuille/',     views.vue_exporter_feuille_notes, name='exporter_feuille_notes'),
+    path('section/<int:id_section>/feuille/importer/', views.vue_importer_feuille_notes, name='importer_feuille_notes'),
     path('note/<int:id_note>/modifier-prof/',     views.modifier_note_professeur,   name='modifier_note_professeur'),
     path('inscription/<int:id_inscription>/note/', views.saisie_modifier_note_professeur, name='saisie_modifier_note_professeur'),
     path('mes-etudiants/',                        views.vue_mes_etudiants,          name='mes_etudiants'),
@@ -42,4 +44,5 @@ urlpatterns = [
     
     path('declaration/',          views.vue_declaration_notes,      name='declaration_notes'),
     path('valider-declarations/', views.vue_valider_notes_declarees, name='valider_notes_declarees'),
+    path('valider-declarations/rapprochement/', views.vue_rapprocher_notes_declarees, name='rapprocher_notes_declarees'),
 ]
\ No newline at end of file
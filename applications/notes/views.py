@@ -1,7 +1,9 @@
 import csv
 import io
+import secrets
 from io import BytesIO
 from collections import defaultdict
+from decimal import Decimal
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
@@ -22,6 +24,18 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT
 
 from .models import Note, HistoriqueNote, Bulletin,NoteDeclaree
 from .forms import FormulaireNote
+from .services import (
+    ErreurFeuilleNotes,
+    appliquer_feuille_section,
+    exporter_feuille_csv,
+    exporter_feuille_xlsx,
+    lire_composante,
+    lire_feuille_notes,
+    lire_feuille_section,
+    rapprocher_notes_declarees,
+    rejeter_notes_declarees,
+    valider_notes_declarees,
+)
 from applications.inscriptions.models import Inscription
 from applications.cours.models import SectionCours
 from applications.comptes.models import Utilisateur, Etudiant
@@ -35,6 +49,9 @@ from utilitaires.roles import est_administrateur, est_professeur, est_etudiant
 
 STATUTS_VISIBLES = ["INSCRIT", "COMPLETE", "ECHOUE"]
 
+# Aperçu de la feuille de notes d'une section en attente de confirmation
+CLE_SESSION_FEUILLE = "notes:feuille:{}"
+
 @login_required
 @user_passes_test(est_professeur)
 def vue_sections_professeur(request):
@@ -44,14 +61,7 @@ def vue_sections_professeur(request):
         professeur = request.user.profil_professeur
         sections = professeur.sections_cours.select_related("cours")
 
-    # ← appliquer l'annotation aux deux
-    sections = sections.annotate(
-        nb_inscrits=Count(
-            "inscriptions",
-            filter=Q(inscriptions__statut__in=STATUTS_VISIBLES)
-        )
-    )
-
+    # nb_inscrits : compteur tenu à jour sur SectionCours
     contexte = {"sections": sections}
     return render(request, "notes/sections_professeur.html", contexte)
 
@@ -95,39 +105,26 @@ def vue_saisie_notes(request, id_section):
             else request.user.profil_professeur
         )
 
+        historiques = []
         for inscription in inscriptions:
-            note, creee = Note.objects.get_or_create(
-                inscription=inscription, defaults={"note_par": note_par}
-            )
-
-            anciennes_valeurs = {
-                "examen_mi_parcours": note.examen_mi_parcours,
-                "examen_final":       note.examen_final,
-                "travaux":            note.travaux,
-                "participation":      note.participation,
-                "projet":             note.projet,
-            }
+            # select_related("note") : la note existante est déjà chargée et
+            # mémorise son état (Note.from_db), pas besoin de la relire.
+            try:
+                note = inscription.note
+            except Note.DoesNotExist:
+                note = Note(inscription=inscription, note_par=note_par)
 
-            for composante in anciennes_valeurs:
+            for composante in Note.COMPOSANTES:
                 cle_champ = f"note_{inscription.id}_{composante}"
                 valeur = request.POST.get(cle_champ)
                 if valeur:
                     try:
-                        nouvelle_valeur = float(valeur)
-                        ancienne_valeur = anciennes_valeurs[composante]
-
-                        if ancienne_valeur != nouvelle_valeur:
-                            HistoriqueNote.objects.create(
-                                note=note,
-                                composante=composante,
-                                ancienne_valeur=ancienne_valeur,
-                                nouvelle_valeur=nouvelle_valeur,
-                                modifie_par=note_par,
-                            )
-                        setattr(note, composante, nouvelle_valeur)
+                        setattr(note, composante, float(valeur))
                     except ValueError:
                         pass
 
+            changements = note.champs_modifies(Note.COMPOSANTES)
+
             commentaires = request.POST.get(f"commentaires_{inscription.id}")
             if commentaires:
                 note.commentaires = commentaires
@@ -135,6 +132,19 @@ def vue_saisie_notes(request, id_section):
             note.note_par = note_par
             note.save()
 
+            historiques.extend(
+                HistoriqueNote(
+                    note=note,
+                    composante=composante,
+                    ancienne_valeur=valeurs["ancienne"],
+                    nouvelle_valeur=valeurs["nouvelle"],
+                    modifie_par=note_par,
+                )
+                for composante, valeurs in changements.items()
+            )
+
+        HistoriqueNote.objects.bulk_create(historiques)
+
         messages.success(request, "Notes enregistrées avec succès.")
         return redirect("notes:saisie_notes_professeur", id_section=section.id)
 
@@ -156,6 +166,119 @@ def vue_saisie_notes(request, id_section):
     return render(request, "notes/saisie_notes.html", contexte)
 
 
+@login_required
+@user_passes_test(est_professeur)
+def vue_exporter_feuille_notes(request, id_section):
+    """Modèle pré-rempli de la feuille de notes d'une section (XLSX, ou CSV avec ?format=csv)"""
+    section = get_object_or_404(SectionCours.objects.select_related("cours"), id=id_section)
+
+    if not request.user.is_superuser:
+        if section.professeur != request.user.profil_professeur:
+            messages.error(request, "Vous n'avez pas accès à cette section.")
+            return redirect("notes:sections_professeur")
+
+    nom_fichier = f"notes_{section.cours.code}_{section.numero_section}"
+    if request.GET.get("format") == "csv":
+        reponse = HttpResponse(exporter_feuille_csv(section), content_type="text/csv; charset=utf-8")
+        nom_fichier += ".csv"
+    else:
+        reponse = HttpResponse(
+            exporter_feuille_xlsx(section),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        nom_fichier += ".xlsx"
+    reponse["Content-Disposition"] = f'attachment; filename="{nom_fichier}"'
+    return reponse
+
+
+@login_required
+@user_passes_test(est_professeur)
+def vue_importer_feuille_notes(request, id_section):
+    """
+    Importe la feuille de notes remplie hors ligne.
+
+    L'envoi du fichier affiche l'aperçu des changements, sans rien enregistrer ;
+    la confirmation (« appliquer ») enregistre ces changements, gardés en
+    session, en une transaction, avec l'historique de chaque composante
+    modifiée. Une feuille qui contient des erreurs ne peut pas être appliquée.
+    """
+    section = get_object_or_404(SectionCours.objects.select_related("cours"), id=id_section)
+
+    if not request.user.is_superuser:
+        if section.professeur != request.user.profil_professeur:
+            messages.error(request, "Vous n'avez pas accès à cette section.")
+            return redirect("notes:sections_professeur")
+
+    if request.method != "POST":
+        return redirect("notes:saisie_notes_professeur", id_section=section.id)
+
+    # Aperçu gardé en session : la confirmation applique exactement ce qui a
+    # été montré, jamais des valeurs renvoyées par le navigateur
+    cle_session = CLE_SESSION_FEUILLE.format(section.id)
+
+    fichier = request.FILES.get("feuille")
+    if fichier:
+        request.session.pop(cle_session, None)
+        try:
+            modifications, erreurs = lire_feuille_section(fichier, section)
+        except ErreurFeuilleNotes as e:
+            messages.error(request, str(e))
+            return redirect("notes:saisie_notes_professeur", id_section=section.id)
+
+        for modification in modifications:
+            modification["lignes"] = [
+                (Note._meta.get_field(composante).verbose_name, ancienne, nouvelle)
+                for composante, (ancienne, nouvelle) in modification["valeurs"].items()
+            ]
+        jeton = None
+        if modifications and not erreurs:
+            jeton = secrets.token_urlsafe(16)
+            request.session[cle_session] = {
+                "jeton":   jeton,
+                "valeurs": {
+                    str(modification["inscription"].id): {
+                        composante: str(nouvelle)
+                        for composante, (_, nouvelle) in modification["valeurs"].items()
+                    }
+                    for modification in modifications
+                },
+            }
+        contexte = {
+            "section":       section,
+            "modifications": modifications,
+            "erreurs":       erreurs,
+            "jeton":         jeton,
+        }
+        return render(request, "notes/apercu_feuille_notes.html", contexte)
+
+    if request.POST.get("appliquer") != "1":
+        messages.error(request, "Veuillez joindre la feuille de notes (CSV ou XLSX).")
+        return redirect("notes:saisie_notes_professeur", id_section=section.id)
+
+    # Une feuille en erreur n'est jamais mise en session : rien à appliquer
+    apercu = request.session.pop(cle_session, None)
+    if apercu is None or request.POST.get("jeton") != apercu["jeton"]:
+        messages.error(
+            request,
+            "Aucun aperçu valide à enregistrer (expiré, déjà appliqué ou fichier en erreur) : "
+            "renvoyez la feuille de notes.",
+        )
+        return redirect("notes:saisie_notes_professeur", id_section=section.id)
+    valeurs = {
+        int(id_inscription): {composante: Decimal(valeur) for composante, valeur in composantes.items()}
+        for id_inscription, composantes in apercu["valeurs"].items()
+    }
+
+    note_par = (
+        section.professeur
+        if request.user.is_superuser
+        else request.user.profil_professeur
+    )
+    notes = appliquer_feuille_section(section, valeurs, note_par)
+    messages.success(request, f"{len(notes)} note(s) mise(s) à jour depuis la feuille.")
+    return redirect("notes:saisie_notes_professeur", id_section=section.id)
+
+
 PONDERATIONS_NOTE = [
     ("examen_mi_parcours", "Examen mi-parcours", 25),
     ("examen_final", "Examen final", 35),
@@ -1679,42 +1802,104 @@ def vue_valider_notes_declarees(request):
     ).order_by("inscription__etudiant__utilisateur__last_name")
 
     if request.method == "POST":
-        note_id = request.POST.get("note_id")
-        action  = request.POST.get("action")
-        note    = get_object_or_404(NoteDeclaree, id=note_id)
+        action = request.POST.get("action")
 
-        if action == "valider":
-            note_val = float(note.note_declaree)
+        # Une seule ligne (boutons de la ligne) ou la sélection cochée
+        if request.POST.get("note_id"):
+            ids = [get_object_or_404(NoteDeclaree, id=request.POST["note_id"]).id]
+        else:
+            ids = [i for i in request.POST.getlist("note_ids") if i.isdigit()]
 
-            # get_or_create pour éviter de toucher au save() du modèle
-            note_obj, created = Note.objects.get_or_create(
-                inscription=note.inscription,
-                defaults={'note_par': None},
-            )
-            # Mise à jour directe en base — contourne calculer_note_finale()
-            Note.objects.filter(pk=note_obj.pk).update(
-                note_finale=note_val,
-                mention=Note.obtenir_mention(note_val),
-            )
-            note.statut     = "VALIDEE"
-            note.valide_par = request.user
-            messages.success(request, f"Note validée pour {note.inscription.etudiant}.")
+        if not ids:
+            messages.warning(request, "Aucune note sélectionnée.")
+        elif action == "valider":
+            validees = valider_notes_declarees(ids, request.user)
+            messages.success(request, f"{len(validees)} note(s) validée(s).")
         elif action == "rejeter":
-            note.statut           = "REJETEE"
-            note.commentaire_admin = request.POST.get("commentaire_admin", "")
-            messages.warning(request, f"Note rejetée pour {note.inscription.etudiant}.")
+            nombre = rejeter_notes_declarees(
+                ids, request.user, request.POST.get("commentaire_admin", "")
+            )
+            messages.warning(request, f"{nombre} note(s) rejetée(s).")
 
-        note.save()
         return redirect("notes:valider_notes_declarees")
 
     contexte = {
         "notes":           notes,
         "total":           notes.count(),
         "notes_en_attente": NoteDeclaree.objects.filter(statut="EN_ATTENTE").count(),
+        "sections":        SectionCours.objects.filter(
+            inscriptions__note_declaree__statut="EN_ATTENTE"
+        ).select_related("cours").distinct().order_by("cours__code", "numero_section"),
     }
     return render(request, "notes/valider_notes_declarees.html", contexte)
 
 
+@login_required
+@user_passes_test(est_administrateur)
+def vue_rapprocher_notes_declarees(request):
+    """
+    Rapproche les déclarations d'une section avec la feuille de notes du professeur.
+
+    Le premier envoi affiche l'aperçu ; la case « appliquer » valide les notes
+    concordantes et rejette les divergentes en une transaction.
+    """
+    if request.method != "POST":
+        return redirect("notes:valider_notes_declarees")
+
+    section = get_object_or_404(
+        SectionCours.objects.select_related("cours"), id=request.POST.get("section")
+    )
+    fichier = request.FILES.get("feuille")
+    erreurs = []
+
+    if fichier:
+        try:
+            notes_feuille, erreurs = lire_feuille_notes(fichier)
+        except ErreurFeuilleNotes as e:
+            messages.error(request, str(e))
+            return redirect("notes:valider_notes_declarees")
+    elif request.POST.getlist("matricules"):
+        # Confirmation depuis l'aperçu : la feuille est renvoyée en champs
+        # cachés, validés comme à la lecture du fichier
+        matricules = request.POST.getlist("matricules")
+        valeurs = request.POST.getlist("valeurs")
+        try:
+            if len(matricules) != len(valeurs):
+                raise ValueError
+            notes_feuille = {}
+            for matricule, brute in zip(matricules, valeurs):
+                valeur = lire_composante(brute.strip())
+                if not matricule.strip() or valeur is None:
+                    raise ValueError
+                notes_feuille[matricule.strip().upper()] = valeur
+        except ValueError:
+            messages.error(request, "Notes de la feuille invalides : renvoyez le fichier.")
+            return redirect("notes:valider_notes_declarees")
+    else:
+        messages.error(request, "Veuillez joindre la feuille de notes (CSV).")
+        return redirect("notes:valider_notes_declarees")
+
+    appliquer = request.POST.get("appliquer") == "1"
+    rapport = rapprocher_notes_declarees(section, notes_feuille, request.user, appliquer=appliquer)
+
+    if appliquer:
+        messages.success(
+            request,
+            f"{len(rapport['concordantes'])} note(s) validée(s), "
+            f"{len(rapport['divergentes'])} rejetée(s), "
+            f"{len(rapport['absentes'])} laissée(s) en attente.",
+        )
+        return redirect("notes:valider_notes_declarees")
+
+    contexte = {
+        "section": section,
+        "rapport": rapport,
+        "erreurs": erreurs,
+        "notes_feuille": sorted(notes_feuille.items()),
+    }
+    return render(request, "notes/rapprochement_notes_declarees.html", contexte)
+
+
 
 @login_required
 @user_passes_test(est_etudiant)
@@ -7,27 +7,21 @@ from applications.notifications.utils import _envoyer_notification_note
 @receiver(pre_save, sender=Note)
 def sauvegarder_ancienne_note(sender, instance, **kwargs):
     """
-    Sauvegarde les anciennes valeurs avant modification.
-    """
+    Garantit qu'une référence existe pour le calcul des changements.
 
-    if instance.pk:
-        try:
-            ancienne = Note.objects.get(pk=instance.pk)
+    Les notes chargées depuis la base mémorisent déjà leur état
+    (Note.from_db) : aucune requête n'est faite dans ce cas. Seule une
+    instance construite à la main avec un pk existant est relue.
+    """
 
-            instance._ancienne_valeurs = {
-                'examen_mi_parcours': ancienne.examen_mi_parcours,
-                'examen_final': ancienne.examen_final,
-                'travaux': ancienne.travaux,
-                'participation': ancienne.participation,
-                'projet': ancienne.projet,
-                'note_finale': ancienne.note_finale,
-                'mention': ancienne.mention,
-            }
+    if instance.pk is None:
+        return
+    if getattr(instance, '_valeurs_chargees', None) is not None:
+        return
 
-        except Note.DoesNotExist:
-            instance._ancienne_valeurs = None
-    else:
-        instance._ancienne_valeurs = None
+    ancienne = Note.objects.filter(pk=instance.pk).only(*Note.CHAMPS_SUIVIS).first()
+    if ancienne is not None:
+        instance._valeurs_chargees = ancienne._valeurs_chargees
 
 
 @receiver(post_save, sender=Note)
@@ -36,24 +30,11 @@ def notifier_etudiant_note(sender, instance, created, **kwargs):
     Envoie une notification après création ou modification d'une note.
     """
 
-    anciennes = getattr(instance, '_ancienne_valeurs', None)
-
-    # Construire dictionnaire des changements
-    changements = {}
-
-    if anciennes:
-        for champ, ancienne_valeur in anciennes.items():
-            nouvelle_valeur = getattr(instance, champ)
-
-            if ancienne_valeur != nouvelle_valeur:
-                changements[champ] = {
-                    'ancienne': ancienne_valeur,
-                    'nouvelle': nouvelle_valeur
-                }
+    changements = {} if created else instance.champs_modifies()
 
     # Appel propre du service
     _envoyer_notification_note(
         etudiant=instance.inscription.etudiant,
         note=instance,
         anciennes_valeurs=changements if changements else None
-    )
\ No newline at end of file
+    )
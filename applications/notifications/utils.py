@@ -1,61 +1,64 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from applications.notifications.models import Notification
 
 
-def _envoyer_notification_note(etudiant, note, anciennes_valeurs=None):
-    """
-    Envoie une notification à l'étudiant concernant une note créée ou modifiée.
-    """
+NOMS_CHAMPS_NOTE = {
+    'examen_mi_parcours': 'Examen mi-parcours',
+    'examen_final': 'Examen final',
+    'travaux': 'Travaux',
+    'participation': 'Participation',
+    'projet': 'Projet',
+    'note_finale': 'Note finale',
+    'mention': 'Mention',
+}
 
-    utilisateur = etudiant.utilisateur
 
+def contenu_notification_note(note, anciennes_valeurs=None):
+    """
+    (type, titre, message) de la notification d'une note créée ou modifiée.
+    Partagé avec les écritures en bloc, qui créent les Notification sans signaux.
+    """
     cours = note.inscription.section_cours.cours
 
     # ─────────────────────────────
     # CAS 1 : nouvelle note
     # ─────────────────────────────
     if not anciennes_valeurs:
-        type_notif = 'note_publiee'
         titre = f"Votre note en {cours.nom} a été publiée"
-
         message = (
             f"La note finale {note.note_finale}/100 "
             f"({note.mention}) a été enregistrée pour le cours {cours.code}."
         )
-
-        ancienne_note = None
+        return 'note_publiee', titre, message
 
     # ─────────────────────────────
     # CAS 2 : modification
     # ─────────────────────────────
-    else:
-        type_notif = 'note_modifiee'
-        titre = f"Votre note en {cours.nom} a été modifiée"
-
-        noms_champs = {
-            'examen_mi_parcours': 'Examen mi-parcours',
-            'examen_final': 'Examen final',
-            'travaux': 'Travaux',
-            'participation': 'Participation',
-            'projet': 'Projet',
-            'note_finale': 'Note finale',
-            'mention': 'Mention',
-        }
-
-        lignes = []
-        for champ, vals in anciennes_valeurs.items():
-            ancienne = vals.get('ancienne')
-            nouvelle = vals.get('nouvelle')
-
-            if ancienne != nouvelle:
-                nom = noms_champs.get(champ, champ)
-                lignes.append(f"• {nom}: {ancienne} → {nouvelle}")
-
-        message = "Vos notes ont été mises à jour :\n" + "\n".join(lignes)
+    titre = f"Votre note en {cours.nom} a été modifiée"
 
-        ancienne_note = anciennes_valeurs.get('note_finale', {}).get('ancienne')
+    lignes = []
+    for champ, vals in anciennes_valeurs.items():
+        ancienne = vals.get('ancienne')
+        nouvelle = vals.get('nouvelle')
+
+        if ancienne != nouvelle:
+            nom = NOMS_CHAMPS_NOTE.get(champ, champ)
+            lignes.append(f"• {nom}: {ancienne} → {nouvelle}")
+
+    message = "Vos notes ont été mises à jour :\n" + "\n".join(lignes)
+    return 'note_modifiee', titre, message
+
+
+def _envoyer_notification_note(etudiant, note, anciennes_valeurs=None):
+    """
+    Envoie une notification à l'étudiant concernant une note créée ou modifiée.
+    """
+
+    utilisateur = etudiant.utilisateur
+
+    type_notif, titre, message = contenu_notification_note(note, anciennes_valeurs)
 
     # ─────────────────────────────
     # Notification DB
@@ -71,8 +74,24 @@ def _envoyer_notification_note(etudiant, note, anciennes_valeurs=None):
     # ─────────────────────────────
     # Email
     # ─────────────────────────────
+    envoyer_emails_notes([(note, titre, anciennes_valeurs)])
+
+
+def _email_note(note, titre, anciennes_valeurs=None):
+    """Email annonçant à l'étudiant sa note créée ou modifiée"""
+    inscription = note.inscription
+    utilisateur = inscription.etudiant.utilisateur
+    cours = inscription.section_cours.cours
+
+    ancienne_note = None
+    if anciennes_valeurs:
+        ancienne_note = anciennes_valeurs.get('note_finale', {}).get('ancienne')
+
     contexte_email = {
         'utilisateur': utilisateur,
+        'etudiant': inscription.etudiant,
+        'inscription': inscription,
+        'note': note,
         'cours': cours.nom,
         'code_cours': cours.code,
         'note_finale': note.note_finale,
@@ -83,18 +102,21 @@ def _envoyer_notification_note(etudiant, note, anciennes_valeurs=None):
         'changements': anciennes_valeurs,
     }
 
+    html = render_to_string('emails/notification_note.html', contexte_email)
+    email = EmailMultiAlternatives(titre, strip_tags(html), 'noreply@fasch.edu', [utilisateur.email])
+    email.attach_alternative(html, 'text/html')
+    return email
+
+
+def envoyer_emails_notes(notes):
+    """
+    Envoie l'email de chaque (note, titre, anciennes_valeurs), par une seule
+    connexion au serveur de messagerie. Partagé avec les écritures en bloc
+    (applications.notes.services.appliquer_feuille_section).
+    """
     try:
-        html = render_to_string('email/notification_note.html', contexte_email)
-        text = strip_tags(html)
-
-        send_mail(
-            titre,
-            text,
-            'noreply@fasch.edu',
-            [utilisateur.email],
-            html_message=html,
-            fail_silently=True,
-        )
+        emails = [_email_note(*n) for n in notes]
+        get_connection(fail_silently=True).send_messages(emails)
 
     except Exception as e:
-        print(f"❌ Erreur email: {e}")
\ No newline at end of file
+        print(f"❌ Erreur email: {e}")
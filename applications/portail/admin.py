@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .mediatheque import filtrer_disponibles
 from .models import SiteSettings, NewsletterInscription, Livre, Personnel, Examen
 
 
@@ -29,14 +30,9 @@ class FiltreDisponible(admin.SimpleListFilter):
         ]
 
     def queryset(self, request, queryset):
-        # On délègue le calcul à Python car c'est une property
-        if self.value() == 'oui':
-            ids = [l.pk for l in queryset if l.disponible]
-        elif self.value() == 'non':
-            ids = [l.pk for l in queryset if not l.disponible]
-        else:
-            return queryset
-        return queryset.filter(pk__in=ids)
+        if self.value() in ('oui', 'non'):
+            return filtrer_disponibles(queryset, disponible=self.value() == 'oui')
+        return queryset
 
 
 @admin.register(Livre)
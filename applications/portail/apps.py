@@ -5,3 +5,6 @@ class PortailConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'applications.portail'
     verbose_name = "Portail de l'Université"
+
+    def ready(self):
+        import applications.portail.signals  # noqa: F401
@@ -3,6 +3,7 @@ import datetime
 from django import forms
 from .models import Emprunt, Examen, Reservation, SiteSettings
 from applications.cours.models import SectionCours
+from applications.cours.planning import conflits_examen, verifier_formulaire
 
 
 class FormulaireParametresSite(forms.ModelForm):
@@ -118,6 +119,12 @@ class ExamenForm(forms.ModelForm):
             f"| Section {s.numero_section} "
             f"| {s.get_semestre_display()} {s.annee}"
         )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # La salle et le professeur de la section doivent être libres à cette heure
+        verifier_formulaire(self, conflits_examen)
+        return cleaned_data
         
         
 from django import forms
@@ -0,0 +1,23 @@
+"""
+Commande d'expiration des réservations de la médiathèque non retirées.
+
+Une réservation « disponible » garde un exemplaire pendant
+Reservation.DELAI_DISPONIBILITE_JOURS jours. Passé ce délai, elle expire et
+l'exemplaire est attribué au suivant de la file d'attente, qui est notifié
+(voir applications/portail/services.py). À planifier une fois par jour.
+
+Usage :
+    python manage.py expirer_reservations
+"""
+
+from django.core.management.base import BaseCommand
+
+from applications.portail.services import expirer_reservations
+
+
+class Command(BaseCommand):
+    help = "Expire les réservations non retirées et transmet les exemplaires à la file d'attente."
+
+    def handle(self, *args, **options):
+        expirees = expirer_reservations()
+        self.stdout.write(self.style.SUCCESS(f"{expirees} réservation(s) expirée(s)."))
@@ -0,0 +1,291 @@
+"""
+Commande d'import du catalogue de la médiathèque (Livre) depuis un ou
+plusieurs fichiers JSON ou CSV.
+
+Colonnes (CSV) ou clés (JSON) :
+    titre,auteur,isbn,editeur,annee,categorie,resume,nombre_exemplaires,couverture
+
+Un fichier JSON est un tableau d'objets, lu élément par élément : les
+fixtures Django (donnees/livres_demo.json) sont acceptées telles quelles.
+La catégorie est donnée par son code (« sociologie ») ou son libellé.
+
+Déroulement (moteur commun utilitaires/importation.py) :
+    - préchargement : les clés des livres existants (ISBN normalisé, titre
+                      et auteur normalisés) sont chargées en une requête ;
+    - validation    : un livre est reconnu par son ISBN (ISBN-10 ou 13,
+                      séparateurs ignorés) ou, sans ISBN, par son titre et
+                      son auteur. Déjà en base : il est mis à jour ; déjà vu
+                      dans les fichiers : la ligne est ignorée (la première
+                      l'emporte) ;
+    - écriture      : par lot (--taille-lot), bulk_create / bulk_update puis
+                      réindexation des mots-clés du lot (recherche du
+                      catalogue). Le cache du catalogue est invalidé à la fin.
+
+Couvertures (--couvertures) : la colonne couverture donne une URL ou un
+chemin d'image (relatif au fichier importé). Après l'enregistrement, hors
+transaction, les images sont lues par --fils-couvertures fils, réduites à
+COUVERTURE_MAX et enregistrées en JPEG. Seuls les livres sans couverture
+sont concernés ; une image illisible est signalée sans annuler l'import.
+
+Usage :
+    python manage.py importer_livres donnees/livres_demo.json
+    python manage.py importer_livres catalogue.csv --dry-run --rapport erreurs.csv
+    python manage.py importer_livres catalogue.json --couvertures --fils-couvertures 8
+"""
+
+import io
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Max
+from PIL import Image
+
+from applications.portail.mediatheque import invalider_catalogue
+from applications.portail.models import Livre, indexer_livres, normaliser_isbn, normaliser_texte
+from utilitaires.importation import Colonne, CommandeImport, ErreurLigne, Source
+
+# Code, ou libellé normalisé → code de catégorie
+CATEGORIES = {
+    **{normaliser_texte(libelle): code for code, libelle in Livre.CHOIX_CATEGORIE},
+    **{code: code for code, _ in Livre.CHOIX_CATEGORIE},
+}
+
+# Champs écrits par l'import (jamais les compteurs ni la couverture)
+CHAMPS = [
+    "titre", "auteur", "isbn", "editeur", "annee", "categorie", "resume",
+    "nombre_exemplaires", "titre_normalise", "isbn_normalise",
+]
+
+COUVERTURE_MAX = (400, 600)      # largeur, hauteur maximales (pixels)
+COUVERTURE_DELAI = 10            # secondes par téléchargement
+
+# Livre déjà en base : id, ISBN tel qu'enregistré, couverture présente
+Existant = namedtuple("Existant", "pk isbn a_couverture")
+
+
+def _texte(longueur):
+    def convertir(valeur):
+        valeur = str(valeur)
+        if len(valeur) > longueur:
+            raise ValueError
+        return valeur
+    return convertir
+
+
+def _entier_positif(valeur):
+    valeur = int(valeur)
+    if valeur < 0:
+        raise ValueError
+    return valeur
+
+
+def _cle_titre(titre, auteur):
+    return f"titre:{normaliser_texte(titre)}|{normaliser_texte(auteur)}"
+
+
+class Command(CommandeImport):
+    help = "Importe ou met à jour le catalogue de la médiathèque depuis des fichiers JSON ou CSV."
+
+    COLONNES = {
+        "titre":              Colonne(obligatoire=True, convertir=_texte(200), libelle="Titre"),
+        "auteur":             Colonne(obligatoire=True, convertir=_texte(200), libelle="Auteur"),
+        "isbn":               Colonne(defaut=None, libelle="ISBN"),
+        "editeur":            Colonne(convertir=_texte(100), libelle="Éditeur"),
+        "annee":              Colonne(obligatoire=True, convertir=int, libelle="Année"),
+        "categorie":          Colonne(defaut="autre", libelle="Catégorie"),
+        "resume":             Colonne(),
+        "nombre_exemplaires": Colonne(defaut=1, convertir=_entier_positif, libelle="Nombre d'exemplaires"),
+        "couverture":         Colonne(),
+    }
+
+    RESUME = "{creees} livre(s) créé(s), {mises_a_jour} mis à jour, {ignorees} ignoré(s)"
+    CATEGORIES = {
+        "format":  "format invalide",
+        "isbn":    "ISBN invalide",
+        "doublon": "en double dans les fichiers",
+    }
+
+    def ajouter_arguments(self, parser):
+        parser.add_argument("chemins", nargs="+", help="Fichiers .json ou .csv du catalogue")
+        parser.add_argument(
+            "--couvertures", action="store_true",
+            help="Télécharge et réduit les couvertures indiquées (livres sans couverture).",
+        )
+        parser.add_argument(
+            "--fils-couvertures", type=int, default=4,
+            help="Couvertures traitées en parallèle (défaut : 4).",
+        )
+
+    def sources(self, options):
+        sources = []
+        for chemin in options["chemins"]:
+            if not os.path.isfile(chemin):
+                raise CommandError(f"Fichier introuvable : {chemin}")
+            if os.path.splitext(chemin)[1].lower() not in (".json", ".csv"):
+                raise CommandError(f"Format non reconnu (.json ou .csv attendu) : {chemin}")
+            sources.append(Source(os.path.basename(chemin), chemin))
+        return sources
+
+    # ── Préchargement et validation ──────────────────────────────────────────
+
+    def preparer(self, options):
+        self.existants = {}
+        for pk, isbn, isbn_normalise, titre, auteur, couverture in Livre.objects.values_list(
+            "pk", "isbn", "isbn_normalise", "titre", "auteur", "couverture"
+        ).iterator(chunk_size=5000):
+            existant = Existant(pk, isbn, bool(couverture))
+            if isbn_normalise:
+                self.existants[f"isbn:{isbn_normalise}"] = existant
+            self.existants.setdefault(_cle_titre(titre, auteur), existant)
+        self.vues = set()
+        self.couvertures = []   # (id du livre, URL ou chemin), après écriture du lot
+
+    def valider(self, valeurs, source, options):
+        categorie = CATEGORIES.get(valeurs["categorie"]) or CATEGORIES.get(normaliser_texte(valeurs["categorie"]))
+        if categorie is None:
+            raise ErreurLigne(f"Catégorie inconnue « {valeurs['categorie']} »")
+
+        isbn = valeurs["isbn"]
+        isbn_normalise = None
+        if isbn is not None:
+            isbn = str(isbn)
+            isbn_normalise = normaliser_isbn(isbn)
+            if isbn_normalise is None or len(isbn) > 20:
+                raise ErreurLigne(f"ISBN invalide « {isbn} »", "isbn")
+
+        cle_titre = _cle_titre(valeurs["titre"], valeurs["auteur"])
+        cle = f"isbn:{isbn_normalise}" if isbn_normalise else cle_titre
+        if cle in self.vues:
+            raise ErreurLigne("Livre déjà présent plus haut dans les fichiers", "doublon")
+        self.vues.update({cle, cle_titre})
+
+        existant = self.existants.get(cle)
+        if existant is None and isbn_normalise:
+            # Livre enregistré sans ISBN : on le complète
+            existant = self.existants.get(cle_titre)
+            if existant is not None and existant.isbn:
+                existant = None
+        if existant is not None and isbn is None:
+            isbn = existant.isbn
+
+        livre = Livre(
+            pk=existant.pk if existant else None,
+            titre=valeurs["titre"],
+            auteur=valeurs["auteur"],
+            isbn=isbn,
+            editeur=valeurs["editeur"],
+            annee=valeurs["annee"],
+            categorie=categorie,
+            resume=valeurs["resume"],
+            nombre_exemplaires=valeurs["nombre_exemplaires"],
+            # Renseignés d'ordinaire par save(), que bulk_create n'appelle pas
+            titre_normalise=normaliser_texte(valeurs["titre"])[:200],
+            isbn_normalise=isbn_normalise,
+        )
+        livre.cle_import = cle
+        livre.couverture_source = None
+        if options["couvertures"] and valeurs["couverture"] and not (existant and existant.a_couverture):
+            livre.couverture_source = self._origine(valeurs["couverture"], source)
+        return livre
+
+    def _origine(self, couverture, source):
+        couverture = str(couverture)
+        if urlparse(couverture).scheme in ("http", "https") or os.path.isabs(couverture):
+            return couverture
+        return os.path.join(os.path.dirname(os.path.abspath(source.chemin)), couverture)
+
+    # ── Écriture ─────────────────────────────────────────────────────────────
+
+    def ecrire_lot(self, lot, source, options):
+        taille_lot = options["taille_lot"]
+        nouveaux = [livre for livre in lot if livre.pk is None]
+        existants = [livre for livre in lot if livre.pk is not None]
+
+        dernier = None
+        if nouveaux and not connection.features.can_return_rows_from_bulk_insert:
+            dernier = Livre.objects.aggregate(m=Max("pk"))["m"] or 0
+        Livre.objects.bulk_create(nouveaux, batch_size=taille_lot)
+        if dernier is not None:
+            # MySQL ne renvoie pas les clés : relues d'après les clés d'import
+            par_cle = {livre.cle_import: livre for livre in nouveaux}
+            for pk, titre, auteur, isbn_normalise in Livre.objects.filter(pk__gt=dernier).values_list(
+                "pk", "titre", "auteur", "isbn_normalise"
+            ):
+                livre = par_cle.get(f"isbn:{isbn_normalise}") or par_cle.get(_cle_titre(titre, auteur))
+                if livre is not None:
+                    livre.pk = pk
+
+        # Mises à jour : seulement les livres dont un champ a changé
+        actuels = Livre.objects.in_bulk([livre.pk for livre in existants])
+        modifies = [
+            livre for livre in existants
+            if any(getattr(livre, champ) != getattr(actuels[livre.pk], champ) for champ in CHAMPS)
+        ]
+        Livre.objects.bulk_update(modifies, CHAMPS, batch_size=taille_lot)
+
+        indexer_livres(nouveaux + modifies)
+        self.couvertures.extend(
+            (livre.pk, livre.couverture_source) for livre in lot if livre.couverture_source
+        )
+        return len(nouveaux), len(existants)
+
+    def apres_enregistrement(self, options):
+        invalider_catalogue()
+        if self.couvertures:
+            self._attacher_couvertures(options)
+
+    # ── Couvertures ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _lire_image(origine):
+        if urlparse(origine).scheme in ("http", "https"):
+            requete = Request(origine, headers={"User-Agent": "gestionEtudiants/importer_livres"})
+            with urlopen(requete, timeout=COUVERTURE_DELAI) as reponse:
+                return reponse.read()
+        with open(origine, "rb") as fichier:
+            return fichier.read()
+
+    @classmethod
+    def _preparer_couverture(cls, tache):
+        """(id, nom enregistré, octets lus, erreur) ; exécuté dans un fil du pool"""
+        pk, origine = tache
+        try:
+            contenu = cls._lire_image(origine)
+            with Image.open(io.BytesIO(contenu)) as image:
+                image = image.convert("RGB")
+                image.thumbnail(COUVERTURE_MAX)
+                sortie = io.BytesIO()
+                image.save(sortie, "JPEG", quality=85, optimize=True)
+            dossier = Livre._meta.get_field("couverture").upload_to
+            nom = default_storage.save(f"{dossier}livre_{pk}.jpg", ContentFile(sortie.getvalue()))
+            return pk, nom, len(contenu), None
+        except Exception as exc:   # réseau, fichier, image illisible : la couverture est ignorée
+            return pk, None, 0, f"{origine} : {exc}"
+
+    def _attacher_couvertures(self, options):
+        debut = time.monotonic()
+        attachees, echecs, octets = [], 0, 0
+        with ThreadPoolExecutor(max_workers=max(1, options["fils_couvertures"])) as pool:
+            for pk, nom, lus, erreur in pool.map(self._preparer_couverture, self.couvertures):
+                if erreur:
+                    echecs += 1
+                    if options["verbosity"] >= 1:
+                        self.stdout.write(self.style.WARNING(f"  Couverture ignorée — {erreur}"))
+                    continue
+                attachees.append(Livre(pk=pk, couverture=nom))
+                octets += lus
+        Livre.objects.bulk_update(attachees, ["couverture"], batch_size=options["taille_lot"])
+
+        duree = time.monotonic() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"Couvertures : {len(attachees)} attachée(s), {echecs} échec(s) en {duree:.2f} s "
+            f"({len(self.couvertures) / duree if duree else 0:.1f}/s, {octets / 1024:.0f} Ko lus)."
+        ))
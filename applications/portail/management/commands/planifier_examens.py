@@ -0,0 +1,139 @@
+"""
+Commande de planification des examens d'une période.
+
+Les sections de la période qui n'ont pas encore d'examen du type demandé
+reçoivent un créneau et une salle, de façon qu'aucun étudiant ni professeur
+n'ait deux examens qui se chevauchent (voir portail/planification.py). Les
+examens proposés sont créés en bloc ; ils restent modifiables depuis la
+liste des examens.
+
+Créneaux : chaque jour du lundi au samedi entre --debut et --fin, aux
+heures de --heures. Salles : --salle NOM:CAPACITE (répétable) ou, à défaut,
+les salles des sections, avec pour capacité la plus grande section qui y a
+cours.
+
+Usage :
+    python manage.py planifier_examens --annee 2026 --semestre AUTOMNE --debut 2026-12-07 --fin 2026-12-19
+    python manage.py planifier_examens --annee 2026 --semestre AUTOMNE --debut 2026-12-07 --fin 2026-12-19 \\
+        --heures 08:00 13:00 --salle Amphi:200 --salle A-101:40 --dry-run
+"""
+
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.cours.models import SectionCours
+from applications.departements.models import Departement
+from applications.portail.models import Examen
+from applications.portail.planification import generer_creneaux, planifier_examens
+
+
+def _date(valeur):
+    try:
+        return datetime.date.fromisoformat(valeur)
+    except ValueError:
+        raise CommandError(f"Date invalide : {valeur} (attendu AAAA-MM-JJ)")
+
+
+def _heure(valeur):
+    try:
+        return datetime.datetime.strptime(valeur, "%H:%M").time()
+    except ValueError:
+        raise CommandError(f"Heure invalide : {valeur} (attendu HH:MM)")
+
+
+def _salle(valeur):
+    nom, _, capacite = valeur.rpartition(":")
+    if not nom or not capacite.isdigit():
+        raise CommandError(f"Salle invalide : {valeur} (attendu NOM:CAPACITE)")
+    return nom.strip(), int(capacite)
+
+
+class Command(BaseCommand):
+    help = "Planifie les examens d'une période sans chevauchement pour les étudiants et professeurs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--annee", type=int, required=True, help="Année académique (ex. 2026)")
+        parser.add_argument(
+            "--semestre", required=True,
+            choices=[code for code, _ in SectionCours.CHOIX_SEMESTRE],
+        )
+        parser.add_argument("--debut", required=True, help="Premier jour d'examens (AAAA-MM-JJ)")
+        parser.add_argument("--fin", required=True, help="Dernier jour d'examens (AAAA-MM-JJ)")
+        parser.add_argument(
+            "--heures", nargs="+", default=["08:00", "13:00"],
+            help="Heures de début des créneaux de chaque jour (défaut : 08:00 13:00)",
+        )
+        parser.add_argument(
+            "--duree", type=int, default=120,
+            help="Durée des examens en minutes (défaut : 120)",
+        )
+        parser.add_argument(
+            "--type", dest="type_examen", default="final",
+            choices=[code for code, _ in Examen.CHOIX_TYPE],
+        )
+        parser.add_argument(
+            "--salle", action="append", dest="salles", default=[],
+            help="Salle disponible, NOM:CAPACITE (répétable)",
+        )
+        parser.add_argument("--departement", help="Limiter à un département (code, ex. PSY)")
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Affiche le planning proposé sans créer les examens",
+        )
+
+    def handle(self, *args, **options):
+        debut, fin = _date(options["debut"]), _date(options["fin"])
+        if fin < debut:
+            raise CommandError("--fin précède --debut.")
+        creneaux = generer_creneaux(debut, fin, [_heure(h) for h in options["heures"]])
+        if not creneaux:
+            raise CommandError("Aucun créneau entre --debut et --fin (dimanches exclus).")
+
+        departement = None
+        if options["departement"]:
+            try:
+                departement = Departement.objects.get(code=options["departement"])
+            except Departement.DoesNotExist:
+                raise CommandError(f"Département introuvable : {options['departement']}")
+
+        dry_run = options["dry_run"]
+        chrono = time.monotonic()
+        rapport = planifier_examens(
+            options["annee"], options["semestre"], creneaux,
+            salles=[_salle(s) for s in options["salles"]] or None,
+            duree=options["duree"], type_examen=options["type_examen"],
+            departement=departement, appliquer=not dry_run,
+        )
+        duree = time.monotonic() - chrono
+
+        self.stdout.write(
+            f"{rapport['sections']} section(s), {rapport['aretes']} paire(s) incompatibles, "
+            f"{len(creneaux)} créneau(x) disponibles — {rapport['creneaux_utilises']} utilisé(s)."
+        )
+        if rapport["deja_planifies"]:
+            self.stdout.write(f"{rapport['deja_planifies']} section(s) avaient déjà leur examen.")
+
+        if dry_run or options["verbosity"] > 1:
+            for examen in rapport["nouveaux"]:
+                section = examen.section_cours
+                self.stdout.write(
+                    f"  {examen.date:%a %d/%m} {examen.heure:%H:%M}  "
+                    f"{section.cours.code}-{section.numero_section:<8} "
+                    f"{examen.salle} ({section.nb_inscrits} inscrits)"
+                )
+
+        if rapport["non_placees"]:
+            self.stdout.write(self.style.WARNING(f"\n{len(rapport['non_placees'])} section(s) non planifiée(s) :"))
+            for section, motif in rapport["non_placees"].items():
+                self.stdout.write(f"  {section.cours.code}-{section.numero_section} : {motif}")
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(
+                f"\n[DRY-RUN] {len(rapport['nouveaux'])} examen(s) proposé(s) en {duree:.2f} s, aucun enregistré."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"\n{len(rapport['nouveaux'])} examen(s) créé(s) en {duree:.2f} s."
+            ))
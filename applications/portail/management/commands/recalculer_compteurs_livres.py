@@ -0,0 +1,46 @@
+"""
+Commande de rapprochement des compteurs Livre.nb_empruntes et
+Livre.nb_en_attente.
+
+Les compteurs sont tenus à jour par les signaux de l'app portail ; les
+écritures faites hors de l'ORM (SQL direct, QuerySet.update sur le statut)
+peuvent les décaler. Cette commande recalcule les livres en écart à partir
+des emprunts en cours et des réservations en attente.
+
+Usage :
+    python manage.py recalculer_compteurs_livres
+    python manage.py recalculer_compteurs_livres --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from applications.portail.mediatheque import recalculer_compteurs_livres
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs d'emprunts et de réservations des livres en écart."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Affiche les écarts sans corriger les compteurs",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        ecarts = recalculer_compteurs_livres(appliquer=not dry_run)
+
+        livres = set()
+        for champ, lignes in ecarts.items():
+            for id_livre, compteur, reel in lignes:
+                livres.add(id_livre)
+                self.stdout.write(f"  Livre {id_livre} : {champ} {compteur}, réel {reel}")
+
+        if not livres:
+            self.stdout.write(self.style.SUCCESS("Tous les compteurs sont à jour."))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(
+                f"{len(livres)} livre(s) en écart (dry-run : aucune correction)."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(livres)} livre(s) corrigé(s)."))
@@ -0,0 +1,321 @@
+"""
+Catalogue de la médiathèque : compteurs dénormalisés et recherche.
+
+Compteurs
+---------
+Livre.nb_empruntes (emprunts en cours ou en retard) et Livre.nb_en_attente
+(réservations en attente) sont ajustés par une expression F() à chaque
+création, changement de statut (ou de livre) et suppression d'un emprunt ou
+d'une réservation (voir signals.py) : l'UPDATE est atomique côté base, ne
+dépend d'aucune valeur lue auparavant et appartient à la transaction de
+l'écriture qui l'a provoqué. Le catalogue filtre ainsi sur la disponibilité
+en SQL, sans charger l'historique des emprunts.
+
+Les QuerySet.update(statut=...) ne passent pas par les signaux : ils doivent
+appeler ajuster_compteurs_livre eux-mêmes. En cas de doute :
+manage.py recalculer_compteurs_livres.
+
+Recherche
+---------
+Les titres et auteurs sont découpés en mots normalisés (sans accents ni
+casse) dans MotCleLivre, l'ISBN est ramené à sa forme ISBN-13 : une
+recherche ne parcourt que des index. Les pages sont lues par curseur (titre
+normalisé, id) — ni OFFSET ni COUNT — et le total vient des facettes par
+catégorie, calculées en une requête groupée et gardées en cache. Le cache
+est invalidé (génération incrémentée) à chaque création, modification ou
+suppression de livre ; les facettes « disponibles seulement » peuvent
+retarder sur les emprunts d'au plus CATALOGUE_CACHE_DUREE secondes.
+
+Circulation
+-----------
+Les chiffres du tableau de bord des emprunts (en cours, en retard, rendus et
+emprunts du mois, titres les plus empruntés, taux d'utilisation par
+catégorie) sont calculés en deux requêtes groupées et gardés en cache
+CIRCULATION_CACHE_DUREE secondes ; tout emprunt créé, modifié ou supprimé
+vide ce cache à la validation de sa transaction (voir signals.py).
+"""
+
+import datetime
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    Emprunt, Livre, MotCleLivre, Reservation,
+    mots_cles, normaliser_isbn, normaliser_texte,
+)
+
+# Compteur de Livre → (modèle suivi, statuts comptés)
+COMPTEURS = {
+    "nb_empruntes":  (Emprunt, Emprunt.STATUTS_ACTIFS),
+    "nb_en_attente": (Reservation, Reservation.STATUTS_ACTIFS),
+}
+
+
+def ajuster_compteurs_livre(id_livre, **ecarts):
+    """
+    Ajoute les écarts (positifs ou négatifs) aux compteurs du livre, en un
+    seul UPDATE : ajuster_compteurs_livre(id, nb_empruntes=1, nb_en_attente=-1)
+    """
+    valeurs = {champ: F(champ) + ecart for champ, ecart in ecarts.items() if ecart}
+    if valeurs:
+        Livre.objects.filter(pk=id_livre).update(**valeurs)
+
+
+def filtrer_disponibles(livres, disponible=True):
+    """Livres dont au moins un exemplaire est (ou n'est pas) en rayon"""
+    if disponible:
+        return livres.filter(nombre_exemplaires__gt=F("nb_empruntes"))
+    return livres.filter(nombre_exemplaires__lte=F("nb_empruntes"))
+
+
+def compteur_reel(champ):
+    """Expression : valeur réelle du compteur `champ` du livre (sous-requête)"""
+    modele, statuts = COMPTEURS[champ]
+    actifs = (
+        modele.objects.filter(livre=OuterRef("pk"), statut__in=statuts)
+        .order_by()
+        .values("livre")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(actifs), 0)
+
+
+def recalculer_compteurs_livres(appliquer=True):
+    """
+    Compare les compteurs de Livre aux emprunts et réservations réels et
+    corrige les écarts (une requête de contrôle par compteur, un UPDATE).
+    Retourne {compteur: [(id, compteur, réel)]} pour les livres en écart.
+    """
+    ecarts = {}
+    for champ in COMPTEURS:
+        ecarts[champ] = list(
+            Livre.objects.annotate(reel=compteur_reel(champ))
+            .exclude(**{champ: F("reel")})
+            .order_by("pk")
+            .values_list("pk", champ, "reel")
+        )
+        if appliquer and ecarts[champ]:
+            # Recalcul dans l'UPDATE lui-même : pas de fenêtre entre lecture et écriture
+            Livre.objects.filter(pk__in=[e[0] for e in ecarts[champ]]).update(
+                **{champ: compteur_reel(champ)}
+            )
+    return ecarts
+
+
+# ── Recherche ────────────────────────────────────────────────────────────
+
+CLE_GENERATION = "catalogue:generation"
+
+PageCatalogue = namedtuple("PageCatalogue", "livres precedent suivant")
+
+
+def rechercher_livres(q="", categorie="", disponible=False):
+    """
+    Livres correspondant à la recherche, non triés :
+
+    - un ISBN (10 ou 13 chiffres, séparateurs permis) : égalité sur l'ISBN normalisé,
+    - sinon chaque mot doit commencer un mot du titre ou de l'auteur,
+    - une recherche faite de mots vides seulement : début du titre.
+    """
+    livres = Livre.objects.all()
+    q = q.strip()
+    if q:
+        isbn = normaliser_isbn(q)
+        mots = mots_cles(q)
+        if isbn:
+            livres = livres.filter(isbn_normalise=isbn)
+        elif mots:
+            for mot in sorted(mots):
+                livres = livres.filter(
+                    pk__in=MotCleLivre.objects.filter(mot__startswith=mot).values("livre_id")
+                )
+        else:
+            livres = livres.filter(titre_normalise__startswith=normaliser_texte(q))
+    if categorie:
+        livres = livres.filter(categorie=categorie)
+    if disponible:
+        livres = filtrer_disponibles(livres)
+    return livres
+
+
+def _generation():
+    return cache.get_or_set(CLE_GENERATION, 1, None)
+
+
+def invalider_catalogue():
+    """Oublie toutes les facettes en cache"""
+    _generation()
+    try:
+        cache.incr(CLE_GENERATION)
+    except ValueError:
+        # Clé évincée entre-temps : toute nouvelle valeur invalide l'ancienne
+        cache.set(CLE_GENERATION, int(datetime.datetime.now().timestamp()), None)
+
+
+def facettes_categories(q="", disponible=False):
+    """
+    {catégorie: nombre de livres} pour la recherche, toutes catégories
+    confondues : une requête groupée, gardée en cache.
+    """
+    # Deux recherches de même forme normalisée ont les mêmes résultats
+    empreinte = hashlib.sha1(f"{normaliser_texte(q)}|{int(bool(disponible))}".encode()).hexdigest()
+    cle = f"catalogue:facettes:{_generation()}:{empreinte}"
+    facettes = cache.get(cle)
+    if facettes is None:
+        facettes = dict(
+            rechercher_livres(q, disponible=disponible)
+            .order_by()
+            .values_list("categorie")
+            .annotate(total=Count("pk"))
+        )
+        cache.set(cle, facettes, getattr(settings, "CATALOGUE_CACHE_DUREE", 5 * 60))
+    return facettes
+
+
+def page_catalogue(livres, apres=None, avant=None, taille=25):
+    """
+    Une page de `livres` triés par titre, à partir d'un curseur : `apres`
+    (resp. `avant`) est l'id du dernier (resp. premier) livre de la page
+    voisine. Le coût d'une page ne dépend pas de sa position.
+
+    Retourne PageCatalogue(livres, precedent, suivant), precedent et suivant
+    étant les curseurs des pages voisines, ou None.
+    """
+    reference = apres or avant
+    pivot = None
+    if reference:
+        pivot = Livre.objects.filter(pk=reference).values_list("titre_normalise", flat=True).first()
+
+    if pivot is None:
+        # Première page (ou curseur d'un livre supprimé depuis)
+        lignes = list(livres.order_by("titre_normalise", "pk")[:taille + 1])
+        page = lignes[:taille]
+        return PageCatalogue(page, None, page[-1].pk if len(lignes) > taille else None)
+
+    if apres:
+        lignes = list(
+            livres.filter(Q(titre_normalise__gt=pivot) | Q(titre_normalise=pivot, pk__gt=reference))
+            .order_by("titre_normalise", "pk")[:taille + 1]
+        )
+        page = lignes[:taille]
+        return PageCatalogue(
+            page, page[0].pk if page else None, page[-1].pk if len(lignes) > taille else None,
+        )
+
+    lignes = list(
+        livres.filter(Q(titre_normalise__lt=pivot) | Q(titre_normalise=pivot, pk__lt=reference))
+        .order_by("-titre_normalise", "-pk")[:taille + 1]
+    )
+    page = lignes[:taille][::-1]
+    return PageCatalogue(
+        page, page[0].pk if len(lignes) > taille else None, page[-1].pk if page else None,
+    )
+
+
+# ── Circulation ──────────────────────────────────────────────────────────
+
+CLE_CIRCULATION = "circulation:statistiques"
+
+# « Titres les plus empruntés » : nombre et fenêtre
+NB_TOP_LIVRES = 10
+PERIODE_TOP_JOURS = 90
+
+
+def _debut_mois(jour):
+    return jour.replace(day=1)
+
+
+def _calculer_circulation(aujourd_hui):
+    debut_mois = _debut_mois(aujourd_hui)
+    debut_mois_precedent = _debut_mois(debut_mois - datetime.timedelta(days=1))
+    debut_top = min(aujourd_hui - datetime.timedelta(days=PERIODE_TOP_JOURS), debut_mois_precedent)
+
+    actif = Q(statut__in=Emprunt.STATUTS_ACTIFS)
+    # Le statut « en_retard » n'est posé qu'à l'enregistrement : la date fait foi
+    en_retard = actif & Q(date_retour_prevue__lt=aujourd_hui)
+
+    # 1. Emprunts récents ou encore actifs, groupés par livre
+    par_livre = (
+        Emprunt.objects.filter(
+            actif | Q(date_emprunt__gte=debut_top) | Q(date_retour_effective__gte=debut_mois)
+        )
+        .order_by()
+        .values("livre_id", "livre__titre", "livre__auteur")
+        .annotate(
+            en_cours=Count("pk", filter=actif & ~en_retard),
+            en_retard=Count("pk", filter=en_retard),
+            rendus_mois=Count("pk", filter=Q(statut="rendu", date_retour_effective__gte=debut_mois)),
+            emprunts_mois=Count("pk", filter=Q(date_emprunt__gte=debut_mois)),
+            emprunts_mois_precedent=Count(
+                "pk", filter=Q(date_emprunt__gte=debut_mois_precedent, date_emprunt__lt=debut_mois)
+            ),
+            periode=Count("pk", filter=Q(date_emprunt__gte=aujourd_hui - datetime.timedelta(days=PERIODE_TOP_JOURS))),
+        )
+    )
+    totaux = dict.fromkeys(
+        ("en_cours", "en_retard", "rendus_mois", "emprunts_mois", "emprunts_mois_precedent"), 0
+    )
+    top = []
+    for ligne in par_livre:
+        for cle in totaux:
+            totaux[cle] += ligne[cle]
+        if ligne["periode"]:
+            top.append((ligne["periode"], ligne["livre__titre"], ligne["livre__auteur"], ligne["livre_id"]))
+    top.sort(key=lambda t: (-t[0], t[1]))
+
+    # 2. Exemplaires et emprunts en cours par catégorie (compteurs de Livre)
+    libelles = dict(Livre.CHOIX_CATEGORIE)
+    categories = []
+    for code, titres, exemplaires, empruntes in (
+        Livre.objects.order_by()
+        .values_list("categorie")
+        .annotate(Count("pk"), Sum("nombre_exemplaires"), Sum("nb_empruntes"))
+    ):
+        categories.append({
+            "code": code,
+            "libelle": libelles.get(code, code),
+            "titres": titres,
+            "exemplaires": exemplaires or 0,
+            "empruntes": empruntes or 0,
+            "taux": round(100 * (empruntes or 0) / exemplaires, 1) if exemplaires else 0.0,
+        })
+    categories.sort(key=lambda c: (-c["taux"], c["libelle"]))
+
+    return {
+        **totaux,
+        "top_livres": [
+            {"id": id_livre, "titre": titre, "auteur": auteur, "emprunts": n}
+            for n, titre, auteur, id_livre in top[:NB_TOP_LIVRES]
+        ],
+        "categories": categories,
+        "periode_top_jours": PERIODE_TOP_JOURS,
+        "calcule_le": timezone.now(),
+    }
+
+
+def statistiques_circulation():
+    """
+    Chiffres de circulation de la médiathèque (deux requêtes groupées,
+    gardés en cache quelques instants) :
+
+    en_cours, en_retard, rendus_mois, emprunts_mois, emprunts_mois_precedent,
+    top_livres [{id, titre, auteur, emprunts}] sur PERIODE_TOP_JOURS jours,
+    categories [{code, libelle, titres, exemplaires, empruntes, taux}].
+    """
+    statistiques = cache.get(CLE_CIRCULATION)
+    if statistiques is None:
+        statistiques = _calculer_circulation(datetime.date.today())
+        cache.set(CLE_CIRCULATION, statistiques, getattr(settings, "CIRCULATION_CACHE_DUREE", 60))
+    return statistiques
+
+
+def invalider_circulation():
+    """Oublie les statistiques de circulation en cache"""
+    cache.delete(CLE_CIRCULATION)
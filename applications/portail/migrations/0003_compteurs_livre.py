@@ -0,0 +1,47 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remplir_compteurs_livre(apps, schema_editor):
+    Livre = apps.get_model('portail', 'Livre')
+    Emprunt = apps.get_model('portail', 'Emprunt')
+    Reservation = apps.get_model('portail', 'Reservation')
+
+    def compter(modele, statuts):
+        actifs = (
+            modele.objects.filter(livre=OuterRef('pk'), statut__in=statuts)
+            .order_by()
+            .values('livre')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return Coalesce(Subquery(actifs), 0)
+
+    Livre.objects.update(
+        nb_empruntes=compter(Emprunt, ['en_cours', 'en_retard']),
+        nb_en_attente=compter(Reservation, ['en_attente']),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portail', '0002_alter_livre_options_remove_livre_disponible_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livre',
+            name='nb_empruntes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Exemplaires empruntés'),
+        ),
+        migrations.AddField(
+            model_name='livre',
+            name='nb_en_attente',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Réservations en attente'),
+        ),
+        migrations.RunPython(remplir_compteurs_livre, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:04
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Copie de la normalisation de applications/portail/models.py au moment de la
+# migration : l'index construit ici ne doit pas dépendre du code courant.
+
+MOTS_VIDES = frozenset(
+    "au aux ce ces d dans de des du en et l la le les leur un une ou par pour "
+    "sur a an and in of on the to".split()
+)
+LONGUEUR_MOT = 50
+
+
+def normaliser_texte(valeur):
+    decompose = unicodedata.normalize('NFKD', valeur or '')
+    sans_accents = ''.join(c for c in decompose if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[\W_]+', ' ', sans_accents.casefold()).split())
+
+
+def mots_cles(valeur):
+    return {
+        mot[:LONGUEUR_MOT]
+        for mot in normaliser_texte(valeur).split()
+        if len(mot) > 1 and mot not in MOTS_VIDES
+    }
+
+
+def normaliser_isbn(valeur):
+    compact = ''.join(c for c in (valeur or '').upper() if c.isdigit() or c == 'X')
+    if len(compact) == 13 and compact.isdigit():
+        return compact
+    if len(compact) != 10 or not compact[:9].isdigit():
+        return None
+    base = '978' + compact[:9]
+    somme = sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(base))
+    return base + str(-somme % 10)
+
+
+def indexer_catalogue(apps, schema_editor):
+    Livre = apps.get_model('portail', 'Livre')
+    MotCleLivre = apps.get_model('portail', 'MotCleLivre')
+    livres, mots = [], []
+    for livre in Livre.objects.only('titre', 'auteur', 'isbn').iterator():
+        livre.titre_normalise = normaliser_texte(livre.titre)[:200]
+        livre.isbn_normalise = normaliser_isbn(livre.isbn)
+        livres.append(livre)
+        mots.extend(
+            MotCleLivre(livre_id=livre.pk, mot=mot)
+            for mot in mots_cles(f"{livre.titre} {livre.auteur}")
+        )
+    Livre.objects.bulk_update(livres, ['titre_normalise', 'isbn_normalise'], batch_size=500)
+    MotCleLivre.objects.bulk_create(mots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portail', '0003_compteurs_livre'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livre',
+            name='isbn_normalise',
+            field=models.CharField(db_index=True, editable=False, max_length=13, null=True),
+        ),
+        migrations.AddField(
+            model_name='livre',
+            name='titre_normalise',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.CreateModel(
+            name='MotCleLivre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mot', models.CharField(max_length=50)),
+                ('livre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mots_cles', to='portail.livre')),
+            ],
+            options={
+                'verbose_name': 'Mot-clé de livre',
+                'verbose_name_plural': 'Mots-clés de livres',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='motclelivre',
+            constraint=models.UniqueConstraint(fields=('mot', 'livre'), name='unicite_mot_cle_livre'),
+        ),
+        migrations.RunPython(indexer_catalogue, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.utils.text import slugify
 import datetime
+import re
+import unicodedata
 from django.core.exceptions import ValidationError
 from django.conf import settings
 
@@ -13,6 +15,56 @@ from django.conf import settings
 
 
 
+# ── Normalisation pour la recherche dans le catalogue ───────────────────────
+
+# Mots trop fréquents pour être indexés ou cherchés
+MOTS_VIDES = frozenset(
+    "au aux ce ces d dans de des du en et l la le les leur un une ou par pour "
+    "sur a an and in of on the to".split()
+)
+
+
+def normaliser_texte(valeur):
+    """Minuscules sans accents ni ponctuation : « L'Être et le Néant » → 'l etre et le neant'"""
+    decompose = unicodedata.normalize('NFKD', valeur or '')
+    sans_accents = ''.join(c for c in decompose if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[\W_]+', ' ', sans_accents.casefold()).split())
+
+
+def mots_cles(valeur):
+    """Mots significatifs (normalisés, dédoublonnés) d'un titre, d'un auteur ou d'une recherche"""
+    return {
+        mot[:MotCleLivre.LONGUEUR_MAX]
+        for mot in normaliser_texte(valeur).split()
+        if len(mot) > 1 and mot not in MOTS_VIDES
+    }
+
+
+def normaliser_isbn(valeur):
+    """ISBN-13 sans séparateurs (un ISBN-10 est converti), None si ce n'est pas un ISBN"""
+    compact = ''.join(c for c in (valeur or '').upper() if c.isdigit() or c == 'X')
+    if len(compact) == 13 and compact.isdigit():
+        return compact
+    if len(compact) != 10 or not compact[:9].isdigit():
+        return None
+    base = '978' + compact[:9]
+    somme = sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(base))
+    return base + str(-somme % 10)
+
+
+def indexer_livres(livres):
+    """Réécrit les mots-clés des livres donnés (une suppression, un bulk_create)"""
+    MotCleLivre.objects.filter(livre__in=[livre.pk for livre in livres]).delete()
+    MotCleLivre.objects.bulk_create(
+        [
+            MotCleLivre(livre_id=livre.pk, mot=mot)
+            for livre in livres
+            for mot in mots_cles(f"{livre.titre} {livre.auteur}")
+        ],
+        batch_size=1000,
+    )
+
+
 class Livre(models.Model):
     """Catalogue de la médiathèque."""
 
@@ -90,6 +142,17 @@ class Livre(models.Model):
     nombre_exemplaires = models.PositiveIntegerField('Nombre d\'exemplaires', default=1)
     date_creation   = models.DateTimeField(auto_now_add=True, editable=False)
 
+    # Emprunts en cours ou en retard / réservations en attente, tenus à jour
+    # par applications/portail/signals.py — manage.py recalculer_compteurs_livres
+    nb_empruntes  = models.PositiveIntegerField('Exemplaires empruntés', default=0, editable=False)
+    nb_en_attente = models.PositiveIntegerField('Réservations en attente', default=0, editable=False)
+
+    COMPTEURS = ('nb_empruntes', 'nb_en_attente')
+
+    # Clés de recherche et de tri, renseignées par save() (voir mediatheque.py)
+    titre_normalise = models.CharField(max_length=200, db_index=True, editable=False, default='')
+    isbn_normalise  = models.CharField(max_length=13, db_index=True, editable=False, null=True)
+
     class Meta:
         verbose_name        = 'Livre'
         verbose_name_plural = 'Livres'
@@ -98,21 +161,78 @@ class Livre(models.Model):
     def __str__(self):
         return f"{self.titre} — {self.auteur}"
 
+    def save(self, *args, **kwargs):
+        self.titre_normalise = normaliser_texte(self.titre)[:200]
+        self.isbn_normalise = normaliser_isbn(self.isbn)
+        champs = kwargs.get('update_fields')
+        # Les compteurs ne sont écrits que par des UPDATE ... F() : une
+        # instance chargée avant un emprunt ne doit pas les écraser.
+        if not self._state.adding and champs is None:
+            kwargs['update_fields'] = [
+                f.attname for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in self.COMPTEURS
+            ]
+        super().save(*args, **kwargs)
+        if champs is None or {'titre', 'auteur'} & set(champs):
+            indexer_livres([self])
+
     @property
     def exemplaires_disponibles(self):
         """Nombre d'exemplaires actuellement disponibles."""
-        empruntes = self.emprunts.filter(statut='en_cours').count()
-        return max(0, self.nombre_exemplaires - empruntes)
+        return max(0, self.nombre_exemplaires - self.nb_empruntes)
 
     @property
     def disponible(self):
         return self.exemplaires_disponibles > 0
 
     def en_attente_count(self):
-        return self.reservations.filter(statut='en_attente').count()
+        return self.nb_en_attente
+
+
+class MotCleLivre(models.Model):
+    """
+    Index inversé du catalogue : un mot normalisé du titre ou de l'auteur par
+    ligne. La recherche par préfixe de mot (« trop » → « Tristes tropiques »)
+    parcourt l'index (mot, livre) au lieu de balayer les titres.
+    """
+
+    LONGUEUR_MAX = 50
+
+    livre = models.ForeignKey(Livre, on_delete=models.CASCADE, related_name='mots_cles')
+    mot   = models.CharField(max_length=LONGUEUR_MAX)
+
+    class Meta:
+        verbose_name        = 'Mot-clé de livre'
+        verbose_name_plural = 'Mots-clés de livres'
+        constraints = [
+            models.UniqueConstraint(fields=['mot', 'livre'], name='unicite_mot_cle_livre'),
+        ]
+
+    def __str__(self):
+        return self.mot
+
+
+class SuiviLivreStatut:
+    """
+    Mémorise livre et statut chargés d'un emprunt ou d'une réservation, pour
+    ajuster les compteurs de Livre sans relire la ligne (voir signals.py).
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.memoriser_etat()
+        return instance
+
+    def memoriser_etat(self):
+        differes = self.get_deferred_fields()
+        self._etat_charge = (
+            None if 'livre_id' in differes else self.livre_id,
+            None if 'statut' in differes else self.statut,
+        )
 
 
-class Emprunt(models.Model):
+class Emprunt(SuiviLivreStatut, models.Model):
     """Enregistre chaque emprunt d'un livre par un utilisateur."""
 
     STATUT_CHOICES = [
@@ -120,6 +240,8 @@ class Emprunt(models.Model):
         ('rendu',    'Rendu'),
         ('en_retard','En retard'),
     ]
+    # Exemplaire sorti de la médiathèque (Livre.nb_empruntes)
+    STATUTS_ACTIFS = ('en_cours', 'en_retard')
 
     DUREE_DEFAUT_JOURS = 14  # 2 semaines
 
@@ -178,7 +300,7 @@ class Emprunt(models.Model):
         return delta.days  # négatif si en retard
 
 
-class Reservation(models.Model):
+class Reservation(SuiviLivreStatut, models.Model):
     """File d'attente quand un livre est indisponible."""
 
     STATUT_CHOICES = [
@@ -187,6 +309,8 @@ class Reservation(models.Model):
         ('expiree',     'Expirée'),
         ('annulee',     'Annulée'),
     ]
+    # Place dans la file d'attente (Livre.nb_en_attente)
+    STATUTS_ACTIFS = ('en_attente',)
 
     DELAI_DISPONIBILITE_JOURS = 3  # L'utilisateur a 3 jours pour récupérer
 
@@ -0,0 +1,281 @@
+"""
+Planification automatique des examens d'une période.
+
+Deux sections sont voisines dans le graphe des conflits si un étudiant est
+inscrit aux deux (inscriptions actives) ou si elles ont le même professeur :
+leurs examens ne peuvent pas se chevaucher. Chaque créneau (date, heure de
+début) est une « couleur » ; les sections sont coloriées par DSatur — la plus
+contrainte d'abord (nombre de créneaux déjà pris par ses voisines, puis
+degré, puis effectif) — en prenant le premier créneau compatible où reste
+libre une salle assez grande (la plus petite qui convient).
+
+Les examens déjà planifiés sont respectés : ceux des sections concernées
+fixent leur créneau s'il tombe sur la grille ; sur la grille ou non, les
+créneaux qui chevauchent leur horaire réel sont interdits à leurs voisines.
+Toute salle occupée par un examen pendant un créneau y est indisponible.
+
+Les sections qu'aucun créneau ne peut accueillir sont signalées, jamais
+planifiées en conflit : élargir la période, ajouter des créneaux ou des salles.
+"""
+
+import datetime
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from heapq import heappop, heappush
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import Max
+
+from applications.cours.emploi_du_temps import invalider_emploi_du_temps
+from applications.cours.models import SectionCours
+from applications.cours.planning import JOURS, normaliser_salle
+from applications.inscriptions.models import Inscription
+
+from .models import Examen
+
+CreneauExamen = namedtuple("CreneauExamen", "date heure")
+
+DESCRIPTION = "Proposé par planifier_examens"
+
+
+def generer_creneaux(debut, fin, heures):
+    """Créneaux (date, heure) du lundi au samedi entre `debut` et `fin` inclus"""
+    creneaux = []
+    jour = debut
+    while jour <= fin:
+        if jour.weekday() < len(JOURS):
+            creneaux.extend(CreneauExamen(jour, heure) for heure in sorted(heures))
+        jour += datetime.timedelta(days=1)
+    return creneaux
+
+
+def _intervalle(date, heure, duree):
+    debut = datetime.datetime.combine(date, heure)
+    return debut, debut + datetime.timedelta(minutes=duree)
+
+
+def _creneaux_chevauchants(creneaux, duree):
+    """Pour chaque créneau, les indices des créneaux qui le chevauchent (lui compris)"""
+    intervalles = [_intervalle(c.date, c.heure, duree) for c in creneaux]
+    par_date = defaultdict(list)
+    for i, creneau in enumerate(creneaux):
+        par_date[creneau.date].append(i)
+    chevauchants = []
+    for i, (debut, fin) in enumerate(intervalles):
+        chevauchants.append([
+            j for j in par_date[creneaux[i].date]
+            if intervalles[j][0] < fin and debut < intervalles[j][1]
+        ])
+    return chevauchants
+
+
+def construire_graphe(sections, inscriptions):
+    """
+    {id de section: set(ids voisins)} à partir des couples
+    (étudiant, section) et des professeurs des sections.
+    """
+    voisins = {section.id: set() for section in sections}
+    groupes = defaultdict(set)
+    for etudiant_id, section_id in inscriptions:
+        if section_id in voisins:
+            groupes[("etudiant", etudiant_id)].add(section_id)
+    for section in sections:
+        if section.professeur_id:
+            groupes[("professeur", section.professeur_id)].add(section.id)
+    for membres in groupes.values():
+        for a, b in combinations(membres, 2):
+            voisins[a].add(b)
+            voisins[b].add(a)
+    return voisins
+
+
+def colorier(sections, voisins, creneaux, salles, duree, fixes=None, salles_occupees=None,
+             creneaux_interdits=None):
+    """
+    Affecte à chaque section un créneau et une salle.
+
+    salles              : [(nom, capacité)]
+    fixes               : {id de section: indice de créneau} déjà planifiés
+    salles_occupees     : {indice de créneau: set(noms normalisés)} indisponibles
+    creneaux_interdits  : {id de section: set(indices de créneau)} où elle ne
+                          peut pas être placée (examen existant d'une voisine)
+
+    Retourne ({id: (indice de créneau, nom de salle ou None)}, {id: motif}).
+    """
+    fixes = fixes or {}
+    par_id = {section.id: section for section in sections}
+    chevauchants = _creneaux_chevauchants(creneaux, duree)
+    salles = sorted((capacite, nom) for nom, capacite in salles)
+    capacites = [capacite for capacite, _ in salles]
+    occupees = defaultdict(set)
+    for indice, noms in (salles_occupees or {}).items():
+        occupees[indice] |= noms
+
+    affectations = {}
+    non_placees = {}
+    pris_par_voisins = defaultdict(set)   # id -> créneaux des voisines déjà placées
+    interdits_fixes = creneaux_interdits or {}
+
+    def placer(id_section, indice, salle):
+        affectations[id_section] = (indice, salle)
+        if salle:
+            occupees[indice].add(normaliser_salle(salle))
+        for voisin in voisins[id_section]:
+            pris_par_voisins[voisin].add(indice)
+
+    for id_section, indice in fixes.items():
+        placer(id_section, indice, None)
+
+    def salle_libre(indice, effectif):
+        prises = set()
+        for j in chevauchants[indice]:
+            prises |= occupees[j]
+        for k in range(bisect_left(capacites, effectif), len(salles)):
+            nom = salles[k][1]
+            if normaliser_salle(nom) not in prises:
+                return nom
+        return None
+
+    def priorite(id_section):
+        contraints = pris_par_voisins[id_section] | interdits_fixes.get(id_section, set())
+        return (-len(contraints), -len(voisins[id_section]),
+                -par_id[id_section].nb_inscrits, id_section)
+
+    tas = []
+    for id_section in par_id:
+        if id_section not in affectations:
+            heappush(tas, priorite(id_section))
+
+    while tas:
+        entree = heappop(tas)
+        id_section = entree[-1]
+        if id_section in affectations or id_section in non_placees or entree != priorite(id_section):
+            continue   # entrée périmée : une plus récente est dans le tas
+
+        effectif = par_id[id_section].nb_inscrits
+        if not capacites or effectif > capacites[-1]:
+            non_placees[id_section] = f"aucune salle de {effectif} places"
+            continue
+
+        interdits = pris_par_voisins[id_section]
+        exclus = interdits_fixes.get(id_section, ())
+        for indice in range(len(creneaux)):
+            if indice in exclus or any(j in interdits for j in chevauchants[indice]):
+                continue
+            salle = salle_libre(indice, effectif)
+            if salle is not None:
+                break
+        else:
+            non_placees[id_section] = "aucun créneau compatible"
+            continue
+
+        placer(id_section, indice, salle)
+        for voisin in voisins[id_section]:
+            if voisin not in affectations and voisin not in non_placees:
+                heappush(tas, priorite(voisin))
+
+    return affectations, non_placees
+
+
+# ── Chargement et écriture ───────────────────────────────────────────────
+
+def salles_connues():
+    """Salles des sections, avec pour capacité la plus grande section qui y a cours"""
+    return list(
+        SectionCours.objects
+        .exclude(salle="")
+        .values("salle")
+        .annotate(capacite=Max("capacite_max"))
+        .values_list("salle", "capacite")
+    )
+
+
+def planifier_examens(annee, semestre, creneaux, salles=None, duree=120,
+                      type_examen="final", departement=None, appliquer=True):
+    """
+    Planifie les examens `type_examen` des sections de la période qui n'en ont
+    pas encore, et les crée en bloc si `appliquer`.
+
+    Retourne un dict : sections, aretes, nouveaux (liste d'Examen),
+    non_placees ({section: motif}), creneaux_utilises.
+    """
+    sections = (
+        SectionCours.objects
+        .filter(annee=annee, semestre=semestre, nb_inscrits__gt=0)
+        .select_related("cours")
+    )
+    if departement is not None:
+        sections = sections.filter(cours__departement=departement)
+    sections = list(sections)
+
+    # Couples de toute la période : construire_graphe écarte les autres sections
+    inscriptions = Inscription.objects.filter(
+        section_cours__annee=annee, section_cours__semestre=semestre,
+        statut__in=Inscription.STATUTS_ACTIFS,
+    ).values_list("etudiant_id", "section_cours_id")
+    voisins = construire_graphe(sections, inscriptions)
+
+    if salles is None:
+        salles = salles_connues()
+
+    indices = {creneau: i for i, creneau in enumerate(creneaux)}
+    par_date = defaultdict(list)
+    for i, creneau in enumerate(creneaux):
+        par_date[creneau.date].append(i)
+    fixes, deja_planifiees = {}, set()
+    salles_occupees, creneaux_interdits = defaultdict(set), defaultdict(set)
+    if creneaux:
+        existants = Examen.objects.filter(
+            date__range=(creneaux[0].date, creneaux[-1].date), heure__isnull=False,
+        ).values_list("section_cours_id", "type_examen", "date", "heure", "duree_minutes", "salle")
+        for section_id, type_existant, date, heure, duree_existant, salle in existants:
+            debut, fin = _intervalle(date, heure, duree_existant)
+            pendant = []   # créneaux de la grille qui chevauchent cet examen
+            for i in par_date[date]:
+                d, f = _intervalle(date, creneaux[i].heure, duree)
+                if d < fin and debut < f:
+                    pendant.append(i)
+            if type_existant == type_examen and section_id in voisins:
+                deja_planifiees.add(section_id)
+                if (date, heure) in indices:
+                    fixes[section_id] = indices[(date, heure)]
+                # Horaire réel, sur la grille ou non : interdit aux voisines
+                for voisin in voisins[section_id]:
+                    creneaux_interdits[voisin].update(pendant)
+            if salle:
+                for i in pendant:
+                    salles_occupees[i].add(normaliser_salle(salle))
+    # Les sections déjà dotées d'un examen hors grille ne sont pas replanifiées ;
+    # leurs voisines évitent leur horaire par creneaux_interdits
+    a_planifier = [s for s in sections if s.id not in deja_planifiees or s.id in fixes]
+    voisins = {s.id: voisins[s.id] & {t.id for t in a_planifier} for s in a_planifier}
+
+    affectations, non_placees = colorier(
+        a_planifier, voisins, creneaux, salles, duree,
+        fixes=fixes, salles_occupees=salles_occupees, creneaux_interdits=creneaux_interdits,
+    )
+
+    par_id = {section.id: section for section in sections}
+    nouveaux = [
+        Examen(
+            section_cours=par_id[id_section], type_examen=type_examen,
+            date=creneaux[indice].date, heure=creneaux[indice].heure,
+            salle=salle, duree_minutes=duree, description=DESCRIPTION,
+        )
+        for id_section, (indice, salle) in sorted(affectations.items(), key=lambda a: (a[1][0], a[0]))
+        if id_section not in fixes
+    ]
+    if appliquer:
+        with transaction.atomic():
+            Examen.objects.bulk_create(nouveaux, batch_size=500)
+        invalider_emploi_du_temps()
+
+    return {
+        "sections": len(a_planifier),
+        "aretes": sum(len(v) for v in voisins.values()) // 2,
+        "nouveaux": nouveaux,
+        "deja_planifies": len(deja_planifiees),
+        "non_placees": {par_id[i]: motif for i, motif in non_placees.items()},
+        "creneaux_utilises": len({indice for indice, _ in affectations.values()}),
+    }
@@ -0,0 +1,241 @@
+"""
+Emprunts et réservations de la médiathèque.
+
+Chaque opération (emprunter, retourner, réserver, annuler une réservation)
+est une transaction qui verrouille d'abord la ligne Livre : deux opérations
+simultanées sur le même livre sont sérialisées, et les compteurs
+(nb_empruntes, nb_en_attente) lus sous verrou sont exacts. On ne peut donc
+plus prêter plus d'exemplaires qu'il n'en existe, ni promouvoir deux fois la
+même réservation.
+
+Un exemplaire rendu revient au premier de la file d'attente : sa réservation
+passe à « disponible » et lui garde l'exemplaire pendant
+Reservation.DELAI_DISPONIBILITE_JOURS jours. Pendant ce délai, l'exemplaire
+ne peut être emprunté que par lui ; passé ce délai, la réservation expire et
+l'exemplaire passe au suivant de la file. L'expiration a lieu sous le verrou
+du livre au prochain emprunt ou à la prochaine réservation, et pour tous les
+livres avec manage.py expirer_reservations (à planifier chaque jour).
+
+Utilisé par vue_emprunter, vue_retourner, vue_reserver,
+vue_annuler_reservation et vue_enregistrer_retour_admin. Les refus lèvent
+ValidationError (avec un code), comme applications.inscriptions.services.
+"""
+
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from applications.notifications.models import Notification
+from .models import Emprunt, Livre, Reservation
+
+# Réservations qui occupent l'utilisateur (une au plus par livre)
+STATUTS_RESERVATION_OUVERTS = ("en_attente", "disponible")
+
+
+def _verrouiller_livre(id_livre):
+    return Livre.objects.select_for_update().get(pk=id_livre)
+
+
+def _exemplaires_gardes(livre, sauf_utilisateur=None):
+    """Exemplaires en rayon mais gardés pour une réservation « disponible » non échue"""
+    gardes = livre.reservations.filter(
+        statut="disponible", date_disponibilite__gte=datetime.date.today()
+    )
+    if sauf_utilisateur is not None:
+        gardes = gardes.exclude(utilisateur=sauf_utilisateur)
+    return gardes.count()
+
+
+def _exemplaires_libres(livre, pour=None):
+    """
+    Exemplaires que `pour` peut emprunter (livre verrouillé et relu) :
+    en rayon, moins ceux gardés pour les réservations des autres.
+    """
+    return livre.exemplaires_disponibles - _exemplaires_gardes(livre, sauf_utilisateur=pour)
+
+
+def _expirer_gardes(id_livre):
+    """
+    Expire les réservations « disponible » du livre dont le délai de retrait
+    est passé et attribue leurs exemplaires à la file d'attente. Transaction
+    propre : un refus de l'opération qui suit ne l'annule pas.
+    Retourne le nombre de réservations expirées.
+    """
+    with transaction.atomic():
+        livre = _verrouiller_livre(id_livre)
+        # update() : « disponible » et « expiree » ne comptent ni l'un ni
+        # l'autre dans nb_en_attente, aucun compteur à tenir
+        echues = livre.reservations.filter(
+            statut="disponible", date_disponibilite__lt=datetime.date.today()
+        ).update(statut="expiree")
+        if echues:
+            promouvoir_reservations(id_livre)
+    return echues
+
+
+def emprunter(utilisateur, id_livre, duree_jours=Emprunt.DUREE_DEFAUT_JOURS):
+    """
+    Prête un exemplaire du livre pour `duree_jours` (entre 1 et 30) et clôt
+    la réservation de l'emprunteur sur ce livre. Lève ValidationError si
+    aucun exemplaire n'est libre pour lui. Retourne l'emprunt.
+    """
+    duree_jours = max(1, min(duree_jours, 30))
+    _expirer_gardes(id_livre)
+    with transaction.atomic():
+        livre = _verrouiller_livre(id_livre)
+        if Emprunt.objects.filter(
+            utilisateur=utilisateur, livre=livre, statut__in=Emprunt.STATUTS_ACTIFS
+        ).exists():
+            raise ValidationError("Vous avez déjà ce livre en votre possession.", code="deja_emprunte")
+        if _exemplaires_libres(livre, pour=utilisateur) <= 0:
+            raise ValidationError("Ce livre n'a plus d'exemplaires disponibles.", code="indisponible")
+
+        aujourd_hui = datetime.date.today()
+        emprunt = Emprunt.objects.create(
+            utilisateur=utilisateur,
+            livre=livre,
+            date_emprunt=aujourd_hui,
+            date_retour_prevue=aujourd_hui + datetime.timedelta(days=duree_jours),
+        )
+
+        # save() plutôt qu'update() : la file d'attente du livre est décomptée
+        reservation = Reservation.objects.filter(
+            utilisateur=utilisateur, livre=livre, statut__in=STATUTS_RESERVATION_OUVERTS
+        ).first()
+        if reservation:
+            reservation.statut = "annulee"
+            reservation.save(update_fields=["statut"])
+        return emprunt
+
+
+def _notifier_disponibilite(reservation, livre):
+    Notification.objects.create(
+        utilisateur_id=reservation.utilisateur_id,
+        type_notification="livre",
+        titre=f'"{livre.titre}" est disponible pour vous',
+        message=(
+            f"Bonne nouvelle ! Le livre « {livre.titre} » que vous avez réservé "
+            f"est maintenant disponible. Vous avez {Reservation.DELAI_DISPONIBILITE_JOURS} jours "
+            f"pour venir le récupérer à la médiathèque."
+        ),
+        lien=reverse("portail:liste_livres"),
+    )
+
+
+def promouvoir_reservations(id_livre):
+    """
+    Attribue les exemplaires libres du livre aux premiers de la file
+    d'attente, dans l'ordre d'arrivée, et les notifie. Nombre de requêtes
+    constant par réservation promue.
+
+    À appeler dans la transaction qui libère l'exemplaire.
+    Retourne la liste des réservations promues.
+    """
+    promues = []
+    with transaction.atomic():
+        # Relu sous verrou : compteurs à jour des écritures de la transaction
+        livre = _verrouiller_livre(id_livre)
+        libres = _exemplaires_libres(livre)
+
+        while libres > 0:
+            tete = (
+                livre.reservations.filter(statut="en_attente")
+                .order_by("date_reservation", "pk").first()
+            )
+            if tete is None:
+                break
+            tete.statut = "disponible"
+            tete.date_disponibilite = (
+                datetime.date.today() + datetime.timedelta(days=Reservation.DELAI_DISPONIBILITE_JOURS)
+            )
+            tete.save(update_fields=["statut", "date_disponibilite"])
+            _notifier_disponibilite(tete, livre)
+            promues.append(tete)
+            libres -= 1
+
+    return promues
+
+
+def retourner(emprunt):
+    """
+    Enregistre le retour de l'emprunt et attribue l'exemplaire au premier
+    de la file d'attente, dans la même transaction. Lève ValidationError si
+    l'emprunt est déjà rendu. Retourne les réservations promues.
+    """
+    with transaction.atomic():
+        _verrouiller_livre(emprunt.livre_id)
+        # Statut relu sous verrou : un retour simultané a pu passer avant
+        emprunt = Emprunt.objects.select_related("livre", "utilisateur").get(pk=emprunt.pk)
+        if emprunt.statut == "rendu":
+            raise ValidationError("Ce livre a déjà été retourné.", code="deja_rendu")
+        emprunt.statut = "rendu"
+        emprunt.date_retour_effective = datetime.date.today()
+        emprunt.save(update_fields=["statut", "date_retour_effective"])
+        return promouvoir_reservations(emprunt.livre_id)
+
+
+def reserver(utilisateur, id_livre):
+    """
+    Place l'utilisateur en fin de file d'attente du livre ; une ancienne
+    réservation (annulée, expirée) est reprise. Lève ValidationError si un
+    exemplaire est libre pour lui ou s'il a déjà le livre ou une réservation
+    ouverte. Retourne la réservation.
+    """
+    _expirer_gardes(id_livre)
+    with transaction.atomic():
+        livre = _verrouiller_livre(id_livre)
+        if _exemplaires_libres(livre, pour=utilisateur) > 0:
+            raise ValidationError(
+                "Ce livre est disponible — vous pouvez directement l'emprunter.", code="disponible"
+            )
+        if Emprunt.objects.filter(
+            utilisateur=utilisateur, livre=livre, statut__in=Emprunt.STATUTS_ACTIFS
+        ).exists():
+            raise ValidationError("Vous avez déjà ce livre en votre possession.", code="deja_emprunte")
+
+        # Une seule réservation par (utilisateur, livre) : contrainte d'unicité
+        reservation = Reservation.objects.filter(utilisateur=utilisateur, livre=livre).first()
+        if reservation is None:
+            return Reservation.objects.create(utilisateur=utilisateur, livre=livre)
+        if reservation.statut in STATUTS_RESERVATION_OUVERTS:
+            raise ValidationError(
+                "Vous avez déjà une réservation active pour ce livre.", code="deja_reserve"
+            )
+        reservation.statut = "en_attente"
+        reservation.date_reservation = timezone.now()   # fin de file
+        reservation.date_disponibilite = None
+        reservation.save(update_fields=["statut", "date_reservation", "date_disponibilite"])
+        return reservation
+
+
+def annuler_reservation(reservation):
+    """
+    Annule la réservation ; si elle gardait un exemplaire, celui-ci passe au
+    suivant de la file. Retourne les réservations promues.
+    """
+    with transaction.atomic():
+        _verrouiller_livre(reservation.livre_id)
+        reservation = Reservation.objects.get(pk=reservation.pk)
+        if reservation.statut not in STATUTS_RESERVATION_OUVERTS:
+            return []
+        gardait = reservation.statut == "disponible"
+        reservation.statut = "annulee"
+        reservation.save(update_fields=["statut"])
+        return promouvoir_reservations(reservation.livre_id) if gardait else []
+
+
+def expirer_reservations():
+    """
+    Expire, pour tous les livres, les réservations « disponible » dont le
+    délai de retrait est passé et attribue les exemplaires à la file
+    d'attente (une transaction par livre). Retourne le nombre d'expirées.
+    """
+    ids_livres = (
+        Reservation.objects
+        .filter(statut="disponible", date_disponibilite__lt=datetime.date.today())
+        .values_list("livre_id", flat=True).distinct()
+    )
+    return sum(_expirer_gardes(id_livre) for id_livre in list(ids_livres))
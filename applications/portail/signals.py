@@ -0,0 +1,73 @@
+"""
+Maintien des compteurs Livre.nb_empruntes et Livre.nb_en_attente.
+
+Chaque création, changement de statut (ou de livre) et suppression d'un
+emprunt ou d'une réservation ajuste le compteur du livre par une expression
+F() (voir mediatheque.py). Toute écriture sur un livre invalide les
+facettes du catalogue en cache, toute écriture sur un emprunt les
+statistiques de circulation.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .mediatheque import ajuster_compteurs_livre, invalider_catalogue, invalider_circulation
+from .models import Emprunt, Livre, Reservation
+
+COMPTEUR_DU_MODELE = {Emprunt: "nb_empruntes", Reservation: "nb_en_attente"}
+
+
+@receiver(pre_save, sender=Emprunt)
+@receiver(pre_save, sender=Reservation)
+def charger_etat_precedent(sender, instance, **kwargs):
+    """Lit l'état en base seulement pour une instance construite à la main"""
+    if instance._state.adding:
+        return
+    etat = getattr(instance, '_etat_charge', (None, None))
+    if None not in etat:
+        return
+    ligne = sender.objects.filter(pk=instance.pk).values_list('livre_id', 'statut').first()
+    instance._etat_charge = ligne or (None, None)
+
+
+@receiver(post_save, sender=Emprunt)
+@receiver(post_save, sender=Reservation)
+def maj_compteurs_enregistrement(sender, instance, created, **kwargs):
+    ancien_livre, ancien_statut = (
+        (None, None) if created else getattr(instance, '_etat_charge', (None, None))
+    )
+
+    ecarts = Counter()
+    if ancien_livre is not None and ancien_statut in sender.STATUTS_ACTIFS:
+        ecarts[ancien_livre] -= 1
+    if instance.statut in sender.STATUTS_ACTIFS:
+        ecarts[instance.livre_id] += 1
+    # Rien à écrire si l'emprunt (la réservation) reste actif sur le même livre
+    for id_livre, ecart in ecarts.items():
+        ajuster_compteurs_livre(id_livre, **{COMPTEUR_DU_MODELE[sender]: ecart})
+
+    instance.memoriser_etat()
+
+
+@receiver(post_delete, sender=Emprunt)
+@receiver(post_delete, sender=Reservation)
+def maj_compteurs_suppression(sender, instance, **kwargs):
+    livre, statut = getattr(instance, '_etat_charge', (None, None))
+    if (statut or instance.statut) in sender.STATUTS_ACTIFS:
+        ajuster_compteurs_livre(livre or instance.livre_id, **{COMPTEUR_DU_MODELE[sender]: -1})
+
+
+@receiver(post_save, sender=Livre)
+@receiver(post_delete, sender=Livre)
+def invalider_facettes(sender, **kwargs):
+    invalider_catalogue()
+
+
+@receiver(post_save, sender=Emprunt)
+@receiver(post_delete, sender=Emprunt)
+def invalider_statistiques_circulation(sender, **kwargs):
+    # Après validation : une lecture concurrente ne remet pas en cache l'état d'avant
+    transaction.on_commit(invalider_circulation)
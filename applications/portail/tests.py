@@ -1,3 +1,675 @@
-from django.test import TestCase
+import datetime
+import os
+import random
+import tempfile
+import threading
+import unittest
+from io import StringIO
+from itertools import combinations
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from applications.comptes.models import Utilisateur
+from applications.cours.models import Cours, SectionCours
+from applications.departements.models import Departement
+from applications.inscriptions.models import Inscription
+from applications.notifications.models import Notification
+from . import services
+from .mediatheque import (
+    facettes_categories, filtrer_disponibles, page_catalogue,
+    recalculer_compteurs_livres, rechercher_livres, statistiques_circulation,
+)
+from .models import Emprunt, Examen, Livre, Reservation, normaliser_isbn
+from .planification import colorier, construire_graphe, generer_creneaux, planifier_examens
+
+
+class PlanificationExamensTest(TestCase):
+    """Tests de la planification des examens par coloration du graphe des conflits"""
+
+    LUNDI = datetime.date(2026, 12, 7)
+
+    def creneaux(self, jours=2, heures=(8, 13)):
+        return generer_creneaux(
+            self.LUNDI, self.LUNDI + datetime.timedelta(days=jours - 1),
+            [datetime.time(h) for h in heures],
+        )
+
+    def test_coloration_valide(self):
+        aleatoire = random.Random(39)
+        sections = [
+            SimpleNamespace(id=i, professeur_id=aleatoire.randrange(15), nb_inscrits=aleatoire.randrange(5, 60))
+            for i in range(80)
+        ]
+        inscriptions = [
+            (etudiant, section)
+            for etudiant in range(400)
+            for section in aleatoire.sample(range(80), 5)
+        ]
+        voisins = construire_graphe(sections, inscriptions)
+        salles = [("Amphi", 60), ("A-101", 40), ("A-102", 40), ("B-1", 25)]
+        creneaux = self.creneaux(jours=13, heures=(8, 10, 13, 15))  # deux semaines
+
+        affectations, non_placees = colorier(sections, voisins, creneaux, salles, duree=120)
+
+        self.assertEqual(len(affectations) + len(non_placees), 80)
+        capacites = dict(salles)
+        for id_section, (indice, salle) in affectations.items():
+            self.assertGreaterEqual(capacites[salle], sections[id_section].nb_inscrits)
+            for voisin in voisins[id_section]:
+                if voisin in affectations:
+                    self.assertNotEqual(affectations[voisin][0], indice)
+        occupation = [(indice, salle) for indice, salle in affectations.values()]
+        self.assertEqual(len(occupation), len(set(occupation)))
+        self.assertEqual(non_placees, {})
+
+    def test_creneaux_qui_se_chevauchent(self):
+        sections = [SimpleNamespace(id=i, professeur_id=None, nb_inscrits=10) for i in range(2)]
+        voisins = construire_graphe(sections, [(1, 0), (1, 1)])
+        # 08:00 et 09:00 pour des examens de 2 h : un seul créneau utilisable à la fois
+        creneaux = self.creneaux(jours=1, heures=(8, 9))
+        affectations, non_placees = colorier(sections, voisins, creneaux, [("A", 30), ("B", 30)], duree=120)
+        self.assertEqual(len(affectations), 1)
+        self.assertEqual(list(non_placees.values()), ["aucun créneau compatible"])
+
+    def test_planifier_examens(self):
+        departement = Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        sections = []
+        for i in range(4):
+            cours = Cours.objects.create(
+                code=f"PSY10{i}", nom=f"Cours {i}", credits=3, departement=departement, niveau="NIVEAU1",
+            )
+            sections.append(SectionCours.objects.create(
+                cours=cours, numero_section="01", jour_semaine="LUNDI",
+                heure_debut=datetime.time(8 + 2 * i), heure_fin=datetime.time(9 + 2 * i),
+                salle=f"S{i}", session="SESSION_1", semestre="AUTOMNE", annee=2026, capacite_max=30,
+            ))
+        for n in range(6):
+            etudiant = Utilisateur.objects.create_user(
+                email=f"etu{n}@example.com", password="motdepasse123",
+                first_name="Etu", last_name=str(n), role="ETUDIANT",
+            ).profil_etudiant
+            # Chaque étudiant suit trois des quatre cours
+            for section in sections[:n % 4] + sections[n % 4 + 1:]:
+                Inscription.objects.create(etudiant=etudiant, section_cours=section)
+
+        rapport = planifier_examens(
+            2026, "AUTOMNE", self.creneaux(), salles=[("Amphi", 10), ("Annexe", 10)],
+        )
+        self.assertEqual(rapport["non_placees"], {})
+        self.assertEqual(Examen.objects.filter(type_examen="final").count(), 4)
+
+        # Aucun étudiant n'a deux examens au même créneau
+        for etudiant_id in Inscription.objects.values_list("etudiant_id", flat=True).distinct():
+            creneaux = list(
+                Examen.objects
+                .filter(section_cours__inscriptions__etudiant_id=etudiant_id)
+                .values_list("date", "heure")
+            )
+            self.assertEqual(len(creneaux), len(set(creneaux)))
+        # Deux examens au même créneau n'occupent pas la même salle
+        for a, b in combinations(Examen.objects.all(), 2):
+            if (a.date, a.heure) == (b.date, b.heure):
+                self.assertNotEqual(a.salle, b.salle)
+
+        # Réexécution : les examens existants sont conservés
+        sortie = StringIO()
+        call_command(
+            "planifier_examens", "--annee", "2026", "--semestre", "AUTOMNE",
+            "--debut", "2026-12-07", "--fin", "2026-12-08", stdout=sortie,
+        )
+        self.assertIn("4 section(s) avaient déjà leur examen", sortie.getvalue())
+        self.assertEqual(Examen.objects.count(), 4)
+
+
+    def test_examen_existant_hors_grille(self):
+        departement = Departement.objects.create(code="PSY", slug="psychologie", nom="Psychologie")
+        sections = []
+        for i in range(2):
+            cours = Cours.objects.create(
+                code=f"PSY10{i}", nom=f"Cours {i}", credits=3, departement=departement, niveau="NIVEAU1",
+            )
+            sections.append(SectionCours.objects.create(
+                cours=cours, numero_section="01", jour_semaine="LUNDI",
+                heure_debut=datetime.time(8 + 2 * i), heure_fin=datetime.time(9 + 2 * i),
+                session="SESSION_1", semestre="AUTOMNE", annee=2026, capacite_max=30,
+            ))
+        etudiant = Utilisateur.objects.create_user(
+            email="etu@example.com", password="motdepasse123", first_name="Etu", last_name="Diant",
+            role="ETUDIANT",
+        ).profil_etudiant
+        for section in sections:
+            Inscription.objects.create(etudiant=etudiant, section_cours=section)
+        # Lundi 9h-11h, hors de la grille (8h, 13h) : chevauche le créneau de 8h
+        Examen.objects.create(
+            section_cours=sections[0], type_examen="final", date=self.LUNDI,
+            heure=datetime.time(9), duree_minutes=120,
+        )
+
+        rapport = planifier_examens(2026, "AUTOMNE", self.creneaux(), salles=[("Amphi", 10)])
+
+        self.assertEqual(rapport["non_placees"], {})
+        self.assertEqual(Examen.objects.filter(section_cours=sections[0]).count(), 1)
+        nouveau = Examen.objects.get(section_cours=sections[1])
+        self.assertNotEqual((nouveau.date, nouveau.heure), (self.LUNDI, datetime.time(8)))
+
+
+class CompteursLivreTest(TestCase):
+    """Tests des compteurs d'emprunts et de réservations tenus sur Livre"""
+
+    def setUp(self):
+        self.lecteurs = [
+            Utilisateur.objects.create_user(
+                email=f"lecteur{i}@example.com", password="motdepasse123",
+                first_name="Lec", last_name=f"Teur{i}", role="ETUDIANT",
+                doit_changer_mot_de_passe=False,
+            )
+            for i in range(2)
+        ]
+        self.livre = Livre.objects.create(
+            titre="Tristes tropiques", auteur="Lévi-Strauss", annee=1955,
+            resume="…", nombre_exemplaires=1,
+        )
+
+    def _emprunter(self, lecteur):
+        return Emprunt.objects.create(
+            utilisateur=lecteur, livre=self.livre,
+            date_retour_prevue=datetime.date.today() + datetime.timedelta(days=14),
+        )
+
+    def test_emprunt_et_retour(self):
+        emprunt = self._emprunter(self.lecteurs[0])
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_empruntes, 1)
+        self.assertFalse(self.livre.disponible)
+
+        emprunt = Emprunt.objects.get(pk=emprunt.pk)
+        emprunt.statut = "en_retard"
+        emprunt.save()
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_empruntes, 1)
+
+        emprunt.statut = "rendu"
+        emprunt.save()
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_empruntes, 0)
+        self.assertTrue(self.livre.disponible)
+
+    def test_file_attente(self):
+        reservation = Reservation.objects.create(utilisateur=self.lecteurs[1], livre=self.livre)
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.en_attente_count(), 1)
+        reservation.notifier_disponible()
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_en_attente, 0)
+
+    def test_suppression_et_instance_perimee(self):
+        perime = Livre.objects.get(pk=self.livre.pk)
+        emprunt = self._emprunter(self.lecteurs[0])
+        # Une instance chargée avant l'emprunt n'écrase pas le compteur
+        perime.titre = "Tristes Tropiques"
+        perime.save()
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_empruntes, 1)
+        emprunt.delete()
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_empruntes, 0)
+
+    def test_catalogue_filtre_en_sql(self):
+        Livre.objects.create(titre="Autre", auteur="X", annee=2000, resume="…")
+        self._emprunter(self.lecteurs[0])
+        self.assertEqual(
+            list(filtrer_disponibles(Livre.objects.all()).values_list("titre", flat=True)), ["Autre"],
+        )
+        self.client.force_login(self.lecteurs[1])
+        reponse = self.client.get(reverse("portail:liste_livres"), {"dispo": "1"})
+        self.assertEqual([l.titre for l in reponse.context["livres"]], ["Autre"])
+        self.assertEqual(reponse.context["total"], 1)
+
+    def test_recalcul_apres_update(self):
+        self._emprunter(self.lecteurs[0])
+        Emprunt.objects.update(statut="rendu")   # hors signaux
+        ecarts = recalculer_compteurs_livres()
+        self.assertEqual(ecarts["nb_empruntes"], [(self.livre.pk, 1, 0)])
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_empruntes, 0)
+        self.assertEqual(recalculer_compteurs_livres(), {"nb_empruntes": [], "nb_en_attente": []})
+
+
+class RechercheCatalogueTest(TestCase):
+    """Tests de la recherche indexée, des facettes et des pages par curseur"""
+
+    def setUp(self):
+        cache.clear()
+        self.tristes = Livre.objects.create(
+            titre="Tristes tropiques", auteur="Claude Lévi-Strauss", annee=1955,
+            resume="…", categorie="anthropologie", isbn="2-266-11926-6",
+        )
+        self.suicide = Livre.objects.create(
+            titre="Le Suicide", auteur="Émile Durkheim", annee=1897,
+            resume="…", categorie="sociologie",
+        )
+        self.regles = Livre.objects.create(
+            titre="Les Règles de la méthode sociologique", auteur="Émile Durkheim",
+            annee=1895, resume="…", categorie="sociologie",
+        )
+
+    def _titres(self, q="", **kwargs):
+        return sorted(rechercher_livres(q, **kwargs).values_list("titre", flat=True))
+
+    def test_recherche_par_mots_sans_accents(self):
+        self.assertEqual(self._titres("tropi"), ["Tristes tropiques"])
+        self.assertEqual(self._titres("LEVI"), ["Tristes tropiques"])
+        self.assertEqual(self._titres("durkheim regles"), ["Les Règles de la méthode sociologique"])
+        self.assertEqual(len(self._titres("emile")), 2)
+        self.assertEqual(self._titres("le"), ["Le Suicide", "Les Règles de la méthode sociologique"])
+
+    def test_recherche_par_isbn(self):
+        self.assertEqual(normaliser_isbn("2-266-11926-6"), "9782266119269")
+        self.assertEqual(self._titres("978-2-266-11926-9"), ["Tristes tropiques"])
+        self.assertEqual(self._titres("2266119266"), ["Tristes tropiques"])
+
+    def test_index_suit_le_titre(self):
+        self.suicide.titre = "De la division du travail social"
+        self.suicide.save()
+        self.assertEqual(self._titres("suicide"), [])
+        self.assertEqual(self._titres("division"), ["De la division du travail social"])
+
+    def test_facettes_en_cache(self):
+        with self.assertNumQueries(1):
+            facettes = facettes_categories("emile")
+        self.assertEqual(facettes, {"sociologie": 2})
+        with self.assertNumQueries(0):
+            facettes_categories("Émile")
+        Livre.objects.create(titre="Émile", auteur="Rousseau", annee=1762, resume="…", categorie="philosophie")
+        self.assertEqual(facettes_categories("emile"), {"sociologie": 2, "philosophie": 1})
+
+    def test_pages_par_curseur(self):
+        for i in range(4):
+            Livre.objects.create(titre=f"Annales {i}", auteur="Collectif", annee=2000, resume="…")
+        livres = Livre.objects.all()
+        titres = list(livres.order_by("titre_normalise", "pk").values_list("titre", flat=True))
+
+        vus, page = [], page_catalogue(livres, taille=3)
+        self.assertIsNone(page.precedent)
+        while True:
+            vus.extend(livre.titre for livre in page.livres)
+            if page.suivant is None:
+                break
+            page = page_catalogue(livres, apres=page.suivant, taille=3)
+        self.assertEqual(vus, titres)
+
+        retour = page_catalogue(livres, avant=page.precedent, taille=3)
+        self.assertEqual([l.titre for l in retour.livres], titres[3:6])
+
+    def test_vue_catalogue(self):
+        lecteur = Utilisateur.objects.create_user(
+            email="lecteur@example.com", password="motdepasse123",
+            first_name="Lec", last_name="Teur", role="ETUDIANT",
+            doit_changer_mot_de_passe=False,
+        )
+        self.client.force_login(lecteur)
+        reponse = self.client.get(reverse("portail:liste_livres"), {"q": "durkheim", "categorie": "sociologie"})
+        self.assertEqual(reponse.context["total"], 2)
+        self.assertEqual([l.titre for l in reponse.context["livres"]],
+                         ["Le Suicide", "Les Règles de la méthode sociologique"])
+
+
+class LecteursMixin:
+    def creer_lecteurs(self, nombre, premier=0):
+        return [
+            Utilisateur.objects.create_user(
+                email=f"abonne{i}@example.com", password="motdepasse123",
+                first_name="Abo", last_name=f"Nne{i}", role="ETUDIANT",
+                doit_changer_mot_de_passe=False,
+            )
+            for i in range(premier, premier + nombre)
+        ]
+
+
+class ServicesMediathequeTest(LecteursMixin, TestCase):
+    """Tests des emprunts, retours et réservations sous verrou"""
+
+    def setUp(self):
+        self.lecteurs = self.creer_lecteurs(5)
+        self.livre = Livre.objects.create(
+            titre="Le Suicide", auteur="Durkheim", annee=1897, resume="…", nombre_exemplaires=2,
+        )
+
+    def _file_complete(self):
+        """Deux exemplaires prêtés, trois lecteurs en attente"""
+        emprunts = [services.emprunter(l, self.livre.id) for l in self.lecteurs[:2]]
+        reservations = [services.reserver(l, self.livre.id) for l in self.lecteurs[2:]]
+        return emprunts, reservations
+
+    def test_retours_promeuvent_la_tete_de_file(self):
+        emprunts, reservations = self._file_complete()
+
+        promues = services.retourner(emprunts[0])
+        self.assertEqual([r.pk for r in promues], [reservations[0].pk])
+        promues = services.retourner(emprunts[1])
+        self.assertEqual([r.pk for r in promues], [reservations[1].pk])
+
+        self.assertEqual(
+            list(Reservation.objects.order_by("pk").values_list("statut", flat=True)),
+            ["disponible", "disponible", "en_attente"],
+        )
+        self.livre.refresh_from_db()
+        self.assertEqual((self.livre.nb_empruntes, self.livre.nb_en_attente), (0, 1))
+        self.assertTrue(
+            Notification.objects.filter(utilisateur=self.lecteurs[2], type_notification="livre").exists()
+        )
+
+    def test_exemplaire_garde_pour_le_reservataire(self):
+        emprunts, reservations = self._file_complete()
+        services.retourner(emprunts[0])
+
+        with self.assertRaises(ValidationError) as refus:
+            services.emprunter(self.lecteurs[0], self.livre.id)
+        self.assertEqual(refus.exception.code, "indisponible")
+
+        services.emprunter(self.lecteurs[2], self.livre.id)
+        reservations[0].refresh_from_db()
+        self.assertEqual(reservations[0].statut, "annulee")
+
+    def test_double_retour_refuse(self):
+        emprunt = services.emprunter(self.lecteurs[0], self.livre.id)
+        perime = Emprunt.objects.get(pk=emprunt.pk)
+        services.retourner(emprunt)
+        with self.assertRaises(ValidationError) as refus:
+            services.retourner(perime)
+        self.assertEqual(refus.exception.code, "deja_rendu")
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_empruntes, 0)
+
+    def test_annulation_transmet_l_exemplaire(self):
+        emprunts, reservations = self._file_complete()
+        services.retourner(emprunts[0])
+        promues = services.annuler_reservation(reservations[0])
+        self.assertEqual([r.pk for r in promues], [reservations[1].pk])
+
+    def test_nouvelle_reservation_en_fin_de_file(self):
+        emprunts, reservations = self._file_complete()
+        services.annuler_reservation(reservations[0])
+        reprise = services.reserver(self.lecteurs[2], self.livre.id)
+        self.assertEqual(reprise.pk, reservations[0].pk)
+        with self.assertRaises(ValidationError):
+            services.reserver(self.lecteurs[2], self.livre.id)
+
+        promues = services.retourner(emprunts[0])
+        self.assertEqual([r.pk for r in promues], [reservations[1].pk])
+
+    def _garde_echue(self):
+        """Première réservation promue puis jamais retirée"""
+        emprunts, reservations = self._file_complete()
+        services.retourner(emprunts[0])
+        Reservation.objects.filter(pk=reservations[0].pk).update(
+            date_disponibilite=datetime.date.today() - datetime.timedelta(days=1)
+        )
+        return reservations
+
+    def test_garde_echue_passe_au_suivant(self):
+        reservations = self._garde_echue()
+        passant = self.creer_lecteurs(1, premier=5)[0]
+
+        # L'exemplaire n'est pas libre pour un passant : il revient au suivant
+        with self.assertRaises(ValidationError) as refus:
+            services.emprunter(passant, self.livre.id)
+        self.assertEqual(refus.exception.code, "indisponible")
+        statuts = dict(Reservation.objects.values_list("pk", "statut"))
+        self.assertEqual(statuts[reservations[0].pk], "expiree")
+        self.assertEqual(statuts[reservations[1].pk], "disponible")
+
+        # Le retardataire peut se remettre en fin de file
+        reprise = services.reserver(self.lecteurs[2], self.livre.id)
+        self.assertEqual((reprise.pk, reprise.statut), (reservations[0].pk, "en_attente"))
+        services.emprunter(self.lecteurs[3], self.livre.id)
+
+    def test_commande_expirer_reservations(self):
+        reservations = self._garde_echue()
+        sortie = StringIO()
+        call_command("expirer_reservations", stdout=sortie)
+        self.assertIn("1 réservation(s) expirée(s)", sortie.getvalue())
+        reservations[1].refresh_from_db()
+        self.assertEqual(reservations[1].statut, "disponible")
+        self.assertTrue(
+            Notification.objects.filter(utilisateur=self.lecteurs[3], type_notification="livre").exists()
+        )
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_en_attente, 1)
+
+    def test_vues_emprunt_et_retour(self):
+        self.client.force_login(self.lecteurs[0])
+        self.client.post(reverse("portail:emprunter", args=[self.livre.id]), {"duree_jours": "7"})
+        emprunt = Emprunt.objects.get(utilisateur=self.lecteurs[0])
+        self.assertEqual(emprunt.date_retour_prevue - emprunt.date_emprunt, datetime.timedelta(days=7))
+
+        self.client.post(reverse("portail:retourner", args=[emprunt.id]))
+        reponse = self.client.post(reverse("portail:retourner", args=[emprunt.id]), follow=True)
+        self.assertContains(reponse, "déjà été retourné")
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_empruntes, 0)
+
+    def test_promotion_en_requetes_constantes(self):
+        self.livre.nombre_exemplaires = 1
+        self.livre.save()
+        emprunt = services.emprunter(self.lecteurs[0], self.livre.id)
+        services.reserver(self.lecteurs[1], self.livre.id)
+        with CaptureQueriesContext(connection) as courte:
+            services.retourner(emprunt)
+
+        emprunt = services.emprunter(self.lecteurs[1], self.livre.id)
+        for lecteur in self.lecteurs[2:] + self.creer_lecteurs(10, premier=5):
+            services.reserver(lecteur, self.livre.id)
+        with CaptureQueriesContext(connection) as longue:
+            services.retourner(emprunt)
+        self.assertEqual(len(longue), len(courte))
+
+
+@unittest.skipUnless(
+    connection.features.has_select_for_update,
+    "Le verrouillage de lignes (SELECT ... FOR UPDATE) n'est pas supporté par cette base.",
+)
+class MediathequeConcurrenteTest(LecteursMixin, TransactionTestCase):
+    """Des opérations simultanées sur un livre restent cohérentes"""
+
+    EXEMPLAIRES = 3
+
+    def setUp(self):
+        self.livre = Livre.objects.create(
+            titre="Le Suicide", auteur="Durkheim", annee=1897, resume="…",
+            nombre_exemplaires=self.EXEMPLAIRES,
+        )
+
+    def _en_parallele(self, operation, arguments):
+        depart = threading.Barrier(len(arguments))
+        resultats, refus = [], []
+
+        def executer(argument):
+            try:
+                depart.wait()
+                resultats.append(operation(argument))
+            except ValidationError as e:
+                refus.append(e.code)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        fils = [threading.Thread(target=executer, args=(a,)) for a in arguments]
+        for f in fils:
+            f.start()
+        for f in fils:
+            f.join()
+        return resultats, refus
+
+    def test_emprunts_et_retours_simultanes(self):
+        lecteurs = self.creer_lecteurs(10)
+        emprunts, refus = self._en_parallele(lambda l: services.emprunter(l, self.livre.id), lecteurs)
+        self.assertEqual(len(emprunts), self.EXEMPLAIRES)
+        self.assertEqual(refus, ["indisponible"] * (len(lecteurs) - self.EXEMPLAIRES))
+
+        emprunteurs = {e.utilisateur_id for e in emprunts}
+        for lecteur in lecteurs:
+            if lecteur.id not in emprunteurs:
+                services.reserver(lecteur, self.livre.id)
+
+        # Chaque emprunt rendu deux fois en même temps : un seul retour compte
+        promues, refus = self._en_parallele(services.retourner, emprunts + emprunts)
+        self.assertEqual(refus, ["deja_rendu"] * self.EXEMPLAIRES)
+        ids = [r.pk for lot in promues for r in lot]
+        self.assertEqual(len(ids), self.EXEMPLAIRES)
+        self.assertEqual(len(set(ids)), self.EXEMPLAIRES)
+
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nb_empruntes, 0)
+        self.assertEqual(self.livre.nb_en_attente, len(lecteurs) - 2 * self.EXEMPLAIRES)
+        self.assertEqual(recalculer_compteurs_livres(), {"nb_empruntes": [], "nb_en_attente": []})
+
+
+class ImportLivresTest(TestCase):
+    """Tests de la commande importer_livres"""
+
+    def setUp(self):
+        cache.clear()
+        self.dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dossier.cleanup)
+
+    def _importer(self, *arguments):
+        sortie = StringIO()
+        call_command("importer_livres", *arguments, stdout=sortie)
+        return sortie.getvalue()
+
+    def _csv(self, contenu, nom="catalogue.csv"):
+        chemin = os.path.join(self.dossier.name, nom)
+        with open(chemin, "w", encoding="utf-8") as fichier:
+            fichier.write(contenu)
+        return chemin
+
+    def test_fixture_json_et_reimport(self):
+        sortie = self._importer("donnees/livres_demo.json")
+        self.assertIn("15 livre(s) créé(s)", sortie)
+        self.assertEqual(Livre.objects.count(), 15)
+        self.assertEqual(list(rechercher_livres("duru").values_list("titre", flat=True)),
+                         ["Sociologie de l'éducation"])
+
+        sortie = self._importer("donnees/livres_demo.json")
+        self.assertIn("0 livre(s) créé(s), 15 mis à jour", sortie)
+        self.assertEqual(Livre.objects.count(), 15)
+
+    def test_csv_doublons_et_mises_a_jour(self):
+        existant = Livre.objects.create(titre="Le Suicide", auteur="Durkheim", annee=1897, resume="…")
+        chemin = self._csv(
+            "titre,auteur,isbn,annee,categorie,nombre_exemplaires\n"
+            "Tristes tropiques,Lévi-Strauss,2-266-11926-6,1955,Anthropologie,2\n"
+            "Tristes Tropiques (poche),Lévi-Strauss,978-2-266-11926-9,1984,anthropologie,1\n"
+            "Le suicide,DURKHEIM,,1897,sociologie,3\n"
+            "Sans ISBN valide,X,12345,2000,autre,1\n"
+            "Mauvaise catégorie,X,,2000,astrologie,1\n"
+        )
+        rapport = os.path.join(self.dossier.name, "erreurs.csv")
+        sortie = self._importer(chemin, "--rapport", rapport)
+        self.assertIn("1 livre(s) créé(s), 1 mis à jour, 3 ignoré(s)", sortie)
+        self.assertIn("1 en double dans les fichiers", sortie)
+
+        tristes = Livre.objects.get(isbn_normalise="9782266119269")
+        self.assertEqual((tristes.categorie, tristes.nombre_exemplaires), ("anthropologie", 2))
+        existant.refresh_from_db()
+        self.assertEqual(existant.nombre_exemplaires, 3)
+        self.assertEqual(existant.titre, "Le suicide")
+
+    def test_dry_run(self):
+        self._importer("donnees/livres_demo.json", "--dry-run")
+        self.assertFalse(Livre.objects.exists())
+
+    def test_couvertures_reduites(self):
+        Image.new("RGB", (1200, 1800), "navy").save(os.path.join(self.dossier.name, "couv.png"))
+        chemin = self._csv(
+            "titre,auteur,annee,couverture\n"
+            "Tristes tropiques,Lévi-Strauss,1955,couv.png\n"
+            "Le Suicide,Durkheim,1897,absente.png\n"
+        )
+        with override_settings(MEDIA_ROOT=os.path.join(self.dossier.name, "media")):
+            sortie = self._importer(chemin, "--couvertures", "--fils-couvertures", "2")
+            self.assertIn("1 attachée(s), 1 échec(s)", sortie)
+            livre = Livre.objects.get(titre="Tristes tropiques")
+            with Image.open(livre.couverture.path) as image:
+                self.assertEqual(image.size, (400, 600))
+        self.assertFalse(Livre.objects.get(titre="Le Suicide").couverture)
+
+
+class StatistiquesCirculationTest(LecteursMixin, TestCase):
+    """Tests des statistiques de circulation du tableau de bord des emprunts"""
+
+    def setUp(self):
+        cache.clear()
+        self.lecteurs = self.creer_lecteurs(3)
+        self.suicide = Livre.objects.create(
+            titre="Le Suicide", auteur="Durkheim", annee=1897, resume="…",
+            categorie="sociologie", nombre_exemplaires=4,
+        )
+        self.annales = Livre.objects.create(
+            titre="Annales", auteur="Bloch", annee=1929, resume="…",
+            categorie="histoire", nombre_exemplaires=1,
+        )
+        aujourd_hui = datetime.date.today()
+        jours = datetime.timedelta
+        for lecteur, livre, debut, statut in [
+            (self.lecteurs[0], self.suicide, aujourd_hui, "en_cours"),
+            (self.lecteurs[1], self.suicide, aujourd_hui - jours(30), "en_cours"),   # en retard
+            (self.lecteurs[2], self.suicide, aujourd_hui, "rendu"),
+            (self.lecteurs[0], self.annales, aujourd_hui - jours(400), "rendu"),      # hors période
+        ]:
+            Emprunt.objects.create(
+                utilisateur=lecteur, livre=livre, date_emprunt=debut,
+                date_retour_prevue=debut + jours(14), statut=statut,
+                date_retour_effective=aujourd_hui if statut == "rendu" and debut == aujourd_hui else None,
+            )
+
+    def test_chiffres_en_deux_requetes(self):
+        with self.assertNumQueries(2):
+            stats = statistiques_circulation()
+        self.assertEqual(
+            (stats["en_cours"], stats["en_retard"], stats["rendus_mois"]), (1, 1, 1),
+        )
+        self.assertEqual(
+            [(l["titre"], l["emprunts"]) for l in stats["top_livres"]], [("Le Suicide", 3)],
+        )
+        self.assertEqual(
+            [(c["code"], c["empruntes"], c["exemplaires"], c["taux"]) for c in stats["categories"]],
+            [("sociologie", 2, 4, 50.0), ("histoire", 0, 1, 0.0)],
+        )
+        with self.assertNumQueries(0):
+            statistiques_circulation()
+
+    def test_cache_vide_au_retour(self):
+        statistiques_circulation()
+        emprunt = Emprunt.objects.get(utilisateur=self.lecteurs[0], statut="en_cours")
+        with self.captureOnCommitCallbacks(execute=True):
+            services.retourner(emprunt)
+        stats = statistiques_circulation()
+        self.assertEqual((stats["en_cours"], stats["rendus_mois"]), (0, 2))
+
+    def test_tableau_de_bord_et_export(self):
+        admin = Utilisateur.objects.create_user(
+            email="admin@example.com", password="motdepasse123",
+            first_name="Ad", last_name="Min", role="ADMIN", doit_changer_mot_de_passe=False,
+        )
+        self.client.force_login(admin)
+        reponse = self.client.get(reverse("portail:gestion_emprunts"), {"statut": "rendu"})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.context["stats"]["en_retard"], 1)
+        self.assertEqual(len(reponse.context["emprunts"]), 2)
+
+        reponse = self.client.get(reverse("portail:export_circulation_csv"))
+        contenu = reponse.content.decode()
+        self.assertEqual(reponse["Content-Type"], "text/csv")
+        self.assertIn("Emprunts en retard,1", contenu)
+        self.assertIn("Le Suicide,Durkheim,3", contenu)
+        self.assertIn("Sociologie,1,4,2,50.0", contenu)
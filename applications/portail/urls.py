@@ -41,5 +41,6 @@ urlpatterns = [
 
     # ── Livres : administration ───────────────────────────────────────────────
     path('livres/admin/emprunts/',                            views.vue_gestion_emprunts,          name='gestion_emprunts'),          # ← nouveau
+    path('livres/admin/emprunts/statistiques.csv',            views.vue_export_circulation_csv,    name='export_circulation_csv'),
     path('livres/admin/emprunts/<int:emprunt_id>/retour/',    views.vue_enregistrer_retour_admin,  name='enregistrer_retour_admin'),   # ← nouveau
 ]
\ No newline at end of file
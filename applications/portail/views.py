@@ -19,14 +19,21 @@ from .models import Personnel, Livre
 # Remplacer les 4 vues livre existantes par ce bloc complet
 # ============================================================
 
+import csv
 import datetime
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db import IntegrityError
-from django.http import HttpResponseForbidden
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.http import HttpResponse, HttpResponseForbidden
 from django.utils import timezone
 
+from . import services
+from .mediatheque import (
+    facettes_categories, page_catalogue, rechercher_livres, statistiques_circulation,
+)
 from .models import Livre, Emprunt, Reservation
 from utilitaires.roles import est_administrateur
 from applications.notifications.models import Notification
@@ -376,28 +383,6 @@ def _notifier(utilisateur, titre, message, lien=''):
     )
 
 
-def _activer_prochaine_reservation(livre):
-    """Notifie le prochain en liste d'attente quand un exemplaire se libère."""
-    prochaine = (
-        livre.reservations
-        .filter(statut='en_attente')
-        .order_by('date_reservation')
-        .first()
-    )
-    if prochaine:
-        prochaine.notifier_disponible()
-        _notifier(
-            prochaine.utilisateur,
-            titre=f'"{livre.titre}" est disponible pour vous',
-            message=(
-                f'Bonne nouvelle ! Le livre « {livre.titre} » que vous avez réservé '
-                f'est maintenant disponible. Vous avez {Reservation.DELAI_DISPONIBILITE_JOURS} jours '
-                f'pour venir le récupérer à la médiathèque.'
-            ),
-            lien='/portail/livres/',
-        )
-
-
 # ── Catalogue ────────────────────────────────────────────────────────────────
 
 @login_required
@@ -405,34 +390,46 @@ def vue_liste_livres(request):
     q         = request.GET.get('q', '').strip()
     categorie = request.GET.get('categorie', '')
     dispo     = request.GET.get('dispo', '')
-
-    livres = Livre.objects.prefetch_related('emprunts', 'reservations')
-
-    if q:
-        livres = livres.filter(titre__icontains=q) | livres.filter(auteur__icontains=q)
-        livres = livres.distinct()
-    if categorie:
-        livres = livres.filter(categorie=categorie)
-    if dispo == '1':
-        # On filtre côté Python car disponible est une property
-        livres = [l for l in livres if l.disponible]
-
-    # Mes emprunts en cours + réservations actives (pour les badges)
-    mes_emprunts_ids     = set()
-    mes_reservations_ids = set()
-    if request.user.is_authenticated:
-        mes_emprunts_ids = set(
-            Emprunt.objects.filter(utilisateur=request.user, statut__in=['en_cours', 'en_retard'])
-            .values_list('livre_id', flat=True)
-        )
-        mes_reservations_ids = set(
-            Reservation.objects.filter(utilisateur=request.user, statut__in=['en_attente', 'disponible'])
-            .values_list('livre_id', flat=True)
-        )
+    apres     = request.GET.get('apres', '')
+    avant     = request.GET.get('avant', '')
+
+    # Recherche indexée, page par curseur et facettes en cache (mediatheque.py)
+    livres = rechercher_livres(q, categorie, disponible=dispo == '1')
+    page = page_catalogue(
+        livres,
+        apres=int(apres) if apres.isdigit() else None,
+        avant=int(avant) if avant.isdigit() else None,
+        taille=getattr(settings, 'ELEMENTS_PAR_PAGE', 10),
+    )
+    facettes = facettes_categories(q, disponible=dispo == '1')
+    total = facettes.get(categorie, 0) if categorie else sum(facettes.values())
+
+    parametres = request.GET.copy()
+    for cle in ('apres', 'avant'):
+        parametres.pop(cle, None)
+
+    # Mes emprunts en cours + réservations actives (pour les badges de la page)
+    ids_page = [livre.id for livre in page.livres]
+    mes_emprunts_ids = set(
+        Emprunt.objects.filter(
+            utilisateur=request.user, livre_id__in=ids_page, statut__in=['en_cours', 'en_retard'],
+        ).values_list('livre_id', flat=True)
+    )
+    mes_reservations_ids = set(
+        Reservation.objects.filter(
+            utilisateur=request.user, livre_id__in=ids_page, statut__in=['en_attente', 'disponible'],
+        ).values_list('livre_id', flat=True)
+    )
 
     return render(request, 'portail/livres/liste.html', {
-        'livres':              livres,
-        'categories':          Livre.CHOIX_CATEGORIE,
+        'livres':              page.livres,
+        'page':                page,
+        'total':               total,
+        'parametres':          parametres.urlencode(),
+        'categories':          [
+            (code, libelle, facettes[code])
+            for code, libelle in Livre.CHOIX_CATEGORIE if facettes.get(code)
+        ],
         'q':                   q,
         'categorie_filtre':    categorie,
         'dispo_filtre':        dispo,
@@ -450,7 +447,7 @@ def vue_detail_livre(request, livre_id):
     ma_reservation = Reservation.objects.filter(
         utilisateur=request.user, livre=livre, statut__in=['en_attente', 'disponible']
     ).first()
-    file_attente = livre.reservations.filter(statut='en_attente').count()
+    file_attente = livre.nb_en_attente
 
     return render(request, 'portail/livres/detail.html', {
         'livre':          livre,
@@ -466,7 +463,7 @@ def vue_detail_livre(request, livre_id):
 def vue_emprunter(request, livre_id):
     livre = get_object_or_404(Livre, id=livre_id)
 
-    # Vérifications
+    # Vérifications (refaites sous verrou par le service)
     if not livre.disponible:
         messages.error(request, "Ce livre n'a plus d'exemplaires disponibles.")
         return redirect('portail:detail_livre', livre_id=livre_id)
@@ -479,21 +476,16 @@ def vue_emprunter(request, livre_id):
         return redirect('portail:detail_livre', livre_id=livre_id)
 
     if request.method == 'POST':
-        duree = int(request.POST.get('duree_jours', Emprunt.DUREE_DEFAUT_JOURS))
-        duree = max(1, min(duree, 30))  # entre 1 et 30 jours
-        aujourd_hui = datetime.date.today()
-
-        emprunt = Emprunt.objects.create(
-            utilisateur=request.user,
-            livre=livre,
-            date_emprunt=aujourd_hui,
-            date_retour_prevue=aujourd_hui + datetime.timedelta(days=duree),
-        )
-
-        # Annuler la réservation si elle en avait une
-        Reservation.objects.filter(
-            utilisateur=request.user, livre=livre, statut__in=['en_attente', 'disponible']
-        ).update(statut='annulee')
+        try:
+            duree = int(request.POST.get('duree_jours', Emprunt.DUREE_DEFAUT_JOURS))
+        except ValueError:
+            duree = Emprunt.DUREE_DEFAUT_JOURS
+        try:
+            emprunt = services.emprunter(request.user, livre.id, duree)
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+            return redirect('portail:detail_livre', livre_id=livre_id)
+        aujourd_hui = emprunt.date_emprunt
 
         _notifier(
             request.user,
@@ -527,9 +519,12 @@ def vue_retourner(request, emprunt_id):
         return redirect('portail:mes_emprunts')
 
     if request.method == 'POST':
-        emprunt.statut = 'rendu'
-        emprunt.date_retour_effective = datetime.date.today()
-        emprunt.save()
+        try:
+            # Le prochain en liste d'attente est notifié par le service
+            services.retourner(emprunt)
+        except ValidationError as e:
+            messages.warning(request, e.messages[0])
+            return redirect('portail:mes_emprunts')
 
         _notifier(
             emprunt.utilisateur,
@@ -538,9 +533,6 @@ def vue_retourner(request, emprunt_id):
             lien='/portail/livres/mes-emprunts/',
         )
 
-        # Notifier le prochain en liste d'attente
-        _activer_prochaine_reservation(emprunt.livre)
-
         messages.success(request, f"Retour de « {emprunt.livre.titre} » enregistré.")
         return redirect('portail:mes_emprunts' if not request.user.est_administrateur() else 'portail:gestion_emprunts')
 
@@ -587,13 +579,13 @@ def vue_reserver(request, livre_id):
 
     if request.method == 'POST':
         try:
-            Reservation.objects.create(utilisateur=request.user, livre=livre)
+            services.reserver(request.user, livre.id)
             messages.success(request, f"Réservation enregistrée pour « {livre.titre} ». Vous serez notifié dès qu'un exemplaire se libère.")
-        except IntegrityError:
-            messages.warning(request, "Vous avez déjà une réservation active pour ce livre.")
+        except ValidationError as e:
+            messages.warning(request, e.messages[0])
         return redirect('portail:mes_emprunts')
 
-    position = livre.reservations.filter(statut='en_attente').count() + 1
+    position = livre.nb_en_attente + 1
     return render(request, 'portail/livres/confirmer_reservation.html', {
         'livre':    livre,
         'position': position,
@@ -604,8 +596,7 @@ def vue_reserver(request, livre_id):
 def vue_annuler_reservation(request, reservation_id):
     reservation = get_object_or_404(Reservation, id=reservation_id, utilisateur=request.user)
     if request.method == 'POST':
-        reservation.statut = 'annulee'
-        reservation.save()
+        services.annuler_reservation(reservation)
         messages.success(request, f"Réservation pour « {reservation.livre.titre} » annulée.")
     return redirect('portail:mes_emprunts')
 
@@ -619,7 +610,7 @@ def vue_gestion_emprunts(request):
     statut = request.GET.get('statut', '')
     q      = request.GET.get('q', '').strip()
 
-    emprunts = Emprunt.objects.select_related('utilisateur', 'livre').order_by('-date_emprunt')
+    emprunts = Emprunt.objects.select_related('utilisateur', 'livre').order_by('-date_emprunt', '-pk')
 
     if statut:
         emprunts = emprunts.filter(statut=statut)
@@ -633,34 +624,67 @@ def vue_gestion_emprunts(request):
         )
         emprunts = emprunts.distinct()
 
-    # Statistiques rapides
-    stats = {
-        'en_cours':  Emprunt.objects.filter(statut='en_cours').count(),
-        'en_retard': Emprunt.objects.filter(statut='en_retard').count(),
-        'rendus_mois': Emprunt.objects.filter(
-            statut='rendu',
-            date_retour_effective__month=datetime.date.today().month
-        ).count(),
-    }
+    paginateur = Paginator(emprunts, getattr(settings, "ELEMENTS_PAR_PAGE", 10))
+    page_obj = paginateur.get_page(request.GET.get('page'))
+    parametres = request.GET.copy()
+    parametres.pop('page', None)
 
     return render(request, 'portail/livres/gestion_emprunts.html', {
-        'emprunts': emprunts,
-        'stats':    stats,
+        'emprunts': page_obj.object_list,
+        'page_obj': page_obj,
+        'parametres': parametres.urlencode(),
+        'stats':    statistiques_circulation(),
         'statut_filtre': statut,
         'q': q,
     })
 
 
+@login_required
+@user_passes_test(est_administrateur)
+def vue_export_circulation_csv(request):
+    """Statistiques de circulation du tableau de bord, en CSV."""
+    stats = statistiques_circulation()
+
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = (
+        f'attachment; filename="circulation_{stats["calcule_le"]:%Y-%m-%d}.csv"'
+    )
+    writer = csv.writer(response)
+    writer.writerow(['Indicateur', 'Valeur'])
+    writer.writerow(['Emprunts en cours', stats['en_cours']])
+    writer.writerow(['Emprunts en retard', stats['en_retard']])
+    writer.writerow(['Rendus ce mois', stats['rendus_mois']])
+    writer.writerow(['Emprunts ce mois', stats['emprunts_mois']])
+    writer.writerow(['Emprunts le mois précédent', stats['emprunts_mois_precedent']])
+
+    writer.writerow([])
+    writer.writerow([f"Titres les plus empruntés ({stats['periode_top_jours']} derniers jours)"])
+    writer.writerow(['Titre', 'Auteur', 'Emprunts'])
+    for livre in stats['top_livres']:
+        writer.writerow([livre['titre'], livre['auteur'], livre['emprunts']])
+
+    writer.writerow([])
+    writer.writerow(['Utilisation par catégorie'])
+    writer.writerow(['Catégorie', 'Titres', 'Exemplaires', 'Empruntés', "Taux d'utilisation (%)"])
+    for categorie in stats['categories']:
+        writer.writerow([
+            categorie['libelle'], categorie['titres'], categorie['exemplaires'],
+            categorie['empruntes'], categorie['taux'],
+        ])
+    return response
+
+
 @login_required
 @user_passes_test(est_administrateur)
 def vue_enregistrer_retour_admin(request, emprunt_id):
     """Admin enregistre un retour physique."""
     emprunt = get_object_or_404(Emprunt, id=emprunt_id)
     if request.method == 'POST':
-        emprunt.statut = 'rendu'
-        emprunt.date_retour_effective = datetime.date.today()
-        emprunt.save()
-        _activer_prochaine_reservation(emprunt.livre)
+        try:
+            services.retourner(emprunt)
+        except ValidationError as e:
+            messages.warning(request, e.messages[0])
+            return redirect('portail:gestion_emprunts')
         messages.success(request, f"Retour de « {emprunt.livre.titre} » enregistré pour {emprunt.utilisateur.get_full_name()}.")
     return redirect('portail:gestion_emprunts')
 
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -104,9 +104,10 @@ DATABASES = {
 # Custom User Model
 AUTH_USER_MODEL = "comptes.Utilisateur"
 # Authentication Backends
+# AuthentificationUniverselle hérite de ModelBackend (permissions) et gère
+# déjà l'email : ModelBackend seul ferait une seconde recherche non limitée.
 AUTHENTICATION_BACKENDS = [
-    "django.contrib.auth.backends.ModelBackend",  # par défaut
-    "applications.comptes.backends.AuthentificationUniverselle",  # ton backend
+    "applications.comptes.backends.AuthentificationUniverselle",
 ]
 
 
@@ -152,9 +153,30 @@ LOGIN_URL = "comptes:connexion"
 LOGIN_REDIRECT_URL = "tableau_de_bord"
 LOGOUT_REDIRECT_URL = "accueil"
 
+# Cache (partagé entre processus en production : Redis ou Memcached)
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default=""),
+    }
+}
+
 # Session settings
+# Sessions servies depuis le cache (applications/comptes/sessions.py) seulement
+# si le cache est partagé : avec un cache par processus, une session supprimée
+# dans un processus resterait valide dans les autres.
+if CACHES["default"]["BACKEND"] in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+):
+    SESSION_ENGINE = "django.contrib.sessions.backends.db"
+else:
+    SESSION_ENGINE = "applications.comptes.sessions"
 SESSION_COOKIE_AGE = 7200  # 2 heure
 SESSION_SAVE_EVERY_REQUEST = True
+# Écart toléré (secondes) entre l'expiration glissante et celle en base
+# avant réécriture de la session (voir applications/comptes/sessions.py)
+SESSION_SEUIL_PROLONGATION = 10 * 60
 
 
 # Messages
@@ -182,6 +204,16 @@ DEFAULT_FROM_EMAIL  = f'Faculté des Sciences Humaines <{config("EMAIL_HOST_USER
 MAX_COURS_PAR_SESSION = 7  
 MOT_DE_PASSE_TEMPORAIRE = "motdepasse123"  # était DEFAULT_TEMP_PASSWORD
 ELEMENTS_PAR_PAGE = 20  # était PAGINATION_PER_PAGE
+# Limitation des connexions échouées (compteurs en cache, fenêtre en secondes).
+# Au-delà de la limite, délai croissant entre deux tentatives (secondes)
+CONNEXION_ECHECS_MAX_IDENTIFIANT = 5
+CONNEXION_ECHECS_MAX_IP = 50
+CONNEXION_FENETRE_ECHECS = 15 * 60
+CONNEXION_DELAI_BASE = 2
+CONNEXION_DELAI_MAX = 5 * 60
+# Proxys inverses dont l'en-tête X-Forwarded-For est fiable (adresses séparées par des virgules)
+CONNEXION_PROXYS_DE_CONFIANCE = config("CONNEXION_PROXYS_DE_CONFIANCE", default="", cast=Csv())
+CONNEXION_ENTETE_IP = "HTTP_X_FORWARDED_FOR"
 ARTICLES_PAR_PAGE = config('ARTICLES_PAR_PAGE',  default=9, cast=int)
 
 
@@ -0,0 +1,12 @@
+from django.conf import settings
+
+# Caches propres à chaque processus : une écriture n'y est pas vue des autres
+CACHES_LOCAUX = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_partage(alias="default"):
+    """Vrai si le cache `alias` est partagé entre processus (Redis, Memcached, base…)"""
+    return settings.CACHES[alias]["BACKEND"] not in CACHES_LOCAUX
@@ -0,0 +1,543 @@
+"""
+Moteur commun des commandes d'import CSV (import_departements, import_cours,
+import_etudiants, import_emplois_du_temps).
+
+Une commande d'import hérite de CommandeImport et déclare :
+    - COLONNES    : {champ: Colonne(...)} — lecture, nettoyage et conversion
+                    de chaque colonne, sans accès à la base ;
+    - valider()   : règles métier d'une ligne (recherches dans les index
+                    préchargés par preparer()), lève ErreurLigne pour la rejeter ;
+    - ecrire_lot(): enregistrement groupé des lignes valides, typiquement
+                    par upsert() ; retourne (créés, mis à jour).
+
+Le moteur se charge du reste : lecture en flux de fichiers CSV ou JSON (les
+lignes ne sont jamais toutes en mémoire, seulement un lot de --taille-lot ;
+un JSON est un tableau d'objets, fixtures Django comprises), lecture anticipée de
+plusieurs fichiers en parallèle (--fils), rapport des lignes rejetées en
+CSV ou JSON (--rapport), progression, transaction unique annulée en
+--dry-run, résumé et durée de chaque étape.
+"""
+
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+class ErreurLigne(Exception):
+    """Ligne rejetée ; `categorie` sert au décompte du résumé."""
+
+    def __init__(self, message, categorie="format"):
+        super().__init__(message)
+        self.message = message
+        self.categorie = categorie
+
+
+class _StopDryRun(Exception):
+    """Exception interne : annule la transaction en mode --dry-run."""
+    pass
+
+
+# Fichier (ou liste de dicts) à importer. `contexte` est transmis tel quel à
+# valider() ; une source avec `erreur` est signalée puis ignorée.
+Source = namedtuple("Source", "nom chemin lignes contexte erreur", defaults=(None, None, None, None))
+
+
+# ── Colonnes ─────────────────────────────────────────────────────────────────
+
+class Colonne:
+    """
+    Colonne du fichier : valeur nettoyée (strip), puis, si elle n'est pas
+    vide, traduite par `choix` ({brut: valeur}) ou `convertir` (ValueError
+    = ligne rejetée). Vide : ErreurLigne si `obligatoire`, sinon `defaut`.
+    """
+
+    def __init__(self, source=None, obligatoire=False, defaut="", choix=None,
+                 convertir=None, libelle=None, categorie="format"):
+        self.source = source
+        self.obligatoire = obligatoire
+        self.defaut = defaut
+        self.choix = choix
+        self.convertir = convertir
+        self.libelle = libelle
+        self.categorie = categorie
+
+    def lire(self, nom, ligne):
+        brut = ligne.get(self.source or nom)
+        if isinstance(brut, str) or brut is None:
+            brut = (brut or "").strip()
+        libelle = self.libelle or nom
+
+        if self.choix is not None:
+            if brut not in self.choix:
+                raise ErreurLigne(f"{libelle} inconnu « {brut} »", self.categorie)
+            return self.choix[brut]
+
+        if brut == "":
+            if self.obligatoire:
+                raise ErreurLigne(f"{libelle} manquant", self.categorie)
+            return self.defaut
+
+        if self.convertir is not None:
+            try:
+                return self.convertir(brut)
+            except ValueError:
+                raise ErreurLigne(f"{libelle} invalide « {brut} »", self.categorie)
+        return brut
+
+
+# ── JSON en flux ─────────────────────────────────────────────────────────────
+
+def lire_json_en_flux(fichier, taille_bloc=1 << 16):
+    """
+    Éléments d'un tableau JSON, décodés un à un au fil de la lecture : le
+    fichier n'est jamais chargé en entier, seulement l'élément en cours.
+    Lève ValueError si le fichier n'est pas un tableau JSON valide.
+    """
+    decodeur = json.JSONDecoder()
+    tampon, fin_fichier = "", False
+
+    def completer():
+        nonlocal tampon, fin_fichier
+        bloc = fichier.read(taille_bloc)
+        fin_fichier = not bloc
+        tampon += bloc
+
+    while not tampon.strip() and not fin_fichier:
+        completer()
+    tampon = tampon.lstrip()
+    if not tampon.startswith("["):
+        raise ValueError("le fichier doit contenir un tableau JSON")
+    tampon = tampon[1:]
+    attendu_virgule = False
+    while True:
+        tampon = tampon.lstrip()
+        if not tampon:
+            if fin_fichier:
+                raise ValueError("tableau JSON non terminé")
+            completer()
+            continue
+        if tampon[0] == "]":
+            return
+        if attendu_virgule:
+            if tampon[0] != ",":
+                raise ValueError(f"« , » attendu avant « {tampon[:20]} »")
+            tampon = tampon[1:]
+            attendu_virgule = False
+            continue
+        try:
+            element, fin = decodeur.raw_decode(tampon)
+        except json.JSONDecodeError:
+            if fin_fichier:
+                raise
+            completer()
+            continue
+        if fin == len(tampon) and not fin_fichier:
+            # Un nombre en fin de tampon peut être coupé : on relit la suite
+            completer()
+            continue
+        yield element
+        tampon = tampon[fin:]
+        attendu_virgule = True
+
+
+def _ligne_json(element):
+    """Objet d'un tableau JSON → ligne ; une entrée de fixture Django donne ses `fields`"""
+    if isinstance(element, dict) and "model" in element and isinstance(element.get("fields"), dict):
+        return element["fields"]
+    return element
+
+
+# ── Rapport des lignes rejetées ──────────────────────────────────────────────
+
+class RapportErreurs:
+    """Écrit les lignes rejetées au fil de l'eau, en CSV ou en JSON (selon l'extension)"""
+
+    ENTETE = ["fichier", "ligne", "categorie", "message", "donnees"]
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.nombre = 0
+        self._json = chemin.lower().endswith(".json")
+        self._fichier = open(chemin, "w", newline="", encoding="utf-8")
+        if self._json:
+            self._fichier.write("[")
+        else:
+            self._csv = csv.writer(self._fichier)
+            self._csv.writerow(self.ENTETE)
+
+    def ajouter(self, fichier, num_ligne, erreur, donnees):
+        valeurs = [fichier, num_ligne, erreur.categorie, erreur.message, donnees]
+        if self._json:
+            self._fichier.write(("," if self.nombre else "") + "\n  ")
+            self._fichier.write(json.dumps(dict(zip(self.ENTETE, valeurs)), ensure_ascii=False))
+        else:
+            valeurs[-1] = json.dumps(donnees, ensure_ascii=False)
+            self._csv.writerow(valeurs)
+        self.nombre += 1
+
+    def fermer(self):
+        if self._json:
+            self._fichier.write("\n]\n")
+        self._fichier.close()
+
+
+# ── Écritures groupées ───────────────────────────────────────────────────────
+
+def completer_pks(modele, objets, champ):
+    """
+    Clés primaires après bulk_create, quand la base ne les renvoie pas
+    (MySQL) : relues d'après `champ`, unique.
+    """
+    if not objets or connection.features.can_return_rows_from_bulk_insert:
+        return
+    ids = dict(
+        modele.objects.filter(**{f"{champ}__in": [getattr(o, champ) for o in objets]})
+        .values_list(champ, "pk")
+    )
+    for objet in objets:
+        objet.pk = ids[getattr(objet, champ)]
+
+
+def upsert(modele, objets, cle, champs, taille_lot=None):
+    """
+    Enregistre des instances non sauvegardées d'après le champ unique `cle` :
+    une requête pour retrouver celles qui existent, puis bulk_create des
+    nouvelles et bulk_update des existantes dont un des `champs` a changé.
+    Pour une même clé, la dernière instance l'emporte. Les pk sont
+    renseignées sur les instances. Retourne (créées, mises à jour).
+    """
+    par_cle = {getattr(objet, cle): objet for objet in objets}
+    existants = modele.objects.in_bulk(list(par_cle), field_name=cle)
+    a_creer, a_modifier = [], []
+    for valeur, objet in par_cle.items():
+        existant = existants.get(valeur)
+        if existant is None:
+            a_creer.append(objet)
+            continue
+        objet.pk = existant.pk
+        if any(
+            modele._meta.get_field(champ).value_from_object(objet)
+            != modele._meta.get_field(champ).value_from_object(existant)
+            for champ in champs
+        ):
+            a_modifier.append(objet)
+
+    modele.objects.bulk_create(a_creer, batch_size=taille_lot)
+    completer_pks(modele, a_creer, cle)
+
+    # bulk_update n'applique pas auto_now
+    horodatages = [f.name for f in modele._meta.concrete_fields if getattr(f, "auto_now", False)]
+    maintenant = timezone.now()
+    for objet in a_modifier:
+        for champ in horodatages:
+            setattr(objet, champ, maintenant)
+    modele.objects.bulk_update(a_modifier, [*champs, *horodatages], batch_size=taille_lot)
+    return len(a_creer), len(objets) - len(a_creer)
+
+
+# ── Commande de base ─────────────────────────────────────────────────────────
+
+class CommandeImport(BaseCommand, metaclass=ABCMeta):
+    COLONNES = {}
+
+    # Libellés du résumé : {creees}, {mises_a_jour}, {ignorees}
+    RESUME = "{creees} ligne(s) créée(s), {mises_a_jour} mise(s) à jour, {ignorees} ignorée(s)"
+    # Catégories d'ErreurLigne -> libellé du détail des lignes ignorées
+    CATEGORIES = {"format": "format invalide"}
+
+    TAILLE_LOT = 1000
+    PROGRESSION = 10000
+    FILS = 1
+
+    def __init_subclass__(cls, **kwargs):
+        # ABCMeta ne refuse qu'à l'instanciation : une commande incomplète
+        # doit échouer dès le chargement de son module
+        super().__init_subclass__(**kwargs)
+        manquantes = sorted(
+            nom for nom in CommandeImport.__abstractmethods__
+            if getattr(getattr(cls, nom), "__isabstractmethod__", False)
+        )
+        if manquantes:
+            raise TypeError(f"{cls.__qualname__} doit définir {', '.join(manquantes)}()")
+
+    # ── Arguments ────────────────────────────────────────────────────────────
+
+    def ajouter_arguments(self, parser):
+        """Arguments propres à la commande (fichier(s) à importer, options)"""
+        parser.add_argument("csv_path", help="Chemin vers le fichier CSV")
+
+    def add_arguments(self, parser):
+        self.ajouter_arguments(parser)
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Simule l'import sans rien enregistrer en base.",
+        )
+        parser.add_argument(
+            "--taille-lot", type=int, default=self.TAILLE_LOT,
+            help=f"Lignes enregistrées par lot (défaut : {self.TAILLE_LOT}).",
+        )
+        parser.add_argument(
+            "--rapport",
+            help="Écrit les lignes rejetées dans ce fichier (.csv ou .json) au lieu de les afficher.",
+        )
+        parser.add_argument(
+            "--progression", type=int, default=self.PROGRESSION,
+            help=f"Affiche l'avancement toutes les N lignes (défaut : {self.PROGRESSION}, 0 : jamais).",
+        )
+        parser.add_argument(
+            "--fils", type=int, default=self.FILS,
+            help=f"Fichiers lus à l'avance en parallèle (défaut : {self.FILS}).",
+        )
+
+    # ── Points d'extension ───────────────────────────────────────────────────
+
+    def sources(self, options):
+        chemin = options["csv_path"]
+        if not os.path.isfile(chemin):
+            raise CommandError(f"Fichier introuvable : {chemin}")
+        return [Source(os.path.basename(chemin), chemin)]
+
+    def preparer(self, options):
+        """Index en mémoire, chargés une fois dans la transaction"""
+
+    def debut_source(self, source, options):
+        pass
+
+    def valider(self, valeurs, source, options):
+        """Objet à enregistrer pour la ligne, ou ErreurLigne"""
+        return valeurs
+
+    @abstractmethod
+    def ecrire_lot(self, lot, source, options):
+        """Enregistre un lot de lignes validées ; retourne (créées, mises à jour)"""
+
+    def terminer(self, options):
+        """Après la dernière source, avant le résumé"""
+
+    def confirmer(self, options):
+        """Après le résumé, hors --dry-run : CommandError annule tout l'import"""
+
+    def apres_enregistrement(self, options):
+        """Après la validation de la transaction"""
+
+    def liberer(self):
+        """Toujours appelé en fin de commande (pools, fichiers…)"""
+
+    # ── Déroulement ──────────────────────────────────────────────────────────
+
+    @contextmanager
+    def chronometrer(self, etape):
+        debut = time.monotonic()
+        try:
+            yield
+        finally:
+            self.chronos[etape] = self.chronos.get(etape, 0.0) + time.monotonic() - debut
+
+    def handle(self, *args, **options):
+        sources = list(self.sources(options))
+        if not sources:
+            raise CommandError("Aucun fichier à importer.")
+
+        self.stats = Counter()
+        self.chronos = {"préchargement": 0.0, "lecture": 0.0, "validation": 0.0, "écriture": 0.0}
+        self._debut = time.monotonic()
+        self._rapport = RapportErreurs(options["rapport"]) if options["rapport"] else None
+
+        try:
+            with transaction.atomic():
+                with self.chronometrer("préchargement"):
+                    self.preparer(options)
+                with closing(self._lire(sources, options)) as lecture:
+                    for source, lignes in lecture:
+                        self._importer_source(source, lignes, options)
+                self.terminer(options)
+                self.afficher_resume(options)
+
+                if options["dry_run"]:
+                    raise _StopDryRun()
+                self.confirmer(options)
+        except _StopDryRun:
+            self.stdout.write(self.style.WARNING(
+                "\n[DRY-RUN] Aucune donnée enregistrée. Relancez sans --dry-run pour appliquer."
+            ))
+        else:
+            self.apres_enregistrement(options)
+        finally:
+            if self._rapport is not None:
+                self._rapport.fermer()
+            self.liberer()
+
+    def _importer_source(self, source, lignes, options):
+        self.debut_source(source, options)
+        if source.erreur:
+            self.stdout.write(self.style.ERROR(f"  Fichier ignoré : {source.erreur}"))
+            return
+
+        taille_lot = options["taille_lot"]
+        progression = options["progression"]
+        lot = []
+        lignes = iter(lignes)
+        while True:
+            with self.chronometrer("lecture"):
+                suivante = next(lignes, None)
+            if suivante is None:
+                break
+            num_ligne, valeurs, erreur, brut = suivante
+            self.stats["lues"] += 1
+            if progression and options["verbosity"] >= 1 and self.stats["lues"] % progression == 0:
+                duree = time.monotonic() - self._debut
+                self.stdout.write(f"  … {self.stats['lues']} ligne(s) lues ({self.stats['lues'] / duree:.0f}/s)")
+
+            if erreur is None:
+                try:
+                    with self.chronometrer("validation"):
+                        lot.append(self.valider(valeurs, source, options))
+                except ErreurLigne as exc:
+                    erreur = exc
+            if erreur is not None:
+                self._rejeter(source, num_ligne, erreur, brut, options)
+                continue
+
+            if len(lot) >= taille_lot:
+                self._traiter_lot(lot, source, options)
+                lot = []
+        if lot:
+            self._traiter_lot(lot, source, options)
+
+    def _traiter_lot(self, lot, source, options):
+        with self.chronometrer("écriture"):
+            creees, mises_a_jour = self.ecrire_lot(lot, source, options)
+        self.stats["creees"] += creees
+        self.stats["mises_a_jour"] += mises_a_jour
+
+    def _rejeter(self, source, num_ligne, erreur, brut, options):
+        self.stats["ignorees"] += 1
+        self.stats[f"ignorees_{erreur.categorie}"] += 1
+        if self._rapport is not None:
+            self._rapport.ajouter(source.nom, num_ligne, erreur, brut)
+        elif options["verbosity"] >= 1:
+            self.stdout.write(self.style.WARNING(f"  Ligne {num_ligne} : {erreur.message}, ignorée."))
+
+    # ── Lecture en flux ──────────────────────────────────────────────────────
+
+    def _analyser(self, source):
+        """(num_ligne, valeurs, ErreurLigne ou None, ligne brute) ; sans accès à la base"""
+        if source.erreur:
+            return
+        if source.lignes is not None:
+            lignes = enumerate(source.lignes, start=1)
+            yield from (self._analyser_ligne(num, ligne) for num, ligne in lignes)
+            return
+        with open(source.chemin, newline="", encoding="utf-8") as fichier:
+            if not source.chemin.lower().endswith(".json"):
+                for num_ligne, ligne in enumerate(csv.DictReader(fichier), start=2):
+                    yield self._analyser_ligne(num_ligne, ligne)
+                return
+            # JSON : « ligne » = rang de l'élément dans le tableau
+            try:
+                for num_ligne, element in enumerate(lire_json_en_flux(fichier), start=1):
+                    yield self._analyser_ligne(num_ligne, _ligne_json(element))
+            except ValueError as exc:
+                raise CommandError(f"{source.nom} : JSON invalide ({exc})")
+
+    def _analyser_ligne(self, num_ligne, ligne):
+        if not isinstance(ligne, dict):
+            return num_ligne, None, ErreurLigne("élément JSON qui n'est pas un objet"), ligne
+        valeurs = {}
+        try:
+            for nom, colonne in self.COLONNES.items():
+                valeurs[nom] = colonne.lire(nom, ligne)
+        except ErreurLigne as exc:
+            return num_ligne, None, exc, ligne
+        return num_ligne, valeurs, None, ligne
+
+    def _lire(self, sources, options):
+        fils = options["fils"]
+        if fils <= 1 or len(sources) == 1:
+            for source in sources:
+                yield source, self._analyser(source)
+            return
+
+        # Lecture anticipée : chaque fichier est analysé par un fil dans une
+        # file bornée (mémoire limitée à ~2 lots par fichier en cours), et
+        # consommé dans l'ordre. Les sources sont soumises dans l'ordre de
+        # consommation : celle qu'on attend a toujours un fil.
+        arret = threading.Event()
+        fin = object()
+
+        def deposer(file, element):
+            # Abandon si la commande s'arrête avant d'avoir tout consommé
+            while not arret.is_set():
+                try:
+                    file.put(element, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def remplir(source, file):
+            try:
+                for element in self._analyser(source):
+                    if not deposer(file, element):
+                        return
+                deposer(file, fin)
+            except Exception as exc:
+                deposer(file, exc)
+
+        def vider(file):
+            while True:
+                element = file.get()
+                if element is fin:
+                    return
+                if isinstance(element, Exception):
+                    raise element
+                yield element
+
+        with ThreadPoolExecutor(max_workers=fils) as pool:
+            try:
+                files = []
+                for source in sources:
+                    file = queue.Queue(maxsize=2 * options["taille_lot"])
+                    pool.submit(remplir, source, file)
+                    files.append((source, file))
+                for source, file in files:
+                    yield source, vider(file)
+            finally:
+                arret.set()
+
+    # ── Résumé ───────────────────────────────────────────────────────────────
+
+    def afficher_resume(self, options):
+        s = self.stats
+        prefixe = "[DRY-RUN] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{prefixe}Terminé. {s['lues']} ligne(s) lues — "
+            + self.RESUME.format(creees=s["creees"], mises_a_jour=s["mises_a_jour"], ignorees=s["ignorees"])
+            + "."
+        ))
+
+        if s["ignorees"] and len(self.CATEGORIES) > 1:
+            self.stdout.write(self.style.WARNING(f"{s['ignorees']} ligne(s) ignorée(s) : " + ", ".join(
+                f"{s[f'ignorees_{categorie}']} {libelle}" for categorie, libelle in self.CATEGORIES.items()
+            ) + "."))
+        if self._rapport is not None and self._rapport.nombre:
+            self.stdout.write(self.style.WARNING(
+                f"{self._rapport.nombre} ligne(s) rejetée(s) détaillée(s) dans {self._rapport.chemin}."
+            ))
+
+        duree = time.monotonic() - self._debut
+        self.stdout.write(
+            f"Durée : {duree:.2f} s ({s['lues'] / duree if duree else 0:.0f} lignes/s) — "
+            + ", ".join(f"{etape} {secondes:.2f} s" for etape, secondes in self.chronos.items())
+        )
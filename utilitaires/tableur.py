@@ -0,0 +1,191 @@
+"""
+Lecture et écriture de classeurs XLSX simples, sans dépendance tierce.
+
+Un fichier XLSX est une archive ZIP de documents XML (SpreadsheetML). On
+n'écrit qu'une feuille, sans styles, avec des chaînes « inline » : de quoi
+ouvrir, remplir et réenregistrer un modèle dans Excel ou LibreOffice.
+
+À la lecture, seule la première feuille est prise en compte ; les chaînes
+partagées (ce qu'écrivent Excel et LibreOffice) et inline sont reconnues, les
+formules sont lues par leur dernière valeur calculée. Le XML reçu est analysé
+par defusedxml (fichier envoyé par un utilisateur).
+"""
+
+import io
+import posixpath
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from defusedxml import ElementTree
+
+NS = {
+    "s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+
+SIGNATURE_ZIP = b"PK\x03\x04"
+
+
+class ErreurTableur(ValueError):
+    """Classeur XLSX illisible"""
+
+
+def est_xlsx(contenu):
+    return contenu[:4] == SIGNATURE_ZIP
+
+
+def _colonne(indice):
+    """0 → A, 25 → Z, 26 → AA"""
+    lettres = ""
+    indice += 1
+    while indice:
+        indice, reste = divmod(indice - 1, 26)
+        lettres = chr(65 + reste) + lettres
+    return lettres
+
+
+def _indice(reference):
+    """« AB12 » → 27"""
+    indice = 0
+    for lettre in re.match(r"[A-Z]+", reference).group():
+        indice = indice * 26 + ord(lettre) - 64
+    return indice - 1
+
+
+# ── Écriture ─────────────────────────────────────────────────────────────
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _cellule(reference, valeur):
+    if valeur is None or valeur == "":
+        return ""
+    if isinstance(valeur, (int, float, Decimal)) and not isinstance(valeur, bool):
+        return f'<c r="{reference}"><v>{valeur}</v></c>'
+    return (
+        f'<c r="{reference}" t="inlineStr"><is>'
+        f'<t xml:space="preserve">{escape(str(valeur))}</t></is></c>'
+    )
+
+
+def ecrire_xlsx(lignes, titre="Feuille1"):
+    """Classeur d'une feuille à partir d'une liste de lignes ; retourne les octets"""
+    xml_lignes = []
+    for i, ligne in enumerate(lignes, start=1):
+        cellules = "".join(_cellule(f"{_colonne(j)}{i}", v) for j, v in enumerate(ligne))
+        xml_lignes.append(f'<row r="{i}">{cellules}</row>')
+    feuille = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<worksheet xmlns="{NS["s"]}"><sheetData>{"".join(xml_lignes)}</sheetData></worksheet>'
+    )
+    classeur = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<workbook xmlns="{NS["s"]}" xmlns:r="{NS["r"]}">'
+        f'<sheets><sheet name="{escape(titre[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+    tampon = io.BytesIO()
+    with zipfile.ZipFile(tampon, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _RELS)
+        archive.writestr("xl/workbook.xml", classeur)
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        archive.writestr("xl/worksheets/sheet1.xml", feuille)
+    return tampon.getvalue()
+
+
+# ── Lecture ──────────────────────────────────────────────────────────────
+
+def _texte(element):
+    """Texte d'un <si> ou d'un <is> : concatène les <t>, y compris ceux des runs enrichis"""
+    return "".join(t.text or "" for t in element.iter(f"{{{NS['s']}}}t"))
+
+
+def _chemin_premiere_feuille(archive):
+    classeur = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    feuille = classeur.find("s:sheets/s:sheet", NS)
+    if feuille is None:
+        raise ErreurTableur("Le classeur ne contient aucune feuille.")
+    id_relation = feuille.get(f"{{{NS['r']}}}id")
+    relations = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    for relation in relations.findall("rel:Relationship", NS):
+        if relation.get("Id") == id_relation:
+            cible = relation.get("Target")
+            if cible.startswith("/"):
+                return cible.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", cible))
+    raise ErreurTableur("Feuille introuvable dans le classeur.")
+
+
+def lire_xlsx(contenu):
+    """
+    Lignes de la première feuille, chaque ligne étant une liste de chaînes
+    (cellules vides comprises, "" en fin de ligne omises).
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(contenu)) as archive:
+            partagees = []
+            if "xl/sharedStrings.xml" in archive.namelist():
+                racine = ElementTree.fromstring(archive.read("xl/sharedStrings.xml"))
+                partagees = [_texte(si) for si in racine.findall("s:si", NS)]
+            feuille = ElementTree.fromstring(archive.read(_chemin_premiere_feuille(archive)))
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise ErreurTableur(f"Classeur XLSX illisible ({e}).")
+
+    lignes = []
+    for row in feuille.iterfind("s:sheetData/s:row", NS):
+        ligne = []
+        for c in row.iterfind("s:c", NS):
+            reference = c.get("r")
+            if reference:
+                ligne.extend([""] * (_indice(reference) - len(ligne)))
+            type_cellule = c.get("t")
+            if type_cellule == "inlineStr":
+                element = c.find("s:is", NS)
+                valeur = _texte(element) if element is not None else ""
+            else:
+                v = c.find("s:v", NS)
+                valeur = v.text or "" if v is not None else ""
+                if type_cellule == "s" and valeur:
+                    try:
+                        valeur = partagees[int(valeur)]
+                    except (IndexError, ValueError):
+                        raise ErreurTableur(f"Cellule {reference} : chaîne partagée introuvable.")
+            ligne.append(valeur.strip())
+        # Les lignes vides peuvent être omises par le tableur : on garde le numéro
+        numero = int(row.get("r", len(lignes) + 1))
+        lignes.extend([[]] * (numero - 1 - len(lignes)))
+        lignes.append(ligne)
+    return lignes